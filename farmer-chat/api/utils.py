@@ -29,6 +29,7 @@ except ImportError:
     HEALTHCARE_PDF_AVAILABLE = False
 
 from common.constants import Constants
+from common.tracing import set_trace_message, span, traced
 from common.utils import (
     create_or_update_user_by_email,
     decode_base64_to_binary,
@@ -49,6 +50,7 @@ from database.database_config import db_conn
 from database.db_operations import update_record, get_record_by_field
 from database.models import User
 from django_core.config import Config
+from intent_classification.classifier import normalize_query
 from intent_classification.intent import process_user_intent
 from language_service.asr import transcribe_and_translate
 from language_service.translation import (
@@ -57,7 +59,7 @@ from language_service.translation import (
 )
 from language_service.tts import synthesize_speech
 from language_service.utils import get_language_by_id
-from rag_service.execute_rag import execute_rag_pipeline
+from rag_service.execute_rag import execute_rag_pipeline, retrieve_query_content
 
 logger = logging.getLogger(__name__)
 
@@ -197,10 +199,51 @@ def preprocess_user_data(
     return user_data, message_obj
 
 
-def process_query(original_query, email_id, authenticated_user={}):
+@traced("prefetch_query_context")
+def prefetch_query_context(original_query, email_id, with_db_config=Config.WITH_DB_CONFIG, cancelled=None):
+    """
+    Run the steps of `process_query` which save nothing (chat history, translation to english, rephrasing and
+    content retrieval) for a query, ahead of `process_query(..., prefetched=...)`: on a stable partial transcript
+    of a voice query while the user is still speaking (see api/voice_stream.py).
+    None when the query would not go through the RAG pipeline, or when `cancelled` (a threading.Event) is set
+    before the translation or the retrieval starts.
+    """
+    if not LOCAL_CONTENT_AVAILABLE and HEALTHCARE_PDF_AVAILABLE:
+        return None
+
+    chat_history = None
+    if with_db_config:
+        user = get_user_by_email(email_id)
+        if user:
+            chat_history = get_user_chat_history(user.get("user_id"))
+
+    if cancelled is not None and cancelled.is_set():
+        return None
+    with span("translate_query"):
+        query_in_english, input_language_detected = asyncio.run(
+            detect_language_and_translate_to_english(original_query)
+        )
+    if cancelled is not None and cancelled.is_set():
+        return None
+    rephrased_query_response, retrieved_chunks_data = retrieve_query_content(
+        query_in_english, email_id, chat_history
+    )
+    return {
+        "original_query": original_query,
+        "chat_history": chat_history,
+        "query_in_english": query_in_english,
+        "input_language_detected": input_language_detected,
+        "rephrased_query_response": rephrased_query_response,
+        "retrieved_chunks_data": retrieved_chunks_data,
+    }
+
+
+@traced("process_query")
+def process_query(original_query, email_id, authenticated_user={}, prefetched=None):
     """
     Pre-process user profile and user query, execute RAG pipeline with local content
     or fallback to PDF handler, and return the generated response.
+    `prefetched` is the result of `prefetch_query_context` for the same query and chat history, if any.
     """
     message_obj, chat_history = None, None
     (
@@ -217,7 +260,13 @@ def process_query(original_query, email_id, authenticated_user={}):
         user_id = user_data.get("user_id", None)
         user_name = user_data.get("user_name", None)
         message_id = user_data.get("message_id", None)
+        set_trace_message(message_id)
         chat_history = get_user_chat_history(user_id) if user_id else None
+        if prefetched is not None and (
+            normalize_query(prefetched["original_query"]) != normalize_query(original_query)
+            or prefetched["chat_history"] != chat_history
+        ):
+            prefetched = None
 
         # Get user name for healthcare responses
         if not user_name:
@@ -229,9 +278,14 @@ def process_query(original_query, email_id, authenticated_user={}):
         message_data_to_insert_or_update["input_translation_start_time"] = (
             datetime.datetime.now()
         )
-        query_in_english, input_language_detected = asyncio.run(
-            detect_language_and_translate_to_english(original_query)
-        )
+        if prefetched is not None:
+            query_in_english = prefetched["query_in_english"]
+            input_language_detected = prefetched["input_language_detected"]
+        else:
+            with span("translate_query"):
+                query_in_english, input_language_detected = asyncio.run(
+                    detect_language_and_translate_to_english(original_query)
+                )
         message_data_to_insert_or_update["translated_message"] = query_in_english
         message_data_to_insert_or_update["input_translation_end_time"] = (
             datetime.datetime.now()
@@ -253,6 +307,7 @@ def process_query(original_query, email_id, authenticated_user={}):
                 user_name=user_name,
                 message_id=message_id,
                 chat_history=chat_history,
+                prefetched=prefetched,
             )
             
         # Priority 2: Use simple PDF handler as fallback
@@ -273,9 +328,10 @@ def process_query(original_query, email_id, authenticated_user={}):
         else:
             logger.info("🔄 ServVIA: Using original RAG pipeline (no local content)")
             
-            intent_response, user_intent, proceed_to_rag = asyncio.run(
-                process_user_intent(original_query, user_name)
-            )
+            with span("intent"):
+                intent_response, user_intent, proceed_to_rag = asyncio.run(
+                    process_user_intent(original_query, user_name, message_id)
+                )
 
             if not proceed_to_rag:
                 # do not execute rag pipeline
@@ -289,22 +345,24 @@ def process_query(original_query, email_id, authenticated_user={}):
                     user_name=user_name,
                     message_id=message_id,
                     chat_history=chat_history,
+                    prefetched=prefetched,
                 )
 
         # translate back to the detected input language of the original query
         # begin translating original response to input_language_detected
-        (
-            translated_response,
-            final_response,
-            follow_up_question_options,
-            follow_up_question_data_to_insert,
-        ) = asyncio.run(
-            postprocess_and_translate_query_response(
-                response_map.get("generated_final_response"),
-                input_language_detected,
-                str(message_id),
+        with span("translate_response"):
+            (
+                translated_response,
+                final_response,
+                follow_up_question_options,
+                follow_up_question_data_to_insert,
+            ) = asyncio.run(
+                postprocess_and_translate_query_response(
+                    response_map.get("generated_final_response"),
+                    input_language_detected,
+                    str(message_id),
+                )
             )
-        )
         # end translating original response to input_language_detected
 
         # Add healthcare-specific follow-up questions
@@ -375,10 +433,12 @@ def process_input_audio_to_base64(
     input_audio, input_audio_file = None, None
 
     try:
-        translated_text = asyncio.run(a_translate_to(original_text, language_code))
-        input_audio_file = asyncio.run(
-            synthesize_speech(str(translated_text), language_code, message_id)
-        )
+        with span("translate_heard_query"):
+            translated_text = asyncio.run(a_translate_to(original_text, language_code))
+        with span("text_to_speech", text="query"):
+            input_audio_file = asyncio.run(
+                synthesize_speech(str(translated_text), language_code, message_id)
+            )
         input_audio = encode_binary_to_base64(input_audio_file)
 
     except Exception as error:
@@ -424,9 +484,10 @@ def process_output_audio(
         
         logger.info(f"🔊 Synthesizing speech for text: '{original_text[:50]}...' in language: {input_language_detected}")
         
-        response_audio_file = asyncio.run(
-            synthesize_speech(str(original_text), input_language_detected, message_id)
-        )
+        with span("text_to_speech", text="response"):
+            response_audio_file = asyncio.run(
+                synthesize_speech(str(original_text), input_language_detected, message_id)
+            )
         
         message_data_to_insert_or_update["response_text_to_speech_end_time"] = (
             datetime.datetime.now()
@@ -479,10 +540,13 @@ def process_transcriptions(
     language_bcp_code=Constants.LANGUAGE_BCP_CODE_NATIVE,
     message_input_type=Constants.MESSAGE_INPUT_TYPE_VOICE,
     with_db_config=Config.WITH_DB_CONFIG,
+    transcription=None,
 ):
     """
     Process generation of transcriptions (text) for a given audio or voice file
     in a specified language if any or in user preferred language.
+    `transcription` is the result of a streaming recognition (see api/voice_stream.py), a dict of
+    transcriptions, detected_language, confidence_score, start_time and end_time, the audio file is then None.
     """
     message_id, message_obj = None, None
     response_map, message_data_to_insert_or_update, language_dict = {}, {}, {}
@@ -505,16 +569,23 @@ def process_transcriptions(
         )
 
         message_data_to_insert_or_update["message_input_time"] = datetime.datetime.now()
-        message_data_to_insert_or_update["input_speech_to_text_start_time"] = (
-            datetime.datetime.now()
-        )
-        transcriptions, detected_language, confidence_score = asyncio.run(
-            transcribe_and_translate(voice_file, language_bcp_code)
-        )
+        if transcription is not None:
+            transcriptions = transcription["transcriptions"]
+            confidence_score = transcription["confidence_score"]
+            message_data_to_insert_or_update["input_speech_to_text_start_time"] = transcription["start_time"]
+            message_data_to_insert_or_update["input_speech_to_text_end_time"] = transcription["end_time"]
+        else:
+            message_data_to_insert_or_update["input_speech_to_text_start_time"] = (
+                datetime.datetime.now()
+            )
+            with span("speech_to_text"):
+                transcriptions, detected_language, confidence_score = asyncio.run(
+                    transcribe_and_translate(voice_file, language_bcp_code)
+                )
 
-        message_data_to_insert_or_update["input_speech_to_text_end_time"] = (
-            datetime.datetime.now()
-        )
+            message_data_to_insert_or_update["input_speech_to_text_end_time"] = (
+                datetime.datetime.now()
+            )
         response_map["confidence_score"] = confidence_score
         response_map["transcriptions"] = transcriptions
 
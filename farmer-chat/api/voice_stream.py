@@ -0,0 +1,355 @@
+"""
+Streaming voice queries.
+
+`get_answer_by_voice_query` needs the whole recording, base64 encoded, before anything starts. Here the audio
+is received in chunks, over a WebSocket or as the chunked body of an HTTP POST, and every chunk is forwarded to
+the streaming recognizer as it arrives. When the whole transcript heard so far becomes stable (the user paused,
+likely at the end of the query), the translation, rephrasing and content retrieval of the query are started on
+it (`api.utils.prefetch_query_context`) and reused if the final transcript is the same, the prefetches of other
+transcripts being cancelled.
+
+WebSocket `/api/chat/stream_voice_query/`:
+    client: {"email_id": ..., "query_language_bcp_code": ..., "encoding": "mp3"}, the audio as binary
+            messages, then {"event": "end"}
+    server: {"event": "partial", "transcript": ..., "stable_transcript": ...} while the user speaks, then
+            {"event": "answer", "status": ..., ...the response of get_answer_by_voice_query}
+
+HTTP POST `/api/chat/stream_voice_query/?email_id=...&query_language_bcp_code=...&encoding=mp3` with the audio as
+the (chunked) request body, answered with the response of get_answer_by_voice_query.
+"""
+import asyncio
+import datetime
+import json
+import logging
+import threading
+from collections import namedtuple
+from urllib.parse import parse_qs
+
+from common.constants import Constants
+from django_core.config import Config
+from intent_classification.classifier import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# a prefetch running in a thread, `cancelled` stops it at its next step
+Speculation = namedtuple("Speculation", ["future", "cancelled"])
+
+
+class VoiceStreamClosed(Exception):
+    """The client went away before the end of the audio"""
+
+
+def _in_db_connection(function, *args, **kwargs):
+    from database.database_config import db_conn
+
+    with db_conn:
+        return function(*args, **kwargs)
+
+
+class VoiceQueryPipeline:
+    """The blocking steps of a voice query (database, Google and OpenAI calls), run in threads by the session"""
+
+    def authenticate(self, email_id):
+        from api.utils import authenticate_user_based_on_email
+
+        return _in_db_connection(authenticate_user_based_on_email, email_id)
+
+    def detect_language(self, transcriptions):
+        from language_service.asr import detect_language
+
+        return asyncio.run(detect_language(transcriptions))
+
+    def record_transcription(self, email_id, authenticated_user, language_bcp_code, transcription):
+        from api.utils import process_transcriptions
+
+        return _in_db_connection(
+            process_transcriptions,
+            None,
+            email_id,
+            authenticated_user,
+            language_bcp_code=language_bcp_code,
+            transcription=transcription,
+        )
+
+    def prefetch(self, transcript, email_id, cancelled=None):
+        from api.utils import prefetch_query_context
+
+        return _in_db_connection(prefetch_query_context, transcript, email_id, cancelled=cancelled)
+
+    def answer(self, transcript, email_id, authenticated_user, prefetched):
+        from api.utils import process_query
+
+        return _in_db_connection(process_query, transcript, email_id, authenticated_user, prefetched=prefetched)
+
+    def heard_input_audio(self, transcript, message_id):
+        from api.utils import process_input_audio_to_base64
+
+        return _in_db_connection(process_input_audio_to_base64, transcript, message_id)
+
+
+class VoiceQuerySession:
+    """One voice query, from its first audio frame to its answer"""
+
+    def __init__(
+        self,
+        email_id,
+        language_bcp_code=Constants.LANGUAGE_BCP_CODE_NATIVE,
+        encoding="mp3",
+        sample_rate_hertz=16000,
+        recognizer=None,
+        pipeline=None,
+        max_speculations=Config.ASR_MAX_SPECULATIONS,
+    ):
+        if recognizer is None:
+            from language_service.asr import get_streaming_recognizer
+
+            recognizer = get_streaming_recognizer()
+        self.email_id = email_id
+        self.language_bcp_code = language_bcp_code
+        self.encoding = encoding
+        self.sample_rate_hertz = sample_rate_hertz
+        self.recognizer = recognizer
+        self.pipeline = pipeline or VoiceQueryPipeline()
+        self.max_speculations = max_speculations
+        self.speculations = {}
+        self.used_speculation = False
+        self.audio_bytes = 0
+
+    async def _counted(self, frames):
+        async for frame in frames:
+            self.audio_bytes += len(frame)
+            yield frame
+
+    def _speculate(self, update):
+        # only once everything heard so far is stable, not on every stable prefix (a final result is stable too,
+        # its retrieval then overlaps the language detection and the recording of the transcription)
+        if not update.stable_transcript or update.stable_transcript != update.transcript:
+            return
+        key = normalize_query(update.stable_transcript)
+        if key in self.speculations or len(self.speculations) >= self.max_speculations:
+            return
+        cancelled = threading.Event()
+        self.speculations[key] = Speculation(
+            asyncio.ensure_future(
+                asyncio.to_thread(self.pipeline.prefetch, update.stable_transcript, self.email_id, cancelled)
+            ),
+            cancelled,
+        )
+
+    def _cancel_speculations(self, keep=None):
+        """Cancel the prefetches of every transcript but `keep` (normalized), their threads stop at the next step"""
+        for key, speculation in self.speculations.items():
+            if key != keep:
+                speculation.cancelled.set()
+                speculation.future.cancel()
+
+    async def _prefetched(self, transcript):
+        speculation = self.speculations.get(normalize_query(transcript))
+        if speculation is None:
+            return None
+        try:
+            prefetched = await speculation.future
+        except Exception as error:
+            logger.warning(f"Could not prefetch the context of the voice query: {error}")
+            return None
+        self.used_speculation = prefetched is not None
+        return prefetched
+
+    async def run(self, frames, on_partial=None):
+        """
+        (HTTP status, response data) of the voice query whose audio is `frames`, an async iterator of bytes,
+        `on_partial(update)` being awaited with every partial transcript
+        """
+        response_data = {
+            "message": None,
+            "heard_input_query": None,
+            "heard_input_audio": None,
+            "confidence_score": 0,
+            "error": False,
+        }
+        try:
+            authenticated_user = await asyncio.to_thread(self.pipeline.authenticate, self.email_id)
+            if not authenticated_user:
+                response_data["message"] = "Invalid Email ID"
+                return 401, response_data
+
+            start_time = datetime.datetime.now()
+            final = None
+            async for update in self.recognizer.stream(
+                self._counted(frames), self.language_bcp_code, self.encoding, self.sample_rate_hertz
+            ):
+                if update.is_final:
+                    final = update
+                    continue
+                if on_partial is not None:
+                    await on_partial(update)
+                self._speculate(update)
+            end_time = datetime.datetime.now()
+            # the user said something else than what was prefetched
+            self._cancel_speculations(keep=normalize_query(final.transcript))
+
+            if not self.audio_bytes:
+                response_data["message"] = "Please stream the audio of the voice query."
+                return 400, response_data
+
+            transcriptions, detected_language, confidence_score = final.transcript, None, 0
+            if transcriptions:
+                detected_language, confidence_score = await asyncio.to_thread(
+                    self.pipeline.detect_language, transcriptions
+                )
+            response_map = await asyncio.to_thread(
+                self.pipeline.record_transcription,
+                self.email_id,
+                authenticated_user,
+                self.language_bcp_code,
+                {
+                    "transcriptions": transcriptions,
+                    "detected_language": detected_language,
+                    "confidence_score": confidence_score,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                },
+            )
+            message_id = response_map.get("message_id")
+            response_data.update(
+                {
+                    "message": "Unfortunately unable to transcribe the above voice input query.",
+                    "message_id": message_id,
+                    "confidence_score": response_map.get("confidence_score"),
+                    "heard_input_query": response_map.get("transcriptions"),
+                }
+            )
+
+            if confidence_score and confidence_score > Constants.ASR_DEFAULT_CONFIDENCE_SCORE:
+                heard_input_audio = asyncio.ensure_future(
+                    asyncio.to_thread(self.pipeline.heard_input_audio, transcriptions, message_id)
+                )
+                prefetched = await self._prefetched(transcriptions)
+                answer_map = await asyncio.to_thread(
+                    self.pipeline.answer, transcriptions, self.email_id, authenticated_user, prefetched
+                )
+                response_data.update(
+                    {
+                        "message": "Successful retrieval of response for above query",
+                        "heard_input_audio": await heard_input_audio,
+                        "response": answer_map.get("translated_response"),
+                        "source": answer_map.get("source", None),
+                        "follow_up_questions": answer_map.get("follow_up_questions"),
+                    }
+                )
+
+        except VoiceStreamClosed:
+            raise
+        except Exception as error:
+            logger.error(error, exc_info=True)
+            response_data.update({"message": "Something went wrong", "error": True})
+            return 500, response_data
+        finally:
+            # e.g. unused after an unclear transcript, or the client went away
+            self._cancel_speculations()
+
+        return 200, response_data
+
+
+def _session_options(options):
+    return {
+        "email_id": options.get("email_id"),
+        "language_bcp_code": options.get("query_language_bcp_code") or Constants.LANGUAGE_BCP_CODE_NATIVE,
+        "encoding": options.get("encoding") or "mp3",
+        "sample_rate_hertz": int(options.get("sample_rate_hertz") or 16000),
+    }
+
+
+async def _http(scope, receive, send, session_factory):
+    async def respond(status_code, data):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status_code,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send({"type": "http.response.body", "body": json.dumps(data, default=str).encode()})
+
+    if scope["method"] != "POST":
+        await respond(405, {"message": "Method not allowed", "error": True})
+        return
+
+    async def frames():
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise VoiceStreamClosed()
+            if message.get("body"):
+                yield message["body"]
+            if not message.get("more_body"):
+                return
+
+    params = {key: values[0] for key, values in parse_qs(scope.get("query_string", b"").decode()).items()}
+    try:
+        status_code, response_data = await session_factory(**_session_options(params)).run(frames())
+    except VoiceStreamClosed:
+        return
+    await respond(status_code, response_data)
+
+
+async def _websocket(scope, receive, send, session_factory):
+    async def send_json(data):
+        await send({"type": "websocket.send", "text": json.dumps(data, default=str)})
+
+    if (await receive())["type"] != "websocket.connect":
+        return
+    await send({"type": "websocket.accept"})
+
+    message = await receive()
+    if message["type"] == "websocket.disconnect":
+        return
+    try:
+        options = json.loads(message.get("text") or "")
+    except ValueError:
+        options = None
+    if not isinstance(options, dict):
+        await send_json(
+            {
+                "event": "answer",
+                "status": 400,
+                "message": "Please send the email_id, query_language_bcp_code and encoding of the voice query first.",
+                "error": True,
+            }
+        )
+        await send({"type": "websocket.close", "code": 1003})
+        return
+
+    async def frames():
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                raise VoiceStreamClosed()
+            if message.get("bytes"):
+                yield message["bytes"]
+            elif message.get("text") and json.loads(message["text"]).get("event") == "end":
+                return
+
+    async def on_partial(update):
+        await send_json(
+            {"event": "partial", "transcript": update.transcript, "stable_transcript": update.stable_transcript}
+        )
+
+    try:
+        status_code, response_data = await session_factory(**_session_options(options)).run(frames(), on_partial)
+    except VoiceStreamClosed:
+        return
+    await send_json(dict(response_data, event="answer", status=status_code))
+    await send({"type": "websocket.close", "code": 1000})
+
+
+def voice_query_stream_application(session_factory=VoiceQuerySession):
+    """ASGI application of the streaming voice queries, over HTTP and WebSocket"""
+
+    async def application(scope, receive, send):
+        if scope["type"] == "websocket":
+            await _websocket(scope, receive, send, session_factory)
+        elif scope["type"] == "http":
+            await _http(scope, receive, send, session_factory)
+
+    return application
@@ -0,0 +1,141 @@
+"""
+History assembly latency of ``common.utils.get_user_chat_history`` for
+conversations with 10, 100 and 1000 prior messages: the former query and
+format on every turn against ``common.chat_history.ChatHistoryCache`` with
+the in-process store (which checks the latest message id before trusting an
+entry) and, with ``--redis-url``, the Redis store.
+
+    docker run -d -p 5432:5432 -e POSTGRES_PASSWORD=postgres postgres:16
+    python benchmarks/chat_history.py --host localhost --password postgres --redis-url redis://localhost:6379/0
+
+Every turn reads the history, then saves the answered message as
+``save_message_obj`` does. The tables are created in the given database
+(and left in place).
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.chat_history import ChatHistoryCache, LocalHistoryStore, RedisHistoryStore  # noqa: E402
+from database.database_config import db_conn  # noqa: E402
+from database.middleware import PeeweeConnectionMiddleware  # noqa: E402
+from database.models import Conversation, Language, Messages, User  # noqa: E402
+
+WINDOW = 4
+
+
+def uncached_history(user_id):
+    """The former get_user_chat_history."""
+    with db_conn:
+        conversation = (
+            Conversation.select().where(Conversation.user_id == user_id).order_by(Conversation.created_on.desc()).get()
+        )
+        messages = (
+            Messages.select()
+            .where(
+                Messages.conversation_id == conversation.id,
+                Messages.is_deleted == False,  # noqa: E712
+                Messages.translated_message != None,  # noqa: E711
+                Messages.message_response != None,  # noqa: E711
+            )
+            .order_by(Messages.created_on.desc())
+            .limit(WINDOW)
+        )
+        chat_history = ""
+        for message in reversed(messages):
+            chat_history = (
+                chat_history + f"\n\nUser : {message.translated_message}\nAI Assistant : {message.message_response}"
+            )
+    return chat_history
+
+
+def cached_history(cache):
+    def history(user_id):
+        with db_conn:
+            conversation_id = cache.conversation_id(
+                user_id,
+                lambda user_id: Conversation.select().where(Conversation.user_id == user_id).get(),
+            )
+            return cache.get_history(conversation_id)
+    return history
+
+
+def seed(prior_messages):
+    user = User.create(email=f"bench-{uuid.uuid4().hex[:8]}@example.com")
+    conversation = Conversation.create(user=user)
+    start = datetime.datetime.now() - datetime.timedelta(days=1)
+    Messages.insert_many([
+        {"id": str(uuid.uuid4()), "conversation": conversation.id, "translated_message": f"question {index} " * 8,
+         "message_response": f"answer {index} " * 60, "created_on": start + datetime.timedelta(seconds=index)}
+        for index in range(prior_messages)
+    ]).execute()
+    return user, conversation
+
+
+def run_turns(history, user, conversation, turns, record=None):
+    latencies, sizes = [], []
+    middleware = PeeweeConnectionMiddleware(lambda request: history(user.id))
+    for turn in range(turns):
+        started = time.perf_counter()
+        prompt_history = middleware(None)
+        latencies.append(time.perf_counter() - started)
+        sizes.append(len(prompt_history))
+        with db_conn:
+            message = Messages.create(conversation=conversation, translated_message=f"new question {turn}")
+            message.message_response = f"new answer {turn} " * 60
+            message.save()
+        if record is not None:
+            record(message)
+    return latencies, sizes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dbname", default="postgres")
+    parser.add_argument("--user", default="postgres")
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--host", default="localhost", help="host name or unix socket directory")
+    parser.add_argument("--port", type=int, default=5432)
+    parser.add_argument("--redis-url", help="also run the Redis store")
+    parser.add_argument("--prior-messages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    db_conn.init(args.dbname, user=args.user, password=args.password, host=args.host, port=args.port)
+    with db_conn:
+        db_conn.create_tables([Language, User, Conversation, Messages], safe=True)
+
+    stores = [("in-process LRU", LocalHistoryStore)]
+    if args.redis_url:
+        import redis
+
+        client = redis.Redis.from_url(args.redis_url)
+        stores.append(("Redis", lambda: RedisHistoryStore(client, prefix=f"bench:{uuid.uuid4().hex}:")))
+
+    for prior_messages in args.prior_messages:
+        print(f"{prior_messages} prior messages, {args.turns} turns")
+        with db_conn:
+            user, conversation = seed(prior_messages)
+        latencies, sizes = run_turns(uncached_history, user, conversation, args.turns)
+        report("query and format every turn", latencies, sizes)
+        for label, store in stores:
+            with db_conn:
+                user, conversation = seed(prior_messages)
+            cache = ChatHistoryCache(store(), window=WINDOW)
+            latencies, sizes = run_turns(cached_history(cache), user, conversation, args.turns, cache.record_message)
+            report(f"cache, {label}", latencies, sizes)
+
+
+def report(label, latencies, sizes):
+    print(f"  {label:<30} first {latencies[0] * 1000:>7.3f} ms  median {statistics.median(latencies) * 1000:>7.3f} ms"
+          f"  p95 {sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000:>7.3f} ms  max history {max(sizes)} chars")
+
+
+if __name__ == "__main__":
+    main()
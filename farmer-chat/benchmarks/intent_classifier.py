@@ -0,0 +1,146 @@
+"""
+Offline evaluation of the local intent classifier (``intent_classification.classifier``) against the
+intents given by the LLM: the model is cross-validated on the LLM labelled queries, and for each confidence
+threshold the report gives the share of queries escalated to the LLM and the agreement of the local answers
+with the LLM, then the per intent figures at ``--threshold`` and the local prediction latency.
+
+    python benchmarks/intent_classifier.py --host localhost --password postgres
+    python benchmarks/intent_classifier.py --labels labelled_queries.jsonl
+
+The labelled queries are the ``IntentClassification`` entries with source "llm", or a JSON lines file of
+``{"query": ..., "intent": ...}``. When they are read from the database, the share of the classifications
+of the served traffic answered by each tier (cache, local model, LLM) is reported too.
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django_core.config import Config  # noqa: E402
+from intent_classification.classifier import LocalIntentModel, normalize_query  # noqa: E402
+
+THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99]
+
+
+def read_labels(path):
+    labelled = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                labelled[normalize_query(entry["query"])] = (entry["query"], entry["intent"])
+    return [query for query, _ in labelled.values()], [intent for _, intent in labelled.values()]
+
+
+def cross_validate(queries, intents, folds):
+    """Out of fold (intent, confidence) of every query"""
+    from sklearn.model_selection import KFold, StratifiedKFold
+
+    if min(Counter(intents).values()) >= folds:
+        splits = StratifiedKFold(n_splits=folds, shuffle=True, random_state=0).split(queries, intents)
+    else:
+        splits = KFold(n_splits=folds, shuffle=True, random_state=0).split(queries)
+    predictions = [None] * len(queries)
+    for train, test in splits:
+        model = LocalIntentModel.train([queries[i] for i in train], [intents[i] for i in train])
+        for i, prediction in zip(test, model.predict_many([normalize_query(queries[i]) for i in test])):
+            predictions[i] = prediction
+    return predictions
+
+
+def threshold_report(intents, predictions):
+    print(f"{'threshold':>9}  {'escalated':>9}  {'local accuracy':>14}  {'agreement with LLM':>18}")
+    for threshold in THRESHOLDS:
+        local = [(intent, predicted) for intent, (predicted, confidence) in zip(intents, predictions)
+                 if confidence >= threshold]
+        correct = sum(intent == predicted for intent, predicted in local)
+        escalated = len(intents) - len(local)
+        local_accuracy = f"{correct / len(local):.1%}" if local else "-"
+        print(f"{threshold:>9.2f}  {escalated / len(intents):>9.1%}  {local_accuracy:>14}  "
+              f"{(correct + escalated) / len(intents):>18.1%}")
+
+
+def intent_report(intents, predictions, threshold):
+    print(f"\nat threshold {threshold}")
+    print(f"{'intent':<18} {'queries':>7}  {'escalated':>9}  {'precision':>9}  {'recall':>7}")
+    for intent, count in Counter(intents).most_common():
+        escalated = sum(1 for label, (_, confidence) in zip(intents, predictions)
+                        if label == intent and confidence < threshold)
+        predicted = [label for label, (prediction, confidence) in zip(intents, predictions)
+                     if prediction == intent and confidence >= threshold]
+        answered = count - escalated
+        true_positives = sum(label == intent for label in predicted)
+        precision = f"{true_positives / len(predicted):.1%}" if predicted else "-"
+        recall = f"{true_positives / answered:.1%}" if answered else "-"
+        print(f"{intent:<18} {count:>7}  {escalated / count:>9.1%}  {precision:>9}  {recall:>7}")
+
+
+def latency_report(queries, intents, samples=1000):
+    model = LocalIntentModel.train(queries, intents)
+    normalized = [normalize_query(query) for query in queries[:samples]]
+    latencies = []
+    for query in normalized:
+        started = time.perf_counter()
+        model.predict(query)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    print(f"\nlocal prediction of one query: median {statistics.median(latencies) * 1e6:.0f} us  "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1e6:.0f} us")
+
+
+def traffic_report(since):
+    from database.models import IntentClassification
+    from peewee import fn
+
+    sources = dict(
+        IntentClassification.select(IntentClassification.source, fn.COUNT(IntentClassification.id))
+        .where(IntentClassification.created_on >= since)
+        .group_by(IntentClassification.source)
+        .tuples()
+    )
+    total = sum(sources.values())
+    if total:
+        shares = "  ".join(f"{source} {count / total:.1%}" for source, count in sorted(sources.items()))
+        print(f"\nserved classifications since {since:%Y-%m-%d}: {total}  {shares}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--labels", help="JSON lines file of labelled queries, instead of the database")
+    parser.add_argument("--dbname", default="postgres")
+    parser.add_argument("--user", default="postgres")
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--host", default="localhost", help="host name or unix socket directory")
+    parser.add_argument("--port", type=int, default=5432)
+    parser.add_argument("--days", type=int, default=30, help="the served traffic of the last DAYS days")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=Config.INTENT_CONFIDENCE_THRESHOLD)
+    args = parser.parse_args()
+
+    since = datetime.datetime.now() - datetime.timedelta(days=args.days)
+    if args.labels:
+        queries, intents = read_labels(args.labels)
+    else:
+        from database.database_config import db_conn
+        from intent_classification.classifier import load_labelled_queries
+
+        db_conn.init(args.dbname, user=args.user, password=args.password, host=args.host, port=args.port)
+        with db_conn:
+            queries, intents = load_labelled_queries()
+            traffic_report(since)
+
+    print(f"{len(queries)} distinct queries labelled by the LLM, {args.folds}-fold cross-validation\n")
+    predictions = cross_validate(queries, intents, args.folds)
+    threshold_report(intents, predictions)
+    intent_report(intents, predictions, args.threshold)
+    latency_report(queries, intents)
+
+
+if __name__ == "__main__":
+    main()
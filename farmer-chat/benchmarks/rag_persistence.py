@@ -0,0 +1,197 @@
+"""
+Latency of the database writes and reads of one chat request (user and
+conversation lookup, message insert, chat history, the RAG pipeline logs and
+the final message update) with the former connection handling against the
+pooled, per-request connection of ``database.middleware``.
+
+    docker run -d -p 5432:5432 -e POSTGRES_PASSWORD=postgres postgres:16
+    python benchmarks/rag_persistence.py --host localhost --password postgres --requests 200 --threads 1 4
+
+Former path: every ``with db_conn`` block opened and closed a connection of
+its own, while the models ran their queries on a second, never closed,
+connection of another ``database_config`` module instance. New path: the
+request checks out one pooled connection which every operation reuses.
+The tables are created in the given database (and left in place).
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from peewee import DoesNotExist, PostgresqlDatabase  # noqa: E402
+
+from database import db_operations  # noqa: E402
+from database.database_config import db_conn  # noqa: E402
+from database.middleware import PeeweeConnectionMiddleware  # noqa: E402
+from database.models import (  # noqa: E402
+    Conversation,
+    FollowUpQuestion,
+    GenerationMetrics,
+    Language,
+    Messages,
+    RephraseMetrics,
+    RerankedChunk,
+    RerankMetrics,
+    RetrievedChunk,
+    User,
+)
+
+MODELS = [
+    Language, User, Conversation, Messages, FollowUpQuestion, RetrievedChunk,
+    RerankedChunk, RerankMetrics, GenerationMetrics, RephraseMetrics,
+]
+
+
+class LegacyOperations:
+    """The former ``database.db_operations``: ``wrapper`` opens a connection per block, the models use ``models_db``."""
+
+    def __init__(self, wrapper):
+        self.db = wrapper
+
+    def get_record_by_field(self, model_class, field_name, value):
+        try:
+            with self.db:
+                return model_class.select().where(getattr(model_class, field_name) == value).get()
+        except DoesNotExist:
+            return None
+
+    def create_record(self, model_class, data):
+        with self.db.atomic():
+            return model_class.create(**data)
+
+    def create_multiple_records(self, model_class, data):
+        with self.db.atomic():
+            return model_class.insert_many(data).execute()
+
+    def update_record(self, model_class, record_id, data):
+        record = model_class.get_by_id(record_id)
+        with self.db.atomic():
+            for field, value in data.items():
+                setattr(record, field, value)
+            record.save()
+        return record
+
+    def chat_history(self, conversation_id):
+        with self.db:
+            return list(
+                Messages.select()
+                .where(Messages.conversation_id == conversation_id, Messages.message_response != None)  # noqa: E711
+                .order_by(Messages.created_on.desc())
+                .limit(4)
+            )
+
+    def latest_conversation(self, user_id):
+        with self.db:
+            query = Conversation.select().where(Conversation.user_id == user_id).order_by(Conversation.created_on.desc())
+        return query.get() if len(query) >= 1 else None
+
+
+class PooledOperations(LegacyOperations):
+    """``database.db_operations`` on the pooled ``db_conn``."""
+
+    def __init__(self):
+        super().__init__(db_conn)
+        self.get_record_by_field = db_operations.get_record_by_field
+        self.create_record = db_operations.create_record
+        self.create_multiple_records = db_operations.create_multiple_records
+        self.update_record = db_operations.update_record
+
+    def latest_conversation(self, user_id):
+        with self.db:
+            query = Conversation.select().where(Conversation.user_id == user_id).order_by(Conversation.created_on.desc())
+            return query.get() if len(query) >= 1 else None
+
+
+def chat_request(ops, email, index):
+    """The persistence sequence of one answered text query."""
+    now = datetime.datetime.now()
+    user = ops.get_record_by_field(User, "email", email)
+    conversation = ops.latest_conversation(user.id)
+    message = ops.create_record(
+        Messages, {"conversation": conversation.id, "original_message": f"query {index}", "message_input_time": now}
+    )
+    ops.chat_history(conversation.id)
+    ops.create_record(RephraseMetrics, {"message": message.id, "rephrase_start_time": now, "total_tokens": "120"})
+    ops.create_multiple_records(RetrievedChunk, [
+        {"chunk_id": str(uuid.uuid4()), "message": message.id, "chunk_text": "chunk text " * 80,
+         "source": "source.pdf", "cosine_score": 0.8, "page_no": rank, "id": str(uuid.uuid4())}
+        for rank in range(10)
+    ])
+    ops.create_multiple_records(RerankedChunk, [
+        {"chunk_id": str(uuid.uuid4()), "message": message.id, "chunk_text": "chunk text " * 80,
+         "source": "source.pdf", "rank": rank, "id": str(uuid.uuid4())}
+        for rank in range(5)
+    ])
+    ops.create_record(RerankMetrics, {"message": message.id, "rerank_start_time": now, "total_tokens": "900"})
+    ops.create_record(GenerationMetrics, {"message": message.id, "generation_start_time": now, "total_tokens": "700"})
+    ops.create_multiple_records(FollowUpQuestion, [
+        {"id": str(uuid.uuid4()), "ref_id": message.id, "message": f"follow up {rank}", "sequence": rank}
+        for rank in range(3)
+    ])
+    ops.update_record(Messages, message.id, {
+        "translated_message": f"query {index}", "message_response": "answer " * 50,
+        "message_response_time": datetime.datetime.now(),
+    })
+
+
+def run(label, request, requests, threads):
+    def timed(index):
+        started = time.perf_counter()
+        request(index)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        latencies = sorted(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<34} {threads:>2} threads  median {statistics.median(latencies) * 1000:>7.2f} ms  "
+          f"p95 {p95 * 1000:>7.2f} ms  {requests / elapsed:>7.1f} requests/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dbname", default="postgres")
+    parser.add_argument("--user", default="postgres")
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--host", default="localhost", help="host name or unix socket directory")
+    parser.add_argument("--port", type=int, default=5432)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--max-connections", type=int, default=8)
+    args = parser.parse_args()
+
+    connect_kwargs = dict(user=args.user, password=args.password, host=args.host, port=args.port)
+    setup_db = PostgresqlDatabase(args.dbname, **connect_kwargs)
+    with setup_db.bind_ctx(MODELS):
+        setup_db.create_tables(MODELS, safe=True)
+        email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+        user = User.create(email=email)
+        Conversation.create(user=user)
+    setup_db.close()
+
+    for threads in args.threads:
+        # former path: a connection per `with` block, plus the models' own connection in every thread
+        wrapper = PostgresqlDatabase(args.dbname, **connect_kwargs)
+        models_db = PostgresqlDatabase(args.dbname, **connect_kwargs)
+        legacy = LegacyOperations(wrapper)
+        with models_db.bind_ctx(MODELS):
+            run("connection per operation", lambda index: chat_request(legacy, email, index), args.requests, threads)
+
+        db_conn.init(args.dbname, max_connections=args.max_connections, stale_timeout=300, timeout=10, **connect_kwargs)
+        db_conn.reset_metrics()
+        pooled = PooledOperations()
+        middleware = PeeweeConnectionMiddleware(lambda index: chat_request(pooled, email, index))
+        run("pooled, connection per request", middleware, args.requests, threads)
+        print(f"    pool: {db_conn.pool_metrics()}")
+        db_conn.close_all()
+
+
+if __name__ == "__main__":
+    main()
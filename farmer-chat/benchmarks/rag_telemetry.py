@@ -0,0 +1,131 @@
+"""
+Time spent in ``rag_service.utils.post_process_rag_pipeline`` per answered
+query: the former synchronous inserts (one transaction per metrics row and
+per chunk list) against the write-behind buffer of ``database.write_behind``,
+plus the time the buffer takes to write everything it queued.
+
+    docker run -d -p 5432:5432 -e POSTGRES_PASSWORD=postgres postgres:16
+    python benchmarks/rag_telemetry.py --host localhost --password postgres --queries 500
+
+The tables are created in the given database (and left in place).
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import write_behind  # noqa: E402
+from database.database_config import db_conn  # noqa: E402
+from database.db_operations import create_multiple_records, create_record  # noqa: E402
+from database.middleware import PeeweeConnectionMiddleware  # noqa: E402
+from database.models import (  # noqa: E402
+    Conversation,
+    GenerationMetrics,
+    Language,
+    Messages,
+    RephraseMetrics,
+    RerankedChunk,
+    RerankMetrics,
+    RetrievedChunk,
+    User,
+)
+from rag_service.utils import post_process_rag_pipeline  # noqa: E402
+
+TELEMETRY_MODELS = [RephraseMetrics, RetrievedChunk, RerankedChunk, RerankMetrics, GenerationMetrics]
+
+
+def pipeline_logs(message_id, chunks):
+    """The arguments of post_process_rag_pipeline for one query, as built by execute_rag_pipeline."""
+    now = datetime.datetime.now()
+    retrieved = [
+        {"chunk_id": str(uuid.uuid4()), "message": message_id, "chunk_text": "chunk text " * 80,
+         "source": "guide.pdf", "repo_link": None, "cosine_score": 0.8, "page_no": rank, "rank": None}
+        for rank in range(chunks)
+    ]
+    reranked = [
+        {"chunk_id": chunk["chunk_id"], "message": message_id, "chunk_text": chunk["chunk_text"],
+         "source": "guide.pdf", "rank": rank}
+        for rank, chunk in enumerate(retrieved[:5])
+    ]
+    tokens = {"completion_tokens": 120, "prompt_tokens": 900, "total_tokens": 1020}
+    return (
+        message_id,
+        dict(tokens, rephrased_query="rephrased", rephrase_start_time=now, rephrase_end_time=now),
+        retrieved,
+        reranked,
+        dict(tokens, reranked_chunks={}, rerank_start_time=now, rerank_end_time=now, is_rerank_response_parsed=True),
+        dict(tokens, response="answer " * 100, generation_start_time=now, generation_end_time=now),
+    )
+
+
+def synchronous_post_process(message_id, rephrase, retrieved, reranked, rerank, generation):
+    """The former post_process_rag_pipeline: five inserts in the request."""
+    create_record(RephraseMetrics, dict(rephrase, message_id=message_id))
+    create_multiple_records(RetrievedChunk, retrieved)
+    create_multiple_records(RerankedChunk, reranked)
+    create_record(RerankMetrics, dict(rerank, message_id=message_id))
+    create_record(GenerationMetrics, dict(generation, message_id=message_id))
+
+
+def run(label, post_process, requests):
+    latencies = []
+    middleware = PeeweeConnectionMiddleware(lambda args: post_process(*args))
+    started = time.perf_counter()
+    for args in requests:
+        call_started = time.perf_counter()
+        middleware(args)
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(f"{label:<28} median {statistics.median(latencies) * 1000:>7.3f} ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:>7.3f} ms  total {elapsed:>6.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dbname", default="postgres")
+    parser.add_argument("--user", default="postgres")
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--host", default="localhost", help="host name or unix socket directory")
+    parser.add_argument("--port", type=int, default=5432)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--chunks", type=int, default=10, help="retrieved chunks per query")
+    parser.add_argument("--flush-size", type=int, default=500)
+    parser.add_argument("--fsync", action="store_true", help="fsync the spill file on every queued row")
+    args = parser.parse_args()
+
+    db_conn.init(args.dbname, user=args.user, password=args.password, host=args.host, port=args.port)
+    with db_conn:
+        db_conn.create_tables([Language, User, Conversation, Messages] + TELEMETRY_MODELS, safe=True)
+        conversation = Conversation.create(user=User.create(email=f"bench-{uuid.uuid4().hex[:8]}@example.com"))
+        message_ids = [Messages.create(conversation=conversation).id for _ in range(args.queries)]
+
+    rows_per_query = args.chunks + min(args.chunks, 5) + 3
+    print(f"{args.queries} queries, {rows_per_query} telemetry rows each")
+    run("synchronous inserts", synchronous_post_process, [pipeline_logs(m, args.chunks) for m in message_ids])
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        writer = write_behind.WriteBehindBuffer(
+            spill_dir, TELEMETRY_MODELS, flush_size=args.flush_size, flush_interval=1.0, fsync=args.fsync
+        )
+        write_behind._telemetry_writer = writer
+        requests = [pipeline_logs(m, args.chunks) for m in message_ids]
+        started = time.perf_counter()
+        run("write-behind buffer", lambda *logs: post_process_rag_pipeline(*logs, with_db_config=True), requests)
+        writer.close()
+        print(f"{'  ...all rows written after':<28} {time.perf_counter() - started:>6.2f} s")
+
+    with db_conn:
+        expected = args.queries * rows_per_query * 2
+        saved = sum(model.select().where(model.message.in_(message_ids)).count() for model in TELEMETRY_MODELS)
+        print(f"rows saved {saved} / {expected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Database queries and latency of the static text lookups of a request
+(``common.utils.fetch_multilingual_texts_for_static_text_messages``): the former query of the
+``multilingual_text`` table on every lookup against ``common.static_texts.StaticTextCatalog``, then the time
+the catalog of a worker takes to see a change of the table through the LISTEN/NOTIFY trigger.
+
+    docker run -d -p 5432:5432 -e POSTGRES_PASSWORD=postgres postgres:16
+    python benchmarks/static_texts.py --host localhost --password postgres
+
+The tables and the notification trigger are created in the given database (and left in place), the texts of
+the benchmark have text codes of their own.
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.static_texts import StaticTextCatalog, StaticTextListener, create_notify_trigger  # noqa: E402
+from database.database_config import db_conn  # noqa: E402
+from database.models import Language, MultilingualText  # noqa: E402
+
+
+class QueryCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.queries = 0
+
+    def emit(self, record):
+        self.queries += 1
+
+
+def uncached_texts(text_codes):
+    """The former lookup of fetch_multilingual_texts_for_static_text_messages"""
+    with db_conn:
+        query = MultilingualText.select(MultilingualText.text_code, MultilingualText.text).where(
+            MultilingualText.is_deleted == False,
+            MultilingualText.text_code.in_(text_codes),
+        )
+        if len(query) >= 1:
+            return list(query.dicts().execute())
+    return []
+
+
+def seed(languages, texts_per_language):
+    prefix = f"bench_{uuid.uuid4().hex[:8]}"
+    first_language = (Language.select(Language.id).order_by(Language.id.desc()).scalar() or 0) + 1
+    first_text = (MultilingualText.select(MultilingualText.id).order_by(MultilingualText.id.desc()).scalar() or 0) + 1
+    codes = []
+    for number in range(languages):
+        code = f"b{uuid.uuid4().hex[:6]}"
+        codes.append(code)
+        Language.create(id=first_language + number, name=code, display_name=code, code=code)
+    MultilingualText.insert_many(
+        [
+            {
+                "id": first_text + number * texts_per_language + index,
+                "language": first_language + number,
+                "text_code": f"{prefix}_{index}_{code}",
+                "text": f"static text {index} in {code}",
+            }
+            for number, code in enumerate(codes)
+            for index in range(texts_per_language)
+        ]
+    ).execute()
+    return prefix, codes
+
+
+def run_requests(lookup, prefix, codes, requests):
+    latencies = []
+    for number in range(requests):
+        code = codes[number % len(codes)]
+        started = time.perf_counter()
+        lookup([f"{prefix}_0_{code}"], code)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(label, latencies, queries):
+    print(
+        f"  {label:<28} {queries / len(latencies):>5.2f} queries/request  median "
+        f"{statistics.median(latencies) * 1000:>7.3f} ms  p95 "
+        f"{sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000:>7.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dbname", default="postgres")
+    parser.add_argument("--user", default="postgres")
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--host", default="localhost", help="host name or unix socket directory")
+    parser.add_argument("--port", type=int, default=5432)
+    parser.add_argument("--languages", type=int, default=12)
+    parser.add_argument("--texts-per-language", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    db_conn.init(args.dbname, user=args.user, password=args.password, host=args.host, port=args.port)
+    with db_conn:
+        db_conn.create_tables([Language, MultilingualText], safe=True)
+        prefix, codes = seed(args.languages, args.texts_per_language)
+    create_notify_trigger(db_conn)
+
+    counter = QueryCounter()
+    peewee_logger = logging.getLogger("peewee")
+    peewee_logger.addHandler(counter)
+    peewee_logger.setLevel(logging.DEBUG)
+
+    print(f"{args.languages} languages of {args.texts_per_language} static texts, {args.requests} requests")
+    latencies = run_requests(lambda text_codes, code: uncached_texts(text_codes), prefix, codes, args.requests)
+    report("query every lookup", latencies, counter.queries)
+
+    catalog = StaticTextCatalog(database=db_conn, max_age=3600)
+    started = time.perf_counter()
+    catalog.warm_up()
+    print(f"  catalog warm up: {(time.perf_counter() - started) * 1000:.1f} ms")
+    counter.queries = 0
+    latencies = run_requests(catalog.get, prefix, codes, args.requests)
+    report("catalog", latencies, counter.queries)
+
+    listener = StaticTextListener(catalog, database=db_conn, poll_interval=0.5)
+    listener.start()
+    listener.listening.wait(10)
+    text_code = f"{prefix}_0_{codes[0]}"
+    delays = []
+    for change in range(5):
+        with db_conn:
+            MultilingualText.update(text=f"changed {change}").where(MultilingualText.text_code == text_code).execute()
+        changed = time.perf_counter()
+        while catalog.get([text_code], codes[0]).get(text_code) != f"changed {change}":
+            time.sleep(0.001)
+        delays.append(time.perf_counter() - changed)
+    listener.stop()
+    print(f"  change seen by the catalog after a median {statistics.median(delays) * 1000:.1f} ms (LISTEN/NOTIFY)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Simulated latency of a voice query after the end of speech, on the batch path of ``get_answer_by_voice_query``
+(the whole recording is uploaded, then recognized, then the query answered) and on the streaming path of
+``api.voice_stream`` (the audio is recognized while it is spoken and the retrieval starts on the stable
+partial transcript).
+
+    python benchmarks/voice_query.py --words 12 --speech-rate 2.5 --retrieval 1.2
+
+No service is called: the recognizer is ``language_service.fake_recognizer.FakeRecognizer`` and every step of
+the pipeline sleeps for the latency given to it, so the figures show how the steps overlap, not the latency
+of Google or OpenAI. Reported per path: the time from the end of speech to the final transcript and to the
+first token of the answer.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.voice_stream import VoiceQuerySession  # noqa: E402
+from language_service.fake_recognizer import FakeRecognizer  # noqa: E402
+
+WORDS = "how do I protect my tomato plants from early blight during the monsoon season this year".split()
+BYTES_PER_WORD = 4000
+
+
+class SimulatedPipeline:
+    """VoiceQueryPipeline whose steps sleep, the time of the final transcript and first token being recorded"""
+
+    def __init__(self, args):
+        self.args = args
+        self.transcribed_at = None
+        self.first_token_at = None
+
+    def authenticate(self, email_id):
+        return {"first_name": "Asha"}
+
+    def detect_language(self, transcriptions):
+        time.sleep(self.args.detect_language)
+        return "en", 0.95
+
+    def record_transcription(self, email_id, authenticated_user, language_bcp_code, transcription):
+        self.transcribed_at = time.perf_counter()
+        time.sleep(self.args.database)
+        return {
+            "message_id": "message",
+            "confidence_score": transcription["confidence_score"],
+            "transcriptions": transcription["transcriptions"],
+        }
+
+    def prefetch(self, transcript, email_id):
+        time.sleep(self.args.retrieval)
+        return {"original_query": transcript}
+
+    def answer(self, transcript, email_id, authenticated_user, prefetched):
+        if prefetched is None:
+            self.prefetch(transcript, email_id)
+        time.sleep(self.args.first_token)
+        self.first_token_at = time.perf_counter()
+        return {"translated_response": "answer", "follow_up_questions": []}
+
+    def heard_input_audio(self, transcript, message_id):
+        return None
+
+
+def recognizer(args, words):
+    return FakeRecognizer(
+        " ".join(words),
+        bytes_per_word=BYTES_PER_WORD,
+        final_latency=args.endpointing,
+        batch_latency=args.batch_recognize,
+        batch_latency_per_byte=args.batch_recognize_per_second / (BYTES_PER_WORD * args.speech_rate),
+    )
+
+
+def batch(args, words):
+    """(to transcript, to first token) of the former path: upload, recognize, then answer"""
+    fake, pipeline = recognizer(args, words), SimulatedPipeline(args)
+    audio = b"\0" * (BYTES_PER_WORD * len(words))
+    time.sleep(len(audio) / args.upload_bytes_per_second)
+    transcript = fake.recognize(audio)
+    pipeline.detect_language(transcript)
+    pipeline.record_transcription(None, None, None, {"transcriptions": transcript, "confidence_score": 0.95})
+    pipeline.answer(transcript, None, None, None)
+    return pipeline.transcribed_at, pipeline.first_token_at
+
+
+async def streaming(args, words):
+    """(end of speech, to transcript, to first token) of the streaming path"""
+    pipeline = SimulatedPipeline(args)
+    end_of_speech = None
+
+    async def frames():
+        nonlocal end_of_speech
+        for _ in words:
+            await asyncio.sleep(1 / args.speech_rate)
+            yield b"\0" * BYTES_PER_WORD
+        end_of_speech = time.perf_counter()
+
+    session = VoiceQuerySession("asha@example.com", recognizer=recognizer(args, words), pipeline=pipeline)
+    await session.run(frames())
+    return end_of_speech, pipeline.transcribed_at, pipeline.first_token_at
+
+
+def summary(label, timings):
+    to_transcript = [transcribed - end for end, transcribed, _ in timings]
+    to_first_token = [first_token - end for end, _, first_token in timings]
+    print(
+        f"{label:<10} to transcript {statistics.median(to_transcript) * 1000:8.0f} ms   "
+        f"to first token {statistics.median(to_first_token) * 1000:8.0f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=12, help="words of the voice query")
+    parser.add_argument("--speech-rate", type=float, default=2.5, help="words spoken per second")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--upload-bytes-per-second", type=float, default=200_000, help="of the batch path")
+    parser.add_argument("--batch-recognize", type=float, default=0.6, help="seconds of a batch recognition")
+    parser.add_argument(
+        "--batch-recognize-per-second", type=float, default=0.1, help="seconds per second of audio recognized"
+    )
+    parser.add_argument("--endpointing", type=float, default=0.4, help="seconds to the final streaming result")
+    parser.add_argument("--detect-language", type=float, default=0.15)
+    parser.add_argument("--database", type=float, default=0.02)
+    parser.add_argument("--retrieval", type=float, default=1.2, help="seconds of translation, rephrasing, search")
+    parser.add_argument("--first-token", type=float, default=0.6, help="seconds to the first token of the answer")
+    args = parser.parse_args()
+
+    words = (WORDS * (args.words // len(WORDS) + 1))[: args.words]
+    print(f"{len(words)} words at {args.speech_rate} words/s, simulated stage latencies")
+
+    timings = []
+    for _ in range(args.runs):
+        # the recording ends with the speech, the upload starts then
+        end_of_speech = time.perf_counter()
+        timings.append((end_of_speech,) + batch(args, words))
+    summary("batch", timings)
+    summary("streaming", [asyncio.run(streaming(args, words)) for _ in range(args.runs)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Per-conversation chat history cache with rolling summaries.
+
+The prompt history of a conversation is kept as its last `window` answered turns plus a rolling summary of
+the older ones. The cached entry is updated when a message is saved (see `record_message`) instead of
+re-querying and re-formatting the messages on every turn, and the verbatim turns are compacted into the
+summary once they exceed `token_budget` tokens, so the prompt stays bounded however long the conversation.
+
+Entries live in an in-process LRU or, when `CHAT_HISTORY_REDIS_URL` is set, in Redis, shared by all workers.
+A worker cannot see the writes of the other workers to its in-process LRU, so it checks the id of the latest
+answered message of the conversation before trusting an entry (one indexed lookup instead of loading and
+formatting the turns).
+"""
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict
+
+from database.models import Messages
+from django_core.config import Config
+
+logger = logging.getLogger(__name__)
+
+# older answered messages loaded into the summary when an entry is built from the database
+SUMMARY_SOURCE_TURNS = 20
+# characters of a compacted question kept in the summary
+MAX_SUMMARY_QUESTION_CHARS = 200
+
+
+def count_tokens(text):
+    """Approximate number of LLM tokens of `text`, about 4 characters per token"""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def format_turn(user_message, ai_message):
+    return f"\n\nUser : {user_message}\nAI Assistant : {ai_message}"
+
+
+def compact_into_summary(summary, user_message, ai_message, max_tokens):
+    """
+    Rolling extractive summary: the questions of the compacted turns, the oldest ones dropped first once the
+    summary is over `max_tokens`.
+    """
+    questions = summary.split("; ") if summary else []
+    questions.append(" ".join(user_message.replace(";", ",").split())[:MAX_SUMMARY_QUESTION_CHARS])
+    while len(questions) > 1 and count_tokens("; ".join(questions)) > max_tokens:
+        questions.pop(0)
+    return "; ".join(questions)
+
+
+class LocalHistoryStore:
+    """In-process LRU of history entries"""
+
+    shared = False
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisHistoryStore:
+    """History entries stored as JSON in Redis, expiring `ttl` seconds after their last update"""
+
+    shared = True
+
+    def __init__(self, client, ttl=86400, prefix="farmer_chat:history:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, entry):
+        self.client.set(self.prefix + key, json.dumps(entry), ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+class ChatHistoryCache:
+    """
+    Prompt history of conversations: a summary of the older turns followed by the last `window` answered turns.
+
+    An entry is `{"summary": str, "turns": [[message id, user message, AI response], ...]}`, oldest turn first.
+    """
+
+    def __init__(self, store, window=4, token_budget=1000, summary_tokens=200, summarizer=compact_into_summary):
+        self.store = store
+        self.window = max(int(window), 1)
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+
+    def _key(self, conversation_id):
+        return f"{self.window}:{conversation_id}"
+
+    @staticmethod
+    def _answered_messages(conversation_id):
+        return Messages.select().where(
+            Messages.conversation_id == conversation_id,
+            Messages.is_deleted == False,
+            Messages.translated_message != None,
+            Messages.message_response != None,
+        )
+
+    def _compact(self, summary, turns):
+        tokens = sum(count_tokens(user) + count_tokens(ai) for _, user, ai in turns)
+        while len(turns) > self.window or (len(turns) > 1 and tokens > self.token_budget):
+            _, user, ai = turns.pop(0)
+            tokens -= count_tokens(user) + count_tokens(ai)
+            summary = self.summarizer(summary, user, ai, self.summary_tokens)
+        return {"summary": summary, "turns": turns}
+
+    def load(self, conversation_id):
+        """Entry of a conversation built from its latest answered messages"""
+        messages = (
+            self._answered_messages(conversation_id)
+            .order_by(Messages.created_on.desc())
+            .limit(self.window + SUMMARY_SOURCE_TURNS)
+        )
+        turns = [
+            [str(message.id), message.translated_message, message.message_response]
+            for message in reversed(list(messages))
+        ]
+        return self._compact("", turns)
+
+    def _latest_message_id(self, conversation_id):
+        latest = (
+            self._answered_messages(conversation_id)
+            .select(Messages.id)
+            .order_by(Messages.created_on.desc())
+            .limit(1)
+            .scalar()
+        )
+        return str(latest) if latest is not None else None
+
+    def conversation_id(self, user_id, get_conversation):
+        """
+        Id of the latest conversation of a user, `get_conversation(user_id)` is only called on a cache miss.
+        A user's conversation is only created when the user has none, so the mapping never changes.
+        """
+        key = f"user:{user_id}"
+        try:
+            cached = self.store.get(key)
+            if cached is not None:
+                return cached["conversation_id"]
+        except Exception as error:
+            logger.warning(f"Chat history cache unavailable: {error}")
+        conversation = get_conversation(user_id)
+        if conversation is None:
+            return None
+        try:
+            self.store.set(key, {"conversation_id": str(conversation.id)})
+        except Exception as error:
+            logger.warning(f"Chat history cache unavailable: {error}")
+        return str(conversation.id)
+
+    def render(self, entry):
+        history = ""
+        if entry["summary"]:
+            history = f"\n\nEarlier in this conversation the user asked about : {entry['summary']}"
+        for _, user, ai in entry["turns"]:
+            history = history + format_turn(user, ai)
+        return history
+
+    def get_history(self, conversation_id):
+        key = self._key(conversation_id)
+        entry = None
+        try:
+            entry = self.store.get(key)
+        except Exception as error:
+            logger.warning(f"Chat history cache unavailable: {error}")
+
+        if entry is not None and not self.store.shared:
+            last_turn_id = entry["turns"][-1][0] if entry["turns"] else None
+            if self._latest_message_id(conversation_id) != last_turn_id:
+                entry = None
+
+        if entry is None:
+            entry = self.load(conversation_id)
+            try:
+                self.store.set(key, entry)
+            except Exception as error:
+                logger.warning(f"Chat history cache unavailable: {error}")
+
+        return self.render(entry)
+
+    def record_message(self, message):
+        """Apply a saved message to the cached entry of its conversation, if there is one"""
+        key = self._key(message.conversation_id)
+        try:
+            entry = self.store.get(key)
+            if entry is None:
+                return
+            message_id = str(message.id)
+            turns = list(entry["turns"])
+            index = next((i for i, turn in enumerate(turns) if turn[0] == message_id), None)
+            answered = (
+                not message.is_deleted
+                and message.translated_message is not None
+                and message.message_response is not None
+            )
+            if answered:
+                turn = [message_id, message.translated_message, message.message_response]
+                if index is None:
+                    turns.append(turn)
+                else:
+                    turns[index] = turn
+            elif index is not None:
+                del turns[index]
+            else:
+                return
+            self.store.set(key, self._compact(entry["summary"], turns))
+        except Exception as error:
+            logger.warning(f"Could not update the chat history cache: {error}")
+            try:
+                self.store.delete(key)
+            except Exception:
+                pass
+
+
+_store = None
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_chat_history_cache(window=Config.CHAT_HISTORY_WINDOW):
+    """Process-wide ChatHistoryCache for a history window, configured from `Config`"""
+    global _store
+    window = max(int(window), 1)
+    cache = _caches.get(window)
+    if cache is None:
+        with _caches_lock:
+            if _store is None:
+                if Config.CHAT_HISTORY_REDIS_URL:
+                    import redis
+
+                    _store = RedisHistoryStore(
+                        redis.Redis.from_url(Config.CHAT_HISTORY_REDIS_URL), ttl=Config.CHAT_HISTORY_CACHE_TTL
+                    )
+                else:
+                    _store = LocalHistoryStore(Config.CHAT_HISTORY_CACHE_SIZE)
+            cache = _caches.get(window)
+            if cache is None:
+                cache = _caches[window] = ChatHistoryCache(
+                    _store,
+                    window=window,
+                    token_budget=Config.CHAT_HISTORY_TOKEN_BUDGET,
+                    summary_tokens=Config.CHAT_HISTORY_SUMMARY_TOKENS,
+                )
+    return cache
+
+
+def record_message(message):
+    """Update the cached histories with a saved `Messages` instance"""
+    if message is None:
+        return
+    for cache in list(_caches.values()):
+        cache.record_message(message)
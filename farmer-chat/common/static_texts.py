@@ -0,0 +1,205 @@
+"""
+Process-wide catalog of the static texts (`MultilingualText`).
+
+`fetch_multilingual_texts_for_static_text_messages` used to query the `multilingual_text` table for the static
+messages of every request. The catalog loads all the rows once (`warm_up`, called at startup) and serves the
+lookups from a dict; the texts of a language which was not loaded yet (added since) are loaded on its first
+lookup, a language without any text being remembered as such.
+
+Changes to the table are picked up through Postgres LISTEN/NOTIFY: a trigger of `multilingual_text` (created by
+database/migrate.py, see `create_notify_trigger`) notifies `CHANGES_CHANNEL` on every change, and the listener
+thread of every worker then bumps the version of its catalog, which is reloaded on its next lookup. The listener
+is started on the first lookup of every process, not by the warm-up, so that the workers forked from a process which
+loaded the catalog (gunicorn --preload) start their own. Should the trigger be missing or the listener lose its connection, the catalog is still reloaded every `max_age` seconds.
+"""
+import logging
+import os
+import select
+import threading
+import time
+
+from database.database_config import db_conn
+from database.models import Language, MultilingualText
+from django_core.config import Config
+
+logger = logging.getLogger(__name__)
+
+CHANGES_CHANNEL = "multilingual_text_changed"
+
+NOTIFY_TRIGGER_SQL = [
+    f"""
+    CREATE OR REPLACE FUNCTION notify_multilingual_text_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{CHANGES_CHANNEL}', TG_OP);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS multilingual_text_changed ON multilingual_text",
+    """
+    CREATE TRIGGER multilingual_text_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON multilingual_text
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_multilingual_text_changed()
+    """,
+]
+
+# seconds between two attempts of the listener to reconnect
+LISTENER_RETRY_INTERVAL = 5
+
+
+def create_notify_trigger(database=db_conn):
+    """Create (or replace) the trigger which notifies the changes of `multilingual_text`"""
+    with database:
+        for statement in NOTIFY_TRIGGER_SQL:
+            database.execute_sql(statement)
+
+
+class StaticTextCatalog:
+    """In-process `MultilingualText` lookups, by text code"""
+
+    def __init__(self, database=db_conn, max_age=Config.STATIC_TEXT_CATALOG_MAX_AGE):
+        self.database = database
+        self.max_age = max_age
+        self.version = 0
+        self._lock = threading.Lock()
+        # replaced, never updated in place, so that lookups need no lock
+        self._texts = {}
+        self._languages = frozenset()
+        self._loaded_version = None
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        """Reload the catalog on its next lookup"""
+        with self._lock:
+            self.version += 1
+
+    def _stale(self):
+        return self._loaded_version != self.version or time.monotonic() - self._loaded_at > self.max_age
+
+    def _load_all(self):
+        version = self.version
+        with self.database:
+            rows = MultilingualText.select(MultilingualText.text_code, MultilingualText.text).where(
+                MultilingualText.is_deleted == False
+            )
+            texts = {row.text_code: row.text for row in rows}
+            languages = frozenset(language.code for language in Language.select(Language.code))
+        self._texts, self._languages = texts, languages
+        self._loaded_version, self._loaded_at = version, time.monotonic()
+        logger.info(f"Loaded {len(texts)} static texts of {len(languages)} languages")
+
+    def warm_up(self):
+        """Load the texts of all the languages"""
+        with self._lock:
+            self._load_all()
+
+    def _load_language(self, language_code):
+        with self._lock:
+            if language_code in self._languages:
+                return
+            suffix = f"_{language_code}"
+            with self.database:
+                rows = MultilingualText.select(MultilingualText.text_code, MultilingualText.text).where(
+                    MultilingualText.is_deleted == False,
+                    MultilingualText.text_code.endswith(suffix),
+                )
+                texts = {row.text_code: row.text for row in rows}
+            self._texts = {**self._texts, **texts}
+            self._languages = self._languages | {language_code}
+
+    def get(self, text_codes, language_code):
+        """{text code: text} of the `text_codes` (formatted, with the language code) found"""
+        if self._stale():
+            with self._lock:
+                if self._stale():
+                    self._load_all()
+        if language_code not in self._languages:
+            self._load_language(language_code)
+        texts = self._texts
+        return {text_code: texts[text_code] for text_code in text_codes if text_code in texts}
+
+
+class StaticTextListener(threading.Thread):
+    """Invalidates `catalog` on every notification of `CHANGES_CHANNEL`, on a connection of its own"""
+
+    def __init__(self, catalog, database=db_conn, poll_interval=5.0):
+        super().__init__(name="static-text-listener", daemon=True)
+        self.catalog = catalog
+        self.database = database
+        self.poll_interval = poll_interval
+        self.listening = threading.Event()
+        self._stopped = threading.Event()
+
+    def _listen(self):
+        import psycopg2
+
+        connection = psycopg2.connect(database=self.database.database, **self.database.connect_params)
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANGES_CHANNEL}")
+            # changes made while nobody listened
+            self.catalog.invalidate()
+            self.listening.set()
+            while not self._stopped.is_set():
+                if select.select([connection], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                connection.poll()
+                if connection.notifies:
+                    connection.notifies.clear()
+                    self.catalog.invalidate()
+        finally:
+            self.listening.clear()
+            connection.close()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            except Exception as error:
+                logger.warning(f"Not listening to the changes of the static texts: {error}")
+                self._stopped.wait(LISTENER_RETRY_INTERVAL)
+
+    def stop(self):
+        self._stopped.set()
+
+
+_catalog = None
+# process which started the listener, a worker forked from a process which had one (the loaded catalog being
+# inherited) has to start its own, threads not surviving a fork
+_listener_pid = None
+_catalog_lock = threading.Lock()
+
+
+def _get_catalog():
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = StaticTextCatalog()
+    return _catalog
+
+
+def get_static_text_catalog():
+    """
+    Process-wide StaticTextCatalog, listening to the changes of the static texts as configured in `Config`: the
+    listener of a process is started on its first lookup
+    """
+    global _listener_pid
+    catalog = _get_catalog()
+    if Config.STATIC_TEXT_CATALOG_LISTEN and _listener_pid != os.getpid():
+        with _catalog_lock:
+            if _listener_pid != os.getpid():
+                StaticTextListener(catalog).start()
+                _listener_pid = os.getpid()
+    return catalog
+
+
+def warm_up_static_text_catalog():
+    """Load the static texts at startup, a failure only delaying the load to the first lookup"""
+    if not Config.WITH_DB_CONFIG:
+        return
+    try:
+        _get_catalog().warm_up()
+    except Exception as error:
+        logger.error(f"Could not load the static texts: {error}", exc_info=True)
@@ -0,0 +1,396 @@
+"""
+Stage latencies of the requests.
+
+Every stage of a request (rephrasing, content retrieval, remedy filtering, reranking, generation, translation,
+text to speech...) runs in a `span`:
+
+    with span("rerank", chunks=len(chunks)):
+        ...
+
+Spans nest (through a context variable, so they follow `asyncio.run` and `asyncio.to_thread`), the outermost
+one being the whole request, its trace. Nothing is recorded by default (`TRACING_BACKENDS` empty), `span` then
+returns a shared no-op context manager. The backends:
+
+- "local": the spans of a sampled trace (`TRACING_SAMPLE_RATE`) are saved as `PipelineSpan` rows through the
+  telemetry write-behind buffer once the trace ends, `python -m common.tracing report` gives the p50/p95/p99
+  latency of every stage over a time window.
+- "otel": every span is also an OpenTelemetry span of the tracer "farmer-chat" (the opentelemetry-api package
+  and an SDK configured by the deployment), the names and attributes of the spans being the same.
+
+`TRACING_PROFILER` samples the stacks of the threads running a span every `TRACING_PROFILE_INTERVAL` seconds,
+and writes them collapsed (`stage;module:function;... count`, the input of flamegraph.pl or speedscope) to
+`TRACING_PROFILE_DIR` every minute and at exit.
+"""
+import argparse
+import atexit
+import contextlib
+import contextvars
+import datetime
+import functools
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+from django_core.config import Config
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = [50, 95, 99]
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+NOOP_SPAN = contextlib.nullcontext()
+
+
+class Span:
+    """A running stage of a trace, its context manager records it"""
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "attributes",
+        "id",
+        "parent",
+        "trace",
+        "start_time",
+        "started",
+        "duration_ms",
+        "error",
+        "_token",
+        "_otel",
+        "_otel_context",
+    )
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.id = None
+        self.error = False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+        if self._otel is not None:
+            self._otel.set_attribute(key, value)
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        if self.parent is None:
+            self.trace = _Trace(self.tracer.sampled())
+        else:
+            self.trace = self.parent.trace
+        if self.trace.sampled:
+            self.id = uuid.uuid4().hex
+            if self.parent is None:
+                self.trace.id = self.id
+            self.start_time = datetime.datetime.now()
+        self._otel_context = self.tracer.start_otel_span(self)
+        self._otel = self._otel_context.__enter__() if self._otel_context is not None else None
+        self._token = _current_span.set(self)
+        self.tracer.entered(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration_ms = (time.perf_counter() - self.started) * 1000
+        self.error = exc_type is not None
+        _current_span.reset(self._token)
+        self.tracer.exited(self)
+        if self._otel_context is not None:
+            self._otel_context.__exit__(exc_type, exc_value, traceback)
+        if self.trace.sampled:
+            self.trace.spans.append(self)
+            if self.parent is None:
+                self.tracer.record(self.trace)
+        return False
+
+
+class _Trace:
+    __slots__ = ("id", "sampled", "spans", "message_id")
+
+    def __init__(self, sampled):
+        self.id = None
+        self.sampled = sampled
+        self.spans = []
+        self.message_id = None
+
+
+class Tracer:
+    """
+    Spans of the requests: recorded with `writer` (a WriteBehindBuffer) for a `sample_rate` share of the traces,
+    also started on `otel_tracer` (an OpenTelemetry tracer) if given, and the threads running them sampled by
+    `profiler` if given.
+    """
+
+    def __init__(self, writer=None, sample_rate=1.0, otel_tracer=None, profiler=None):
+        self.writer = writer
+        self.sample_rate = sample_rate
+        self.otel_tracer = otel_tracer
+        self.profiler = profiler
+
+    def sampled(self):
+        return self.writer is not None and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def span(self, name, attributes):
+        return Span(self, name, attributes)
+
+    def start_otel_span(self, span):
+        """Context manager of the OpenTelemetry span of `span`, None without OpenTelemetry"""
+        if self.otel_tracer is None:
+            return None
+        return self.otel_tracer.start_as_current_span(span.name, attributes=span.attributes)
+
+    def entered(self, span):
+        if self.profiler is not None:
+            self.profiler.entered(span)
+
+    def exited(self, span):
+        if self.profiler is not None:
+            self.profiler.exited(span)
+
+    def record(self, trace):
+        from database.models import PipelineSpan
+
+        try:
+            self.writer.enqueue(
+                PipelineSpan,
+                [
+                    {
+                        "id": span.id,
+                        "trace_id": trace.id,
+                        "parent_id": span.parent.id if span.parent is not None else None,
+                        "message_id": trace.message_id,
+                        "name": span.name,
+                        "start_time": span.start_time,
+                        "duration_ms": round(span.duration_ms, 3),
+                        "error": span.error,
+                        "attributes": json.dumps(span.attributes, default=str) if span.attributes else None,
+                    }
+                    for span in trace.spans
+                ],
+            )
+        except Exception as error:
+            logger.warning(f"Could not record the spans of trace {trace.id}: {error}")
+
+
+class SamplingProfiler:
+    """
+    Collapsed stacks of the threads running a span, sampled every `interval` seconds and written to `path`
+    every `dump_interval` seconds and by `stop`
+    """
+
+    def __init__(self, path, interval=0.01, dump_interval=60.0):
+        self.path = path
+        self.interval = interval
+        self.dump_interval = dump_interval
+        self.stacks = Counter()
+        # frame that entered spans: spans it is running, innermost last. The frame of a coroutine is only in the
+        # stack of its thread while the coroutine runs, so interleaved requests of an event loop keep their spans.
+        self._spans = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _caller():
+        """Frame running the `with span(...)`, the first one out of this module"""
+        frame = sys._getframe(2)
+        while frame is not None and frame.f_globals.get("__name__") == __name__:
+            frame = frame.f_back
+        return frame
+
+    def entered(self, span):
+        self._spans.setdefault(self._caller(), []).append(span)
+
+    def exited(self, span):
+        frame = self._caller()
+        spans = self._spans.get(frame)
+        if spans and span in spans:
+            spans.remove(span)
+            if not spans:
+                del self._spans[frame]
+
+    @staticmethod
+    def _collapse(frame):
+        functions = []
+        while frame is not None:
+            code = frame.f_code
+            functions.append(f"{frame.f_globals.get('__name__', code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(functions))
+
+    def sample(self):
+        samples = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == threading.get_ident():
+                continue
+            caller = frame
+            while caller is not None:
+                spans = self._spans.get(caller, [])[-1:]
+                if spans:
+                    samples.append(f"{spans[0].name};{self._collapse(frame)}")
+                    break
+                caller = caller.f_back
+        with self._lock:
+            self.stacks.update(samples)
+
+    def dump(self):
+        with self._lock:
+            lines = [f"{stack} {count}\n" for stack, count in self.stacks.most_common()]
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        partial = f"{self.path}.tmp"
+        with open(partial, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(partial, self.path)
+
+    def _run(self):
+        dumped = time.monotonic()
+        while not self._stopped.wait(self.interval):
+            self.sample()
+            if time.monotonic() - dumped >= self.dump_interval:
+                self.dump()
+                dumped = time.monotonic()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.dump()
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def _create_tracer():
+    backends = {backend.strip() for backend in Config.TRACING_BACKENDS.split(",") if backend.strip()}
+    writer, otel_tracer, profiler = None, None, None
+    if "local" in backends:
+        from database.write_behind import get_telemetry_writer
+
+        writer = get_telemetry_writer()
+    if "otel" in backends:
+        try:
+            from opentelemetry import trace
+
+            otel_tracer = trace.get_tracer("farmer-chat")
+        except ImportError:
+            logger.warning("TRACING_BACKENDS has otel but the opentelemetry-api package is not installed")
+    if Config.TRACING_PROFILER:
+        path = os.path.join(Config.TRACING_PROFILE_DIR, f"stacks-{os.getpid()}.collapsed")
+        profiler = SamplingProfiler(path, Config.TRACING_PROFILE_INTERVAL).start()
+        atexit.register(profiler.stop)
+    if writer is None and otel_tracer is None and profiler is None:
+        return None
+    return Tracer(writer, Config.TRACING_SAMPLE_RATE, otel_tracer, profiler)
+
+
+def get_tracer():
+    """Process-wide Tracer configured from `Config`, None when tracing is off"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = _create_tracer() or False
+    return _tracer or None
+
+
+def span(name, **attributes):
+    """Context manager of a stage named `name`, a no-op when tracing is off"""
+    tracer = get_tracer()
+    if tracer is None:
+        return NOOP_SPAN
+    return tracer.span(name, attributes)
+
+
+def traced(name):
+    """Decorator running the function in a span named `name`"""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def set_trace_message(message_id):
+    """Attach the message answered by the current request to its trace"""
+    current = _current_span.get()
+    if current is not None and message_id:
+        current.trace.message_id = str(message_id)
+
+
+def percentile(sorted_values, percent):
+    """Nearest rank percentile of a sorted list"""
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def stage_latencies(since, until=None):
+    """{stage: (count, errors, {percentile: milliseconds})} of the spans started between `since` and `until`"""
+    from database.models import PipelineSpan
+
+    query = PipelineSpan.select(PipelineSpan.name, PipelineSpan.duration_ms, PipelineSpan.error).where(
+        PipelineSpan.start_time >= since
+    )
+    if until is not None:
+        query = query.where(PipelineSpan.start_time < until)
+    durations, errors = defaultdict(list), Counter()
+    for name, duration_ms, error in query.tuples().iterator():
+        durations[name].append(duration_ms)
+        errors[name] += bool(error)
+    report = {}
+    for name, values in durations.items():
+        values.sort()
+        report[name] = (len(values), errors[name], {p: percentile(values, p) for p in PERCENTILES})
+    return report
+
+
+def print_report(report, out=sys.stdout):
+    header = f"{'stage':<28} {'count':>8} {'errors':>7}" + "".join(f" {f'p{p} ms':>10}" for p in PERCENTILES)
+    out.write(header + "\n")
+    for name, (count, errors, percentiles) in sorted(report.items(), key=lambda item: -item[1][2][50]):
+        out.write(
+            f"{name:<28} {count:>8} {errors:>7}" + "".join(f" {percentiles[p]:>10.1f}" for p in PERCENTILES) + "\n"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency percentiles of the stages of the requests")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    report = subcommands.add_parser("report", help="p50/p95/p99 of every stage over a time window")
+    report.add_argument("--minutes", type=float, default=60, help="window ending now (default 60)")
+    report.add_argument("--since", type=datetime.datetime.fromisoformat, help="start of the window (ISO format)")
+    report.add_argument("--until", type=datetime.datetime.fromisoformat, help="end of the window (ISO format)")
+    args = parser.parse_args(argv)
+
+    from database.database_config import db_conn
+
+    since = args.since or datetime.datetime.now() - datetime.timedelta(minutes=args.minutes)
+    with db_conn:
+        latencies = stage_latencies(since, args.until)
+    if not latencies:
+        print(f"No span recorded since {since:%Y-%m-%d %H:%M:%S}")
+        return
+    print(f"Spans since {since:%Y-%m-%d %H:%M:%S}" + (f" until {args.until:%Y-%m-%d %H:%M:%S}" if args.until else ""))
+    print_report(latencies)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,9 @@ import uuid
 
 import certifi
 import regex
+from common.chat_history import get_chat_history_cache, record_message
 from common.constants import Constants
+from common.static_texts import get_static_text_catalog
 from database.database_config import db_conn
 from database.db_operations import create_record, get_record_by_field, update_record
 from database.models import (
@@ -23,7 +25,6 @@ from database.models import (
     FollowUpQuestion,
     Language,
     Messages,
-    MultilingualText,
     User,
 )
 from django_core import celery
@@ -167,8 +168,8 @@ def get_or_create_latest_conversation(conversation_data: dict) -> Conversation:
                 .where(Conversation.user_id == user_id)
                 .order_by(Conversation.created_on.desc())
             )
+            conversation = conversation_qs.get() if len(conversation_qs) >= 1 else None
 
-        conversation = conversation_qs.get() if len(conversation_qs) >= 1 else None
         if not conversation:
             conversation = create_record(Conversation, conversation_data)
             logger.info(f"New conversation created for user_id:{user_id}")
@@ -181,28 +182,16 @@ def get_or_create_latest_conversation(conversation_data: dict) -> Conversation:
 
 def get_user_chat_history(user_id, window=Config.CHAT_HISTORY_WINDOW):
     """
-    Fetch user chat history by querying the previous messages associated with the user.
+    Fetch user chat history: the last `window` answered messages of the user's latest conversation,
+    preceded by a summary of the older ones, from the chat history cache.
     """
     chat_history = None
+    cache = get_chat_history_cache(window)
     with db_conn:
-        conversation = get_or_create_latest_conversation({"user_id": user_id})
-        messages = (
-            Messages.select()
-            .where(
-                Messages.conversation_id == conversation.id,
-                Messages.is_deleted == False,
-                Messages.translated_message != None,
-                Messages.message_response != None,
-            )
-            .order_by(Messages.created_on.desc())
-            .limit(window)
+        conversation_id = cache.conversation_id(
+            user_id, lambda user_id: get_or_create_latest_conversation({"user_id": user_id})
         )
-        chat_history = ""
-        for message in reversed(messages):
-            chat_history = (
-                chat_history
-                + f"\n\nUser : {message.translated_message}\nAI Assistant : {message.message_response}"
-            )
+        chat_history = cache.get_history(conversation_id)
 
     return chat_history
 
@@ -383,9 +372,10 @@ async def postprocess_and_translate_query_response(
 
 def save_message_obj(message_id, message_data_to_insert_or_update):
     """
-    Update a Message instance.
+    Update a Message instance and the cached chat history of its conversation.
     """
-    update_record(Messages, message_id, message_data_to_insert_or_update)
+    message = update_record(Messages, message_id, message_data_to_insert_or_update)
+    record_message(message)
 
 
 def clean_text(text):
@@ -488,40 +478,23 @@ def fetch_multilingual_texts_for_static_text_messages(
 ):
     """
     Return a list MultilingualTexts for a given list of static texts in specified language.
+    The texts are looked up in the process-wide catalog (common/static_texts.py), not in the database.
     """
-    multilingual_text_list, multilingual_text_query_list = [], []
+    multilingual_text_list = []
 
     try:
-        text_code_list = [
-            format_multilingual_text_code(
-                text_code_without_lang_code + "_" + language_code
-            )
-            for text_code_without_lang_code in text_code_without_lang_code_list
-        ]
-
         if with_db_config:
-            with db_conn:
-                multilingual_text_query = MultilingualText.select(
-                    MultilingualText.text_code, MultilingualText.text
-                ).where(
-                    MultilingualText.is_deleted == False,
-                    MultilingualText.text_code.in_(text_code_list),
-                )
-
-                if len(multilingual_text_query) >= 1:
-                    multilingual_text_query_list = list(
-                        multilingual_text_query.dicts().execute()
-                    )
-
-                if len(multilingual_text_query_list) >= 1:
-                    multilingual_text_list = [
-                        {
-                            text_code.get("text_code").strip(
-                                f"_{language_code}"
-                            ): text_code.get("text")
-                        }
-                        for text_code in multilingual_text_query_list
-                    ]
+            text_codes = {
+                format_multilingual_text_code(
+                    text_code_without_lang_code + "_" + language_code
+                ): text_code_without_lang_code
+                for text_code_without_lang_code in text_code_without_lang_code_list
+            }
+            multilingual_texts = get_static_text_catalog().get(text_codes, language_code)
+            multilingual_text_list = [
+                {text_codes[text_code]: text}
+                for text_code, text in multilingual_texts.items()
+            ]
 
         else:
             multilingual_text_list = [
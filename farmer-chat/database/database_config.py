@@ -1,19 +1,129 @@
+import logging
 import os, sys
+import threading
+import time
 from pathlib import Path
-from peewee import PostgresqlDatabase
-from playhouse.pool import PooledPostgresqlExtDatabase
+from playhouse.pool import MaxConnectionsExceeded, PooledPostgresqlDatabase
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 CONFIG_DIR = os.path.join(BASE_DIR, "django_core")
 sys.path.append(str(CONFIG_DIR))
 from config import Config
 
-# normal DB connection
-db_conn = PostgresqlDatabase(
-    Config.DB_NAME, user=Config.DB_USER, password=Config.DB_PASSWORD, host=Config.DB_HOST, port=Config.DB_PORT
-)
+logger = logging.getLogger(__name__)
+
+
+class MeteredPooledPostgresqlDatabase(PooledPostgresqlDatabase):
+    """
+    Pooled PostgreSQL database which keeps track of the pool usage.
+
+    Connections are returned to the pool on close() and handed out again by the next connect(),
+    at most `max_connections` at a time; connect() waits up to `timeout` seconds for one to be returned.
+    Connections older than `stale_timeout` seconds are closed instead of being reused.
+
+    `with db_conn:` reuses the connection already opened by the current thread (e.g. the one of the
+    request, see `database.middleware.PeeweeConnectionMiddleware`) and only returns it to the pool
+    when the block opened it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._scopes = threading.local()
+        self._metrics_lock = threading.Lock()
+        self.reset_metrics()
+        super().__init__(*args, **kwargs)
+
+    def reset_metrics(self):
+        with self._metrics_lock:
+            self._checkouts = 0
+            self._wait_time = 0.0
+            self._max_wait_time = 0.0
+            self._timeouts = 0
+            self._opened = 0
+            self._stale_closed = 0
+
+    def connect(self, reuse_if_open=False):
+        started = time.perf_counter()
+        try:
+            opened = super().connect(reuse_if_open)
+        except MaxConnectionsExceeded:
+            with self._metrics_lock:
+                self._timeouts += 1
+            logger.error(f"No database connection available after {self._wait_timeout}s: {self.pool_metrics()}")
+            raise
+
+        if opened:
+            waited = time.perf_counter() - started
+            with self._metrics_lock:
+                self._checkouts += 1
+                self._wait_time += waited
+                self._max_wait_time = max(self._max_wait_time, waited)
+        return opened
+
+    def _connect(self):
+        # a new connection is only opened when no idle one could be reused
+        idle = {self.conn_key(conn) for _, conn in self._connections}
+        conn = super()._connect()
+        if self.conn_key(conn) not in idle:
+            with self._metrics_lock:
+                self._opened += 1
+        return conn
+
+    def _is_stale(self, timestamp):
+        stale = super()._is_stale(timestamp)
+        if stale:
+            with self._metrics_lock:
+                self._stale_closed += 1
+        return stale
+
+    def __enter__(self):
+        opened = self.connect(reuse_if_open=True)
+        if not hasattr(self._scopes, "opened"):
+            self._scopes.opened = []
+        self._scopes.opened.append(opened)
+        ctx = self.atomic()
+        self._state.ctx.append(ctx)
+        ctx.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        ctx = self._state.ctx.pop()
+        try:
+            ctx.__exit__(exc_type, exc_val, exc_tb)
+        finally:
+            if self._scopes.opened.pop():
+                self.close()
+
+    def pool_metrics(self):
+        """
+        Snapshot of the pool usage: connections checked out and idle, connect() wait times in
+        milliseconds, connections opened, stale connections closed and connect() timeouts.
+        """
+        with self._metrics_lock:
+            checkouts = self._checkouts
+            return {
+                "max_connections": self._max_connections,
+                "checked_out": len(self._in_use),
+                "idle": len(self._connections),
+                "checkouts": checkouts,
+                "avg_wait_ms": round(self._wait_time / checkouts * 1000, 3) if checkouts else 0.0,
+                "max_wait_ms": round(self._max_wait_time * 1000, 3),
+                "connections_opened": self._opened,
+                "stale_closed": self._stale_closed,
+                "timeouts": self._timeouts,
+            }
+
 
 # Pooled DB connection
-pooled_db_conn = PooledPostgresqlExtDatabase(
-    Config.DB_NAME, user=Config.DB_USER, password=Config.DB_PASSWORD, host=Config.DB_HOST, port=Config.DB_PORT
+db_conn = MeteredPooledPostgresqlDatabase(
+    Config.DB_NAME,
+    user=Config.DB_USER,
+    password=Config.DB_PASSWORD,
+    host=Config.DB_HOST,
+    port=Config.DB_PORT,
+    max_connections=Config.MAX_CONNECTIONS,
+    stale_timeout=Config.STALE_TIMEOUT,
+    timeout=Config.POOL_TIMEOUT,
 )
+
+# kept for the Celery task signals, which used to have a pool of their own
+pooled_db_conn = db_conn
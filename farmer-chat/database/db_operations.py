@@ -1,7 +1,7 @@
 import logging
 
 from database.database_config import db_conn
-from peewee import DoesNotExist
+from peewee import DoesNotExist, IntegrityError
 
 logger = logging.getLogger(__name__)
 
@@ -25,11 +25,11 @@ def create_record(model_class, data_to_be_inserted):
     """Create a new record in the database."""
     record = None
     try:
-        with db_conn.atomic() as current_transaction:
+        # the transaction is rolled back when the insert fails
+        with db_conn:
             record = model_class.create(**data_to_be_inserted)
 
     except Exception as error:
-        current_transaction.rollback()
         logger.error(error, exc_info=True)
 
     return record
@@ -39,11 +39,11 @@ def create_multiple_records(model_class, data_to_be_inserted):
     """Create / insert multiple records in to the database."""
     records = None
     try:
-        with db_conn.atomic() as current_transaction:
+        # the transaction is rolled back when the insert fails
+        with db_conn:
             records = model_class.insert_many(data_to_be_inserted).execute()
 
     except Exception as error:
-        current_transaction.rollback()
         logger.error(error, exc_info=True)
 
     return records
@@ -53,14 +53,14 @@ def update_record(model_class, record_id, data_to_be_updated, **kwargs):
     """Update a record."""
     record = None
     try:
-        record = model_class.get_by_id(record_id)
-        try:
-            with db_conn.atomic() as current_transaction:
-                for field, value in data_to_be_updated.items():
-                    setattr(record, field, value)
-                record.save()
-        except IntegrityError as e:
-            logger.error(f"Error updating record {e}", exc_info=True)
+        with db_conn:
+            record = model_class.get_by_id(record_id)
+            for field, value in data_to_be_updated.items():
+                setattr(record, field, value)
+            record.save()
+
+    except IntegrityError as e:
+        logger.error(f"Error updating record {e}", exc_info=True)
 
     except DoesNotExist:
         logger.error(
@@ -0,0 +1,21 @@
+from database.database_config import db_conn
+
+
+class PeeweeConnectionMiddleware:
+    """
+    Check out one pooled database connection per request.
+
+    Every `with db_conn:` block and query of the request reuses it instead of taking its own
+    connection, and it is returned to the pool once the response is built.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        opened = db_conn.connect(reuse_if_open=True)
+        try:
+            return self.get_response(request)
+        finally:
+            if opened and not db_conn.is_closed():
+                db_conn.close()
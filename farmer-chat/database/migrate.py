@@ -13,7 +13,7 @@ from database.models import (
     Language, User, Conversation, Messages, MessageMediaFiles,
     Resource, UserActions, MultilingualText, FollowUpQuestion,
     RetrievedChunk, RetrievalMetrics, RerankedChunk, RerankMetrics,
-    GenerationMetrics, RephraseMetrics,
+    GenerationMetrics, RephraseMetrics, IntentClassification, PipelineSpan,
     UserMedicalProfile, UserMedicalConsent, 
     IngredientSubstitution, MedicalProfileAuditLog
 )
@@ -40,7 +40,7 @@ def create_all_tables():
         Language, User, Conversation, Messages, MessageMediaFiles,
         Resource, UserActions, MultilingualText, FollowUpQuestion,
         RetrievedChunk, RetrievalMetrics, RerankedChunk, RerankMetrics,
-        GenerationMetrics, RephraseMetrics,
+        GenerationMetrics, RephraseMetrics, IntentClassification, PipelineSpan,
         UserMedicalProfile, UserMedicalConsent,
         IngredientSubstitution, MedicalProfileAuditLog,
     ]
@@ -58,6 +58,23 @@ def create_all_tables():
         traceback.print_exc()
         return False
 
+def create_triggers():
+    """Create the triggers which notify the workers of the changes of their cached tables"""
+    print("🔔 Creating the change notification triggers...")
+
+    try:
+        from common.static_texts import create_notify_trigger
+
+        create_notify_trigger(db_conn)
+        print("✅ multilingual_text notifies its changes!\n")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error creating the triggers: {e}\n")
+        import traceback
+        traceback.print_exc()
+        return False
+
 def verify_tables():
     """Verify all tables exist in database"""
     print("🔍 Verifying tables in database...")
@@ -111,6 +128,10 @@ def main():
     if not create_all_tables():
         print("\n❌ Migration failed!")
         return False
+
+    if not create_triggers():
+        print("\n❌ Migration failed!")
+        return False
     
     verify_tables()
     
@@ -6,7 +6,11 @@ from pathlib import Path
 
 DB_CONN_DIR = Path(__file__).resolve().parent
 sys.path.append(str(DB_CONN_DIR))
-from database_config import db_conn
+try:
+    # same instance (and pool) as `database.db_operations`, a bare `database_config` import would create another one
+    from database.database_config import db_conn
+except ImportError:
+    from database_config import db_conn
 
 
 class BaseModel(Model):
@@ -460,6 +464,76 @@ class RephraseMetrics(BaseModel):
         table_name = "rephrase_metrics"
 
 
+class IntentClassification(BaseModel):
+    """
+    Stores the intent of a user query or message and the tier which classified it, the LLM labelled entries
+    are the training data of the local intent classifier
+
+    Attributes
+    ----------
+        query : `peewee.CharField`
+           query as given to the classifier
+        normalized_query : `peewee.CharField`
+           query lowercased, without punctuation and repeated whitespace (the key of the result cache)
+        intent : `peewee.CharField`
+           one of `IntentConstants`
+        source : `peewee.CharField`
+           "llm", "local" or "cache"
+        confidence : `peewee.FloatField`
+           probability of the intent given by the local classifier, null for the LLM
+    """
+
+    id = CharField(primary_key=True, default=uuid.uuid4, max_length=50)
+    message = ForeignKeyField(Messages, backref="intent_classifications", null=True)
+    query = CharField(max_length=10000)
+    normalized_query = CharField(max_length=10000)
+    intent = CharField(max_length=50)
+    source = CharField(max_length=10)
+    confidence = FloatField(null=True)
+
+    class Meta:
+        table_name = "intent_classification"
+
+
+class PipelineSpan(BaseModel):
+    """
+    Stores the latency of a stage of a request (rephrasing, retrieval, reranking, generation, translation,
+    text to speech...), the spans of a request sharing its trace_id (see common/tracing.py)
+
+    Attributes
+    ----------
+        trace_id : `peewee.CharField`
+           ID of the request, shared by its spans
+        parent_id : `peewee.CharField`
+           ID of the enclosing span, null for the span of the whole request
+        message_id : `peewee.CharField`
+           ID of the message answered by the request, if any
+        name : `peewee.CharField`
+           stage of the span
+        start_time : `peewee.DateTimeField`
+           datetime at which the stage started
+        duration_ms : `peewee.FloatField`
+           latency of the stage in milliseconds
+        error : `peewee.BooleanField`
+           whether the stage raised an exception
+        attributes : `peewee.TextField`
+           JSON of the attributes given to the span
+    """
+
+    id = CharField(primary_key=True, default=uuid.uuid4, max_length=50)
+    trace_id = CharField(max_length=50, index=True)
+    parent_id = CharField(max_length=50, null=True)
+    message_id = CharField(max_length=50, null=True)
+    name = CharField(max_length=100)
+    start_time = DateTimeField(index=True)
+    duration_ms = FloatField()
+    error = BooleanField(default=False)
+    attributes = TextField(null=True)
+
+    class Meta:
+        table_name = "pipeline_span"
+
+
 # ============================================================================
 # MEDICAL PROFILING MODELS - Added for User Health Profile Feature
 # ============================================================================
@@ -0,0 +1,379 @@
+"""
+Write-behind buffer for the RAG pipeline telemetry (rephrase, retrieval, rerank and generation logs, intent
+classifications, stage latencies).
+
+Rows are queued in memory and appended to a spill file in the same call, then a background thread
+inserts them in bulk once `flush_size` rows are queued or `flush_interval` seconds have passed, and
+deletes the spill file once its rows are committed. Spill files left behind by a process that died
+(or could not reach the database before exiting) are replayed when the next buffer starts.
+
+Primary keys and defaults are filled in when a row is queued and rows are inserted with
+ON CONFLICT DO NOTHING, so replaying a spill file whose rows were partly committed inserts no row twice.
+
+Rows the database rejects (a constraint or data error) are narrowed down by bisecting their chunk, and
+only those rows are set aside in a `rejected-*.jsonl` file of the spill directory. Once their cause is
+fixed, `python -m database.write_behind --replay-rejected` inserts them again.
+"""
+import argparse
+import atexit
+import datetime
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows, spill files are not locked against other processes
+    fcntl = None
+
+from peewee import InterfaceError, Model, OperationalError
+
+logger = logging.getLogger(__name__)
+
+INSERT_CHUNK_SIZE = 1000
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, Model):
+        return _json_value(value.get_id())
+    return value
+
+
+class SpillFile:
+    """An append-only file of queued rows, locked by its owner while the rows are not committed"""
+
+    def __init__(self, path, file):
+        self.path = path
+        self.file = file
+        self.groups = []
+
+    @classmethod
+    def create(cls, path):
+        spill = cls(path, open(path, "a", encoding="utf-8"))
+        if fcntl is not None:
+            fcntl.flock(spill.file, fcntl.LOCK_EX)
+        return spill
+
+    @classmethod
+    def claim(cls, path):
+        """Open a spill file of another (dead) process, None if it is still in use or gone"""
+        try:
+            file = open(path, "a+", encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        if fcntl is not None:
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                file.close()
+                return None
+        spill = cls(path, file)
+        file.seek(0)
+        for line in file:
+            try:
+                entry = json.loads(line)
+                spill.groups.append((entry["model"], entry["rows"]))
+            except (ValueError, KeyError):
+                # the last line of a process killed while writing it
+                logger.warning(f"Skipping a truncated line of {path}")
+        return spill
+
+    @property
+    def size(self):
+        return sum(len(rows) for _, rows in self.groups)
+
+    def append(self, model_name, line, rows, fsync=False):
+        self.file.write(line)
+        self.file.flush()
+        if fsync:
+            os.fsync(self.file.fileno())
+        self.groups.append((model_name, rows))
+
+    def discard(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self.file.close()
+
+
+class WriteBehindBuffer:
+    """
+    Bulk inserts of the rows of `models`, queued with `enqueue` and written by a background thread.
+
+    `close` (registered with atexit by `get_telemetry_writer`) writes the queued rows before the
+    process exits.
+    """
+
+    def __init__(self, spill_dir, models, flush_size=500, flush_interval=1.0, retry_interval=5.0, fsync=False):
+        self.spill_dir = spill_dir
+        self.models = {model.__name__: model for model in models}
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.fsync = fsync
+        self._pid = None
+        self._init_state()
+
+    def _init_state(self):
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._segment = None
+        self._ready = []
+        self._retry_at = 0.0
+        self._segment_started = 0.0
+        self._thread = None
+        self._closing = False
+
+    def _start(self):
+        # called with self._cond held
+        if self._pid == os.getpid():
+            return
+        if self._pid is not None:
+            # forked: the queued rows and spill files belong to the parent
+            self._init_state()
+        self._pid = os.getpid()
+        os.makedirs(self.spill_dir, exist_ok=True)
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, "*.spill"))):
+            spill = SpillFile.claim(path)
+            if spill is None:
+                continue
+            if spill.groups:
+                logger.info(f"Replaying {spill.size} telemetry rows from {path}")
+                self._ready.append(spill)
+            else:
+                spill.discard()
+        self._thread = threading.Thread(target=self._run, name="telemetry-write-behind", daemon=True)
+        self._thread.start()
+
+    def _rotate(self):
+        # called with self._cond held, hands the current segment over to the writer
+        if self._segment is not None and self._segment.groups:
+            self._ready.append(self._segment)
+            self._segment = None
+
+    @property
+    def queued(self):
+        with self._cond:
+            return sum(spill.size for spill in self._ready) + (self._segment.size if self._segment else 0)
+
+    def enqueue(self, model, rows):
+        """Queue `rows` (dicts of field or column names) of `model`, return them with their defaults filled in"""
+        if isinstance(rows, dict):
+            rows = [rows]
+        rows = [self._row(model, data) for data in rows or []]
+        if not rows:
+            return rows
+        line = json.dumps({"model": model.__name__, "rows": rows}, default=str) + "\n"
+        # queued as they are read back from a spill file
+        rows = json.loads(line)["rows"]
+        with self._cond:
+            self._start()
+            if self._segment is None:
+                # pids are reused across container restarts, a left over file must not be appended to
+                path = os.path.join(self.spill_dir, f"telemetry-{self._pid}-{uuid.uuid4().hex}.spill")
+                self._segment = SpillFile.create(path)
+                self._segment_started = time.monotonic()
+                # start the flush_interval timer of the writer
+                self._cond.notify()
+            self._segment.append(model.__name__, line, rows, self.fsync)
+            if self._segment.size >= self.flush_size:
+                self._rotate()
+                self._cond.notify()
+        return rows
+
+    @staticmethod
+    def _row(model, data):
+        meta = model._meta
+        row = {}
+        for key, value in data.items():
+            field = meta.combined.get(key)
+            # the pipeline logs carry extra keys (responses, chunks) which are not saved
+            if field is not None:
+                row[field.name] = _json_value(value)
+        for field in meta.sorted_fields:
+            if field.name not in row and field.default is not None:
+                default = field.default() if callable(field.default) else field.default
+                row[field.name] = _json_value(default)
+        return row
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    flush_at = self._segment_started + self.flush_interval
+                    if self._segment is not None and self._segment.groups and (self._closing or now >= flush_at):
+                        self._rotate()
+                    if self._ready and (self._closing or now >= self._retry_at):
+                        break
+                    if self._closing:
+                        return
+                    timeouts = [self._retry_at - now] if self._ready else []
+                    if self._segment is not None and self._segment.groups:
+                        timeouts.append(flush_at - now)
+                    self._cond.wait(max(min(timeouts), 0.01) if timeouts else None)
+            if not self.flush() and self._closing:
+                # the database is unreachable, the spill files are replayed on the next start
+                return
+
+    def flush(self):
+        """Insert every queued row now, False if some could not be written and stay queued"""
+        with self._write_lock:
+            with self._cond:
+                self._start()
+                self._rotate()
+                ready, self._ready = self._ready, []
+            failed = []
+            for spill in ready:
+                try:
+                    self._write(spill)
+                except (OperationalError, InterfaceError) as error:
+                    logger.warning(f"Telemetry rows kept in {spill.path} for a retry: {error}")
+                    failed.append(spill)
+                else:
+                    spill.discard()
+            if failed:
+                with self._cond:
+                    self._ready[:0] = failed
+                    self._retry_at = time.monotonic() + self.retry_interval
+            return not failed
+
+    def _insert(self, model, rows):
+        """Insert `rows` in a savepoint, bisecting them when the database rejects them; return the rejected rows"""
+        try:
+            with model._meta.database.atomic():
+                model.insert_many(rows).on_conflict_ignore().execute()
+            return []
+        except (OperationalError, InterfaceError):
+            raise
+        except Exception as error:
+            if len(rows) == 1:
+                logger.error(f"{model.__name__} row {rows[0].get('id')} rejected: {error}")
+                return rows
+            middle = len(rows) // 2
+            return self._insert(model, rows[:middle]) + self._insert(model, rows[middle:])
+
+    def _write(self, spill):
+        """Insert the rows of `spill`, set aside those the database rejects; return how many were rejected"""
+        rows_by_model = {}
+        for model_name, rows in spill.groups:
+            rows_by_model.setdefault(model_name, []).extend(rows)
+        rejected_count = 0
+        for model_name, rows in rows_by_model.items():
+            model = self.models.get(model_name)
+            if model is None:
+                logger.error(f"{len(rows)} rows of the unknown model {model_name} rejected")
+                rejected = rows
+            else:
+                rejected = []
+                with model._meta.database:
+                    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+                        rejected += self._insert(model, rows[start:start + INSERT_CHUNK_SIZE])
+            if rejected:
+                # rows the database rejects would fail on every retry, keep them aside for inspection
+                path = os.path.join(self.spill_dir, f"rejected-{os.getpid()}-{uuid.uuid4().hex}.jsonl")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(json.dumps({"model": model_name, "rows": rejected}) + "\n")
+                logger.error(f"{len(rejected)} of {len(rows)} {model_name} rows rejected, saved to {path}")
+                rejected_count += len(rejected)
+        return rejected_count
+
+    def replay_rejected(self):
+        """
+        Insert the rows of the `rejected-*.jsonl` files again, e.g. once a missing parent row or a schema
+        change was fixed. Rows rejected again are set aside in a new file. Returns the number of rows
+        replayed and rejected again.
+        """
+        replayed = rejected = 0
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, "rejected-*.jsonl"))):
+            spill = SpillFile.claim(path)
+            if spill is None:
+                continue
+            try:
+                rejected += self._write(spill)
+            except (OperationalError, InterfaceError):
+                spill.file.close()
+                raise
+            replayed += spill.size
+            spill.discard()
+        return replayed, rejected
+
+    def close(self, timeout=30):
+        """Write the queued rows and stop the background thread"""
+        with self._cond:
+            if self._pid != os.getpid() or self._thread is None:
+                return
+            self._closing = True
+            self._cond.notify()
+            thread = self._thread
+        thread.join(timeout)
+        with self._cond:
+            if self._segment is not None and not self._segment.groups:
+                self._segment.discard()
+                self._segment = None
+            self._thread = None
+            self._pid = None
+            self._closing = False
+
+
+_telemetry_writer = None
+_telemetry_writer_lock = threading.Lock()
+
+
+def get_telemetry_writer():
+    """Process-wide WriteBehindBuffer of the RAG pipeline logs, configured from `Config`"""
+    global _telemetry_writer
+    if _telemetry_writer is None:
+        with _telemetry_writer_lock:
+            if _telemetry_writer is None:
+                from database.models import (
+                    GenerationMetrics,
+                    IntentClassification,
+                    PipelineSpan,
+                    RephraseMetrics,
+                    RerankedChunk,
+                    RerankMetrics,
+                    RetrievedChunk,
+                )
+                from django_core.config import Config
+
+                writer = WriteBehindBuffer(
+                    Config.TELEMETRY_SPILL_DIR,
+                    [
+                        RephraseMetrics,
+                        RetrievedChunk,
+                        RerankedChunk,
+                        RerankMetrics,
+                        GenerationMetrics,
+                        IntentClassification,
+                        PipelineSpan,
+                    ],
+                    flush_size=Config.TELEMETRY_FLUSH_SIZE,
+                    flush_interval=Config.TELEMETRY_FLUSH_INTERVAL,
+                    fsync=Config.TELEMETRY_SPILL_FSYNC,
+                )
+                atexit.register(writer.close)
+                _telemetry_writer = writer
+    return _telemetry_writer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RAG telemetry write-behind buffer")
+    parser.add_argument(
+        "--replay-rejected", action="store_true", help="insert the rows of the rejected-*.jsonl files again"
+    )
+    args = parser.parse_args()
+    if args.replay_rejected:
+        replayed, rejected = get_telemetry_writer().replay_rejected()
+        print(f"{replayed} rejected telemetry rows replayed, {rejected} rejected again")
+    else:
+        parser.print_help()
@@ -11,12 +11,29 @@ import os
 from channels.routing import ProtocolTypeRouter, URLRouter
 
 from django.core.asgi import get_asgi_application
+from django.urls import path, re_path
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_core.settings")
 
+django_application = get_asgi_application()
+
+# imported once Django is set up
+from api.voice_stream import voice_query_stream_application  # noqa: E402
+from common.static_texts import warm_up_static_text_catalog  # noqa: E402
+
+warm_up_static_text_catalog()
+
+# streaming voice queries read the request body as it arrives, Django reads it whole before calling a view
+voice_query_stream = voice_query_stream_application()
+
 application = ProtocolTypeRouter(
     {
-        "http": get_asgi_application(),
-        # Add other protocol routers here, like WebSockets if needed
+        "http": URLRouter(
+            [
+                path("api/chat/stream_voice_query/", voice_query_stream),
+                re_path(r"", django_application),
+            ]
+        ),
+        "websocket": URLRouter([path("api/chat/stream_voice_query/", voice_query_stream)]),
     }
 )
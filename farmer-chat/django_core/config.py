@@ -30,8 +30,15 @@ class Config:
     DB_PASSWORD = ENV_CONFIG.get("DB_PASSWORD")
     DB_HOST = ENV_CONFIG.get("DB_HOST")
     DB_PORT = ENV_CONFIG.get("DB_PORT")
-    MAX_CONNECTIONS = ENV_CONFIG.get("DB_MAX_CONNECTIONS")
-    STALE_TIMEOUT = ENV_CONFIG.get("DB_STALE_TIMEOUT")
+    MAX_CONNECTIONS = int(ENV_CONFIG.get("DB_MAX_CONNECTIONS", 20))
+    STALE_TIMEOUT = int(ENV_CONFIG.get("DB_STALE_TIMEOUT", 300))
+    POOL_TIMEOUT = int(ENV_CONFIG.get("DB_POOL_TIMEOUT", 10))
+
+    # RAG telemetry write-behind buffer
+    TELEMETRY_SPILL_DIR = ENV_CONFIG.get("TELEMETRY_SPILL_DIR", "telemetry_spill")
+    TELEMETRY_FLUSH_SIZE = int(ENV_CONFIG.get("TELEMETRY_FLUSH_SIZE", 500))
+    TELEMETRY_FLUSH_INTERVAL = float(ENV_CONFIG.get("TELEMETRY_FLUSH_INTERVAL", 1.0))
+    TELEMETRY_SPILL_FSYNC = handle_boolean(ENV_CONFIG.get("TELEMETRY_SPILL_FSYNC", False))
 
     # Medical Profiling config
     ENABLE_MEDICAL_PROFILING = handle_boolean(ENV_CONFIG.get("ENABLE_MEDICAL_PROFILING", False))
@@ -60,6 +67,11 @@ class Config:
     OUT_OF_CONTEXT_PROMPT = ENV_CONFIG.get("OUT_OF_CONTEXT_PROMPT")
     RESPONSE_GEN_PROMPT = ENV_CONFIG.get("RESPONSE_GEN_PROMPT")
 
+    # local intent classifier, the LLM only classifies the queries it is less confident about
+    INTENT_MODEL_PATH = ENV_CONFIG.get("INTENT_MODEL_PATH")
+    INTENT_CONFIDENCE_THRESHOLD = float(ENV_CONFIG.get("INTENT_CONFIDENCE_THRESHOLD", 0.8))
+    INTENT_CACHE_SIZE = int(ENV_CONFIG.get("INTENT_CACHE_SIZE", 10000))
+
     # openAI config
     OPEN_AI_KEY = ENV_CONFIG.get("OPENAI_API_KEY")
     GPT_3_MODEL = ENV_CONFIG.get("GPT_3_MODEL", "gpt-3.5-turbo")
@@ -67,6 +79,11 @@ class Config:
     TEMPERATURE = ENV_CONFIG.get("TEMPERATURE", 0)
     MAX_TOKENS = ENV_CONFIG.get("MAX_TOKENS", 500)
     CHAT_HISTORY_WINDOW = ENV_CONFIG.get("CHAT_HISTORY_WINDOW", 4)
+    CHAT_HISTORY_TOKEN_BUDGET = int(ENV_CONFIG.get("CHAT_HISTORY_TOKEN_BUDGET", 1000))
+    CHAT_HISTORY_SUMMARY_TOKENS = int(ENV_CONFIG.get("CHAT_HISTORY_SUMMARY_TOKENS", 200))
+    CHAT_HISTORY_CACHE_SIZE = int(ENV_CONFIG.get("CHAT_HISTORY_CACHE_SIZE", 10000))
+    CHAT_HISTORY_CACHE_TTL = int(ENV_CONFIG.get("CHAT_HISTORY_CACHE_TTL", 86400))
+    CHAT_HISTORY_REDIS_URL = ENV_CONFIG.get("CHAT_HISTORY_REDIS_URL")
 
     # Content Retrieval APIs
     CONTENT_DOMAIN_URL = ENV_CONFIG.get("CONTENT_DOMAIN_URL")
@@ -79,6 +96,21 @@ class Config:
 
     # Translation
     GOOGLE_APPLICATION_CREDENTIALS = ENV_CONFIG.get("GOOGLE_APPLICATION_CREDENTIALS")
+
+    # Streaming voice queries
+    ASR_STREAMING_STABILITY = float(ENV_CONFIG.get("ASR_STREAMING_STABILITY", 0.8))
+    ASR_MAX_SPECULATIONS = int(ENV_CONFIG.get("ASR_MAX_SPECULATIONS", 2))
+
+    # stage latencies of the requests (common/tracing.py): "local" and/or "otel", empty to record nothing
+    TRACING_BACKENDS = ENV_CONFIG.get("TRACING_BACKENDS", "")
+    TRACING_SAMPLE_RATE = float(ENV_CONFIG.get("TRACING_SAMPLE_RATE", 1.0))
+    TRACING_PROFILER = handle_boolean(ENV_CONFIG.get("TRACING_PROFILER", False))
+    TRACING_PROFILE_INTERVAL = float(ENV_CONFIG.get("TRACING_PROFILE_INTERVAL", 0.01))
+    TRACING_PROFILE_DIR = ENV_CONFIG.get("TRACING_PROFILE_DIR", "profiles")
+
+    # static texts catalog, reloaded on the notifications of the multilingual_text changes or after max age seconds
+    STATIC_TEXT_CATALOG_LISTEN = handle_boolean(ENV_CONFIG.get("STATIC_TEXT_CATALOG_LISTEN", True))
+    STATIC_TEXT_CATALOG_MAX_AGE = int(ENV_CONFIG.get("STATIC_TEXT_CATALOG_MAX_AGE", 3600))
     
     @classmethod
     def validate_medical_config(cls):
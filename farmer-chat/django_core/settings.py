@@ -59,6 +59,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "database.middleware.PeeweeConnectionMiddleware",
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
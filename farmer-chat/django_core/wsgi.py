@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_core.settings")
 
 application = get_wsgi_application()
+
+from common.static_texts import warm_up_static_text_catalog  # noqa: E402
+
+warm_up_static_text_catalog()
@@ -1,11 +1,11 @@
 from database.models import GenerationMetrics
-from database.db_operations import create_record
+from database.write_behind import get_telemetry_writer
 
 
 def insert_generation_data(generation_data_logs: dict, message_id: str = None):
     """
-    Save the generation metric logs associated with a specific message.
+    Queue the generation metric logs associated with a specific message, saved in bulk by the telemetry writer.
     """
     generation_data_logs.update({"message_id": message_id})
-    generated_data = create_record(GenerationMetrics, generation_data_logs)
-    return generated_data
+    queued_generation_data = get_telemetry_writer().enqueue(GenerationMetrics, generation_data_logs)
+    return queued_generation_data
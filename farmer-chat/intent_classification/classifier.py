@@ -0,0 +1,289 @@
+"""
+Tiered intent classification.
+
+A query is first looked up in a cache of the intents of earlier queries, keyed by the normalized query, then
+classified by a local model (TF-IDF character n-grams and a logistic regression, trained on the intents the
+LLM gave to earlier queries, see `intent_classification/train.py`). The LLM is only called when there is no
+local model or the model is less confident than `INTENT_CONFIDENCE_THRESHOLD`.
+
+Every classification is logged in `IntentClassification` through the telemetry write-behind buffer, the
+entries classified by the LLM being the training data of the next model.
+"""
+import logging
+import os
+import pickle
+import re
+import threading
+from collections import OrderedDict
+
+import numpy
+
+from django_core.config import Config
+from intent_classification.constants import IntentConstants
+
+logger = logging.getLogger(__name__)
+
+INTENTS = (
+    IntentConstants.USER_INTENT_GREETING,
+    IntentConstants.USER_INTENT_DISAPPOINTMENT,
+    IntentConstants.USER_INTENT_FARMING,
+    IntentConstants.USER_INTENT_REFERRING_BACK,
+    IntentConstants.USER_INTENT_CHANGE_CROP,
+    IntentConstants.USER_INTENT_UNCLEAR,
+    IntentConstants.USER_INTENT_EXIT,
+    IntentConstants.USER_INTENT_OUT_CONTEXT,
+)
+
+SOURCE_LLM = "llm"
+SOURCE_LOCAL = "local"
+SOURCE_CACHE = "cache"
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+def normalize_query(query):
+    """Lowercase `query`, drop punctuation and repeated whitespace"""
+    return " ".join(_PUNCTUATION.sub(" ", (query or "").lower()).split())
+
+
+class IntentCache:
+    """In-process LRU of the intents of normalized queries"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            intent = self._entries.get(key)
+            if intent is not None:
+                self._entries.move_to_end(key)
+            return intent
+
+    def set(self, key, intent):
+        with self._lock:
+            self._entries[key] = intent
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LocalIntentModel:
+    """TF-IDF character n-grams and a logistic regression over normalized queries"""
+
+    def __init__(self, vectorizer, classifier, trained_on=0):
+        self.vectorizer = vectorizer
+        self.classifier = classifier
+        self.trained_on = trained_on
+        # scikit-learn's transform and predict_proba take ~0.7 ms for a single query, mostly validating and
+        # building sparse matrices, `predict` scores it from the fitted weights instead
+        self._analyzer = vectorizer.build_analyzer()
+        self._vocabulary = vectorizer.vocabulary_
+        self._idf = vectorizer.idf_
+        self._weights = numpy.ascontiguousarray(classifier.coef_.T)
+        self._intercept = classifier.intercept_
+        self._classes = list(classifier.classes_)
+
+    @classmethod
+    def train(cls, queries, intents, C=10.0):
+        """Fit a model on queries and the intents given to them by the LLM"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+
+        if len(set(intents)) < 2:
+            raise ValueError("At least two intents are needed to train the intent classifier")
+        vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True, dtype=numpy.float32)
+        features = vectorizer.fit_transform([normalize_query(query) for query in queries])
+        classifier = LogisticRegression(C=C, max_iter=1000)
+        classifier.fit(features, list(intents))
+        return cls(vectorizer, classifier, trained_on=len(queries))
+
+    def predict_many(self, normalized_queries):
+        """(intent, probability) of each normalized query"""
+        probabilities = self.classifier.predict_proba(self.vectorizer.transform(normalized_queries))
+        best = probabilities.argmax(axis=1)
+        return [
+            (self.classifier.classes_[index], float(row[index])) for index, row in zip(best, probabilities)
+        ]
+
+    def predict(self, normalized_query):
+        """(intent, probability) of a normalized query, the same as `predict_many` but in tens of microseconds"""
+        counts = {}
+        for ngram in self._analyzer(normalized_query):
+            index = self._vocabulary.get(ngram)
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+        scores = self._intercept
+        if counts:
+            indices = numpy.fromiter(counts, dtype=numpy.intp, count=len(counts))
+            # sublinear tf, idf and l2 normalization of TfidfVectorizer
+            values = numpy.fromiter(counts.values(), dtype=float, count=len(counts))
+            values = (1 + numpy.log(values)) * self._idf[indices]
+            values /= numpy.sqrt(values @ values)
+            scores = values @ self._weights[indices] + self._intercept
+        if len(self._classes) == 2:
+            probability = 1 / (1 + numpy.exp(-scores[0]))
+            probabilities = (1 - probability, probability)
+        else:
+            probabilities = numpy.exp(scores - scores.max())
+            probabilities /= probabilities.sum()
+        best = int(numpy.argmax(probabilities))
+        return self._classes[best], float(probabilities[best])
+
+    def save(self, path):
+        """Pickle the model to `path`, replaced atomically so that running workers never read a partial file"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as f:
+            pickle.dump(
+                {"vectorizer": self.vectorizer, "classifier": self.classifier, "trained_on": self.trained_on}, f
+            )
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        return cls(state["vectorizer"], state["classifier"], trained_on=state["trained_on"])
+
+
+class TieredIntentClassifier:
+    """
+    Classifies a query from the cache, then the local model, then `llm_classify(query)`, an async callable
+    returning the intent given by the LLM or None when the LLM could not be reached.
+
+    The local model is (re)loaded from `model_path` when the file changes, so that a model trained while the
+    workers run is picked up without a restart.
+    """
+
+    def __init__(self, llm_classify, model=None, model_path=None, threshold=0.8, cache=None, log=None):
+        self.llm_classify = llm_classify
+        self.model = model
+        self.model_path = model_path
+        self.threshold = threshold
+        self.cache = cache if cache is not None else IntentCache()
+        self.log = log
+        self._model_mtime = None
+        self._model_lock = threading.Lock()
+
+    def _current_model(self):
+        if self.model_path is None:
+            return self.model
+        try:
+            mtime = os.stat(self.model_path).st_mtime_ns
+        except FileNotFoundError:
+            return self.model
+        if mtime != self._model_mtime:
+            with self._model_lock:
+                if mtime != self._model_mtime:
+                    try:
+                        self.model = LocalIntentModel.load(self.model_path)
+                        logger.info(f"Loaded the intent classifier trained on {self.model.trained_on} queries")
+                    except Exception as error:
+                        logger.warning(f"Could not load the intent classifier {self.model_path}: {error}")
+                    # cached local predictions are those of the former model
+                    self.cache.clear()
+                    self._model_mtime = mtime
+        return self.model
+
+    async def classify(self, query, message_id=None):
+        """(intent, source, confidence) of `query`, source being one of "cache", "local" and "llm" """
+        key = normalize_query(query)
+        model = self._current_model()
+        intent, confidence = self.cache.get(key), None
+        if intent is not None:
+            source = SOURCE_CACHE
+        else:
+            if model is not None and key:
+                intent, confidence = model.predict(key)
+            if intent is not None and confidence >= self.threshold:
+                source = SOURCE_LOCAL
+            else:
+                source, confidence = SOURCE_LLM, None
+                intent = await self.llm_classify(query)
+                if intent is not None:
+                    intent = intent.strip()
+                if intent not in INTENTS:
+                    # not logged, nor cached: an unreachable LLM or an answer which is not an intent
+                    logger.warning(f"Unexpected intent classification {intent!r}")
+                    return intent or IntentConstants.USER_INTENT_FARMING, SOURCE_LLM, None
+            self.cache.set(key, intent)
+
+        if self.log is not None:
+            try:
+                self.log(query, key, intent, source, confidence, message_id)
+            except Exception as error:
+                logger.warning(f"Could not log the intent classification: {error}")
+        return intent, source, confidence
+
+
+def log_classification(query, normalized_query, intent, source, confidence, message_id):
+    """Queue an `IntentClassification` row in the telemetry write-behind buffer"""
+    if not Config.WITH_DB_CONFIG:
+        return
+    from database.models import IntentClassification
+    from database.write_behind import get_telemetry_writer
+
+    get_telemetry_writer().enqueue(
+        IntentClassification,
+        {
+            "message": str(message_id) if message_id else None,
+            "query": query[:10000],
+            "normalized_query": normalized_query[:10000],
+            "intent": intent,
+            "source": source,
+            "confidence": confidence,
+        },
+    )
+
+
+def load_labelled_queries(since=None):
+    """
+    Queries classified by the LLM and their intents, from `IntentClassification`, the latest label of a
+    normalized query only
+    """
+    from database.models import IntentClassification
+
+    entries = IntentClassification.select(
+        IntentClassification.query, IntentClassification.normalized_query, IntentClassification.intent
+    ).where(IntentClassification.source == SOURCE_LLM, IntentClassification.is_deleted == False)
+    if since is not None:
+        entries = entries.where(IntentClassification.created_on >= since)
+    labelled = {}
+    for entry in entries.order_by(IntentClassification.created_on).tuples().iterator():
+        query, normalized_query, intent = entry
+        labelled[normalized_query] = (query, intent)
+    return [query for query, _ in labelled.values()], [intent for _, intent in labelled.values()]
+
+
+def default_model_path():
+    return Config.INTENT_MODEL_PATH or os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_model.pkl")
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier(llm_classify):
+    """Process-wide TieredIntentClassifier, configured from `Config`"""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = TieredIntentClassifier(
+                    llm_classify,
+                    model_path=default_model_path(),
+                    threshold=Config.INTENT_CONFIDENCE_THRESHOLD,
+                    cache=IntentCache(Config.INTENT_CACHE_SIZE),
+                    log=log_classification,
+                )
+    return _classifier
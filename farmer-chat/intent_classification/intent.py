@@ -1,15 +1,25 @@
 from django_core.config import Config
 from rag_service.openai_service import make_openai_request
+from intent_classification.classifier import get_intent_classifier
 from intent_classification.constants import IntentConstants
 
 
-async def classify_intent(qn):
+async def classify_intent_with_llm(qn):
     """
-    Classify the query or question intent into any of the classification to which it falls under.
+    Classify the query or question intent with the LLM, None if it could not be reached.
     """
     prompt = Config.INTENT_CLASSIFICATION_PROMPT_TEMPLATE.format(input=qn)
     intent_response, ex, retries = await make_openai_request(prompt, model=Config.GPT_4_MODEL)
-    return intent_response.choices[0].message.content if intent_response else IntentConstants.USER_INTENT_FARMING
+    return intent_response.choices[0].message.content if intent_response else None
+
+
+async def classify_intent(qn, message_id=None):
+    """
+    Classify the query or question intent into any of the classification to which it falls under, from the
+    cache of classified queries or the local classifier when it is confident enough, else with the LLM.
+    """
+    intent, source, confidence = await get_intent_classifier(classify_intent_with_llm).classify(qn, message_id)
+    return intent
 
 
 async def generate_convo_response(qn, name):
@@ -48,7 +58,7 @@ async def generate_out_of_context_response(qn, name):
     return out_of_context_response.choices[0].message.content
 
 
-async def process_user_intent(input_msg, user_name):
+async def process_user_intent(input_msg, user_name, message_id=None):
     """
     Intent classification of the user query or message to recognise the intention of the user. If the user's
     query intent falls under any of the categories such as greetings, unclear queries, exiting the conversation,
@@ -57,7 +67,7 @@ async def process_user_intent(input_msg, user_name):
     response = None
     intent = None
     proceed_to_rag = True
-    intent = await classify_intent(input_msg)
+    intent = await classify_intent(input_msg, message_id)
     if intent == IntentConstants.USER_INTENT_GREETING or intent == IntentConstants.USER_INTENT_DISAPPOINTMENT:
         response = await generate_convo_response(input_msg, user_name)
 
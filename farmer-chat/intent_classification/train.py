@@ -0,0 +1,44 @@
+"""
+Train the local intent classifier on the queries classified by the LLM (`IntentClassification` entries with
+source "llm") and save it where the workers load it from (`INTENT_MODEL_PATH`).
+
+    python -m intent_classification.train --min-queries 500
+
+Run `benchmarks/intent_classifier.py` first to pick `INTENT_CONFIDENCE_THRESHOLD` from the accuracy and
+escalation rate of the model on the same entries.
+"""
+import argparse
+import datetime
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.database_config import db_conn  # noqa: E402
+from intent_classification.classifier import LocalIntentModel, default_model_path, load_labelled_queries  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default=default_model_path(), help="where the model is saved")
+    parser.add_argument("--days", type=int, help="only the queries classified in the last DAYS days")
+    parser.add_argument("--min-queries", type=int, default=200, help="do not train on fewer labelled queries")
+    args = parser.parse_args()
+
+    since = datetime.datetime.now() - datetime.timedelta(days=args.days) if args.days else None
+    with db_conn:
+        queries, intents = load_labelled_queries(since)
+    print(f"{len(queries)} queries classified by the LLM: {dict(Counter(intents).most_common())}")
+    if len(queries) < args.min_queries:
+        print(f"Fewer than {args.min_queries} queries, the model is not trained")
+        return False
+
+    model = LocalIntentModel.train(queries, intents)
+    model.save(args.path)
+    print(f"Saved to {args.path}")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -1,14 +1,56 @@
-import asyncio, logging
+import asyncio, logging, threading
 from google.cloud import speech_v1p1beta1 as speech
-from google.cloud import translate_v2 as translate
 from google.oauth2 import service_account
 
 from django_core.config import Config
+from language_service.streaming import StreamingRecognizer
+from language_service.translation import get_translate_client
 
 logger = logging.getLogger(__name__)
 
 credentials = service_account.Credentials.from_service_account_file(Config.GOOGLE_APPLICATION_CREDENTIALS)
 
+# encodings of the audio of streaming voice queries, by the name given by the client
+STREAMING_ENCODINGS = {
+    "mp3": speech.RecognitionConfig.AudioEncoding.MP3,
+    "webm": speech.RecognitionConfig.AudioEncoding.WEBM_OPUS,
+    "ogg": speech.RecognitionConfig.AudioEncoding.OGG_OPUS,
+    "flac": speech.RecognitionConfig.AudioEncoding.FLAC,
+    "linear16": speech.RecognitionConfig.AudioEncoding.LINEAR16,
+}
+
+# the client holds a gRPC channel, created once per process
+_speech_client = None
+_speech_client_lock = threading.Lock()
+
+
+def get_speech_client():
+    global _speech_client
+    if _speech_client is None:
+        with _speech_client_lock:
+            if _speech_client is None:
+                _speech_client = speech.SpeechClient(credentials=credentials)
+    return _speech_client
+
+
+def recognition_config(language_code, encoding_format, sample_rate_hertz):
+    return speech.RecognitionConfig(
+        encoding=encoding_format,
+        sample_rate_hertz=sample_rate_hertz,
+        language_code=language_code,
+        alternative_language_codes=["en-US", "en-IN"],
+        enable_automatic_punctuation=True,  # Enable automatic punctuation
+        use_enhanced=True,  # Enable enhanced models
+    )
+
+
+async def detect_language(transcriptions):
+    """
+    Detected language and confidence score of transcriptions.
+    """
+    detection_response = await asyncio.to_thread(get_translate_client().detect_language, transcriptions)
+    return detection_response["language"], detection_response["confidence"]
+
 
 async def transcribe_and_translate(
     file_name, language_code, encoding_format=speech.RecognitionConfig.AudioEncoding.MP3, sample_rate_hertz=16000
@@ -17,22 +59,14 @@ async def transcribe_and_translate(
     Generate transcriptions (text) and confidence score for a given audio or voice file
     in a specified language using an ASR model.
     """
-    speech_client = speech.SpeechClient(credentials=credentials)
-    translate_client = translate.Client(credentials=credentials)
+    speech_client = get_speech_client()
 
     audio = None
     with open(file_name, "rb") as audio_data:
         audio_content = audio_data.read()
         audio = speech.RecognitionAudio(content=audio_content)
 
-    config = speech.RecognitionConfig(
-        encoding=encoding_format,
-        sample_rate_hertz=sample_rate_hertz,
-        language_code=language_code,
-        alternative_language_codes=["en-US", "en-IN"],
-        enable_automatic_punctuation=True,  # Enable automatic punctuation
-        use_enhanced=True,  # Enable enhanced models
-    )
+    config = recognition_config(language_code, encoding_format, sample_rate_hertz)
 
     # print(f"Trying to transcribe in the language: {language_code}")
     logger.info(f"Trying to transcribe in the language: {language_code}")
@@ -44,10 +78,42 @@ async def transcribe_and_translate(
     # Send the transcriptions as a reply
     transcriptions = "\n".join(transcriptions)
 
-    detection_response = await asyncio.to_thread(translate_client.detect_language, transcriptions)
-    confidence = detection_response["confidence"]
-    detected_language = detection_response["language"]
+    detected_language, confidence = await detect_language(transcriptions)
     # print(f"Detected language {detected_language} & Confidence: {confidence}")
     logger.info(f"Detected language: {detected_language} | Confidence: {confidence}")
 
     return transcriptions, detected_language, confidence
+
+
+class GoogleStreamingRecognizer(StreamingRecognizer):
+    """
+    Streaming recognition with Google Speech-to-Text, interim results included, on the process-wide client.
+    """
+
+    def __init__(self, client=None, stability_threshold=Config.ASR_STREAMING_STABILITY):
+        super().__init__(stability_threshold)
+        self._client = client
+
+    def streaming_recognize(self, frames, language_code, encoding, sample_rate_hertz):
+        streaming_config = speech.StreamingRecognitionConfig(
+            config=recognition_config(
+                language_code,
+                STREAMING_ENCODINGS.get(encoding, speech.RecognitionConfig.AudioEncoding.MP3),
+                sample_rate_hertz,
+            ),
+            interim_results=True,
+        )
+        requests = (speech.StreamingRecognizeRequest(audio_content=frame) for frame in frames)
+        client = self._client or get_speech_client()
+        return client.streaming_recognize(config=streaming_config, requests=requests)
+
+
+_streaming_recognizer = None
+
+
+def get_streaming_recognizer():
+    """Process-wide GoogleStreamingRecognizer"""
+    global _streaming_recognizer
+    if _streaming_recognizer is None:
+        _streaming_recognizer = GoogleStreamingRecognizer()
+    return _streaming_recognizer
@@ -0,0 +1,85 @@
+"""
+Stand-in for a streaming speech recognition service, for the tests and benchmarks of the streaming voice
+queries: it needs no credentials nor network, answers in the shape of Google Speech-to-Text and with the timing
+given to it.
+"""
+import time
+from types import SimpleNamespace
+
+from language_service.streaming import StreamingRecognizer
+
+
+def _response(*results):
+    """A StreamingRecognizeResponse of (transcript, is_final, stability, confidence) results"""
+    return SimpleNamespace(
+        results=[
+            SimpleNamespace(
+                alternatives=[SimpleNamespace(transcript=transcript, confidence=confidence)],
+                is_final=is_final,
+                stability=stability,
+            )
+            for transcript, is_final, stability, confidence in results
+            if transcript
+        ]
+    )
+
+
+class FakeRecognizer(StreamingRecognizer):
+    """
+    Recognizes `transcript` in any audio: a word is heard for every `bytes_per_word` bytes received, the words
+    heard are reported as interim results (the last `unstable_words` of them with a low stability), all of them
+    stable once the audio ends, and the final result, `final_transcript` if given, follows `final_latency`
+    seconds later (the end of speech detection of a real service).
+
+    `recognize` is the batch call of the former path: the whole audio, `batch_latency` seconds plus
+    `batch_latency_per_byte` per byte of audio.
+    """
+
+    def __init__(
+        self,
+        transcript,
+        final_transcript=None,
+        bytes_per_word=4000,
+        unstable_words=2,
+        final_latency=0.5,
+        batch_latency=0.5,
+        batch_latency_per_byte=0.0,
+        confidence=0.95,
+        stability_threshold=0.8,
+    ):
+        super().__init__(stability_threshold)
+        self.words = transcript.split()
+        self.final_transcript = final_transcript
+        self.bytes_per_word = bytes_per_word
+        self.unstable_words = unstable_words
+        self.final_latency = final_latency
+        self.batch_latency = batch_latency
+        self.batch_latency_per_byte = batch_latency_per_byte
+        self.confidence = confidence
+        self.streams = 0
+
+    def _transcript(self, heard):
+        if self.final_transcript is not None and heard == len(self.words):
+            return self.final_transcript
+        return " ".join(self.words[:heard])
+
+    def streaming_recognize(self, frames, language_code, encoding, sample_rate_hertz):
+        self.streams += 1
+        received, heard = 0, 0
+        for frame in frames:
+            received += len(frame)
+            now_heard = min(len(self.words), received // self.bytes_per_word)
+            if now_heard != heard:
+                heard = now_heard
+                stable = max(heard - self.unstable_words, 0)
+                yield _response(
+                    (" ".join(self.words[:stable]), False, 0.9, 0.0),
+                    (" ".join(self.words[stable:heard]), False, 0.01, 0.0),
+                )
+        yield _response((" ".join(self.words[:heard]), False, 0.9, 0.0))
+        time.sleep(self.final_latency)
+        yield _response((self._transcript(heard), True, 0.0, self.confidence))
+
+    def recognize(self, audio):
+        time.sleep(self.batch_latency + self.batch_latency_per_byte * len(audio))
+        return self._transcript(min(len(self.words), len(audio) // self.bytes_per_word))
@@ -0,0 +1,150 @@
+"""
+Streaming speech recognition.
+
+Audio frames are forwarded to the recognizer as they arrive, instead of once the whole recording is uploaded
+and decoded, and the recognizer reports partial transcripts while the user is still speaking. The speech
+client libraries are blocking (Google Speech-to-Text streams over gRPC), so `StreamingRecognizer.stream` runs
+the call in a thread of its own, fed from the event loop through a queue, and hands its responses back to the
+loop.
+
+Responses have the shape of Google's `StreamingRecognizeResponse`: `results`, each with `alternatives`
+(`transcript`, `confidence`), `is_final` and `stability`.
+"""
+import asyncio
+import logging
+import queue
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# `stable_transcript` is the part of `transcript` the recognizer is unlikely to change, `is_final` is only
+# set on the last update of a stream, with the confidence of the recognizer
+TranscriptUpdate = namedtuple("TranscriptUpdate", ["transcript", "stable_transcript", "is_final", "confidence"])
+
+_END = object()
+
+
+def _join(pieces):
+    return " ".join(piece for piece in pieces if piece)
+
+
+class TranscriptAssembler:
+    """Transcript of a stream from the final and interim results of its responses"""
+
+    def __init__(self, stability_threshold=0.8):
+        self.stability_threshold = stability_threshold
+        self.finals = []
+        self.confidences = []
+        self.last = None
+
+    def add(self, response):
+        """TranscriptUpdate after `response`, None if the transcript did not change"""
+        interim = []
+        for result in response.results:
+            if not result.alternatives:
+                continue
+            alternative = result.alternatives[0]
+            if result.is_final:
+                self.finals.append(alternative.transcript.strip())
+                self.confidences.append(alternative.confidence)
+            else:
+                interim.append((alternative.transcript.strip(), result.stability))
+
+        stable = list(self.finals)
+        for transcript, stability in interim:
+            if stability < self.stability_threshold:
+                break
+            stable.append(transcript)
+        update = TranscriptUpdate(
+            _join(self.finals + [transcript for transcript, _ in interim]), _join(stable), False, None
+        )
+        if update == self.last:
+            return None
+        self.last = update
+        return update
+
+    def final(self):
+        transcript = _join(self.finals)
+        confidence = sum(self.confidences) / len(self.confidences) if self.confidences else 0.0
+        return TranscriptUpdate(transcript, transcript, True, confidence)
+
+
+class StreamingRecognizer:
+    """
+    Base of the streaming recognizers, `streaming_recognize` being the blocking call of the speech service.
+    A recognizer holds no per-stream state, one instance serves all the streams of a process.
+    """
+
+    def __init__(self, stability_threshold=0.8):
+        self.stability_threshold = stability_threshold
+
+    def streaming_recognize(self, frames, language_code, encoding, sample_rate_hertz):
+        """
+        Iterator of the responses of the speech service for `frames`, a blocking iterator of audio bytes which
+        ends with the audio
+        """
+        raise NotImplementedError
+
+    async def stream(self, frames, language_code, encoding="mp3", sample_rate_hertz=16000):
+        """
+        Async iterator of the TranscriptUpdate of the audio of `frames`, an async iterator of audio bytes, the
+        last update being the final one
+        """
+        loop = asyncio.get_running_loop()
+        audio = queue.Queue()
+        responses = asyncio.Queue()
+
+        def blocking_frames():
+            while True:
+                frame = audio.get()
+                if frame is _END:
+                    return
+                yield frame
+
+        def post(item):
+            try:
+                loop.call_soon_threadsafe(responses.put_nowait, item)
+            except RuntimeError:
+                # the loop was closed, nobody is reading the stream anymore
+                pass
+
+        def recognize():
+            try:
+                for response in self.streaming_recognize(
+                    blocking_frames(), language_code, encoding, sample_rate_hertz
+                ):
+                    post(response)
+            except Exception as error:
+                post(error)
+            finally:
+                post(_END)
+
+        async def forward():
+            try:
+                async for frame in frames:
+                    audio.put(frame)
+            finally:
+                audio.put(_END)
+
+        threading.Thread(target=recognize, name="streaming-recognizer", daemon=True).start()
+        forwarding = asyncio.ensure_future(forward())
+        assembler = TranscriptAssembler(self.stability_threshold)
+        try:
+            while True:
+                response = await responses.get()
+                if response is _END:
+                    break
+                if isinstance(response, Exception):
+                    raise response
+                update = assembler.add(response)
+                if update is not None:
+                    yield update
+            if forwarding.done():
+                # the error of `frames`, if any (a client which went away)
+                forwarding.result()
+        finally:
+            if not forwarding.done():
+                forwarding.cancel()
+            audio.put(_END)
+        yield assembler.final()
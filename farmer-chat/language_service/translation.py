@@ -1,4 +1,5 @@
 import asyncio
+import threading
 from google.cloud import translate_v2 as translate
 from google.cloud import texttospeech
 from google.oauth2 import service_account
@@ -8,6 +9,19 @@ from django_core.config import Config
 
 credentials = service_account.Credentials.from_service_account_file(Config.GOOGLE_APPLICATION_CREDENTIALS)
 
+# the client holds an HTTP session, created once per process
+_translate_client = None
+_translate_client_lock = threading.Lock()
+
+
+def get_translate_client():
+    global _translate_client
+    if _translate_client is None:
+        with _translate_client_lock:
+            if _translate_client is None:
+                _translate_client = translate.Client(credentials=credentials)
+    return _translate_client
+
 
 # ========================================
 # KANNADA MEDICAL DICTIONARY
@@ -94,7 +108,7 @@ async def a_translate_to_english(text: str) -> str:
     """
     Translate a given text to english with healthcare context.
     """
-    translate_client = translate.Client(credentials=credentials)
+    translate_client = get_translate_client()
     
     # Add healthcare context hint for better translation
     translation = await asyncio.to_thread(
@@ -111,7 +125,7 @@ async def a_translate_to(text: str, lang_code: str) -> str:
     """
     Translate a given text to specified language with better accuracy.
     """
-    translate_client = translate.Client(credentials=credentials)
+    translate_client = get_translate_client()
     # Extract base language code (hi-Latn -> hi, kn -> kn)
     lang_code = lang_code.split("-")[0] if "-" in lang_code else lang_code
     
@@ -141,7 +155,7 @@ async def detect_language_and_translate_to_english(input_msg):
         return dict_translation, "kn"
     
     # Step 1: Detect language with Google
-    translate_client = translate.Client(credentials=credentials)
+    translate_client = get_translate_client()
     
     language_detection = await asyncio.to_thread(translate_client.detect_language, input_msg)
     input_language_detected = language_detection["language"]
@@ -167,7 +181,7 @@ async def translate_text_to_language(text, target_language_code):
     Translate text to target language - FIXED VERSION for better accuracy
     """
     try:
-        translate_client = translate.Client(credentials=credentials)
+        translate_client = get_translate_client()
         
         # Extract base language code (hi-Latn -> hi, kn -> kn, en-US -> en)
         base_lang = target_language_code.split("-")[0] if "-" in target_language_code else target_language_code
@@ -2,6 +2,7 @@ import asyncio
 import datetime
 import logging
 
+from common.tracing import span
 from generation.generate_response import generate_query_response
 from rag_service.utils import (
     fetch_source_from_reranked_chunks,
@@ -16,6 +17,44 @@ from retrieval.utils import prepare_retrieved_chunks_to_insert
 logger = logging.getLogger(__name__)
 
 
+def retrieve_query_content(original_query, email_id, chat_history=None):
+    """
+    Rephrase the query with the chat history and retrieve the content for the rephrased query, the steps of the
+    RAG pipeline which save nothing.
+    """
+    # Step 1: Execute rephrasing
+    try:
+        logger.info(f"🔄 Rephrasing query: '{original_query}'")
+        with span("rephrase"):
+            rephrased_query_response = asyncio.run(
+                rephrase_query(original_query, chat_history)
+            )
+        rephrased_query = rephrased_query_response.get("rephrased_query")
+        logger.info(f"✅ Rephrased to: '{rephrased_query}'")
+    except Exception as rephrase_error:
+        logger.warning(f"⚠️ Rephrasing failed, using original query: {rephrase_error}")
+        rephrased_query = original_query
+        rephrased_query_response = {"rephrased_query": original_query}
+
+    # Step 2: Content retrieval (will use local healthcare content if available)
+    try:
+        logger.info(f"🔍 Retrieving content for: '{rephrased_query}'")
+        with span("content_retrieval"):
+            retrieval_results = content_retrieval(rephrased_query, email_id)
+        retrieved_chunks_data = retrieval_results.get("retrieved_chunks")
+        
+        if retrieved_chunks_data:
+            logger.info(f"✅ Retrieved {len(retrieved_chunks_data)} chunks")
+        else:
+            logger.warning("⚠️ No content retrieved")
+            
+    except Exception as retrieval_error:
+        logger.error(f"❌ Content retrieval failed: {retrieval_error}")
+        retrieved_chunks_data = None
+
+    return rephrased_query_response, retrieved_chunks_data
+
+
 def execute_rag_pipeline(
     original_query,
     input_language_detected,
@@ -23,6 +62,7 @@ def execute_rag_pipeline(
     user_name=None,
     message_id=None,
     chat_history=None,
+    prefetched=None,
 ):
     """
     Execute RAG pipeline to process rephrasing, reranking and generating response
@@ -43,33 +83,17 @@ def execute_rag_pipeline(
             datetime.datetime.now()
         )
 
-        # Step 1: Execute rephrasing
-        try:
-            logger.info(f"🔄 Rephrasing query: '{original_query}'")
-            rephrased_query_response = asyncio.run(
-                rephrase_query(original_query, chat_history)
+        # Steps 1 and 2: rephrasing and content retrieval, already run on a stable partial transcript of a
+        # voice query when `prefetched` is given (see api/voice_stream.py)
+        if prefetched is not None:
+            logger.info("⏩ Using the rephrasing and content retrieval run ahead of the final transcript")
+            rephrased_query_response = prefetched["rephrased_query_response"]
+            retrieved_chunks_data = prefetched["retrieved_chunks_data"]
+        else:
+            rephrased_query_response, retrieved_chunks_data = retrieve_query_content(
+                original_query, email_id, chat_history
             )
-            rephrased_query = rephrased_query_response.get("rephrased_query")
-            logger.info(f"✅ Rephrased to: '{rephrased_query}'")
-        except Exception as rephrase_error:
-            logger.warning(f"⚠️ Rephrasing failed, using original query: {rephrase_error}")
-            rephrased_query = original_query
-            rephrased_query_response = {"rephrased_query": original_query}
-
-        # Step 2: Content retrieval (will use local healthcare content if available)
-        try:
-            logger.info(f"🔍 Retrieving content for: '{rephrased_query}'")
-            retrieval_results = content_retrieval(rephrased_query, email_id)
-            retrieved_chunks_data = retrieval_results.get("retrieved_chunks")
-            
-            if retrieved_chunks_data:
-                logger.info(f"✅ Retrieved {len(retrieved_chunks_data)} chunks")
-            else:
-                logger.warning("⚠️ No content retrieved")
-                
-        except Exception as retrieval_error:
-            logger.error(f"❌ Content retrieval failed: {retrieval_error}")
-            retrieved_chunks_data = None
+        rephrased_query = rephrased_query_response.get("rephrased_query")
 
         # Step 3: Process retrieved content
         if not retrieved_chunks_data:
@@ -123,9 +147,10 @@ These are general wellness suggestions. For specific medical concerns, please co
             # Step 5: Rerank the retrieved chunks
             try:
                 logger.info("🎯 Reranking retrieved chunks")
-                reranked_query_response = asyncio.run(
-                    rerank_query(rephrased_query, retrieved_chunks_data)
-                )
+                with span("rerank", chunks=len(retrieved_chunks_data)):
+                    reranked_query_response = asyncio.run(
+                        rerank_query(rephrased_query, retrieved_chunks_data)
+                    )
                 reranked_chunks = reranked_query_response.get("reranked_chunks", {})
                 
                 if reranked_chunks:
@@ -175,11 +200,12 @@ These are general wellness suggestions. For specific medical concerns, please co
             # Step 8: Generate final response using LLM
             try:
                 logger.info("🤖 Generating response with LLM")
-                generated_response = asyncio.run(
-                    generate_query_response(
-                        original_query, user_name, context_chunks, rephrased_query
+                with span("generation"):
+                    generated_response = asyncio.run(
+                        generate_query_response(
+                            original_query, user_name, context_chunks, rephrased_query
+                        )
                     )
-                )
                 generated_final_response = generated_response.get("response")
                 
                 if generated_final_response:
@@ -16,10 +16,11 @@ def post_process_rag_pipeline(
 ):
     """
     Save or log the RAG pipeline metrics to DB.
+    The rows are queued for the telemetry write-behind buffer, so the response does not wait for the inserts.
     """
     data_saved = False
     if with_db_config:
-        # insert data logs to db
+        # queue data logs for the db
         insert_rephrase_data(rephrased_query_response, message_id)
         insert_retrieved_chunk_data(retrieved_chunks)
         insert_reranked_chunk_data(reranked_chunk_data)
@@ -1,11 +1,11 @@
 from database.models import RephraseMetrics
-from database.db_operations import create_record
+from database.write_behind import get_telemetry_writer
 
 
 def insert_rephrase_data(rephrase_data_logs: dict, message_id: str = None):
     """
-    Save the rephrase metric logs associated with a specific message.
+    Queue the rephrase metric logs associated with a specific message, saved in bulk by the telemetry writer.
     """
     rephrase_data_logs.update({"message_id": message_id})
-    inserted_rephrase_data = create_record(RephraseMetrics, rephrase_data_logs)
-    return inserted_rephrase_data
+    queued_rephrase_data = get_telemetry_writer().enqueue(RephraseMetrics, rephrase_data_logs)
+    return queued_rephrase_data
@@ -1,5 +1,5 @@
 from database.models import RerankMetrics, RerankedChunk
-from database.db_operations import create_record, create_multiple_records
+from database.write_behind import get_telemetry_writer
 
 
 def prepare_reranked_chunks_to_insert(reranked_chunks_doc_map, message_id):
@@ -23,16 +23,16 @@ def prepare_reranked_chunks_to_insert(reranked_chunks_doc_map, message_id):
 
 def insert_reranked_chunk_data(reranked_chunk_data: dict):
     """
-    Save the reranked chunk data associated with a specific message.
+    Queue the reranked chunk data associated with a specific message, saved in bulk by the telemetry writer.
     """
-    inserted_reranked_chunk_data = create_multiple_records(RerankedChunk, reranked_chunk_data)
-    return inserted_reranked_chunk_data
+    queued_reranked_chunk_data = get_telemetry_writer().enqueue(RerankedChunk, reranked_chunk_data)
+    return queued_reranked_chunk_data
 
 
 def insert_rerank_metrics_data(rerank_metric_logs: dict, message_id: str = None):
     """
-    Save the rerank metric logs associated with a specific message.
+    Queue the rerank metric logs associated with a specific message, saved in bulk by the telemetry writer.
     """
     rerank_metric_logs.update({"message_id": message_id})
-    inserted_rerank_metrics_data = create_record(RerankMetrics, rerank_metric_logs)
-    return inserted_rerank_metrics_data
+    queued_rerank_metrics_data = get_telemetry_writer().enqueue(RerankMetrics, rerank_metric_logs)
+    return queued_rerank_metrics_data
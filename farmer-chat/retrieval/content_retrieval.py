@@ -18,6 +18,7 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 from typing import Dict, List, Optional, Tuple
 
+from common.tracing import span
 from common.utils import send_request
 from django_core.config import Config
 
@@ -218,10 +219,11 @@ def apply_medical_filtering(
     try:
         logger.info(f"🔍 Applying medical filtering for user: {email}")
         
-        filtered_content, warnings, disclaimer = filter_remedies_by_medical_profile(
-            content=content_chunks,
-            user_id=user_id
-        )
+        with span("remedy_filter", chunks=len(content_chunks)):
+            filtered_content, warnings, disclaimer = filter_remedies_by_medical_profile(
+                content=content_chunks,
+                user_id=user_id
+            )
         
         if filtered_content:
             filtered_count = len(content_chunks) - len(filtered_content)
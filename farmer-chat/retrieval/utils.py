@@ -1,5 +1,5 @@
-from database.db_operations import create_multiple_records
 from database.models import RetrievedChunk
+from database.write_behind import get_telemetry_writer
 
 
 def prepare_retrieved_chunks_to_insert(retrieved_chunks_doc_map, message_id):
@@ -29,10 +29,10 @@ def prepare_retrieved_chunks_to_insert(retrieved_chunks_doc_map, message_id):
 
 def insert_retrieved_chunk_data(retrieved_chunk_data: dict):
     """
-    Save the retrieved chunk data associated with a specific message.
+    Queue the retrieved chunk data associated with a specific message, saved in bulk by the telemetry writer.
     """
 
-    inserted_retrieved_chunk_data = create_multiple_records(
+    queued_retrieved_chunk_data = get_telemetry_writer().enqueue(
         RetrievedChunk, retrieved_chunk_data
     )
-    return inserted_retrieved_chunk_data
+    return queued_retrieved_chunk_data
@@ -0,0 +1,144 @@
+"""Tests of the chat history cache (common/chat_history.py), on a SQLite database"""
+import json
+import os
+import sys
+
+import pytest
+from peewee import SqliteDatabase
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common.chat_history import ChatHistoryCache, LocalHistoryStore, RedisHistoryStore, format_turn
+from database.models import Conversation, Language, Messages, User
+
+MODELS = [Language, User, Conversation, Messages]
+
+
+class FakeRedis:
+    """The part of the redis client API used by RedisHistoryStore"""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value.encode()
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+@pytest.fixture
+def conversation(tmp_path):
+    db = SqliteDatabase(str(tmp_path / "history.db"))
+    db.bind(MODELS)
+    db.create_tables(MODELS)
+    yield Conversation.create(user=User.create(email="farmer@example.com"))
+    db.close()
+
+
+def answered(conversation, index, text="question"):
+    return Messages.create(
+        conversation=conversation,
+        translated_message=f"{text} {index}",
+        message_response=f"answer {index}",
+    )
+
+
+def save(cache, message, **data):
+    # what common.utils.save_message_obj does
+    for field, value in data.items():
+        setattr(message, field, value)
+    message.save()
+    cache.record_message(message)
+
+
+def uncached_history(conversation, window):
+    """The former get_user_chat_history"""
+    messages = (
+        Messages.select()
+        .where(Messages.conversation_id == conversation.id, Messages.message_response != None)
+        .order_by(Messages.created_on.desc())
+        .limit(window)
+    )
+    return "".join(format_turn(m.translated_message, m.message_response) for m in reversed(list(messages)))
+
+
+def test_history_of_a_short_conversation_is_unchanged(conversation):
+    for index in range(3):
+        answered(conversation, index)
+    cache = ChatHistoryCache(LocalHistoryStore(), window=4)
+    assert cache.get_history(conversation.id) == uncached_history(conversation, 4)
+
+
+@pytest.mark.parametrize("store", [LocalHistoryStore, lambda: RedisHistoryStore(FakeRedis())])
+def test_saved_messages_update_the_cached_history(conversation, store):
+    cache = ChatHistoryCache(store(), window=4)
+    for index in range(2):
+        answered(conversation, index)
+    cache.get_history(conversation.id)
+
+    message = Messages.create(conversation=conversation, translated_message="question 2")
+    save(cache, message, message_response="answer 2")
+    entry = cache.store.get(cache._key(conversation.id))
+    assert [turn[0] for turn in entry["turns"]][-1] == str(message.id)
+    assert cache.get_history(conversation.id) == uncached_history(conversation, 4)
+
+    save(cache, message, message_response="corrected answer 2")
+    assert cache.get_history(conversation.id).endswith("AI Assistant : corrected answer 2")
+
+    save(cache, message, is_deleted=True)
+    assert "question 2" not in cache.get_history(conversation.id)
+
+
+def test_shared_store_serves_history_without_queries(conversation, monkeypatch):
+    cache = ChatHistoryCache(RedisHistoryStore(FakeRedis()), window=4)
+    answered(conversation, 0)
+    cache.get_history(conversation.id)
+    save(cache, Messages.create(conversation=conversation, translated_message="question 1"), message_response="answer 1")
+
+    def no_query(*args, **kwargs):
+        raise AssertionError("history read from the database")
+
+    monkeypatch.setattr(Messages._meta.database, "execute_sql", no_query)
+    assert cache.get_history(conversation.id) == format_turn("question 0", "answer 0") + format_turn("question 1", "answer 1")
+
+
+def test_local_entry_is_reloaded_after_a_write_of_another_worker(conversation):
+    cache = ChatHistoryCache(LocalHistoryStore(), window=4)
+    answered(conversation, 0)
+    cache.get_history(conversation.id)
+    # saved by another process, this cache's record_message is not called
+    answered(conversation, 1)
+    assert cache.get_history(conversation.id) == uncached_history(conversation, 4)
+
+
+def test_older_turns_are_compacted_into_a_bounded_summary(conversation):
+    cache = ChatHistoryCache(LocalHistoryStore(), window=4, token_budget=200, summary_tokens=50)
+    cache.get_history(conversation.id)
+    lengths = []
+    for index in range(100):
+        message = Messages.create(conversation=conversation, translated_message=f"how do I treat fever {index}")
+        save(cache, message, message_response="rest and fluids " * 20)
+        lengths.append(len(cache.get_history(conversation.id)))
+
+    history = cache.get_history(conversation.id)
+    entry = cache.store.get(cache._key(conversation.id))
+    assert len(entry["turns"]) == 2
+    assert history.startswith("\n\nEarlier in this conversation the user asked about : ")
+    assert "how do I treat fever 97" in entry["summary"] and "fever 0;" not in entry["summary"]
+    assert max(lengths[10:]) - min(lengths[10:]) < 20
+
+    # the same entry is rebuilt from the database
+    assert cache.load(conversation.id)["turns"] == entry["turns"]
+
+
+def test_redis_entries_are_json(conversation):
+    client = FakeRedis()
+    cache = ChatHistoryCache(RedisHistoryStore(client, prefix="test:"), window=2)
+    answered(conversation, 0)
+    cache.get_history(conversation.id)
+    entry = json.loads(client.values[f"test:2:{conversation.id}"])
+    assert entry == {"summary": "", "turns": [[str(Messages.get().id), "question 0", "answer 0"]]}
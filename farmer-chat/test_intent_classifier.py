@@ -0,0 +1,146 @@
+"""Tests of the tiered intent classifier (intent_classification/classifier.py), on a SQLite database"""
+import asyncio
+import os
+import sys
+
+import pytest
+from peewee import SqliteDatabase
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("sklearn")
+
+from database.models import Conversation, IntentClassification, Language, Messages, User
+from database.write_behind import WriteBehindBuffer
+from intent_classification.classifier import (
+    IntentCache,
+    LocalIntentModel,
+    TieredIntentClassifier,
+    load_labelled_queries,
+    normalize_query,
+)
+from intent_classification.constants import IntentConstants
+
+MODELS = [Language, User, Conversation, Messages, IntentClassification]
+
+REMEDIES = ["ginger", "turmeric", "honey", "tulsi", "garlic", "lemon"]
+SYMPTOMS = ["fever", "cold", "cough", "headache", "acidity", "sore throat"]
+LABELLED = (
+    [(f"how do I treat {symptom} with {remedy}", IntentConstants.USER_INTENT_FARMING)
+     for symptom in SYMPTOMS for remedy in REMEDIES]
+    + [(greeting, IntentConstants.USER_INTENT_GREETING)
+       for greeting in ["hi", "hello", "hello there", "good morning", "hey", "hi doctor", "good evening", "hey there"]]
+    + [(goodbye, IntentConstants.USER_INTENT_EXIT)
+       for goodbye in ["bye", "goodbye", "thank you bye", "i am done", "see you later", "exit", "bye bye", "thats all"]]
+)
+
+
+class FakeLLM:
+    def __init__(self, intent=IntentConstants.USER_INTENT_FARMING):
+        self.intent = intent
+        self.queries = []
+
+    async def __call__(self, query):
+        self.queries.append(query)
+        return self.intent
+
+
+@pytest.fixture(scope="module")
+def model():
+    return LocalIntentModel.train(*zip(*LABELLED))
+
+
+def classify(classifier, query, message_id=None):
+    return asyncio.run(classifier.classify(query, message_id))
+
+
+def test_normalized_queries():
+    assert normalize_query("  How do I treat FEVER?? ") == normalize_query("how do i treat fever") == "how do i treat fever"
+    assert normalize_query(None) == ""
+
+
+def test_single_query_prediction_matches_scikit_learn(model):
+    queries = [normalize_query(query) for query, _ in LABELLED] + ["", "what is the price of bitcoin"]
+    for query, (intent, confidence) in zip(queries, model.predict_many(queries)):
+        predicted_intent, predicted_confidence = model.predict(query)
+        assert predicted_intent == intent
+        assert predicted_confidence == pytest.approx(confidence, abs=1e-6)
+
+
+def test_confident_queries_are_not_sent_to_the_llm(model):
+    llm = FakeLLM()
+    classifier = TieredIntentClassifier(llm, model=model, threshold=0.5)
+    intent, source, confidence = classify(classifier, "How do I treat a cough with honey?")
+    assert (intent, source) == (IntentConstants.USER_INTENT_FARMING, "local")
+    assert confidence >= 0.5
+    assert llm.queries == []
+
+
+def test_uncertain_queries_are_escalated_then_cached(model):
+    llm = FakeLLM(IntentConstants.USER_INTENT_OUT_CONTEXT + "\n")
+    classifier = TieredIntentClassifier(llm, model=model, threshold=0.99)
+    assert classify(classifier, "Who won the cricket match?") == (IntentConstants.USER_INTENT_OUT_CONTEXT, "llm", None)
+    assert classify(classifier, "who won the   cricket match") == (IntentConstants.USER_INTENT_OUT_CONTEXT, "cache", None)
+    assert llm.queries == ["Who won the cricket match?"]
+
+
+def test_failed_llm_classifications_are_not_cached():
+    llm = FakeLLM(None)
+    classifier = TieredIntentClassifier(llm)
+    for _ in range(2):
+        assert classify(classifier, "hello")[0] == IntentConstants.USER_INTENT_FARMING
+    assert len(llm.queries) == 2
+    assert len(classifier.cache) == 0
+
+
+def test_cache_is_bounded():
+    cache = IntentCache(max_entries=2)
+    for query in ["a", "b", "c"]:
+        cache.set(query, IntentConstants.USER_INTENT_FARMING)
+    assert (cache.get("a"), len(cache)) == (None, 2)
+
+
+def test_model_file_is_reloaded_when_it_changes(tmp_path, model):
+    path = str(tmp_path / "intent_model.pkl")
+    llm = FakeLLM(IntentConstants.USER_INTENT_GREETING)
+    classifier = TieredIntentClassifier(llm, model_path=path, threshold=0.5)
+    assert classify(classifier, "how do I treat fever with ginger")[1] == "llm"
+
+    model.save(path)
+    assert classify(classifier, "how do I treat fever with ginger") == (
+        IntentConstants.USER_INTENT_FARMING, "local", pytest.approx(model.predict("how do i treat fever with ginger")[1])
+    )
+    assert os.listdir(tmp_path) == ["intent_model.pkl"]
+
+
+def test_llm_labels_are_logged_as_training_data(tmp_path, model):
+    db = SqliteDatabase(str(tmp_path / "intent.db"))
+    db.bind(MODELS)
+    db.create_tables(MODELS)
+    message = Messages.create(conversation=Conversation.create(user=User.create(email="farmer@example.com")))
+    buffer = WriteBehindBuffer(str(tmp_path / "spill"), [IntentClassification], flush_interval=3600)
+
+    def log(query, normalized_query, intent, source, confidence, message_id):
+        buffer.enqueue(IntentClassification, {
+            "message": message_id, "query": query, "normalized_query": normalized_query, "intent": intent,
+            "source": source, "confidence": confidence,
+        })
+
+    llm = FakeLLM(IntentConstants.USER_INTENT_OUT_CONTEXT)
+    classifier = TieredIntentClassifier(llm, model=model, threshold=0.99, log=log)
+    classify(classifier, "What is the capital of France?", str(message.id))
+    classify(classifier, "what is the capital of france", str(message.id))
+    classify(classifier, "how do I treat fever with ginger")
+    llm.intent = IntentConstants.USER_INTENT_GREETING
+    classify(classifier, "Hello!!")
+    buffer.close()
+
+    assert [entry.source for entry in IntentClassification.select().order_by(IntentClassification.created_on)] == [
+        "llm", "cache", "llm", "llm"
+    ]
+    assert load_labelled_queries() == (
+        ["What is the capital of France?", "how do I treat fever with ginger", "Hello!!"],
+        [IntentConstants.USER_INTENT_OUT_CONTEXT, IntentConstants.USER_INTENT_OUT_CONTEXT,
+         IntentConstants.USER_INTENT_GREETING],
+    )
+    db.close()
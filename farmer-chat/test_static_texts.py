@@ -0,0 +1,135 @@
+"""Tests of the static texts catalog (common/static_texts.py), on a SQLite database"""
+import logging
+import os
+import sys
+
+import pytest
+from peewee import SqliteDatabase
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import static_texts
+from common.static_texts import StaticTextCatalog
+from database.models import Language, MultilingualText
+
+MODELS = [Language, MultilingualText]
+
+
+class QueryCounter(logging.Handler):
+    """Counts the queries peewee logs"""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.queries = 0
+
+    def emit(self, record):
+        self.queries += 1
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = SqliteDatabase(str(tmp_path / "static_texts.db"))
+    db.bind(MODELS)
+    db.create_tables(MODELS)
+    english = Language.create(id=1, name="English", display_name="English", code="en")
+    hindi = Language.create(id=2, name="Hindi", display_name="हिन्दी", code="hi")
+    MultilingualText.create(id=1, language=english, text_code="could_not_understand_message_en", text="Sorry?")
+    MultilingualText.create(id=2, language=hindi, text_code="could_not_understand_message_hi", text="क्षमा करें?")
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def queries():
+    counter = QueryCounter()
+    peewee_logger = logging.getLogger("peewee")
+    level = peewee_logger.level
+    peewee_logger.addHandler(counter)
+    peewee_logger.setLevel(logging.DEBUG)
+    yield counter
+    peewee_logger.removeHandler(counter)
+    peewee_logger.setLevel(level)
+
+
+def test_lookups_are_served_without_queries_once_warmed_up(db, queries):
+    catalog = StaticTextCatalog(database=db, max_age=3600)
+    catalog.warm_up()
+    loaded = queries.queries
+
+    for _ in range(100):
+        assert catalog.get(["could_not_understand_message_en", "missing_en"], "en") == {
+            "could_not_understand_message_en": "Sorry?"
+        }
+        assert catalog.get(["could_not_understand_message_hi"], "hi") == {
+            "could_not_understand_message_hi": "क्षमा करें?"
+        }
+    assert queries.queries == loaded
+
+
+def test_languages_added_since_the_warm_up_are_loaded_once(db, queries):
+    catalog = StaticTextCatalog(database=db, max_age=3600)
+    catalog.warm_up()
+    tamil = Language.create(id=3, name="Tamil", display_name="தமிழ்", code="ta")
+    MultilingualText.create(id=3, language=tamil, text_code="could_not_understand_message_ta", text="மன்னிக்கவும்?")
+
+    loaded = queries.queries
+    assert catalog.get(["could_not_understand_message_ta"], "ta") == {
+        "could_not_understand_message_ta": "மன்னிக்கவும்?"
+    }
+    assert catalog.get(["could_not_understand_message_xx"], "xx") == {}
+    after_lazy_loads = queries.queries
+    assert after_lazy_loads > loaded
+
+    catalog.get(["could_not_understand_message_ta"], "ta")
+    catalog.get(["could_not_understand_message_xx"], "xx")
+    assert queries.queries == after_lazy_loads
+
+
+def test_changes_are_seen_once_invalidated(db):
+    catalog = StaticTextCatalog(database=db, max_age=3600)
+    catalog.warm_up()
+    MultilingualText.update(text="Pardon?").where(MultilingualText.id == 1).execute()
+    MultilingualText.update(is_deleted=True).where(MultilingualText.id == 2).execute()
+
+    assert catalog.get(["could_not_understand_message_en"], "en") == {"could_not_understand_message_en": "Sorry?"}
+    catalog.invalidate()
+    assert catalog.get(["could_not_understand_message_en"], "en") == {"could_not_understand_message_en": "Pardon?"}
+    assert catalog.get(["could_not_understand_message_hi"], "hi") == {}
+
+
+def test_catalog_is_reloaded_after_its_max_age(db):
+    catalog = StaticTextCatalog(database=db, max_age=0)
+    assert catalog.get(["could_not_understand_message_en"], "en") == {"could_not_understand_message_en": "Sorry?"}
+    MultilingualText.update(text="Pardon?").where(MultilingualText.id == 1).execute()
+    assert catalog.get(["could_not_understand_message_en"], "en") == {"could_not_understand_message_en": "Pardon?"}
+
+
+def test_every_process_starts_its_listener_on_its_first_lookup(monkeypatch):
+    started = []
+
+    class FakeListener:
+        def __init__(self, catalog):
+            self.catalog = catalog
+
+        def start(self):
+            started.append((os.getpid(), self.catalog))
+
+    monkeypatch.setattr(static_texts, "StaticTextListener", FakeListener)
+    monkeypatch.setattr(static_texts, "_catalog", StaticTextCatalog(database=None))
+    monkeypatch.setattr(static_texts, "_listener_pid", None)
+    monkeypatch.setattr(static_texts.Config, "STATIC_TEXT_CATALOG_LISTEN", True)
+    monkeypatch.setattr(static_texts.Config, "WITH_DB_CONFIG", True)
+    monkeypatch.setattr(StaticTextCatalog, "warm_up", lambda catalog: None)
+
+    static_texts.warm_up_static_text_catalog()
+    assert started == []
+
+    catalog = static_texts.get_static_text_catalog()
+    assert static_texts.get_static_text_catalog() is catalog
+    assert started == [(os.getpid(), catalog)]
+
+    # a worker forked once the catalog was loaded
+    monkeypatch.setattr(static_texts.os, "getpid", lambda: 1)
+    assert static_texts.get_static_text_catalog() is catalog
+    static_texts.get_static_text_catalog()
+    assert len(started) == 2 and started[1][1] is catalog
@@ -0,0 +1,199 @@
+"""Tests of the RAG telemetry write-behind buffer (database/write_behind.py), on a SQLite database"""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+from peewee import IntegrityError, OperationalError, SqliteDatabase
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database.models import Conversation, Language, Messages, RerankMetrics, RetrievedChunk, User
+from database.write_behind import WriteBehindBuffer
+
+MODELS = [Language, User, Conversation, Messages, RetrievedChunk, RerankMetrics]
+TELEMETRY_MODELS = [RetrievedChunk, RerankMetrics]
+
+# a process queueing rows, then killed before they are written (flush_interval is far away)
+CRASHING_PROCESS = textwrap.dedent(
+    """
+    import os, sys
+    sys.path.insert(0, {root!r})
+    from peewee import SqliteDatabase
+    from database.models import RetrievedChunk, RerankMetrics
+    from database.write_behind import WriteBehindBuffer
+
+    SqliteDatabase({db_path!r}).bind([RetrievedChunk, RerankMetrics])
+    buffer = WriteBehindBuffer({spill_dir!r}, [RetrievedChunk, RerankMetrics], flush_size=10 ** 6, flush_interval=3600)
+    for index in range({messages}):
+        buffer.enqueue(RetrievedChunk, [
+            {{"chunk_id": f"{{index}}-{{rank}}", "message_id": {message_id!r}, "chunk_text": "text", "rank": rank}}
+            for rank in range(10)
+        ])
+        buffer.enqueue(RerankMetrics, {{"message_id": {message_id!r}, "total_tokens": 10, "reranked_chunks": {{}}}})
+    {last_line}
+    os._exit(1)
+    """
+)
+
+
+@pytest.fixture
+def database(tmp_path):
+    db = SqliteDatabase(str(tmp_path / "telemetry.db"))
+    db.bind(MODELS)
+    db.create_tables(MODELS)
+    user = User.create(email="farmer@example.com")
+    conversation = Conversation.create(user=user)
+    message = Messages.create(conversation=conversation)
+    yield db, str(message.id)
+    db.close()
+
+
+def crash(tmp_path, db, message_id, messages, last_line=""):
+    script = CRASHING_PROCESS.format(
+        root=os.path.dirname(os.path.abspath(__file__)), db_path=db.database, spill_dir=str(tmp_path / "spill"),
+        messages=messages, message_id=message_id, last_line=last_line,
+    )
+    assert subprocess.run([sys.executable, "-c", script]).returncode == 1
+
+
+def test_rows_are_written_in_bulk_on_flush(tmp_path, database):
+    db, message_id = database
+    buffer = WriteBehindBuffer(str(tmp_path / "spill"), TELEMETRY_MODELS, flush_interval=3600)
+    queued = buffer.enqueue(RetrievedChunk, [{"chunk_id": str(rank), "message": message_id} for rank in range(5)])
+    buffer.enqueue(RerankMetrics, {"message_id": message_id, "completion_tokens": 3, "rerank_retries": None})
+
+    assert RetrievedChunk.select().count() == 0
+    assert buffer.queued == 6
+    assert buffer.flush()
+    assert RetrievedChunk.select().count() == 5
+    assert RerankMetrics.get().completion_tokens == "3"
+    assert {chunk.id for chunk in RetrievedChunk.select()} == {row["id"] for row in queued}
+    buffer.close()
+    assert os.listdir(tmp_path / "spill") == []
+
+
+def test_flush_size_and_interval_trigger_the_writer(tmp_path, database):
+    db, message_id = database
+    buffer = WriteBehindBuffer(str(tmp_path / "spill"), TELEMETRY_MODELS, flush_size=4, flush_interval=0.2)
+    buffer.enqueue(RetrievedChunk, [{"chunk_id": str(rank), "message": message_id} for rank in range(4)])
+    buffer.enqueue(RerankMetrics, {"message_id": message_id})
+    for _ in range(100):
+        if buffer.queued == 0:
+            break
+        buffer._thread.join(0.05)
+    assert buffer.queued == 0
+    assert (RetrievedChunk.select().count(), RerankMetrics.select().count()) == (4, 1)
+    buffer.close()
+
+
+def test_close_drains_the_queue(tmp_path, database):
+    db, message_id = database
+    buffer = WriteBehindBuffer(str(tmp_path / "spill"), TELEMETRY_MODELS, flush_interval=3600)
+    buffer.enqueue(RetrievedChunk, [{"chunk_id": str(rank), "message": message_id} for rank in range(50)])
+    buffer.close()
+    assert RetrievedChunk.select().count() == 50
+    assert os.listdir(tmp_path / "spill") == []
+
+
+def test_rows_of_a_killed_process_are_replayed(tmp_path, database):
+    db, message_id = database
+    crash(tmp_path, db, message_id, messages=20)
+    assert RetrievedChunk.select().count() == 0
+
+    buffer = WriteBehindBuffer(str(tmp_path / "spill"), TELEMETRY_MODELS, flush_interval=3600)
+    buffer.enqueue(RerankMetrics, {"message_id": message_id})
+    buffer.close()
+    assert RetrievedChunk.select().count() == 200
+    assert RerankMetrics.select().count() == 21
+    assert os.listdir(tmp_path / "spill") == []
+
+
+def test_rows_committed_before_a_crash_are_not_duplicated(tmp_path, database):
+    db, message_id = database
+    # killed after its rows were inserted, before the spill file was deleted
+    crash(tmp_path, db, message_id, messages=5, last_line="buffer._write(buffer._segment)")
+    assert RetrievedChunk.select().count() == 50
+
+    WriteBehindBuffer(str(tmp_path / "spill"), TELEMETRY_MODELS).flush()
+    assert RetrievedChunk.select().count() == 50
+    assert RerankMetrics.select().count() == 5
+
+
+def test_truncated_last_line_is_skipped(tmp_path, database):
+    db, message_id = database
+    crash(tmp_path, db, message_id, messages=3)
+    (spill_file,) = (tmp_path / "spill").iterdir()
+    with open(spill_file, "a") as f:
+        f.write('{"model": "RetrievedChunk", "rows": [{"chunk_id": "torn"')
+
+    buffer = WriteBehindBuffer(str(tmp_path / "spill"), TELEMETRY_MODELS)
+    buffer.flush()
+    assert RetrievedChunk.select().count() == 30
+
+
+def test_rows_stay_queued_while_the_database_is_unreachable(tmp_path, database, monkeypatch):
+    db, message_id = database
+    buffer = WriteBehindBuffer(str(tmp_path / "spill"), TELEMETRY_MODELS, flush_interval=3600)
+    buffer.enqueue(RetrievedChunk, [{"chunk_id": str(rank), "message": message_id} for rank in range(3)])
+
+    def unreachable(*args, **kwargs):
+        raise OperationalError("could not connect to server")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db, "execute_sql", unreachable)
+        assert not buffer.flush()
+    assert buffer.queued == 3
+    assert len(os.listdir(tmp_path / "spill")) == 1
+
+    assert buffer.flush()
+    assert RetrievedChunk.select().count() == 3
+    buffer.close()
+
+
+def test_rejected_rows_are_set_aside(tmp_path, database, monkeypatch):
+    db, message_id = database
+    buffer = WriteBehindBuffer(str(tmp_path / "spill"), TELEMETRY_MODELS, flush_interval=3600)
+    buffer.enqueue(RetrievedChunk, {"message": message_id})
+    buffer.enqueue(RerankMetrics, {"message": message_id})
+    execute_sql = db.execute_sql
+
+    def reject_chunks(sql, *args, **kwargs):
+        # SQLite's INSERT OR IGNORE skips NOT NULL violations, PostgreSQL's ON CONFLICT DO NOTHING does not
+        if RetrievedChunk._meta.table_name in sql:
+            raise IntegrityError('null value in column "chunk_id" violates not-null constraint')
+        return execute_sql(sql, *args, **kwargs)
+
+    monkeypatch.setattr(db, "execute_sql", reject_chunks)
+    assert buffer.flush()
+    assert RerankMetrics.select().count() == 1
+    (rejected,) = os.listdir(tmp_path / "spill")
+    assert rejected.startswith("rejected-")
+    buffer.close()
+
+
+def test_only_the_rejected_rows_of_a_chunk_are_set_aside_and_can_be_replayed(tmp_path, database, monkeypatch):
+    db, message_id = database
+    buffer = WriteBehindBuffer(str(tmp_path / "spill"), TELEMETRY_MODELS, flush_interval=3600)
+    buffer.enqueue(RetrievedChunk, [{"chunk_id": f"chunk-{rank}", "message": message_id} for rank in range(7)])
+    execute_sql = db.execute_sql
+
+    def reject_chunk_3(sql, params=None, *args, **kwargs):
+        if RetrievedChunk._meta.table_name in sql and "chunk-3" in (params or ()):
+            raise IntegrityError("value too long for type character varying")
+        return execute_sql(sql, params, *args, **kwargs)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db, "execute_sql", reject_chunk_3)
+        assert buffer.flush()
+    assert sorted(chunk.chunk_id for chunk in RetrievedChunk.select()) == [f"chunk-{rank}" for rank in (0, 1, 2, 4, 5, 6)]
+    (rejected,) = os.listdir(tmp_path / "spill")
+    with open(tmp_path / "spill" / rejected) as f:
+        assert [row["chunk_id"] for row in json.loads(f.read())["rows"]] == ["chunk-3"]
+
+    assert buffer.replay_rejected() == (1, 0)
+    assert RetrievedChunk.select().count() == 7
+    assert os.listdir(tmp_path / "spill") == []
+    buffer.close()
@@ -0,0 +1,212 @@
+"""Tests of the stage latency spans (common/tracing.py)"""
+import asyncio
+import contextlib
+import datetime
+import io
+import os
+import sys
+import threading
+import time
+
+import pytest
+from peewee import SqliteDatabase
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import tracing
+from common.tracing import SamplingProfiler, Tracer, percentile, print_report, set_trace_message, span, stage_latencies
+from database.models import PipelineSpan
+
+
+class FakeWriter:
+    """The part of WriteBehindBuffer used by Tracer"""
+
+    def __init__(self):
+        self.rows = []
+
+    def enqueue(self, model, rows):
+        assert model is PipelineSpan
+        self.rows.extend(rows)
+        return rows
+
+
+@pytest.fixture
+def use_tracer(monkeypatch):
+    def use(tracer):
+        monkeypatch.setattr(tracing, "_tracer", tracer or False)
+        return tracer
+
+    return use
+
+
+def test_spans_are_no_ops_by_default(use_tracer):
+    use_tracer(None)
+    assert span("rerank", chunks=3) is tracing.NOOP_SPAN
+    with span("rerank"):
+        set_trace_message("message-1")
+
+
+def test_spans_of_a_request_are_recorded_once_it_ends(use_tracer):
+    writer = FakeWriter()
+    use_tracer(Tracer(writer))
+
+    def retrieve():
+        with span("content_retrieval"):
+            time.sleep(0.01)
+
+    with span("process_query"):
+        set_trace_message("message-1")
+        with span("rephrase", attempt=1):
+            pass
+        asyncio.run(asyncio.to_thread(retrieve))
+        with pytest.raises(ValueError):
+            with span("generation"):
+                raise ValueError("no answer")
+        assert writer.rows == []
+
+    spans = {row["name"]: row for row in writer.rows}
+    assert set(spans) == {"process_query", "rephrase", "content_retrieval", "generation"}
+    root = spans["process_query"]
+    assert root["parent_id"] is None
+    assert {row["trace_id"] for row in writer.rows} == {root["id"]}
+    assert {row["message_id"] for row in writer.rows} == {"message-1"}
+    assert spans["content_retrieval"]["parent_id"] == root["id"]
+    assert spans["content_retrieval"]["duration_ms"] >= 10
+    assert root["duration_ms"] >= spans["content_retrieval"]["duration_ms"]
+    assert spans["generation"]["error"] and not root["error"]
+    assert spans["rephrase"]["attributes"] == '{"attempt": 1}'
+
+
+def test_unsampled_requests_are_not_recorded(use_tracer):
+    writer = FakeWriter()
+    use_tracer(Tracer(writer, sample_rate=0.0))
+    for _ in range(10):
+        with span("process_query"):
+            with span("rephrase"):
+                pass
+    assert writer.rows == []
+
+
+def test_spans_are_opentelemetry_spans(use_tracer):
+    started = []
+
+    class FakeOtelSpan:
+        def __init__(self, name, attributes):
+            self.name, self.attributes = name, dict(attributes)
+
+        def set_attribute(self, key, value):
+            self.attributes[key] = value
+
+    class FakeOtelTracer:
+        @contextlib.contextmanager
+        def start_as_current_span(self, name, attributes=None):
+            otel_span = FakeOtelSpan(name, attributes or {})
+            started.append(otel_span)
+            yield otel_span
+
+    use_tracer(Tracer(otel_tracer=FakeOtelTracer()))
+    with span("process_query"):
+        with span("rerank", chunks=5) as rerank:
+            rerank.set_attribute("reranked", 3)
+    assert [(s.name, s.attributes) for s in started] == [
+        ("process_query", {}),
+        ("rerank", {"chunks": 5, "reranked": 3}),
+    ]
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_profiler_samples_the_stacks_of_the_running_stages(use_tracer, tmp_path):
+    path = str(tmp_path / "profiles" / "stacks.collapsed")
+    profiler = SamplingProfiler(path, interval=0.002).start()
+    use_tracer(Tracer(profiler=profiler))
+
+    with span("process_query"):
+        with span("generation"):
+            busy(0.1)
+    busy(0.05)
+    profiler.stop()
+
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines
+    stacks = dict(line.rsplit(" ", 1) for line in lines)
+    assert all(stack.split(";")[0] in ("process_query", "generation") for stack in stacks)
+    assert any(stack.startswith("generation;") and stack.endswith(f"{__name__}:busy") for stack in stacks)
+    assert not profiler._spans
+
+
+def test_profiler_keeps_the_stages_of_interleaved_coroutines_apart(use_tracer, tmp_path):
+    path = str(tmp_path / "stacks.collapsed")
+    profiler = SamplingProfiler(path, interval=0.002).start()
+    use_tracer(Tracer(profiler=profiler))
+
+    async def retrieval(turn):
+        with span("retrieval"):
+            await turn.wait()
+            busy(0.1)
+
+    async def generation(turn):
+        with span("generation"):
+            # entered after retrieval and left before it, while retrieval runs
+            turn.set()
+            await asyncio.sleep(0)
+            busy(0.1)
+
+    async def interleave():
+        turn = asyncio.Event()
+        await asyncio.gather(retrieval(turn), generation(turn))
+
+    asyncio.run(interleave())
+    profiler.stop()
+
+    with open(path, encoding="utf-8") as f:
+        stacks = [line.rsplit(" ", 1)[0] for line in f.read().splitlines()]
+    assert any(f"{__name__}:retrieval;" in stack for stack in stacks)
+    assert any(f"{__name__}:generation;" in stack for stack in stacks)
+    for stack in stacks:
+        assert stack.split(";")[0] == ("retrieval" if f"{__name__}:retrieval;" in stack else "generation")
+    assert not profiler._spans
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = SqliteDatabase(str(tmp_path / "spans.db"))
+    db.bind([PipelineSpan])
+    db.create_tables([PipelineSpan])
+    yield db
+    db.close()
+
+
+def test_stage_percentiles_over_a_time_window(db):
+    now = datetime.datetime.now()
+    rows = [
+        {"trace_id": "t", "name": "rerank", "start_time": now, "duration_ms": float(ms), "error": ms == 100}
+        for ms in range(1, 101)
+    ]
+    rows.append({"trace_id": "t", "name": "rerank", "start_time": now - datetime.timedelta(hours=2), "duration_ms": 1e6})
+    rows.append({"trace_id": "t", "name": "generation", "start_time": now, "duration_ms": 800.0})
+    PipelineSpan.insert_many([dict(row, id=str(index)) for index, row in enumerate(rows)]).execute()
+
+    latencies = stage_latencies(now - datetime.timedelta(hours=1))
+    assert latencies == {
+        "rerank": (100, 1, {50: 50.0, 95: 95.0, 99: 99.0}),
+        "generation": (1, 0, {50: 800.0, 95: 800.0, 99: 800.0}),
+    }
+    assert stage_latencies(now - datetime.timedelta(hours=3), now - datetime.timedelta(hours=1))["rerank"][0] == 1
+
+    out = io.StringIO()
+    print_report(latencies, out)
+    lines = out.getvalue().splitlines()
+    assert lines[1].split() == ["generation", "1", "0", "800.0", "800.0", "800.0"]
+    assert lines[2].split() == ["rerank", "100", "1", "50.0", "95.0", "99.0"]
+
+
+def test_percentile():
+    assert percentile([5.0], 99) == 5.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 95) == 4.0
@@ -0,0 +1,260 @@
+"""Tests of the streaming voice queries (api/voice_stream.py, language_service/streaming.py) on a fake recognizer"""
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api.voice_stream import VoiceQuerySession, voice_query_stream_application
+from language_service.fake_recognizer import FakeRecognizer
+from language_service.streaming import TranscriptAssembler
+
+QUERY = "how do I treat a sore throat with honey"
+WORD_BYTES = 1000
+
+
+class FakePipeline:
+    """The steps of VoiceQueryPipeline without database, Google nor OpenAI"""
+
+    def __init__(self, authenticated=True, confidence=0.95):
+        self.authenticated = authenticated
+        self.confidence = confidence
+        self.prefetches = []
+        self.answers = []
+
+    def authenticate(self, email_id):
+        return {"first_name": "Asha"} if self.authenticated else None
+
+    def detect_language(self, transcriptions):
+        return "en", self.confidence
+
+    def record_transcription(self, email_id, authenticated_user, language_bcp_code, transcription):
+        confident = transcription["confidence_score"] > 0.7
+        return {
+            "message_id": "message-1",
+            "confidence_score": transcription["confidence_score"],
+            "transcriptions": transcription["transcriptions"] if confident else "Could not understand",
+        }
+
+    def prefetch(self, transcript, email_id, cancelled=None):
+        self.prefetches.append(transcript)
+        return {"original_query": transcript}
+
+    def answer(self, transcript, email_id, authenticated_user, prefetched):
+        self.answers.append((transcript, prefetched))
+        return {"translated_response": f"answer to {transcript}", "follow_up_questions": []}
+
+    def heard_input_audio(self, transcript, message_id):
+        return "base64-audio"
+
+
+async def speech(words=len(QUERY.split()), pause=0.0):
+    """Audio frames of `words` words, a frame every `pause` seconds"""
+    for _ in range(words * 2):
+        await asyncio.sleep(pause)
+        yield b"\0" * (WORD_BYTES // 2)
+
+
+def recognizer(**kwargs):
+    return FakeRecognizer(QUERY, bytes_per_word=WORD_BYTES, final_latency=0.05, **kwargs)
+
+
+def session(pipeline, **kwargs):
+    return VoiceQuerySession("asha@example.com", recognizer=recognizer(**kwargs), pipeline=pipeline)
+
+
+def response(results):
+    return SimpleNamespace(
+        results=[
+            SimpleNamespace(
+                alternatives=[SimpleNamespace(transcript=transcript, confidence=0.9)],
+                is_final=is_final,
+                stability=stability,
+            )
+            for transcript, is_final, stability in results
+        ]
+    )
+
+
+def test_transcript_assembly():
+    assembler = TranscriptAssembler(stability_threshold=0.8)
+    update = assembler.add(response([("how do", False, 0.9), (" I treat", False, 0.1)]))
+    assert (update.transcript, update.stable_transcript) == ("how do I treat", "how do")
+    assert assembler.add(response([("how do", False, 0.9), (" I treat", False, 0.1)])) is None
+
+    update = assembler.add(response([("how do I treat fever", True, 0.0)]))
+    assert update.stable_transcript == update.transcript == "how do I treat fever"
+    update = assembler.add(response([(" with ginger", False, 0.2)]))
+    assert (update.transcript, update.stable_transcript) == ("how do I treat fever with ginger", "how do I treat fever")
+    assert assembler.final() == ("how do I treat fever", "how do I treat fever", True, 0.9)
+
+
+def test_partial_transcripts_arrive_while_the_audio_streams():
+    async def run():
+        updates = []
+        async for update in recognizer().stream(speech(pause=0.005), "en-US"):
+            updates.append(update)
+        return updates
+
+    updates = asyncio.run(run())
+    assert updates[-1] == (QUERY, QUERY, True, 0.95)
+    partial = [update.transcript for update in updates[:-1]]
+    assert partial[0] == "how" and QUERY in partial
+    assert all(len(a) <= len(b) for a, b in zip(partial, partial[1:]))
+
+
+def test_retrieval_starts_on_the_stable_transcript_and_is_reused():
+    pipeline = FakePipeline()
+    query = session(pipeline)
+    status_code, data = asyncio.run(query.run(speech()))
+
+    assert status_code == 200
+    assert data["heard_input_query"] == QUERY
+    assert data["response"] == f"answer to {QUERY}"
+    assert data["heard_input_audio"] == "base64-audio"
+    assert pipeline.prefetches == [QUERY]
+    assert pipeline.answers == [(QUERY, {"original_query": QUERY})]
+    assert query.used_speculation
+
+
+def test_retrieval_is_not_reused_when_the_final_transcript_differs():
+    final = "how do I treat a sore throat with money"
+    pipeline = FakePipeline()
+    query = session(pipeline, final_transcript=final)
+    status_code, data = asyncio.run(query.run(speech()))
+
+    assert status_code == 200
+    assert pipeline.prefetches == [QUERY, final]
+    assert pipeline.answers == [(final, {"original_query": final})]
+
+
+def test_prefetch_of_a_different_transcript_is_cancelled():
+    class SlowPipeline(FakePipeline):
+        def __init__(self):
+            super().__init__()
+            self.cancelled = {}
+
+        def prefetch(self, transcript, email_id, cancelled=None):
+            # a retrieval still running when the final transcript arrives
+            if transcript == QUERY:
+                self.cancelled[transcript] = cancelled.wait(5)
+                return None
+            return super().prefetch(transcript, email_id, cancelled)
+
+    final = "how do I treat a sore throat with money"
+    pipeline = SlowPipeline()
+    query = session(pipeline, final_transcript=final)
+    status_code, data = asyncio.run(query.run(speech()))
+
+    assert status_code == 200
+    assert pipeline.cancelled == {QUERY: True}
+    assert query.speculations[QUERY.lower()].future.cancelled()
+    assert pipeline.answers == [(final, {"original_query": final})]
+
+
+def test_no_retrieval_is_reused_beyond_the_speculation_limit():
+    pipeline = FakePipeline()
+    query = VoiceQuerySession(
+        "asha@example.com",
+        recognizer=recognizer(final_transcript="how do I treat a sore throat with money"),
+        pipeline=pipeline,
+        max_speculations=1,
+    )
+    asyncio.run(query.run(speech()))
+
+    assert pipeline.prefetches == [QUERY]
+    assert pipeline.answers == [("how do I treat a sore throat with money", None)]
+    assert not query.used_speculation
+
+
+def test_unauthenticated_empty_and_unclear_queries():
+    status_code, data = asyncio.run(session(FakePipeline(authenticated=False)).run(speech()))
+    assert (status_code, data["message"]) == (401, "Invalid Email ID")
+
+    status_code, data = asyncio.run(session(FakePipeline()).run(speech(words=0)))
+    assert status_code == 400
+
+    pipeline = FakePipeline(confidence=0.3)
+    status_code, data = asyncio.run(session(pipeline).run(speech()))
+    assert status_code == 200
+    assert data["heard_input_query"] == "Could not understand"
+    assert pipeline.answers == []
+
+
+class FakeConnection:
+    """ASGI receive and send of a client"""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+
+    async def receive(self):
+        await asyncio.sleep(0)
+        return self.messages.pop(0)
+
+    async def send(self, message):
+        self.sent.append(message)
+
+
+def application(pipeline):
+    return voice_query_stream_application(
+        lambda **options: VoiceQuerySession(recognizer=recognizer(), pipeline=pipeline, **options)
+    )
+
+
+def test_websocket_voice_query():
+    frames = [{"type": "websocket.receive", "bytes": b"\0" * WORD_BYTES} for _ in QUERY.split()]
+    client = FakeConnection(
+        [{"type": "websocket.connect"},
+         {"type": "websocket.receive", "text": json.dumps({"email_id": "asha@example.com", "encoding": "webm"})}]
+        + frames
+        + [{"type": "websocket.receive", "text": json.dumps({"event": "end"})}]
+    )
+    asyncio.run(application(FakePipeline())({"type": "websocket"}, client.receive, client.send))
+
+    assert client.sent[0] == {"type": "websocket.accept"}
+    events = [json.loads(message["text"]) for message in client.sent if message["type"] == "websocket.send"]
+    assert events[0] == {"event": "partial", "transcript": "how", "stable_transcript": ""}
+    assert events[-1]["event"] == "answer" and events[-1]["status"] == 200
+    assert events[-1]["response"] == f"answer to {QUERY}"
+    assert client.sent[-1] == {"type": "websocket.close", "code": 1000}
+
+
+def test_chunked_http_voice_query():
+    chunks = [{"type": "http.request", "body": b"\0" * WORD_BYTES, "more_body": True} for _ in QUERY.split()]
+    client = FakeConnection(chunks + [{"type": "http.request", "body": b"", "more_body": False}])
+    scope = {"type": "http", "method": "POST", "query_string": b"email_id=asha%40example.com&encoding=mp3"}
+    asyncio.run(application(FakePipeline())(scope, client.receive, client.send))
+
+    assert client.sent[0]["status"] == 200
+    assert json.loads(client.sent[1]["body"])["heard_input_query"] == QUERY
+
+
+@pytest.mark.parametrize("disconnect", [{"type": "http.disconnect"}])
+def test_nothing_is_answered_to_a_client_which_went_away(disconnect):
+    pipeline = FakePipeline()
+    client = FakeConnection([{"type": "http.request", "body": b"\0" * WORD_BYTES, "more_body": True}, disconnect])
+    scope = {"type": "http", "method": "POST", "query_string": b"email_id=asha%40example.com"}
+    asyncio.run(application(pipeline)(scope, client.receive, client.send))
+
+    assert client.sent == []
+    assert pipeline.answers == []
+
+
+def test_translate_client_is_built_once_and_reused():
+    from unittest import mock
+
+    service_account = pytest.importorskip("google.oauth2.service_account")
+
+    with mock.patch.object(service_account.Credentials, "from_service_account_file"):
+        from language_service import translation
+    with mock.patch.object(translation, "_translate_client", None), mock.patch.object(
+        translation.translate, "Client"
+    ) as client:
+        first = translation.get_translate_client()
+        assert translation.get_translate_client() is first
+    client.assert_called_once_with(credentials=translation.credentials)
@@ -7,6 +7,7 @@ from django.contrib.auth.models import (
     PermissionsMixin,
 )
 from django.db import models
+from django.utils import timezone
 
 # from utils.validators import validate_file_size
 from core.base_models import TimeStampMixin
@@ -125,4 +126,32 @@ class User(AbstractBaseUser, PermissionsMixin, TimeStampMixin):
         return self.first_name
 
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.email
+
+class OutboxEmail(TimeStampMixin):
+    """
+    Transactional email written in the transaction of the request that sends it
+    and delivered by ``utils.email_outbox`` from a Celery worker.
+
+    A `pending` email is sent once `next_attempt_at` is due. A failed attempt
+    schedules the next one with an exponential backoff; after the last attempt,
+    or on a permanent SMTP error, the email is kept as `dead` with its last error.
+    """
+
+    PENDING = "pending"
+    SENT = "sent"
+    DEAD = "dead"
+    STATUSES = ((PENDING, PENDING), (SENT, SENT), (DEAD, DEAD))
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    to_emails = models.JSONField(default=list)
+    subject = models.CharField(max_length=998, blank=True, default="")
+    content = models.TextField(blank=True, default="")
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"], name="outbox_email_due_idx")]
@@ -0,0 +1,168 @@
+import asyncio
+import socket
+from datetime import timedelta
+from unittest import mock
+
+from aiosmtpd.controller import Controller
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import OutboxEmail
+from core.utils import Utils
+from utils import email_outbox
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class SmtpServer:
+    """
+    aiosmtpd server on a free local port keeping the messages it accepts.
+    `replies` are returned, in order, to the next DATA commands instead of
+    accepting them and every DATA waits `delay` seconds.
+    """
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.messages = []
+        self.replies = []
+        self.connections = 0
+        self.port = free_port()
+        self.controller = Controller(self, hostname="127.0.0.1", port=self.port)
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.delay)
+        if self.replies:
+            return self.replies.pop(0)
+        self.messages.append(envelope)
+        return "250 OK"
+
+    def start(self, testcase):
+        """Start the server for `testcase` and point the SMTP settings at it until the test ends."""
+        self.controller.start()
+        testcase.addCleanup(self.controller.stop)
+        settings_override = override_settings(
+            SMTP_SERVER="127.0.0.1", SMTP_PORT=self.port, SMTP_USE_TLS=False, SMTP_USER="noreply@dg.org", SMTP_PASSWORD=""
+        )
+        settings_override.enable()
+        testcase.addCleanup(settings_override.disable)
+        testcase.addCleanup(email_outbox.CONNECTION.close)
+        return self
+
+
+class TestEmailOutbox(TestCase):
+    def setUp(self):
+        self.smtp = SmtpServer().start(self)
+
+    def test_send_email_is_written_in_the_request_transaction(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Utils().send_email(to_email="farmer@dg.org", content="<p>1234</p>", subject="Your OTP")
+        email = OutboxEmail.objects.get()
+        assert (email.to_emails, email.status, len(callbacks)) == (["farmer@dg.org"], OutboxEmail.PENDING, 1)
+        assert self.smtp.messages == []
+
+        with transaction.atomic():
+            Utils().send_email(to_email=["a@dg.org", "b@dg.org"], content="", subject="Invitation")
+            transaction.set_rollback(True)
+        assert OutboxEmail.objects.count() == 1
+        Utils().send_email(to_email=[], content="", subject="Invitation")
+        assert OutboxEmail.objects.count() == 1
+
+    def test_batches_are_sent_over_one_connection(self):
+        for number in range(5):
+            email_outbox.enqueue([f"farmer{number}@dg.org"], f"<p>{number}</p>", "Your OTP")
+        assert email_outbox.drain(batch_size=2) == 5
+        assert self.smtp.connections == 1
+        assert sorted(message.rcpt_tos[0] for message in self.smtp.messages)[0] == "farmer0@dg.org"
+        assert "Subject: Your OTP" in self.smtp.messages[0].content.decode()
+        assert set(OutboxEmail.objects.values_list("status", flat=True)) == {OutboxEmail.SENT}
+
+        # the connection is kept for the next drain and reopened once dropped
+        email_outbox.enqueue("farmer5@dg.org", "<p>5</p>", "Your OTP")
+        assert email_outbox.drain() == 1 and self.smtp.connections == 1
+        email_outbox.CONNECTION.server.close()
+        email_outbox.enqueue("farmer6@dg.org", "<p>6</p>", "Your OTP")
+        assert email_outbox.drain() == 1 and self.smtp.connections == 2
+
+    def test_failures_are_retried_with_backoff_then_dead_lettered(self):
+        email = email_outbox.enqueue("farmer@dg.org", "<p>1234</p>", "Your OTP")
+        self.smtp.replies = ["451 Try again later"]
+        assert email_outbox.drain() == 0
+        email.refresh_from_db()
+        assert (email.status, email.attempts) == (OutboxEmail.PENDING, 1)
+        assert "451" in email.last_error
+        assert email.next_attempt_at > timezone.now() + timedelta(seconds=email_outbox.RETRY_BASE_DELAY - 5)
+        # not due yet
+        assert email_outbox.drain() == 0 and len(self.smtp.replies) == 0
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        self.smtp.replies = ["452 Mailbox full"]
+        with mock.patch.object(email_outbox, "MAX_ATTEMPTS", 2):
+            email_outbox.drain()
+        email.refresh_from_db()
+        assert (email.status, email.attempts) == (OutboxEmail.DEAD, 2)
+
+        assert email_outbox.requeue([email.id]) == 1
+        assert email_outbox.drain() == 1
+        assert len(self.smtp.messages) == 1
+
+    def test_permanent_failures_are_dead_lettered_at_once(self):
+        email = email_outbox.enqueue("farmer@dg.org", "<p>1234</p>", "Your OTP")
+        self.smtp.replies = ["550 No such user"]
+        email_outbox.drain()
+        email.refresh_from_db()
+        assert (email.status, email.attempts) == (OutboxEmail.DEAD, 1)
+
+    def test_unexpected_errors_fail_the_email_only(self):
+        broken, email = (email_outbox.enqueue("farmer@dg.org", f"<p>{n}</p>", "Your OTP") for n in range(2))
+        OutboxEmail.objects.filter(id=broken.id).update(next_attempt_at=timezone.now() - timedelta(minutes=1))
+        message_of = email_outbox.message_of
+
+        def fail_first(outbox_email):
+            if outbox_email.id == broken.id:
+                raise ValueError("bad header")
+            return message_of(outbox_email)
+
+        with mock.patch.object(email_outbox, "message_of", side_effect=fail_first):
+            assert email_outbox.drain() == 1
+        broken.refresh_from_db()
+        assert (broken.status, broken.attempts, broken.last_error) == (OutboxEmail.PENDING, 1, "ValueError: bad header")
+        assert len(self.smtp.messages) == 1
+
+    def test_purge_deletes_the_sent_and_dead_emails_past_their_retention(self):
+        now = timezone.now()
+        emails = {
+            name: email_outbox.enqueue("farmer@dg.org", "<p>1234</p>", "Your OTP")
+            for name in ("old sent", "sent", "old dead", "dead", "pending")
+        }
+        for name, status, days in (
+            ("old sent", OutboxEmail.SENT, email_outbox.SENT_RETENTION_DAYS + 1),
+            ("sent", OutboxEmail.SENT, email_outbox.SENT_RETENTION_DAYS - 1),
+            ("old dead", OutboxEmail.DEAD, email_outbox.DEAD_RETENTION_DAYS + 1),
+            ("dead", OutboxEmail.DEAD, email_outbox.DEAD_RETENTION_DAYS - 1),
+            ("pending", OutboxEmail.PENDING, email_outbox.SENT_RETENTION_DAYS + 1),
+        ):
+            when = now - timedelta(days=days)
+            OutboxEmail.objects.filter(id=emails[name].id).update(
+                status=status, sent_at=when if status == OutboxEmail.SENT else None, updated_at=when
+            )
+        assert email_outbox.purge() == 2
+        assert set(OutboxEmail.objects.values_list("id", flat=True)) == {
+            emails[name].id for name in ("sent", "dead", "pending")
+        }
+
+    def test_unreachable_server_leaves_the_emails_pending(self):
+        email = email_outbox.enqueue("farmer@dg.org", "<p>1234</p>", "Your OTP")
+        with override_settings(SMTP_PORT=free_port()):
+            assert email_outbox.drain() == 0
+        email.refresh_from_db()
+        assert (email.status, email.attempts) == (OutboxEmail.PENDING, 0)
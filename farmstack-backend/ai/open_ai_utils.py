@@ -308,6 +308,7 @@ def load_vector_db(resource_id):
         collection_name=str("e7d810ae-3fee-4412-b9a8-04f0935e7acf"),
         connection_string=connectionString,
         embedding_function=embeddings,
+        engine_args=settings.PGVECTOR_ENGINE_ARGS,
     )
     print(LangchainPgEmbedding.objects.filter(collection_id='e7d810ae-3fee-4412-b9a8-04f0935e7acf').values('document'))
     retriever = vector_db.as_retriever(search_type="similarity", search_kwargs={"k": 5, "score_threshold": 0.5})
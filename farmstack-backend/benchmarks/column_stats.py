@@ -0,0 +1,98 @@
+"""
+Benchmark of the column statistics used by the dataset dashboards: the
+previous one-thread-per-column implementation against ``utils.column_stats``.
+
+    python benchmarks/column_stats.py --rows 2000000 --columns 6
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.column_stats import ColumnStatsEngine  # noqa: E402
+
+
+def threaded_value_counts(df, column_names, group_by_column):
+    """Reference: the former process_columns_concurrently, one thread per column."""
+    def process(df, column_name, result_dict):
+        df[column_name].replace(["nan", "N/A", "NA", "NAN", np.nan], "NaN", inplace=True)
+        result_dict[column_name] = (
+            df[df[column_name] != "NaN"]
+            .groupby([group_by_column, column_name])[column_name]
+            .count()
+            .unstack(fill_value=0)
+            .astype(int)
+            .apply(lambda x: {k: v for k, v in x.items() if v > 0}, axis=1)
+            .to_dict()
+        )
+
+    result_dict = {}
+    threads = [threading.Thread(target=process, args=(df, column, result_dict)) for column in column_names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return result_dict
+
+
+def threaded_unique(df, column_names, size=False):
+    """Reference: the former find_size_concurrently / find_unique_values_concurrently."""
+    def process(column_name, result_dict):
+        unique = np.unique(df[column_name])
+        result_dict[column_name] = unique.size if size else unique
+
+    result_dict = {}
+    threads = [threading.Thread(target=process, args=(column, result_dict)) for column in column_names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return result_dict
+
+
+def synthetic_frame(rows, columns):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"Subcounty": rng.choice([f"SUB {i}" for i in range(60)], rows)})
+    for i in range(columns):
+        df[f"vc_{i}"] = rng.choice([f"CHAIN {j}" for j in range(25)] + ["nan", "N/A"], rows)
+    df["Telephone"] = rng.integers(0, rows // 2, rows).astype(str)
+    return df
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    func(*args)
+    print(f"{label:<45} {(time.perf_counter() - start) * 1000:>10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--columns", type=int, default=6)
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.rows, args.columns)
+    value_columns = [f"vc_{i}" for i in range(args.columns)]
+    unique_columns = ["Subcounty", "Telephone"] + value_columns
+    inline = ColumnStatsEngine(max_workers=1)
+    pooled = ColumnStatsEngine(process_threshold=0)
+
+    print(f"rows={args.rows} value columns={args.columns}")
+    timed("threaded grouped value counts", threaded_value_counts, df.copy(), value_columns, "Subcounty")
+    timed("engine grouped value counts", inline.value_counts_by, df, value_columns, "Subcounty")
+    timed("engine grouped value counts (process pool)", pooled.value_counts_by, df, value_columns, "Subcounty")
+    timed("threaded unique counts", threaded_unique, df, unique_columns, True)
+    timed("engine unique counts", inline.unique_counts, df, unique_columns)
+    timed("threaded unique values", threaded_unique, df, unique_columns)
+    timed("engine unique values", inline.unique_values, df, unique_columns)
+    pooled.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Wall time and peak RSS of integrating the dataset files of a connector: three synthetic CSV files of ``--rows``
+rows each (farmers, their plots, the crops of the plots) joined by two maps, with the former pandas path of
+``ConnectorsViewSet.integration`` (read every file, chained ``pd.merge``, whole result written to CSV for a 20 row
+preview) against ``connectors.integration`` (one DuckDB query over Parquet caches, preview by LIMIT, count(*), and
+the CSV exported once with the selection of the connector config).
+
+Every run is a child process whose RSS is polled and which is killed above ``--rss-ceiling``; DuckDB is given a
+memory limit below the ceiling and spills to ``--directory`` beyond it.
+
+    python benchmarks/connector_integration.py --rows 5000000 --rss-ceiling 1024 --directory /tmp/integration
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FILES = ("farmers.csv", "plots.csv", "crops.csv")
+MAPS = [
+    {
+        "left_dataset_file_path": "farmers.csv",
+        "right_dataset_file_path": "plots.csv",
+        "condition": {"how": "left", "left_on": ["farmer_id"], "right_on": ["farmer_id"]},
+    },
+    {
+        "left_dataset_file_path": None,
+        "right_dataset_file_path": "crops.csv",
+        "condition": {"how": "left", "left_on": ["crop_id"], "right_on": ["crop_id"]},
+    },
+]
+SELECTED = ["name", "county", "plot_id", "area", "crop", "price"]
+
+
+def generate(directory, rows):
+    import duckdb
+
+    connection = duckdb.connect()
+    queries = {
+        "farmers.csv": f"SELECT range AS farmer_id, 'farmer ' || range AS name, "
+        f"['Meru', 'Nakuru', 'Kisumu', 'Nyeri'][range % 4 + 1] AS county, range % 90 + 18 AS age FROM range({rows})",
+        "plots.csv": f"SELECT range AS plot_id, hash(range) % {rows} AS farmer_id, hash(range + 1) % {rows} AS crop_id, "
+        f"round((hash(range + 2) % 10000) / 100.0, 2) AS area FROM range({rows})",
+        "crops.csv": f"SELECT range AS crop_id, 'crop ' || range % 500 AS crop, "
+        f"round((hash(range) % 100000) / 100.0, 2) AS price FROM range({rows})",
+    }
+    for name, query in queries.items():
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            connection.execute(f"COPY ({query}) TO '{path}' (FORMAT csv, HEADER)")
+
+
+def run_pandas(directory):
+    import pandas as pd
+
+    started = time.perf_counter()
+    result = pd.read_csv(os.path.join(directory, MAPS[0]["left_dataset_file_path"]))
+    for number, integrate in enumerate(MAPS, start=1):
+        condition = integrate["condition"]
+        right = pd.read_csv(os.path.join(directory, integrate["right_dataset_file_path"]))
+        result = pd.merge(
+            result, right, how=condition["how"], left_on=condition["left_on"], right_on=condition["right_on"],
+            suffixes=("", f"_df{number}"),
+        )
+    path = os.path.join(directory, "integrated-pandas.csv")
+    result.to_csv(path, index=False)
+    preview, count = result.head(20), len(result)
+    print(f"preview and count {time.perf_counter() - started:.1f} s ({count} rows)", flush=True)
+    started = time.perf_counter()
+    pd.read_csv(path)[SELECTED].to_csv(os.path.join(directory, "integrated-pandas-edited.csv"), index=False)
+    print(f"export {time.perf_counter() - started:.1f} s", flush=True)
+
+
+def run_duckdb(directory, memory_limit):
+    from django.conf import settings
+
+    settings.configure(
+        DATASET_FILES_URL=directory,
+        CONNECTOR_CACHE_PATH=os.path.join(directory, "cache"),
+        CONNECTOR_INTEGRATION_MEMORY_LIMIT=memory_limit,
+        CONNECTOR_INTEGRATION_THREADS=os.cpu_count(),
+    )
+    from connectors.integration import DatasetIntegration  # noqa: E402
+
+    started = time.perf_counter()
+    integration = DatasetIntegration(MAPS, {"selected": SELECTED})
+    preview, count = integration.preview(20), integration.count()
+    print(f"preview and count {time.perf_counter() - started:.1f} s ({count} rows)", flush=True)
+    started = time.perf_counter()
+    integration.export(os.path.join(directory, "integrated-duckdb.csv"))
+    print(f"export {time.perf_counter() - started:.1f} s", flush=True)
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0
+
+
+def measure(label, arguments, ceiling):
+    started = time.perf_counter()
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), *arguments])
+    peak, killed = 0, False
+    while child.poll() is None:
+        try:
+            peak = max(peak, rss_mb(child.pid))
+        except FileNotFoundError:
+            break
+        if peak > ceiling:
+            child.kill()
+            killed = True
+        time.sleep(0.02)
+    child.wait()
+    outcome = f"killed above {ceiling} MB" if killed else f"exit {child.returncode}"
+    print(f"  {label:<16} {time.perf_counter() - started:7.1f} s  peak RSS {peak:7.0f} MB  {outcome}\n", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5_000_000, help="rows of every file")
+    parser.add_argument("--rss-ceiling", type=int, default=1024, help="MB, the runs are killed above it")
+    parser.add_argument("--directory", default="/tmp/connector-integration-benchmark")
+    parser.add_argument("--run", choices=("pandas", "duckdb"), help=argparse.SUPPRESS)
+    parser.add_argument("--memory-limit", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run == "pandas":
+        return run_pandas(args.directory)
+    if args.run == "duckdb":
+        return run_duckdb(args.directory, args.memory_limit)
+
+    os.makedirs(args.directory, exist_ok=True)
+    started = time.perf_counter()
+    generate(args.directory, args.rows)
+    sizes = sum(os.path.getsize(os.path.join(args.directory, name)) for name in FILES) / 2**20
+    print(f"3 files of {args.rows} rows, {sizes:.0f} MB of CSV ({time.perf_counter() - started:.1f} s)\n")
+    # the rest of the ceiling is left to the interpreter, pandas and the result buffers
+    memory_limit = f"{int(args.rss_ceiling * 0.5)}MB"
+    measure("pandas", ["--run", "pandas", "--directory", args.directory], args.rss_ceiling)
+    for label in ("duckdb (cold)", "duckdb (cached)"):
+        arguments = ["--run", "duckdb", "--directory", args.directory, "--memory-limit", memory_limit]
+        measure(label, arguments, args.rss_ceiling)
+
+
+if __name__ == "__main__":
+    main()
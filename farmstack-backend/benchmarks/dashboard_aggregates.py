@@ -0,0 +1,59 @@
+"""
+Benchmark of the KIAMIS dashboard: recomputing from the raw frame on every
+request against answering from the pre-aggregated cube.
+
+    python benchmarks/dashboard_aggregates.py --rows 1000000 --queries 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import dashboard_aggregates  # noqa: E402
+from utils.synthetic_datasets import kiamis_frame  # noqa: E402
+
+
+def random_filters(rng):
+    return {
+        "county": rng.sample(["NAKURU", "KIAMBU", "MERU"], rng.randint(0, 2)),
+        "sub_county": rng.sample(["S1", "S2", "S3", "S4"], rng.randint(0, 2)),
+        "gender": rng.sample(["MALE", "FEMALE"], rng.randint(0, 1)),
+        "value_chain": rng.sample(dashboard_aggregates.KIAMIS_VALUE_CHAINS, rng.randint(0, 3)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    df = kiamis_frame(args.rows)
+    rng = random.Random(0)
+    queries = [random_filters(rng) for _ in range(args.queries)]
+
+    start = time.perf_counter()
+    for data in queries[:5]:
+        dashboard_aggregates.render_kiamis_dashboard(dashboard_aggregates.build_kiamis_cube(df), data)
+    recompute = (time.perf_counter() - start) / 5
+
+    start = time.perf_counter()
+    cube = dashboard_aggregates.build_kiamis_cube(df)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for data in queries:
+        dashboard_aggregates.render_kiamis_dashboard(cube, data)
+    query = (time.perf_counter() - start) / len(queries)
+
+    print(f"rows={args.rows} cube_cells={len(cube.cells)}")
+    print(f"full recompute per request: {recompute * 1000:.1f} ms")
+    print(f"cube build (once per file version): {build * 1000:.1f} ms")
+    print(f"cube query per request: {query * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Latency and statements of the metrics of ``DatahubNewDashboard.dashboard`` for the datahub admin: the former
+queries (a COUNT per category key, four distinct counts for the connector metrics, a count per participant
+metric) against the aggregates of ``utils.dashboard_metrics``.
+
+The datasets, files and connectors of the benchmark are created in the database of the Django settings inside a
+transaction that is rolled back at the end.
+
+    DJANGO_SETTINGS_MODULE=core.settings python benchmarks/dashboard_metrics.py --datasets 10000 --categories 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+from django.db.models import CharField, Count, F, Func, Sum  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from accounts.models import User, UserRole  # noqa: E402
+from connectors.models import Connectors, ConnectorsMap  # noqa: E402
+from datahub.models import DatasetV2, DatasetV2File, Organization, UserOrganizationMap  # noqa: E402
+from utils import dashboard_metrics  # noqa: E402
+
+
+def create_data(datasets, categories, organizations, connectors):
+    rng = random.Random(0)
+    for role, name in ((1, "datahub_admin"), (3, "datahub_participant_root"), (6, "datahub_co_steward")):
+        UserRole.objects.get_or_create(id=role, defaults={"role_name": name})
+    tag = uuid.uuid4().hex[:8]
+    users = User.objects.bulk_create(
+        [User(email=f"{tag}-{number}@benchmark.org", role_id=1 if number == 0 else 3) for number in range(organizations)]
+    )
+    orgs = Organization.objects.bulk_create(
+        [Organization(name=f"{tag} org {number}", org_email=user.email, address="{}") for number, user in enumerate(users)]
+    )
+    maps = UserOrganizationMap.objects.bulk_create(
+        [UserOrganizationMap(user=user, organization=org) for user, org in zip(users, orgs)]
+    )
+    keys = [f"Category {number}" for number in range(categories)]
+    rows = DatasetV2.objects.bulk_create(
+        [
+            DatasetV2(
+                name=f"{tag} {number}",
+                user_map=rng.choice(maps),
+                category={key: [] for key in rng.sample(keys, min(3, categories))},
+                geography={"state": {"name": f"State {rng.randrange(40)}"}},
+                is_temp=False,
+            )
+            for number in range(datasets)
+        ]
+    )
+    files = DatasetV2File.objects.bulk_create(
+        [DatasetV2File(dataset=row, file=f"{row.name}/file/data.csv", file_size=1000, source="file") for row in rows]
+    )
+    admin_connectors = Connectors.objects.bulk_create(
+        [Connectors(user=users[0], name=f"{tag} connector {number}", description="") for number in range(connectors)]
+    )
+    ConnectorsMap.objects.bulk_create(
+        [
+            ConnectorsMap(connectors=connector, left_dataset_file=rng.choice(files), right_dataset_file=rng.choice(files))
+            for connector in admin_connectors
+        ]
+    )
+    return maps[0]
+
+
+def former_metrics(admin, dataset_query):
+    counts = {}
+    for role, filters in ((6, {}), (3, {"user__on_boarded_by": None, "user__approval_status": True})):
+        counts[role] = UserOrganizationMap.objects.filter(user__status=True, user__role=role, **filters).count()
+    for side in ("right", "left"):
+        for excluded in (None, admin.id):
+            query = dataset_query.filter(**{f"datasets__{side}_dataset_file__connectors__user_id": admin.user_id})
+            query = query.values(f"datasets__{side}_dataset_file")
+            counts[(side, excluded)] = (query.exclude(user_map_id=excluded) if excluded else query).distinct().count()
+    counts["connectors"] = Connectors.objects.filter(user_id=admin.user_id).count()
+    list(
+        dataset_query.values("datasets__source").annotate(
+            dataset_count=Count("id", distinct=True),
+            file_count=Count("datasets__file", distinct=True),
+            total_size=Sum("datasets__file_size"),
+        )
+    )
+    list(dataset_query.values(state_name=F("geography__state__name")).annotate(dataset_count=Count("id", distinct=True)))
+    counts["datasets"] = dataset_query.count()
+    keys = DatasetV2.objects.annotate(
+        key=Func("category", function="JSONB_OBJECT_KEYS", output_field=CharField())
+    ).values_list("key", flat=True).distinct()
+    return {key: dataset_query.filter(category__has_key=key).count() for key in keys}
+
+
+def metrics(admin, dataset_query):
+    dashboard_metrics.participant_metrics("None", "1", admin.user_id)
+    dashboard_metrics.connector_metrics(dataset_query, admin.user_id, admin.id)
+    return dashboard_metrics.dataset_metrics(dataset_query)["dataset_category_metrics"]
+
+
+def run(label, function, admin, repeat):
+    dataset_query = DatasetV2.objects.exclude(is_temp=True).filter(user_map__user__on_boarded_by=None)
+    latencies = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            function(admin, dataset_query)
+            latencies.append(time.perf_counter() - started)
+    print(f"  {label:<12} median {statistics.median(latencies) * 1000:8.1f} ms  {len(queries):4d} statements")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--datasets", type=int, default=10000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--organizations", type=int, default=100)
+    parser.add_argument("--connectors", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with transaction.atomic():
+        admin = create_data(args.datasets, args.categories, args.organizations, args.connectors)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        print(f"{args.datasets} datasets, {args.categories} categories, {args.connectors} connectors")
+        run("former", former_metrics, admin, args.repeat)
+        run("aggregates", metrics, admin, args.repeat)
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Latency of the file previews of ``DatasetV2ViewSet.retrieve`` for a dataset of ``--files`` XLSX files of ``--rows``
+rows each: the former ``read_contents_from_csv_or_xlsx_file`` per file and request (``pd.read_excel(nrows=2)``)
+against ``utils.dataset_preview`` (one query for the files and their previews, extracted once by the Celery task).
+
+The dataset and its files are created in the database of the Django settings inside a transaction that is rolled
+back at the end, the workbooks are written once to ``--directory``.
+
+    DJANGO_SETTINGS_MODULE=core.settings python benchmarks/dataset_preview.py --files 20 --rows 50000
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from django.db import transaction  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from rest_framework.utils.encoders import JSONEncoder  # noqa: E402
+
+from accounts.models import User, UserRole  # noqa: E402
+from datahub.models import DatasetV2, DatasetV2File, Organization, UserOrganizationMap  # noqa: E402
+from utils import dataset_preview  # noqa: E402
+
+
+def generate(directory, files, rows):
+    template = os.path.join(directory, "template.xlsx")
+    if not os.path.exists(template):
+        rng = np.random.default_rng(0)
+        pd.DataFrame(
+            {
+                "farmer": [f"farmer {number}" for number in range(rows)],
+                "county": rng.choice(["Meru", "Nakuru", "Kisumu", "Nyeri"], rows),
+                "ward": [f"ward {number % 1500}" for number in range(rows)],
+                "phone": [f"07{number:08d}" for number in range(rows)],
+                "crop": rng.choice(["maize", "beans", "tea", "coffee", "sorghum"], rows),
+                "acres": rng.random(rows).round(2) * 10,
+                "livestock": rng.integers(0, 40, rows),
+                "registered": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1500, rows), unit="D"),
+            }
+        ).to_excel(template, index=False)
+    names = [f"farmers-{number}.xlsx" for number in range(files)]
+    for name in names:
+        if not os.path.exists(os.path.join(directory, name)):
+            shutil.copyfile(template, os.path.join(directory, name))
+    return names
+
+
+def create_dataset(names):
+    UserRole.objects.get_or_create(id=1, defaults={"role_name": "datahub_admin"})
+    user = User.objects.create(email="preview@benchmark.org", role_id=1)
+    organization = Organization.objects.create(name="preview benchmark", org_email=user.email, address="{}")
+    user_map = UserOrganizationMap.objects.create(user=user, organization=organization)
+    dataset = DatasetV2.objects.create(name="preview benchmark", user_map=user_map, is_temp=False)
+    for name in names:
+        DatasetV2File.objects.create(
+            dataset=dataset, file=name, standardised_file=name, source="file",
+            standardised_configuration={"phone": {"masked": True}},
+        )
+    return dataset
+
+
+def former_previews(dataset):
+    previews = []
+    for file in DatasetV2File.objects.filter(dataset_id=dataset.id):
+        content = pd.read_excel(dataset_preview.file_path_of(file), index_col=None, nrows=2)
+        content = content.drop(content.filter(regex="Unnamed").columns, axis=1).fillna("")
+        content[["phone"]] = "######"
+        content.columns = content.columns.astype(str)
+        previews.append(content.to_dict(orient="records"))
+    return previews
+
+
+def previews(dataset):
+    files = DatasetV2File.objects.select_related("preview").filter(dataset_id=dataset.id)
+    return [dataset_preview.content(file) for file in files]
+
+
+def extract_previews(dataset):
+    """What ``core.utils.index_dataset_file_preview`` does for every file of the dataset."""
+    for file in DatasetV2File.objects.select_related("preview").filter(dataset_id=dataset.id):
+        dataset_preview.index(file)
+
+
+def run(label, function, dataset, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(dataset)
+        latencies.append(time.perf_counter() - started)
+    print(f"  {label:<18} median {statistics.median(latencies) * 1000:9.1f} ms  ({repeat} requests)", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--directory", default="/tmp/dataset-preview-benchmark")
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    names = generate(args.directory, args.files, args.rows)
+    size = os.path.getsize(os.path.join(args.directory, names[0])) / 2**20
+    print(f"{args.files} XLSX files of {args.rows} rows, {size:.1f} MB each")
+    with override_settings(DATASET_FILES_URL=args.directory), transaction.atomic():
+        dataset = create_dataset(names)
+        run("former", former_previews, dataset, args.repeat)
+        run("index (extract)", extract_previews, dataset, 1)
+        run("index (current)", previews, dataset, args.repeat)
+        # the responses are identical once rendered
+        assert json.dumps(previews(dataset), cls=JSONEncoder) == json.dumps(former_previews(dataset), cls=JSONEncoder)
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
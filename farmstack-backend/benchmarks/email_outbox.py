@@ -0,0 +1,128 @@
+"""
+Latency of the OTP endpoint (``ResendOTPViewset.create``) against an SMTP server
+answering every DATA command after ``--smtp-delay`` seconds: the former
+``Utils.send_email`` (a new SMTP connection per email, sent in the request)
+against ``utils.email_outbox`` (an outbox row and a Celery task published to
+the broker of ``CELERY_BROKER_URL``). Then the time to deliver ``--emails``
+emails to a server without delay, one connection per email against a drain
+over one connection.
+
+The SMTP server is a local aiosmtpd server without TLS or authentication, so
+the former sending skips STARTTLS and login as well. The user and the outbox
+rows are created in the database of the Django settings and deleted at the end.
+
+    DJANGO_SETTINGS_MODULE=core.settings python benchmarks/email_outbox.py --smtp-delay 1
+"""
+import argparse
+import asyncio
+import os
+import smtplib
+import statistics
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from aiosmtpd.controller import Controller  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from accounts.models import OutboxEmail, User, UserRole  # noqa: E402
+from accounts.views import ResendOTPViewset  # noqa: E402
+from core.utils import Utils  # noqa: E402
+from utils import email_outbox  # noqa: E402
+
+EMAIL = "otp@benchmark.org"
+
+
+class SlowHandler:
+    delay = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.delay)
+        return "250 OK"
+
+
+def former_send_email(self, to_email, content=None, subject=None):
+    message = email_outbox.message_of(
+        OutboxEmail(to_emails=[to_email] if isinstance(to_email, str) else to_email, subject=subject, content=content)
+    )
+    server = smtplib.SMTP(settings.SMTP_SERVER, settings.SMTP_PORT)
+    server.sendmail(settings.SMTP_USER, to_email, message)
+    server.quit()
+
+
+def request_otp(view, factory):
+    cache.clear()
+    started = time.perf_counter()
+    response = view(factory.post("/accounts/resend_otp/", {"email": EMAIL}, format="json"))
+    assert response.status_code == 201, response.data
+    return time.perf_counter() - started
+
+
+def run(label, requests):
+    view = ResendOTPViewset.as_view({"post": "create"})
+    factory = APIRequestFactory()
+    latencies = sorted(request_otp(view, factory) for _ in range(requests))
+    print(
+        f"  {label:<8} median {statistics.median(latencies) * 1000:8.1f} ms  "
+        f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:8.1f} ms  ({requests} requests)",
+        flush=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--smtp-delay", type=float, default=1.0, help="seconds the server takes to answer DATA")
+    parser.add_argument("--smtp-port", type=int, default=8025)
+    args = parser.parse_args()
+
+    handler = SlowHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=args.smtp_port)
+    controller.start()
+    smtp_settings = override_settings(
+        SMTP_SERVER="127.0.0.1", SMTP_PORT=args.smtp_port, SMTP_USE_TLS=False, SMTP_USER="noreply@benchmark.org",
+        SMTP_PASSWORD="",
+    )
+    role, _ = UserRole.objects.get_or_create(id=3, defaults={"role_name": "datahub_participant_root"})
+    user = User.objects.create(email=EMAIL, role=role)
+    queued = set(OutboxEmail.objects.values_list("id", flat=True))
+    try:
+        with smtp_settings:
+            print(f"OTP endpoint, SMTP server answering DATA in {args.smtp_delay} s")
+            handler.delay = args.smtp_delay
+            with mock.patch.object(Utils, "send_email", former_send_email):
+                run("former", args.requests)
+            run("outbox", args.requests)
+
+            print(f"{args.emails} emails, SMTP server without delay")
+            handler.delay = 0
+            OutboxEmail.objects.exclude(id__in=queued).delete()
+            started = time.perf_counter()
+            for number in range(args.emails):
+                former_send_email(None, f"farmer{number}@benchmark.org", "<p>1234</p>", "Your OTP")
+            print(f"  former   {time.perf_counter() - started:8.2f} s  (a connection per email)", flush=True)
+            for number in range(args.emails):
+                email_outbox.enqueue(f"farmer{number}@benchmark.org", "<p>1234</p>", "Your OTP")
+            started = time.perf_counter()
+            sent = email_outbox.drain()
+            print(f"  outbox   {time.perf_counter() - started:8.2f} s  ({sent} sent by one drain)", flush=True)
+            email_outbox.CONNECTION.close()
+    finally:
+        OutboxEmail.objects.exclude(id__in=queued).delete()
+        user.delete()
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Images/sec of the Medical AI training input pipelines: Keras
+ImageDataGenerator.flow_from_directory (the former loader of the train_*
+scripts) against ``medical_ai.data_pipeline.image_split``, on a generated
+synthetic dataset of JPEGs.
+
+    python benchmarks/medical_ai_input.py --images 2000 --epochs 3
+
+Each loader is iterated for ``--epochs`` full epochs with the augmentation of
+train_phase1_5categories.py; the tf.data rows show the first (decoding) and
+the later (cached) epochs separately.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medical_ai import data_pipeline  # noqa: E402
+
+AUGMENTATION = dict(
+    rotation_range=25, width_shift_range=0.25, height_shift_range=0.25, shear_range=0.2,
+    zoom_range=0.2, horizontal_flip=True, brightness_range=[0.8, 1.2], fill_mode='nearest',
+)
+
+
+def write_dataset(directory, images, classes, size=(480, 360), seed=0):
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    for index in range(images):
+        class_dir = os.path.join(directory, f'class_{index % classes}')
+        os.makedirs(class_dir, exist_ok=True)
+        noise = rng.integers(0, 40, base.shape, dtype=np.uint8)
+        Image.fromarray(base + noise).save(os.path.join(class_dir, f'{index}.jpg'), quality=90)
+
+
+def generator_epochs(directory, img_size, batch_size, epochs, augment):
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+    datagen = ImageDataGenerator(rescale=1./255, **(AUGMENTATION if augment else {}))
+    flow = datagen.flow_from_directory(
+        directory, target_size=(img_size, img_size), batch_size=batch_size, class_mode='categorical', shuffle=True
+    )
+    timings = []
+    for _ in range(epochs):
+        started = time.perf_counter()
+        for step in range(len(flow)):
+            flow[step]
+        flow.on_epoch_end()
+        timings.append(time.perf_counter() - started)
+    return flow.samples, timings
+
+
+def dataset_epochs(directory, img_size, batch_size, epochs, augment, cache):
+    split = data_pipeline.image_split(
+        directory, img_size=img_size, batch_size=batch_size, training=True,
+        augment=data_pipeline.augmentation(**AUGMENTATION) if augment else None, cache=cache,
+    )
+    timings = []
+    for _ in range(epochs):
+        started = time.perf_counter()
+        for _ in split.dataset:
+            pass
+        timings.append(time.perf_counter() - started)
+    return split.samples, timings
+
+
+def report(label, samples, timings):
+    first = samples / timings[0]
+    later = samples * (len(timings) - 1) / sum(timings[1:]) if len(timings) > 1 else first
+    print(f'{label:<40} epoch 1 {first:>8.1f} images/s   later epochs {later:>8.1f} images/s')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=2000)
+    parser.add_argument('--classes', type=int, default=5)
+    parser.add_argument('--img-size', type=int, default=224)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--epochs', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        directory = os.path.join(workdir, 'train')
+        write_dataset(directory, args.images, args.classes)
+        print(f'{args.images} synthetic 480x360 JPEGs, {os.cpu_count()} CPUs')
+        for augment in (False, True):
+            suffix = 'augmented' if augment else 'rescale only'
+            report(f'ImageDataGenerator, {suffix}',
+                   *generator_epochs(directory, args.img_size, args.batch_size, args.epochs, augment))
+            report(f'tf.data, memory cache, {suffix}',
+                   *dataset_epochs(directory, args.img_size, args.batch_size, args.epochs, augment, True))
+            cache = os.path.join(workdir, 'cache', f'train_{augment}')
+            report(f'tf.data, disk cache, {suffix}',
+                   *dataset_epochs(directory, args.img_size, args.batch_size, args.epochs, augment, cache))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Throughput benchmark of medical report OCR: the former inline pipeline (one
+page at a time in the request thread, nested substring term scan) against
+``medical_ai.ocr.OcrEngine`` on a process pool, and the content-hash cache
+on repeated uploads.
+
+    python benchmarks/report_ocr.py --reports 24 --pages 3 --workers 4
+
+Synthetic lab reports (PNG and multi-page PDF) are written to ``--fixtures``
+(a temporary directory by default). Needs opencv, PyMuPDF and Pillow, and
+the tesseract binary; without tesseract pass ``--simulate-ms`` to replace
+each page's OCR call by that much CPU work after the real preprocessing.
+"""
+import argparse
+import hashlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medical_ai import ocr  # noqa: E402
+from medical_ai.models.report_analyzer import MEDICAL_TERMS, TERM_MATCHER  # noqa: E402
+
+LINES = [
+    'Hemoglobin: {:.1f} g/dl', 'Glucose (fasting): {:.0f} mg/dl - elevated', 'Cholesterol: {:.0f} mg/dl',
+    'Creatinine: {:.2f} mg/dl', 'Bilirubin: {:.1f} mg/dl', 'WBC count: {:.0f}', 'RBC count: {:.1f}',
+    'Platelet count: {:.0f}', 'Impression: benign nodule, no acute findings ({:.0f} mm)',
+]
+
+
+def report_page(rng, number):
+    from PIL import Image, ImageDraw
+
+    img = Image.new('RGB', (1240, 1754), 'white')
+    draw = ImageDraw.Draw(img)
+    draw.text((80, 60), f'LABORATORY REPORT - page {number + 1}', fill='black')
+    for row in range(40):
+        draw.text((80, 120 + row * 38), rng.choice(LINES).format(rng.uniform(1, 300)), fill='black')
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def write_fixtures(directory, reports, pages, seed=0):
+    import fitz
+
+    rng = random.Random(seed)
+    paths = []
+    for index in range(reports):
+        if pages > 1 and index % 2:
+            path = os.path.join(directory, f'report_{index}.pdf')
+            with fitz.open() as pdf:
+                for number in range(pages):
+                    page = pdf.new_page(width=595, height=842)
+                    page.insert_image(page.rect, stream=report_page(rng, number))
+                pdf.save(path)
+        else:
+            path = os.path.join(directory, f'report_{index}.png')
+            with open(path, 'wb') as f:
+                f.write(report_page(rng, 0))
+        paths.append(path)
+    return paths
+
+
+def simulated_page(data, name, index, tesseract_cmd=None):
+    """Real rendering and preprocessing, then a fixed amount of CPU work in place of tesseract."""
+    processed = ocr.preprocess_page(ocr.load_page(data, name, index))
+    deadline = time.process_time() + SIMULATE_MS / 1000
+    digest = processed.tobytes()
+    while time.process_time() < deadline:
+        digest = hashlib.sha256(digest).digest()
+    return 'Glucose elevated hemoglobin decreased platelet benign nodule ' * 20
+
+
+SIMULATE_MS = float(os.environ.get('REPORT_OCR_SIMULATE_MS', 0))
+
+
+def legacy_terms(text):
+    """Reference: the former nested substring scan."""
+    text_lower = text.lower()
+    return {term: explanation for term, explanation in MEDICAL_TERMS.items() if term in text_lower}
+
+
+def legacy_pass(documents, page_ocr, tesseract_cmd):
+    for name, data in documents:
+        pages = ocr.count_pages(data, name)
+        text = '\n'.join(page_ocr(data, name, index, tesseract_cmd) for index in range(pages))
+        legacy_terms(text)
+
+
+def engine_pass(engine, documents):
+    for name, data in documents:
+        TERM_MATCHER.find(engine.extract_text(data, name))
+
+
+def timed(label, fn, pages):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f'{label:<36} {elapsed:>8.2f} s  {pages / elapsed:>7.2f} pages/s')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fixtures', help='directory for the synthetic reports, temporary by default')
+    parser.add_argument('--reports', type=int, default=24)
+    parser.add_argument('--pages', type=int, default=3, help='pages of every other report (as PDF)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--simulate-ms', type=float, help='CPU ms per page instead of running tesseract')
+    args = parser.parse_args()
+
+    page_ocr, tesseract_cmd = ocr.tesseract_page, ocr.find_tesseract()
+    if args.simulate_ms is not None:
+        # the spawned pool workers read the cost from the environment
+        global SIMULATE_MS
+        SIMULATE_MS = args.simulate_ms
+        os.environ['REPORT_OCR_SIMULATE_MS'] = str(args.simulate_ms)
+        page_ocr = simulated_page
+    elif tesseract_cmd is None:
+        parser.error('tesseract not found on PATH, install it or pass --simulate-ms')
+
+    fixtures = args.fixtures or tempfile.mkdtemp()
+    os.makedirs(fixtures, exist_ok=True)
+    documents = []
+    for path in write_fixtures(fixtures, args.reports, args.pages):
+        with open(path, 'rb') as f:
+            documents.append((os.path.basename(path), f.read()))
+    pages = sum(ocr.count_pages(data, name) for name, data in documents)
+    print(f'{len(documents)} reports, {pages} pages in {fixtures}, {os.cpu_count()} CPUs')
+
+    timed('inline, one page at a time', lambda: legacy_pass(documents, page_ocr, tesseract_cmd), pages)
+    for workers in args.workers:
+        engine = ocr.OcrEngine(max_workers=workers, tesseract_cmd=tesseract_cmd, cache=None, page_ocr=page_ocr)
+        engine.ocr_pages(documents[0][1], documents[0][0])  # start the pool outside the timing
+        timed(f'process pool, {workers} workers', lambda: engine_pass(engine, documents), pages)
+        engine.close()
+
+    engine = ocr.OcrEngine(max_workers=max(args.workers), tesseract_cmd=tesseract_cmd, page_ocr=page_ocr,
+                           cache=type('DictCache', (dict,), {'set': dict.__setitem__})())
+    engine_pass(engine, documents)
+    timed('repeated uploads, cache hits', lambda: engine_pass(engine, documents), pages)
+    engine.close()
+
+    texts = [' '.join(random.Random(i).choice(LINES).format(1.0) for _ in range(60)) for i in range(500)]
+    rng = random.Random(1)
+    vocabularies = [MEDICAL_TERMS, dict(MEDICAL_TERMS, **{
+        ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(5, 12))): '' for _ in range(1000)
+    })]
+    for terms in vocabularies:
+        matcher = ocr.TermMatcher(terms)
+        started = time.perf_counter()
+        for text in texts:
+            text_lower = text.lower()
+            {term: value for term, value in terms.items() if term in text_lower}
+        legacy = time.perf_counter() - started
+        started = time.perf_counter()
+        for text in texts:
+            matcher.find(text)
+        print(f'term scan over {len(texts)} texts, {len(terms)} terms: nested loop {legacy * 1000:.1f} ms, '
+              f'compiled regex {(time.perf_counter() - started) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
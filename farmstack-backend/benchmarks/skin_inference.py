@@ -0,0 +1,108 @@
+"""
+Benchmark of skin disease inference on CPU: loading the Keras model on every
+request (the former SkinDiseaseDetector per request) against the resident,
+micro-batched model of ``medical_ai.inference``, optionally on the ONNX
+Runtime / TFLite backends exported from the same ``.h5``.
+
+    python benchmarks/skin_inference.py --model medical_ai/models/skin_disease_model_best.h5 \
+        --requests 256 --concurrency 16 --backends keras onnx tflite
+
+Without ``--model`` an untrained MobileNetV2 classifier of the same shape is
+used. Needs TensorFlow, plus tf2onnx/onnxruntime for the ONNX backend.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medical_ai import inference  # noqa: E402
+
+
+def synthetic_model(path, img_size, classes=4):
+    import tensorflow as tf
+
+    base = tf.keras.applications.MobileNetV2(input_shape=(img_size, img_size, 3), include_top=False, weights=None)
+    model = tf.keras.Sequential([
+        tf.keras.layers.Input(shape=(img_size, img_size, 3)),
+        base,
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(classes, activation='softmax'),
+    ])
+    model.save(path)
+    return path
+
+
+def cold_requests(model_path, images):
+    """Reference: keras load_model and a single image predict per request."""
+    import tensorflow as tf
+
+    for image in images:
+        model = tf.keras.models.load_model(model_path)
+        model.predict(image[None], verbose=0)
+
+
+def resident_requests(model, images, concurrency):
+    latencies = []
+
+    def request(image):
+        started = time.perf_counter()
+        model.predict(image)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(request, images))
+    return time.perf_counter() - started, np.percentile(latencies, [50, 95]) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', help='Keras .h5 model, defaults to an untrained MobileNetV2')
+    parser.add_argument('--img-size', type=int, default=224)
+    parser.add_argument('--requests', type=int, default=256)
+    parser.add_argument('--cold-requests', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--max-batch-size', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    parser.add_argument('--backends', nargs='+', default=['keras'], choices=['keras', 'onnx', 'tflite'])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    model_path = args.model or synthetic_model(os.path.join(workdir, 'skin.h5'), args.img_size)
+    rng = np.random.default_rng(0)
+    images = rng.random((args.requests, args.img_size, args.img_size, 3), dtype=np.float32)
+
+    started = time.perf_counter()
+    cold_requests(model_path, images[:args.cold_requests])
+    cold = (time.perf_counter() - started) / args.cold_requests
+    print(f"{'cold load per request':<40} {cold * 1000:>10.1f} ms/request")
+
+    input_shape = (args.img_size, args.img_size, 3)
+    for backend in args.backends:
+        backend_path = None
+        if backend != 'keras':
+            backend_path = inference.export_model(model_path, backend, os.path.join(workdir, f'skin.{backend}'))
+        for max_batch_size in sorted({1, args.max_batch_size}):
+            started = time.perf_counter()
+            model = inference.load_resident_model(
+                model_path, input_shape, backend, backend_path,
+                max_batch_size=max_batch_size, max_wait_ms=args.max_wait_ms,
+            )
+            load = time.perf_counter() - started
+            elapsed, (p50, p95) = resident_requests(model, images, args.concurrency)
+            model.batcher.close()
+            print(
+                f"{f'resident {model.backend.name}, batch<={max_batch_size}':<40} "
+                f"{elapsed / args.requests * 1000:>10.1f} ms/request  {args.requests / elapsed:>7.1f} images/s  "
+                f"p50 {p50:.1f} ms  p95 {p95:.1f} ms  (load + warmup {load:.1f} s)"
+            )
+
+
+if __name__ == '__main__':
+    main()
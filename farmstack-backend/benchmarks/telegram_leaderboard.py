@@ -0,0 +1,212 @@
+"""
+Benchmark of the Telegram bot Leaderboard rankings on a synthetic facts table:
+the former page, which fetched every reach joined with every DA of its kebele
+and ranked them in pandas, against ``warehouse.leaderboard_counts``, which
+aggregates them in SQL, one row per DA, kebele and practice.
+
+The tables are created in the schema ``--schema`` (dropped first) of the
+database of the ``DB_*`` environment variables used by the dashboards:
+
+    DB_NAME=... DB_HOST=... python benchmarks/telegram_leaderboard.py --facts 3750000
+
+The former rankings are computed (and checked against the new ones) on the
+reaches of the last ``--check-days`` days only, as they take minutes on the
+full table; on the full period only the fetch of the joined rows is timed,
+unless ``--skip-former-fetch`` is given (at 5M joined rows it needs over 5 GB).
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+import uuid
+
+import pandas as pd
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit", "telegrambot")
+)
+
+FORMER_QUERY = """
+    WITH telegram_data AS (
+        SELECT
+            details->'data'->'advisory_body'->>'value_chain' AS value_chain_id,
+            details->'data'->'advisory_body'->>'sub_practice' AS sub_practice_id,
+            COUNT(*) AS count
+        FROM core_telegraminteractionlog
+        WHERE action = 'ADVISORY_ACCESS_DA'
+        GROUP BY 1, 2
+    )
+    SELECT
+        da.id AS da_id,
+        da.name || ' ' || da.father_name || ' ' || da.grand_father_name AS "DA Full Name",
+        da.gender AS da_gender,
+        f.kebele_id,
+        k.name AS kebele_name,
+        w.name AS woreda_name,
+        f.gender,
+        f.reach_id,
+        f.adoption_id,
+        p.name AS practice_name,
+        vc.name AS value_chain_name,
+        tg.count AS access_count,
+        f.created_at
+    FROM telegram_reach_facts f
+    INNER JOIN integration_developmentagent da ON da.kebele_id = f.kebele_id
+    INNER JOIN integration_kebele k ON k.id = f.kebele_id
+    INNER JOIN integration_woreda w ON w.id = f.woreda_id
+    INNER JOIN core_practice p ON p.id = f.practice_id
+    INNER JOIN core_valuechain vc ON vc.id = f.value_chain_id
+    LEFT JOIN telegram_data tg ON tg.value_chain_id::uuid = f.value_chain_id AND tg.sub_practice_id::uuid = f.subpractice_id
+    WHERE f.created_at >= %(start_date)s
+"""
+
+SCHEMA_SQL = """
+CREATE TABLE integration_woreda AS
+    SELECT i AS id, 'Woreda ' || i AS name FROM generate_series(0, %(kebeles)s / 10) i;
+CREATE TABLE integration_kebele AS
+    SELECT i AS id, 'Kebele ' || i AS name, i / 10 AS woreda_id FROM generate_series(0, %(kebeles)s - 1) i;
+CREATE TABLE integration_developmentagent AS
+    SELECT i AS id, 'DA' AS name, i::text AS father_name, 'Tesfaye' AS grand_father_name,
+        (ARRAY['Female', 'Male', 'Male', 'Male'])[i %% 4 + 1] AS gender, i %% %(kebeles)s AS kebele_id
+    FROM generate_series(0, %(das)s - 1) i;
+CREATE TABLE core_valuechain AS
+    SELECT md5('value chain ' || i)::uuid AS id, 'Value chain ' || i AS name FROM generate_series(0, 24) i;
+CREATE TABLE core_practice AS
+    SELECT i AS id, 'Practice ' || i AS name, md5('sub practice ' || i)::uuid AS subpractice_id,
+        md5('value chain ' || i %% 25)::uuid AS value_chain_id
+    FROM generate_series(0, %(practices)s - 1) i;
+CREATE TABLE core_telegraminteractionlog AS
+    SELECT 'ADVISORY_ACCESS_DA' AS action, jsonb_build_object('data', jsonb_build_object('advisory_body',
+        jsonb_build_object('value_chain', p.value_chain_id, 'sub_practice', p.subpractice_id))) AS details
+    FROM core_practice p, generate_series(1, 20) n
+    WHERE (p.id * 7 + n) %% 5 > 0;
+SELECT setseed(0);
+CREATE TABLE telegram_reach_facts AS
+    SELECT
+        md5('reach ' || r)::uuid AS reach_id,
+        CASE WHEN random() < 0.4 THEN md5('adoption ' || r)::uuid END AS adoption_id,
+        r / 3 AS farmer_id,
+        (ARRAY['Female', 'Female', 'male', 'male', 'MALE', NULL])[r %% 6 + 1] AS gender,
+        kebele_id, kebele_id / 10 AS woreda_id, 0 AS zone_id, 0 AS region_id,
+        p.id AS advisory_id, p.subpractice_id, p.id AS practice_id, p.value_chain_id,
+        0 AS value_chain_category_id,
+        now() - random() * interval '365 days' AS created_at
+    FROM (
+        SELECT r, (random() * (%(kebeles)s - 1))::int AS kebele_id, r %% %(practices)s AS practice_id
+        FROM generate_series(0, %(facts)s - 1) r
+    ) reaches
+    INNER JOIN core_practice p ON p.id = reaches.practice_id;
+ANALYZE;
+"""
+
+
+def legacy_leaderboards(filtered_df, keys):
+    """Reference: the former page code, one Python call per group and table."""
+    def by_gender(df, keys, kind, genders=("male", "female")):
+        id_column = f"{kind}_id"
+        result = df.groupby(keys).apply(lambda x: pd.Series({
+            f"{gender}_{kind}_count": x[x["gender"].str.lower() == gender][id_column].nunique() for gender in genders
+        })).reset_index()
+        if len(genders) == 2:
+            result[f"total_{kind}_count"] = result[f"male_{kind}_count"] + result[f"female_{kind}_count"]
+        return result
+
+    da_keys, kebele_keys, practice_keys = keys
+    female_das = filtered_df[filtered_df["da_gender"].str.lower() == "female"]
+    female_farmers = filtered_df[filtered_df["gender"].str.lower() == "female"]
+    sorted_df = filtered_df.sort_values(by="access_count", ascending=False)
+    return {
+        "da_reach": by_gender(filtered_df, da_keys, "reach"),
+        "female_da_reach": by_gender(female_das, da_keys, "reach"),
+        "female_advocate_reach": by_gender(female_farmers, da_keys, "reach", ("female",)),
+        "da_adoption": by_gender(filtered_df, da_keys, "adoption"),
+        "female_da_adoption": by_gender(female_das, da_keys, "adoption"),
+        "female_da_female_adoption": by_gender(female_das, da_keys, "adoption", ("female",)),
+        "kebele_reach": by_gender(filtered_df, kebele_keys, "reach"),
+        "kebele_female_reach": by_gender(filtered_df, kebele_keys, "reach", ("female",)),
+        "kebele_adoption": by_gender(filtered_df, kebele_keys, "adoption"),
+        "kebele_female_adoption": by_gender(filtered_df, kebele_keys, "adoption", ("female",)),
+        "popular_content": sorted_df[practice_keys + ["access_count"]].drop_duplicates(subset=practice_keys),
+        "practice_reach": by_gender(filtered_df, practice_keys, "reach"),
+        "practice_adoption": by_gender(filtered_df, practice_keys, "adoption"),
+    }
+
+
+def same_rankings(expected, actual):
+    """Rankings hold the same counts per group (ties may be ordered differently)."""
+    for name, table in expected.items():
+        keys = [column for column in table.columns if not column.endswith("_count")]
+        left = table.sort_values(keys).reset_index(drop=True).astype(float, errors="ignore").astype(str)
+        right = actual[name][table.columns].sort_values(keys).reset_index(drop=True)
+        right = right.astype(float, errors="ignore").astype(str)
+        if not left.equals(right):
+            return name
+    return None
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print(f"{label:<50} {(time.perf_counter() - start) * 1000:>10.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--facts", type=int, default=3750000)
+    parser.add_argument("--das", type=int, default=4000)
+    parser.add_argument("--kebeles", type=int, default=3000)
+    parser.add_argument("--practices", type=int, default=300)
+    parser.add_argument("--check-days", type=int, default=2)
+    parser.add_argument("--schema", default="leaderboard_benchmark")
+    parser.add_argument("--skip-former-fetch", action="store_true")
+    args = parser.parse_args()
+
+    os.environ["PGOPTIONS"] = f"-c search_path={args.schema}"
+    import leaderboard  # noqa: E402
+    import warehouse  # noqa: E402
+
+    with warehouse.connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE; CREATE SCHEMA {args.schema}")
+        started = time.perf_counter()
+        cursor.execute(SCHEMA_SQL, vars(args))
+        for name, columns in warehouse.FACTS_INDEXES.items():
+            include = warehouse.FACTS_INDEX_INCLUDES.get(name)
+            include = f" INCLUDE ({include})" if include else ""
+            cursor.execute(f"CREATE INDEX ON telegram_reach_facts ({columns}){include}")
+        conn.commit()
+    warehouse.vacuum_reach_facts()
+    with warehouse.connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM ({FORMER_QUERY}) joined", {"start_date": datetime.date(1970, 1, 1)})
+        joined = cursor.fetchone()[0]
+    print(f"facts={args.facts} joined rows={joined} loaded in {time.perf_counter() - started:.1f} s")
+
+    try:
+        today = datetime.date.today()
+        check_start = today - datetime.timedelta(days=args.check_days)
+        keys = (leaderboard.DA_KEYS, leaderboard.KEBELE_KEYS, leaderboard.PRACTICE_KEYS)
+        sample = warehouse.fetch_data(FORMER_QUERY, {"start_date": check_start})
+        expected = timed(f"former ranking ({len(sample)} joined rows)", legacy_leaderboards, sample, keys)
+        counts = warehouse.leaderboard_counts(check_start, today, uuid.uuid4().hex)
+        mismatch = same_rankings(expected, leaderboard.compute_leaderboards(counts))
+        print("rankings match" if mismatch is None else f"rankings differ: {mismatch}")
+
+        year = today - datetime.timedelta(days=365)
+        if not args.skip_former_fetch:
+            rows = timed(
+                "former fetch of the joined rows (past year)", warehouse.fetch_data, FORMER_QUERY, {"start_date": year}
+            )
+            print(f"  {len(rows)} rows fetched")
+            del rows
+        counts = timed("SQL counts (past year)", warehouse.leaderboard_counts, year, today, uuid.uuid4().hex)
+        print(f"  {', '.join(f'{len(table)} {name} rows' for name, table in counts.items())} fetched")
+        timed("rankings from the counts (past year)", leaderboard.compute_leaderboards, counts)
+    finally:
+        with warehouse.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA {args.schema} CASCADE")
+            conn.commit()
+
+
+if __name__ == "__main__":
+    main()
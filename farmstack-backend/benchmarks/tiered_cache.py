@@ -0,0 +1,140 @@
+"""
+Load on the Django cache with ``--keys`` entries: the ``FileBasedCache`` of ``core.settings`` (default options, i.e.
+culled to 300 entries, and with ``MAX_ENTRIES`` above the number of keys) against ``utils.tiered_cache`` over the
+Redis at ``--redis``.
+
+Nine keys out of ten are small OTP-like dicts, one out of ten a dashboard response of ``--payload-entries``
+counts under ``dashboard:response:`` (zstd compressed, kept in the local tier). Every key is set once, then
+``--reads`` gets with a Zipf skew are spread over ``--threads`` threads. A backend that cannot write the keys within
+``--populate-budget`` seconds stops there and the reads count the missing keys as misses.
+
+    python benchmarks/tiered_cache.py --keys 100000 --redis redis://localhost:6379/15 --directory /tmp/file-cache
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(latencies, fraction):
+    return sorted(latencies)[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+
+def key_of(number):
+    return f"dashboard:response:kiamis:{number}" if number % 10 == 0 else f"otp:farmer{number}@dg.org"
+
+
+def value_of(number, payload_entries):
+    if number % 10 == 0:
+        return {"county": {f"ward {entry}": {"farmers": entry * 3, "female": entry} for entry in range(payload_entries)}}
+    return {"email": f"farmer{number}@dg.org", "otp": 100000 + number, "otp_attempt": 1, "cache_type": "login"}
+
+
+def populate(cache, keys, payload_entries, budget):
+    latencies, started = [], time.perf_counter()
+    for number in range(keys):
+        value = value_of(number, payload_entries)
+        begun = time.perf_counter()
+        cache.set(key_of(number), value, None)
+        latencies.append(time.perf_counter() - begun)
+        if time.perf_counter() - started > budget:
+            break
+    elapsed = time.perf_counter() - started
+    print(
+        f"    set  {len(latencies):7d} keys in {elapsed:7.1f} s  {len(latencies) / elapsed:9.0f} ops/s  "
+        f"p50 {percentile(latencies, 0.5):7.3f} ms  p99 {percentile(latencies, 0.99):7.3f} ms  "
+        f"last 1000 median {statistics.median(latencies[-1000:]) * 1000:7.3f} ms",
+        flush=True,
+    )
+
+
+def read(alias, keys, reads, threads):
+    from django.core.cache import caches
+
+    order = (np.random.default_rng(0).zipf(1.2, reads) - 1) % keys
+    latencies, hits = [], []
+
+    def worker(numbers):
+        cache = caches[alias]
+        own, found = [], 0
+        for number in numbers:
+            begun = time.perf_counter()
+            found += cache.get(key_of(int(number))) is not None
+            own.append(time.perf_counter() - begun)
+        latencies.extend(own)
+        hits.append(found)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in np.array_split(order, threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    print(
+        f"    get  {reads:7d} reads in {elapsed:7.1f} s  {reads / elapsed:9.0f} ops/s  "
+        f"p50 {percentile(latencies, 0.5):7.3f} ms  p99 {percentile(latencies, 0.99):7.3f} ms  "
+        f"hit ratio {sum(hits) / reads:.3f}",
+        flush=True,
+    )
+
+
+def directory_size(directory):
+    return sum(entry.stat().st_size for entry in os.scandir(directory)) / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=100000)
+    parser.add_argument("--reads", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--payload-entries", type=int, default=300, help="wards of a dashboard response")
+    parser.add_argument("--populate-budget", type=float, default=300, help="seconds to set the keys of a backend")
+    parser.add_argument("--redis", default="redis://localhost:6379/15")
+    parser.add_argument("--directory", default="/tmp/file-cache-benchmark")
+    args = parser.parse_args()
+
+    from django.conf import settings
+
+    settings.configure(
+        CACHES={
+            "file": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": args.directory},
+            "file-unculled": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": f"{args.directory}-unculled",
+                "OPTIONS": {"MAX_ENTRIES": args.keys + 1},
+            },
+            "tiered": {
+                "BACKEND": "utils.tiered_cache.TieredRedisCache",
+                "LOCATION": args.redis,
+                "OPTIONS": {"LOCAL_KEY_PREFIXES": ["dashboard:response:"]},
+            },
+        }
+    )
+    from django.core.cache import caches
+
+    for alias in ("file", "file-unculled", "tiered"):
+        cache = caches[alias]
+        cache.clear()
+        print(f"  {alias}", flush=True)
+        populate(cache, args.keys, args.payload_entries, args.populate_budget)
+        read(alias, args.keys, args.reads, args.threads)
+        if alias == "tiered":
+            memory = cache._cache.get_client(None).info("memory")["used_memory"] / 2**20
+            print(f"    redis used memory {memory:.0f} MB, process metrics {cache.metrics()}", flush=True)
+        else:
+            print(f"    {directory_size(cache._dir):.0f} MB on disk", flush=True)
+        cache.clear()
+    for directory in (args.directory, f"{args.directory}-unculled"):
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Out-of-core integration of the dataset files of a connector.
+
+The maps of a connector join the left file of the first map with the right
+file of every map, one after another, with the semantics of chained
+``pd.merge`` calls: ``how`` of the map, keys of the same name merged into one
+column, ``_df<n>`` suffixes on clashing right columns, null keys matching each
+other and the row order of pandas. `DatasetIntegration` plans them as a single
+DuckDB query over Parquet copies of the source files (converted once, cached by
+path, size and modification time), run under a memory budget and spilling to
+disk beyond it.
+
+The preview is a LIMIT of that query and the row count a ``count(*)`` over it,
+neither materializes the result. The integrated CSV is only written by
+`export`, which also applies the column selection and renames of the connector
+config: the join is staged unordered to Parquet, then sorted on its own. Until then the connector is a plan file next to its CSV path.
+"""
+import hashlib
+import json
+import logging
+import os
+import uuid
+from urllib.parse import unquote
+
+import duckdb
+import pandas as pd
+from django.conf import settings
+
+from core.constants import Constants
+
+LOGGER = logging.getLogger(__name__)
+
+ROW_NUMBER = "file_row_number"
+EXCEL_EXTENSIONS = (".xlsx", ".xls")
+JOINS = {"inner": "JOIN", "left": "LEFT JOIN", "right": "RIGHT JOIN", "outer": "FULL JOIN"}
+# the types and missing values pandas.read_csv infers, dates stay text
+CSV_OPTIONS = (
+    "header = true, sample_size = -1, auto_type_candidates = ['BOOLEAN', 'BIGINT', 'DOUBLE', 'VARCHAR'], "
+    "nullstr = ['', 'NA', 'N/A', 'NaN', 'nan', 'NULL', 'null', '#N/A', 'n/a', '<NA>']"
+)
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def source_file(path):
+    """Path on disk of a dataset file of a map."""
+    return os.path.join(settings.DATASET_FILES_URL, unquote(path).replace(Constants.SLASH_MEDIA_SLASH, ""))
+
+
+def plan_path(csv_path):
+    """Path of the plan of the integrated CSV `csv_path`, saved until the CSV is exported."""
+    return f"{os.path.splitext(csv_path)[0]}.plan.json"
+
+
+def connect(memory_limit=None, threads=None):
+    """DuckDB connection spilling to ``CONNECTOR_CACHE_PATH`` beyond `memory_limit`."""
+    spill_path = os.path.join(settings.CONNECTOR_CACHE_PATH, "spill")
+    os.makedirs(spill_path, exist_ok=True)
+    return duckdb.connect(
+        config={
+            "memory_limit": memory_limit or settings.CONNECTOR_INTEGRATION_MEMORY_LIMIT,
+            "threads": threads or settings.CONNECTOR_INTEGRATION_THREADS,
+            "temp_directory": spill_path,
+        }
+    )
+
+
+def columnar_cache(path, connection):
+    """Parquet copy of the CSV or Excel file `path`, converted on first use."""
+    stat = os.stat(path)
+    key = hashlib.sha256(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:32]
+    cached = os.path.join(settings.CONNECTOR_CACHE_PATH, f"{key}.parquet")
+    if os.path.exists(cached):
+        return cached
+    os.makedirs(settings.CONNECTOR_CACHE_PATH, exist_ok=True)
+    if path.endswith(EXCEL_EXTENSIONS):
+        connection.register("excel_source", pd.read_excel(path))
+        source = "excel_source"
+    else:
+        source = f"read_csv({_literal(path)}, {CSV_OPTIONS})"
+    partial = f"{cached}.{os.getpid()}.tmp"
+    connection.execute(f"COPY (SELECT * FROM {source}) TO {_literal(partial)} (FORMAT parquet)")
+    if source == "excel_source":
+        connection.unregister("excel_source")
+    os.replace(partial, cached)
+    return cached
+
+
+class DatasetIntegration:
+    """
+    Join of the dataset files of the `maps` of a connector, see the module
+    docstring. `config` is the ``selected`` columns and their ``renames``
+    applied by `export`.
+    """
+
+    def __init__(self, maps, config=None, connection=None):
+        self.maps = maps
+        self.config = config or {}
+        self.connection = connection or connect()
+        self._query = None
+
+    @classmethod
+    def load(cls, path, connection=None):
+        with open(path, encoding="utf-8") as file:
+            plan = json.load(file)
+        return cls(plan["maps"], plan.get("config"), connection)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"maps": self.maps, "config": self.config}, file)
+
+    def _table(self, path, selected):
+        """(FROM item, columns) of a source file, the columns in file order like ``usecols``."""
+        cached = columnar_cache(source_file(path), self.connection)
+        columns = [row[0] for row in self.connection.execute(
+            f"DESCRIBE SELECT * FROM read_parquet({_literal(cached)})"
+        ).fetchall()]
+        if selected:
+            missing = [column for column in selected if column not in columns]
+            if missing:
+                raise ValueError(f"Usecols do not match columns, columns expected but not found: {missing}")
+            columns = [column for column in columns if column in selected]
+        return f"read_parquet({_literal(cached)}, file_row_number = true)", columns
+
+    def _plan(self):
+        """(columns: [(name, expression)], FROM clause, ORDER BY expressions) of the join."""
+        if self._query is not None:
+            return self._query
+        first = self.maps[0][Constants.CONDITION]
+        table, names = self._table(self.maps[0][Constants.LEFT_DATASET_FILE_PATH], first.get(Constants.LEFT_SELECTED))
+        columns = [(name, f"t0.{_quote(name)}") for name in names]
+        from_clause = f"{table} AS t0"
+        order = [f"t0.{ROW_NUMBER}"]
+        for number, integrate in enumerate(self.maps, start=1):
+            condition = integrate[Constants.CONDITION]
+            how = condition.get(Constants.HOW, Constants.LEFT)
+            alias = f"t{number}"
+            table, right_names = self._table(
+                integrate[Constants.RIGHT_DATASET_FILE_PATH], condition.get(Constants.RIGHT_SELECTED)
+            )
+            left_on, right_on = _as_list(condition.get(Constants.LEFT_ON)), _as_list(condition.get(Constants.RIGHT_ON))
+            if len(left_on) != len(right_on):
+                raise ValueError("len(right_on) must equal len(left_on)")
+            expressions = dict(columns)
+            unknown = [key for key in left_on if key not in expressions]
+            if unknown:
+                raise KeyError(", ".join(map(str, unknown)))
+            # null keys match each other, like in pandas
+            on = " AND ".join(
+                f"{expressions[left]} IS NOT DISTINCT FROM {alias}.{_quote(right)}" for left, right in zip(left_on, right_on)
+            )
+            merged_keys = {}
+            for left, right in zip(left_on, right_on):
+                if left == right:
+                    right_expression = f"{alias}.{_quote(right)}"
+                    merged_keys[left] = {
+                        "right": right_expression,
+                        "outer": f"COALESCE({expressions[left]}, {right_expression})",
+                    }.get(how, expressions[left])
+            columns = [(name, merged_keys.get(name, expression)) for name, expression in columns]
+            taken = {name for name, _ in columns}
+            for name in right_names:
+                if name in merged_keys:
+                    continue
+                columns.append((f"{name}_df{number}" if name in taken else name, f"{alias}.{_quote(name)}"))
+            if how not in JOINS:
+                raise ValueError(f"Unsupported join type: {how}")
+            join = JOINS[how]
+            from_clause += f" {join} {table} AS {alias} ON {on}"
+            row = f"{alias}.{ROW_NUMBER}"
+            if how == "right":
+                order = [row] + order
+            elif how == "outer":
+                # pandas sorts the keys of outer joins
+                keys = [f"COALESCE({expressions[left]}, {alias}.{_quote(right)})" for left, right in zip(left_on, right_on)]
+                order = keys + order + [row]
+            else:
+                order = order + [row]
+        self._query = (columns, from_clause, order)
+        return self._query
+
+    def _columns(self, apply_config=False):
+        """[(output name, expression)] of the join, with the selection and renames of the config if `apply_config`."""
+        columns, _, _ = self._plan()
+        if apply_config and self.config.get("selected"):
+            expressions = dict(columns)
+            unknown = [name for name in self.config["selected"] if name not in expressions]
+            if unknown:
+                raise KeyError(f"{unknown} not in index")
+            columns = [(name, expressions[name]) for name in self.config["selected"]]
+        renames = (self.config.get("renames") or {}) if apply_config else {}
+        return [(renames.get(name, name), expression) for name, expression in columns]
+
+    def preview(self, limit=20):
+        """First `limit` rows of the join as a DataFrame."""
+        _, from_clause, order = self._plan()
+        select = ", ".join(f"{expression} AS {_quote(name)}" for name, expression in self._columns())
+        order_by = ", ".join(f"{expression} NULLS LAST" for expression in order)
+        return self.connection.execute(f"SELECT {select} FROM {from_clause} ORDER BY {order_by} LIMIT {int(limit)}").df()
+
+    def count(self):
+        _, from_clause, _ = self._plan()
+        return self.connection.execute(f"SELECT count(*) FROM {from_clause}").fetchone()[0]
+
+    def export(self, path, apply_config=True):
+        """Write the join to the CSV `path`, with the selection and renames of the config."""
+        _, from_clause, order = self._plan()
+        columns = self._columns(apply_config)
+        order_columns = [f"{ROW_NUMBER}_{number}" for number in range(len(order))]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # the join is staged unordered first, its hash tables and the sort would not fit the memory limit together
+        staged = os.path.join(settings.CONNECTOR_CACHE_PATH, "spill", f"{uuid.uuid4().hex}.parquet")
+        partial = f"{path}.{os.getpid()}.tmp"
+        select = ", ".join(
+            [f"{expression} AS {_quote(name)}" for name, expression in columns]
+            + [f"{expression} AS {name}" for name, expression in zip(order_columns, order)]
+        )
+        try:
+            self.connection.execute(f"COPY (SELECT {select} FROM {from_clause}) TO {_literal(staged)} (FORMAT parquet)")
+            self.connection.execute(
+                f"COPY (SELECT {', '.join(_quote(name) for name, _ in columns)} FROM read_parquet({_literal(staged)}) "
+                f"ORDER BY {', '.join(f'{name} NULLS LAST' for name in order_columns)}) "
+                f"TO {_literal(partial)} (FORMAT csv, HEADER)"
+            )
+        finally:
+            if os.path.exists(staged):
+                os.remove(staged)
+        os.replace(partial, path)
+        return path
+
+def export_pending(temp_path, dest_path):
+    """
+    Write the integrated CSV of a connector being saved to `dest_path`: from the
+    plan of `temp_path` if the integration was not exported yet, else by moving
+    the CSV at `temp_path`.
+    """
+    pending = plan_path(temp_path)
+    if os.path.exists(pending):
+        DatasetIntegration.load(pending).export(dest_path)
+        os.remove(pending)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    elif os.path.exists(temp_path):
+        os.replace(temp_path, dest_path)
+
+
+def export_edited(file_path, edited_path, selected, renames=None):
+    """
+    Write the `selected` columns of the integrated CSV `file_path` (or of its
+    pending plan) to `edited_path`, renamed by `renames`, without loading it.
+    """
+    config = {"selected": selected, "renames": renames or {}}
+    pending = plan_path(file_path)
+    if os.path.exists(pending):
+        integration = DatasetIntegration.load(pending)
+        integration.config = config
+        return integration.export(edited_path)
+    connection = connect()
+    columns = [row[0] for row in connection.execute(
+        f"DESCRIBE SELECT * FROM read_csv({_literal(file_path)}, header = true, all_varchar = true)"
+    ).fetchall()]
+    unknown = [name for name in selected if name not in columns]
+    if unknown:
+        raise KeyError(f"{unknown} not in index")
+    select = ", ".join(f"{_quote(name)} AS {_quote(config['renames'].get(name, name))}" for name in selected)
+    # columns kept as text, the values are copied as they are
+    connection.execute(
+        f"COPY (SELECT {select} FROM read_csv({_literal(file_path)}, header = true, all_varchar = true)) "
+        f"TO {_literal(edited_path)} (FORMAT csv, HEADER)"
+    )
+    return edited_path
+
+
+def preview_file(file_path, limit=20):
+    """(first `limit` rows, row count) of an integrated CSV, read from its columnar cache."""
+    connection = connect()
+    source = f"read_parquet({_literal(columnar_cache(file_path, connection))})"
+    count = connection.execute(f"SELECT count(*) FROM {source}").fetchone()[0]
+    return connection.execute(f"SELECT * FROM {source} LIMIT {int(limit)}").df(), count
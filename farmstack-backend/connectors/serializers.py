@@ -6,6 +6,7 @@ from django.db.models import DEFERRED, Count, F, Q
 from rest_framework import serializers
 
 from accounts.models import User
+from connectors.integration import preview_file
 from connectors.models import Connectors, ConnectorsMap
 from core import settings
 from core.constants import Constants
@@ -108,11 +109,8 @@ class ConnectorsRetriveSerializer(serializers.ModelSerializer):
 
     def extract_data(self, connector):
         integrated_file = str(connector.integrated_file).replace("media/", "").replace("%20", " ")
-        df = pd.read_csv(os.path.join(settings.MEDIA_ROOT, integrated_file), 
-            ) if integrated_file else pd.DataFrame([])
-        no_of_records = len(df)
-        if no_of_records > 20:
-            df = df.iloc[:20]
+        df, no_of_records = preview_file(os.path.join(settings.MEDIA_ROOT, integrated_file)
+            ) if integrated_file else (pd.DataFrame([]), 0)
         data = json.loads(df.to_json(orient='table',index=False))
         data["no_of_records"] = no_of_records
         return data
@@ -0,0 +1,123 @@
+import io
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+from django.test import SimpleTestCase, override_settings
+
+from connectors.integration import DatasetIntegration, export_edited, export_pending, plan_path, preview_file
+
+FARMERS = pd.DataFrame(
+    {
+        "farmer_id": [3, 1, 2, None, 5],
+        "name": ["Asha", "Bilal", "Chen", "Dara", "Esi"],
+        "county": ["Meru", "Nakuru", "Meru", "Kisumu", "Nakuru"],
+    }
+)
+PLOTS = pd.DataFrame(
+    {
+        "farmer_id": [1, 1, 2, 4, None],
+        "crop_id": [10, 11, 10, 12, 11],
+        "county": ["Nakuru", "Nakuru", "Meru", "Kisumu", "Kisumu"],
+    }
+)
+CROPS = pd.DataFrame({"id": [10, 11, 12], "crop": ["maize", "beans", "tea"]})
+
+
+def integration_map(left, right, how, left_on, right_on, left_selected=None, right_selected=None):
+    condition = {"how": how, "left_on": left_on, "right_on": right_on}
+    if left_selected:
+        condition["left_selected"] = left_selected
+    if right_selected:
+        condition["right_selected"] = right_selected
+    return {"left_dataset_file_path": left, "right_dataset_file_path": right, "condition": condition}
+
+
+class TestDatasetIntegration(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(
+            DATASET_FILES_URL=self.directory,
+            CONNECTOR_CACHE_PATH=os.path.join(self.directory, "cache"),
+            CONNECTOR_INTEGRATION_MEMORY_LIMIT="256MB",
+            CONNECTOR_INTEGRATION_THREADS=1,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for name, frame in (("farmers.csv", FARMERS), ("plots.csv", PLOTS), ("crops.csv", CROPS)):
+            frame.to_csv(self.path(name), index=False)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def merged(self, maps):
+        """The former chained pd.merge of the maps"""
+        condition = maps[0]["condition"]
+        result = pd.read_csv(self.path(maps[0]["left_dataset_file_path"]), usecols=condition.get("left_selected"))
+        for number, integrate in enumerate(maps, start=1):
+            condition = integrate["condition"]
+            right = pd.read_csv(self.path(integrate["right_dataset_file_path"]), usecols=condition.get("right_selected"))
+            result = pd.merge(
+                result, right, how=condition["how"], left_on=condition["left_on"], right_on=condition["right_on"],
+                suffixes=("", f"_df{number}"),
+            )
+        return pd.read_csv(io.StringIO(result.to_csv(index=False)))
+
+    def assert_same_as_pandas(self, maps):
+        integration = DatasetIntegration(maps)
+        exported = pd.read_csv(integration.export(self.path("integrated.csv")))
+        expected = self.merged(maps)
+        pd.testing.assert_frame_equal(exported, expected, check_dtype=False)
+        assert integration.count() == len(expected)
+        preview = pd.read_csv(io.StringIO(integration.preview(3).to_csv(index=False)))
+        pd.testing.assert_frame_equal(preview, expected.iloc[:3], check_dtype=False)
+
+    def test_joins_match_chained_pandas_merges(self):
+        for first in ("left", "inner", "right", "outer"):
+            for second in ("left", "inner"):
+                with self.subTest(first=first, second=second):
+                    self.assert_same_as_pandas(
+                        [
+                            integration_map("farmers.csv", "plots.csv", first, ["farmer_id"], ["farmer_id"]),
+                            integration_map(None, "crops.csv", second, ["crop_id"], ["id"]),
+                        ]
+                    )
+
+    def test_selected_columns_and_suffixes(self):
+        self.assert_same_as_pandas(
+            [
+                integration_map(
+                    "farmers.csv", "plots.csv", "left", ["name"], ["county"],
+                    left_selected=["county", "name"], right_selected=["county", "crop_id"],
+                )
+            ]
+        )
+
+    def test_config_is_applied_at_export(self):
+        maps = [integration_map("farmers.csv", "plots.csv", "inner", ["farmer_id"], ["farmer_id"])]
+        integration = DatasetIntegration(maps, {"selected": ["crop_id", "name"], "renames": {"name": "farmer"}})
+        assert list(integration.preview().columns) == ["farmer_id", "name", "county", "crop_id", "county_df1"]
+        exported = pd.read_csv(integration.export(self.path("integrated.csv")))
+        # the missing farmer_id of Dara matches the missing one of a plot, like in pandas
+        assert exported.to_dict("list") == {"crop_id": [10, 11, 10, 11], "farmer": ["Bilal", "Bilal", "Chen", "Dara"]}
+
+    def test_pending_integration_is_exported_when_saved(self):
+        temp_path, dest_path = self.path("temp/connector.csv"), self.path("connectors/connector.csv")
+        maps = [integration_map("farmers.csv", "crops.csv", "left", ["farmer_id"], ["id"])]
+        DatasetIntegration(maps).save(plan_path(temp_path))
+
+        export_edited(temp_path, self.path("temp/connector_edited.csv"), ["name", "crop"], {"crop": "crop_name"})
+        edited = pd.read_csv(self.path("temp/connector_edited.csv"))
+        assert list(edited.columns) == ["name", "crop_name"]
+
+        os.makedirs(os.path.dirname(dest_path))
+        export_pending(temp_path, dest_path)
+        assert not os.path.exists(plan_path(temp_path))
+        preview, count = preview_file(dest_path, limit=2)
+        assert count == 5
+        assert preview["name"].tolist() == ["Asha", "Bilal"]
+
+        export_edited(dest_path, self.path("connectors/connector_edited.csv"), ["county"])
+        assert pd.read_csv(self.path("connectors/connector_edited.csv"))["county"].tolist() == FARMERS["county"].tolist()
@@ -1,10 +1,7 @@
 import json
 import logging
 import os
-import shutil
-from urllib.parse import unquote
 
-import pandas as pd
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
 from django.shortcuts import render
@@ -13,6 +10,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet, ViewSet
 
+from connectors.integration import DatasetIntegration, export_edited, export_pending, plan_path
 from connectors.models import Connectors, ConnectorsMap
 from connectors.serializers import (
     ConnectorsCreateSerializer,
@@ -47,8 +45,7 @@ class ConnectorsViewSet(GenericViewSet):
         temp_path = f"{settings.TEMP_CONNECTOR_URL}{data.get(Constants.NAME)}.csv"
         dest_path = f"{settings.CONNECTOR_FILES_URL}{data.get(Constants.NAME)}.csv"
         data.pop(Constants.INTEGRATED_FILE)
-        if os.path.exists(temp_path):
-            shutil.move(temp_path, dest_path)
+        export_pending(temp_path, dest_path)
         serializer = ConnectorsCreateSerializer(data=data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -90,8 +87,7 @@ class ConnectorsViewSet(GenericViewSet):
         temp_path = f"{settings.TEMP_CONNECTOR_URL}{data.get(Constants.NAME)}.csv"
         dest_path = f"{settings.CONNECTOR_FILES_URL}{data.get(Constants.NAME)}.csv"
         data.pop(Constants.INTEGRATED_FILE)
-        if os.path.exists(temp_path):
-            shutil.move(temp_path, dest_path)
+        export_pending(temp_path, dest_path)
         connector_serializer = ConnectorsCreateSerializer(instance, data=request.data, partial=True)
         connector_serializer.is_valid(raise_exception=True)
         connector_serializer.save()
@@ -134,16 +130,13 @@ class ConnectorsViewSet(GenericViewSet):
                 serializer.is_valid(raise_exception=True)
                 serializer.save()
                 file_path = permanent_path
-            if os.path.exists(temp_file_path):
+            if os.path.exists(temp_file_path) or os.path.exists(plan_path(temp_file_path)):
                 file_path = temp_file_path
-            integrated_file = str(file_path).replace("media/", "").replace("%20", " ")
-            df = pd.read_csv(os.path.join(settings.MEDIA_ROOT, integrated_file), 
-                ) if integrated_file else pd.DataFrame([])
-            df = df[request.data.get("config").get("selected")]
-            df.rename(columns=request.data.get("config").get("renames", {}), inplace=True)
-            # Save the updated DataFrame to the same CSV file
+            if not file_path:
+                raise FileNotFoundError("Integrated file not found")
+            config = request.data.get("config")
             edited_file_path = file_path.replace(".csv", "_edited.csv")
-            df.to_csv(edited_file_path, index=False)
+            export_edited(file_path, edited_file_path, config.get("selected"), config.get("renames", {}))
             return Response({"message": "File Updated Sucessfully",
                              "file_path":edited_file_path}, status=200)
         except ObjectDoesNotExist as e:
@@ -161,7 +154,9 @@ class ConnectorsViewSet(GenericViewSet):
         integrated_file = request.GET.get(Constants.INTEGRATED_FILE, '')
         if integrated_file:
             integrated_file = str(integrated_file).replace("media/", "").replace("%20", " ")
-            size = os.path.getsize(os.path.join(settings.MEDIA_ROOT, integrated_file))
+            integrated_path = os.path.join(settings.MEDIA_ROOT, integrated_file)
+            # a pending integration has no CSV yet
+            size = os.path.getsize(integrated_path) if os.path.exists(integrated_path) else 0
             if size > Constants.MAX_CONNECTOR_FILE:
                 return Response({f"Integrated data exceeds maximum limit: {size / 1000000} MB"}, status=500)
         if not request.GET.get(Constants.EDIT, False):
@@ -170,71 +165,18 @@ class ConnectorsViewSet(GenericViewSet):
         maps=json.loads(maps) if isinstance(maps, str)  else maps
         if not maps: 
             return Response({f"Minimum 2 datasets should select for integration"}, status=500)
-        integrate = maps[0]
         try:
-            left_dataset_file_path = unquote(integrate.get(Constants.LEFT_DATASET_FILE_PATH)
-                                             ).replace(Constants.SLASH_MEDIA_SLASH, "")
-            right_dataset_file_path = unquote(integrate.get(Constants.RIGHT_DATASET_FILE_PATH)
-                                              ).replace(Constants.SLASH_MEDIA_SLASH, "")
-            condition = integrate.get(Constants.CONDITION)
-
-            if left_dataset_file_path.endswith(".xlsx") or left_dataset_file_path.endswith(".xls"):
-                left_dataset = pd.read_excel(os.path.join(settings.DATASET_FILES_URL, left_dataset_file_path),
-                                             usecols=condition.get(Constants.LEFT_SELECTED))
-            else:
-                left_dataset = pd.read_csv(os.path.join(settings.DATASET_FILES_URL, left_dataset_file_path),
-                                           usecols=condition.get(Constants.LEFT_SELECTED))
-            if right_dataset_file_path.endswith(".xlsx") or right_dataset_file_path.endswith(".xls"):
-                right_dataset = pd.read_excel(os.path.join(settings.DATASET_FILES_URL, right_dataset_file_path),
-                                              usecols=condition.get(Constants.RIGHT_SELECTED))
-            else:
-                right_dataset = pd.read_csv(os.path.join(settings.DATASET_FILES_URL, right_dataset_file_path),
-                                            usecols=condition.get(Constants.RIGHT_SELECTED))
-            # Join the dataframes
-            result = pd.merge(
-                left_dataset,
-                right_dataset,
-                how=condition.get(Constants.HOW, Constants.LEFT),
-                left_on=condition.get(Constants.LEFT_ON),
-                right_on=condition.get(Constants.RIGHT_ON),
-                suffixes=("", "_df1")
-            )
-            print(result)
-            for i in range(1, len(maps)):
-                integrate = maps[i]
-                right_dataset_file_path = unquote(integrate.get(Constants.RIGHT_DATASET_FILE_PATH)
-                                                  ).replace(Constants.SLASH_MEDIA_SLASH, "")
-                condition = integrate.get(Constants.CONDITION)
-                if right_dataset_file_path.endswith(".xlsx") or right_dataset_file_path.endswith(".xls"):
-                    right_dataset = pd.read_excel(
-                        os.path.join(settings.DATASET_FILES_URL, right_dataset_file_path),
-                        usecols=condition.get(Constants.RIGHT_SELECTED)
-                    )
-                else:
-                    right_dataset = pd.read_csv(
-                        os.path.join(settings.DATASET_FILES_URL, right_dataset_file_path),
-                        usecols=condition.get(Constants.RIGHT_SELECTED)
-                    )
-                # Join the dataframes
-                print(f"_df{i+2}")
-
-                result = pd.merge(
-                    result,
-                    right_dataset,
-                    how=condition.get(Constants.HOW, Constants.LEFT),
-                    left_on=condition.get(Constants.LEFT_ON),
-                    right_on=condition.get(Constants.RIGHT_ON),
-                    suffixes=(f"", f"_df{i+1}")
-                )
-                print(result)
+            # one query over columnar copies of the files, the CSV is exported when the connector is saved
+            integration = DatasetIntegration(maps)
+            preview = integration.preview(20)
+            result_length = integration.count()
             name = data.get(Constants.NAME, Constants.CONNECTORS)
             file_path = f"{settings.TEMP_CONNECTOR_URL}{name}.csv"
-            result.to_csv(file_path, index=False)
-            result_length = len(result)
-            if result_length > 20:
-                result = result.iloc[:20]
+            integration.save(plan_path(file_path))
+            if os.path.exists(file_path):
+                os.remove(file_path)
             return Response({Constants.INTEGRATED_FILE: file_path,
-                             Constants.DATA: json.loads(result.to_json(orient='table', index=False)),
+                             Constants.DATA: json.loads(preview.to_json(orient='table', index=False)),
                              "no_of_records": result_length},
                             status=status.HTTP_200_OK)
         except Exception as e:
@@ -110,6 +110,13 @@ DATABASES = {
     }
 }
 
+# SQLAlchemy engine shared by the PGVector stores of a process (utils.pgvector.get_engine)
+PGVECTOR_ENGINE_ARGS = {
+    "pool_size": int(os.environ.get("PGVECTOR_POOL_SIZE", 5)),
+    "max_overflow": int(os.environ.get("PGVECTOR_MAX_OVERFLOW", 10)),
+    "pool_recycle": int(os.environ.get("PGVECTOR_POOL_RECYCLE", 1800)),
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -186,6 +193,10 @@ TEMP_CONNECTOR_PATH = os.path.join(BASE_DIR, "media/temp/connectors/")
 TEMP_CONNECTOR_URL = os.path.join(MEDIA_URL, "temp/connectors/")
 CONNECTOR_FILES_PATH = os.path.join(BASE_DIR, "media/connectors/")
 CONNECTOR_FILES_URL = os.path.join(MEDIA_URL, "connectors/")
+# Parquet copies of the files joined by connectors, and the memory budget of the joins (spilled to disk beyond)
+CONNECTOR_CACHE_PATH = os.path.join(BASE_DIR, "media/temp/connectors/cache/")
+CONNECTOR_INTEGRATION_MEMORY_LIMIT = os.environ.get("CONNECTOR_INTEGRATION_MEMORY_LIMIT", "1GB")
+CONNECTOR_INTEGRATION_THREADS = int(os.environ.get("CONNECTOR_INTEGRATION_THREADS", 4))
 STANDARDISED_FILES_PATH = os.path.join(PROTECTED_MEDIA_ROOT, "standardised/")
 STANDARDISED_FILES_URL = os.path.join(PROTECTED_MEDIA_URL, "standardised/")
 
@@ -220,7 +231,20 @@ MEDICAL_AI_SETTINGS = {
     'MODEL_PATH': os.path.join(MEDICAL_AI_MODELS, 'skin_disease_model_best.h5'),
     'IMG_SIZE': 224,
     'CONFIDENCE_THRESHOLD': 0.6,
-    'TESSERACT_PATH': r'C:\Program Files\Tesseract-OCR\tesseract.exe',  # Windows path
+    # Tesseract binary, e.g. C:\Program Files\Tesseract-OCR\tesseract.exe on Windows; looked up on PATH when unset
+    'TESSERACT_PATH': os.environ.get('MEDICAL_AI_TESSERACT_PATH'),
+    # Size of the OCR process pool (default min(4, cpu count)) and lifetime of cached OCR text
+    'OCR_WORKERS': int(os.environ.get('MEDICAL_AI_OCR_WORKERS', 0)) or None,
+    'OCR_CACHE_TIMEOUT': int(os.environ.get('MEDICAL_AI_OCR_CACHE_TIMEOUT', 7 * 24 * 3600)),
+    # Resident inference: keras, or onnx / tflite after `python medical_ai/inference.py --format ...`
+    'INFERENCE_BACKEND': os.environ.get('MEDICAL_AI_INFERENCE_BACKEND', 'keras'),
+    'ONNX_MODEL_PATH': os.path.join(MEDICAL_AI_MODELS, 'skin_disease_model_best.onnx'),
+    'TFLITE_MODEL_PATH': os.path.join(MEDICAL_AI_MODELS, 'skin_disease_model_best.tflite'),
+    'INFERENCE_THREADS': int(os.environ.get('MEDICAL_AI_INFERENCE_THREADS', 0)) or None,
+    'MAX_BATCH_SIZE': int(os.environ.get('MEDICAL_AI_MAX_BATCH_SIZE', 8)),
+    'MAX_BATCH_WAIT_MS': float(os.environ.get('MEDICAL_AI_MAX_BATCH_WAIT_MS', 10)),
+    # Load and warm up the model when the worker starts instead of on the first request
+    'PRELOAD_MODEL': os.environ.get('MEDICAL_AI_PRELOAD_MODEL', 'False').lower() == 'true',
 }
 
 # ============================================================
@@ -314,10 +338,15 @@ OTP_DURATION = 900
 OTP_LIMIT = 3
 USER_SUSPENSION_DURATION = 300
 
+# Redis shared by every worker, with dashboard responses and OCR text (immutable,
+# content-addressed keys) also kept in each process, see utils/tiered_cache.py
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
-        "LOCATION": os.path.join(BASE_DIR, "django_cache/"),
+        "BACKEND": "utils.tiered_cache.TieredRedisCache",
+        "LOCATION": os.environ.get(
+            "CACHE_REDIS_URL", f'redis://{os.environ.get("REDIS_SERVICE", "localhost")}:6379/1'
+        ),
+        "OPTIONS": {"LOCAL_KEY_PREFIXES": ["dashboard:response:", "medical_ai:ocr:"]},
     }
 }
 
@@ -415,9 +444,10 @@ CELERY_BROKER_URL = f'redis://{os.environ.get("REDIS_SERVICE", "localhost")}:637
 CELERY_RESULT_BACKEND = f'redis://{os.environ.get("REDIS_SERVICE", "localhost")}:6379/0'
 
 SMTP_SERVER = os.environ.get("SMTP_SERVER",'')
-SMTP_PORT = 587
+SMTP_PORT = int(os.environ.get("SMTP_PORT", 587))
 SMTP_USER = os.environ.get("SMTP_USER",'')
 SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD",'')
+SMTP_USE_TLS = os.environ.get("SMTP_USE_TLS", "true").lower() != "false"
 
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
@@ -428,6 +458,15 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'core.utils.fetch_data_for_all_datasets',
         'schedule': crontab(minute=0, hour=0),
     },
+    # emails whose drain task was lost or whose retry is due
+    'drain_email_outbox': {
+        'task': 'core.utils.drain_email_outbox',
+        'schedule': crontab(),
+    },
+    'purge_email_outbox': {
+        'task': 'core.utils.purge_email_outbox',
+        'schedule': crontab(minute=30, hour=0),
+    },
 }
 
 # ============================================================
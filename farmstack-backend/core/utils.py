@@ -4,14 +4,12 @@ import json
 import logging
 import os
 import secrets
-import smtplib
 import time
 import urllib
 import csv
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 from inspect import formatannotationrelativeto
 from urllib import parse
+from utils import dashboard_aggregates, dashboard_cache, dataset_preview, email_outbox
 from utils import file_operations as file_ops
 
 import pandas as pd
@@ -47,65 +45,16 @@ class Utils:
 
     def send_email(self, to_email: list, content=None, subject=None):
         """
-        This function gets the To mails list with content and subject
-        and sends the mail to respective recipiants. By default content and subject will be empty.
+        This function gets the To mails list with content and subject and writes
+        the mail to the outbox, it is sent by a Celery worker once the current
+        transaction commits (see utils.email_outbox). By default content and subject will be empty.
 
         Args:
             to_email (list): List of emails to send the Invitation.
             content (None, optional): _description_. Defaults to None.
             # subject (None, optional): _description_. Defaults to None.
         """
-        # content = Content("text/html", content)
-        # mail = Mail(FROM_EMAIL, to_email, subject, content, is_multiple=True)
-        # try:
-        #     SG.client.mail.send.post(request_body=mail.get())
-        # # except exceptions.BadRequestsError as error:
-        # except exceptions.UnauthorizedError as error:
-        #     LOGGER.error(
-        #         "Failed to send email Subject: %s with ERROR: %s",
-        #         subject,
-        #         error.body,
-        #         exc_info=True,
-        #     )
-        #     # type: ignore
-        #     return Response({"Error": "Failed to send email "}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        # except urllib.error.URLError as error:  # type: ignore
-        #     LOGGER.error(
-        #         "Failed to send email Subject: %s with ERROR: %s",
-        #         subject,
-        #         error,
-        #         exc_info=True,
-        #     )
-        #     # type: ignore
-        #     return Response({"Error": "Failed to send email "}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # return Response({"Message": "Email successfully sent!"}, status=status.HTTP_200_OK)
-        
-        # Create a MIME object
-        msg = MIMEMultipart()
-        msg['From'] = settings.SMTP_USER
-        msg['To'] = ", ".join(to_email) if isinstance(to_email, list) else to_email
-        msg['Subject'] = subject
-
-        # Attach the email content to the MIME object
-        msg.attach(MIMEText(content, 'html'))
-
-        try:
-            # Connect to the SMTP server
-            server = smtplib.SMTP(settings.SMTP_SERVER, settings.SMTP_PORT)
-            server.starttls()  # Secure the connection with TLS
-            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-
-            # Send the email
-            server.sendmail(settings.SMTP_USER, to_email, msg.as_string())
-
-            # Close the connection
-            server.quit()
-
-            print("Email successfully sent!")
-
-        except smtplib.SMTPException as e:
-            print(f"Failed to send email: {e}")
+        email_outbox.enqueue(to_email, content, subject)
 
 def replace_query_param(url, key, val, req):
     """
@@ -272,20 +221,59 @@ def generate_api_key(length=32):
     api_key = secrets.token_hex(length)
     return api_key
 
-def generate_hash_key_for_dashboard(pk, data, role_id=3, logged=False):
-    data["pk"] = pk
-    data["role_id"] = role_id
-    data["logged"] = logged
-    data_string = json.dumps(data)
-    # Create a hashlib SHA-256 hash object
-    # hash_obj = hashlib.sha256()
-    # # Update the hash object with the data as bytes
-    # hash_obj.update(data_string.encode('utf-8'))
-    # # Get the hexadecimal representation of the hash
-    # hash_key = hash_obj.hexdigest()
-    hash_key = hash(data_string)
-    print(hash_key)
-    return hash_key
+@shared_task
+def warm_dashboard_cache(dataset_file_id):
+    """
+    Pre-compute the dashboard cube of an uploaded dataset file and cache the
+    responses of the most requested filter combinations of its dataset type.
+    """
+    try:
+        dataset_file = DatasetV2File.objects.filter(id=dataset_file_id).first()
+        if not dataset_file:
+            return
+        file_name = str(dataset_file.file)
+        dataset_type = dashboard_cache.dataset_type_of(file_name)
+        if not dataset_type or not file_name.endswith((".csv", ".xls", ".xlsx")):
+            return
+        warmed = 0
+        for data in [{}] + dashboard_cache.popular_filters(dataset_type):
+            for filters in (True, False):
+                hash_key = dashboard_cache.dashboard_cache_key(
+                    str(dataset_file.id), data, dataset_type, file_name, filters)
+                dashboard_cache.set_response(
+                    hash_key, dashboard_aggregates.generate_dashboard(dataset_type, file_name, data, filters))
+                warmed += 1
+        LOGGER.info(f"Dashboard cache warmed with {warmed} entries for dataset file {dataset_file_id}")
+    except Exception as e:
+        LOGGER.error(f"Failed to warm dashboard cache for dataset file {dataset_file_id} ERROR: {e}", exc_info=True)
+
+@shared_task
+def index_dataset_file_preview(dataset_file_id):
+    """Extract the preview of a saved dataset file for the dataset detail views."""
+    try:
+        dataset_file = DatasetV2File.objects.select_related("preview").filter(id=dataset_file_id).first()
+        if dataset_file:
+            dataset_preview.index(dataset_file)
+    except Exception as e:
+        LOGGER.error(f"Failed to index the preview of dataset file {dataset_file_id} ERROR: {e}", exc_info=True)
+
+@shared_task(ignore_result=True)
+def drain_email_outbox():
+    """Send the due emails of the outbox over the SMTP connection of the worker."""
+    try:
+        sent = email_outbox.drain()
+        if sent:
+            LOGGER.info(f"{sent} emails sent from the outbox")
+    except Exception as e:
+        LOGGER.error(f"Failed to drain the email outbox ERROR: {e}", exc_info=True)
+
+@shared_task(ignore_result=True)
+def purge_email_outbox():
+    """Delete the emails of the outbox sent or dead-lettered past their retention period."""
+    try:
+        email_outbox.purge()
+    except Exception as e:
+        LOGGER.error(f"Failed to purge the email outbox ERROR: {e}", exc_info=True)
 
 @shared_task
 def fetch_data_for_all_datasets():
@@ -0,0 +1,34 @@
+# Generated by Django 4.1.5 on 2026-10-18 09:12
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datahub', '0085_alter_resourceusagepolicy_approval_status_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetV2FilePreview',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_path', models.CharField(max_length=2000)),
+                ('file_version', models.CharField(max_length=100)),
+                ('columns', models.JSONField(default=list)),
+                ('rows', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('dtypes', models.JSONField(default=dict)),
+                ('row_count', models.BigIntegerField(null=True)),
+                ('dataset_file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='preview', to='datahub.datasetv2file')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -1,3 +1,4 @@
+import logging
 import os
 import uuid
 from datetime import timedelta
@@ -6,8 +7,9 @@ from email.mime import application
 from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 from django.core.files.storage import Storage
-from django.db import models
-from django.db.models.signals import post_delete
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.text import Truncator
@@ -16,12 +18,15 @@ from pgvector.django import VectorField
 from accounts.models import User
 from core.base_models import TimeStampMixin
 from core.constants import Constants
+from utils import dashboard_cache
 from utils.validators import (
     validate_25MB_file_size,
     validate_file_size,
     validate_image_type,
 )
 
+LOGGER = logging.getLogger(__name__)
+
 
 def auto_str(cls):
     def __str__(self):
@@ -374,9 +379,58 @@ def delete_file_on_resourcefile_delete(sender, instance, **kwargs):
     if instance.file:
         instance.file.delete(save=False)
 
+@receiver(post_delete, sender=DatasetV2File)
+@receiver(post_save, sender=DatasetV2File)
+def invalidate_dashboard_cache_on_dataset_file_change(sender, instance, **kwargs):
+    dataset_type = dashboard_cache.dataset_type_of(instance.file)
+    if not dataset_type:
+        return
+    dashboard_cache.bump_generation(dataset_type)
+    if kwargs.get("created"):
+        transaction.on_commit(lambda: warm_dashboard_cache_for_dataset_file(instance.id))
+
+def warm_dashboard_cache_for_dataset_file(dataset_file_id):
+    from core.utils import warm_dashboard_cache
+
+    try:
+        warm_dashboard_cache.delay(str(dataset_file_id))
+    except Exception as error:
+        LOGGER.error(f"Failed to schedule dashboard cache warmup for {dataset_file_id} ERROR: {error}")
+
+@receiver(post_save, sender=DatasetV2File)
+def index_preview_on_dataset_file_save(sender, instance, **kwargs):
+    transaction.on_commit(lambda: index_preview_of_dataset_file(instance.id))
+
+def index_preview_of_dataset_file(dataset_file_id):
+    from core.utils import index_dataset_file_preview
+
+    try:
+        index_dataset_file_preview.delay(str(dataset_file_id))
+    except Exception as error:
+        LOGGER.error(f"Failed to schedule preview indexing for {dataset_file_id} ERROR: {error}")
+
 class DatasetV2FileReload(TimeStampMixin):
     dataset_file = models.ForeignKey(DatasetV2File, on_delete=models.CASCADE, related_name="dataset_file")
 
+class DatasetV2FilePreview(TimeStampMixin):
+    """
+    Header, first rows, dtypes and row count of the standardised file of a
+    :model:`datahub_datasetv2file`, extracted once by ``utils.dataset_preview``.
+
+    `file_path` and `file_version` (mtime and size) identify the file the preview
+    was extracted from, a preview of another path or version is stale. The rows
+    are stored unmasked, masking is applied when they are read.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    dataset_file = models.OneToOneField(DatasetV2File, on_delete=models.CASCADE, related_name="preview")
+    file_path = models.CharField(max_length=2000)
+    file_version = models.CharField(max_length=100)
+    columns = models.JSONField(default=list)
+    rows = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    dtypes = models.JSONField(default=dict)
+    row_count = models.BigIntegerField(null=True)
+
 class Category(TimeStampMixin):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=50)
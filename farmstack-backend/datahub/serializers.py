@@ -13,7 +13,7 @@ from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.core.files.base import ContentFile
 from django.core.validators import URLValidator
-from django.db.models import Count, Prefetch, Q
+from django.db.models import Manager, Prefetch
 from django.utils.translation import gettext as _
 from requests import Response
 from rest_framework import serializers, status
@@ -39,8 +39,8 @@ from datahub.models import (
     UserOrganizationMap,
 )
 from participant.models import Connectors, SupportTicket
+from utils import serializer_counts
 from utils.custom_exceptions import NotFoundException
-from utils.embeddings_creation import VectorDBBuilder
 from utils.file_operations import create_directory, move_directory
 from utils.string_functions import check_special_chars
 from utils.validators import (
@@ -145,6 +145,17 @@ class UserOrganizationMapSerializer(serializers.ModelSerializer):
         # exclude = Constants.EXCLUDE_DATES
 
 
+class ContentFilesCountListSerializer(serializers.ListSerializer):
+    """Counts the content files of all the rows in one query, with the `content_files_counts` of the child."""
+
+    def to_representation(self, data):
+        rows = list(data.all() if isinstance(data, Manager) else data)
+        counts = self.child.content_files_counts(rows)
+        for row in rows:
+            row.content_files_count = counts[row.id]
+        return super().to_representation(rows)
+
+
 class ParticipantSerializer(serializers.ModelSerializer):
     user_id = serializers.PrimaryKeyRelatedField(
         queryset=models.User.objects.all(),
@@ -170,29 +181,31 @@ class ParticipantSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserOrganizationMap
         exclude = Constants.EXCLUDE_DATES
+        list_serializer_class = ContentFilesCountListSerializer
 
     dataset_count = serializers.SerializerMethodField(method_name="get_dataset_count")
     content_files_count = serializers.SerializerMethodField(method_name="get_content_files_count")
     connector_count = serializers.SerializerMethodField(method_name="get_connector_count")
     number_of_participants = serializers.SerializerMethodField()
+    content_files_counts = staticmethod(serializer_counts.participant_content_files_counts)
 
     def get_dataset_count(self, user_org_map):
-        return DatasetV2.objects.filter(user_map_id=user_org_map.id, is_temp=False).count()
-    
+        return serializer_counts.annotated(
+            user_org_map, "dataset_count", serializer_counts.participant_datasets(user_org_map.id)
+        )
+
     def get_content_files_count(self, user_org_map):
-        return ResourceFile.objects.select_related("resource").filter(
-            Q(resource__user_map_id=user_org_map.id) |
-            Q(resource__user_map__user__on_boarded_by=user_org_map.user_id)
-                            ).values('type').annotate(count=Count('type'))
+        if hasattr(user_org_map, "content_files_count"):
+            return user_org_map.content_files_count
+        return serializer_counts.files_per_type(serializer_counts.participant_content_files(user_org_map))
     def get_connector_count(self, user_org_map):
-        return Connectors.objects.filter(user_map_id=user_org_map.id).count()
+        return serializer_counts.annotated(
+            user_org_map, "connector_count", serializer_counts.participant_connectors(user_org_map.id)
+        )
 
     def get_number_of_participants(self, user_org_map):
-        return (
-            UserOrganizationMap.objects.select_related(Constants.USER, Constants.ORGANIZATION)
-            .filter(user__status=True, user__on_boarded_by=user_org_map.user.id, user__role=3)
-            .all()
-            .count()
+        return serializer_counts.annotated(
+            user_org_map, "number_of_participants", serializer_counts.onboarded_participants(user_org_map.user_id)
         )
 
 
@@ -458,22 +471,12 @@ class RecentDatasetListSerializer(serializers.ModelSerializer):
     activity = serializers.SerializerMethodField(method_name="get_activity")
 
     def get_connector_count(self, datasets_queryset):
-        return Connectors.objects.filter(status=True, dataset_id=datasets_queryset.id).count()
+        return serializer_counts.annotated(
+            datasets_queryset, "connector_count", serializer_counts.dataset_connectors(datasets_queryset.id)
+        )
 
     def get_activity(self, datasets_queryset):
-        try:
-            datasets_queryset = Datasets.objects.filter(status=True, id=datasets_queryset.id)
-            if datasets_queryset:
-                if datasets_queryset.first().status == True:
-                    return Constants.ACTIVE
-                else:
-                    return Constants.NOT_ACTIVE
-            else:
-                return Constants.NOT_ACTIVE
-        except Exception as error:
-            LOGGER.error(error, exc_info=True)
-
-        return None
+        return Constants.ACTIVE if datasets_queryset.status else Constants.NOT_ACTIVE
 
 
 class DatasetV2Validation(serializers.Serializer):
@@ -946,12 +949,14 @@ class micrositeOrganizationSerializer(serializers.ModelSerializer):
     users_count = serializers.SerializerMethodField(method_name="get_users_count")
 
     def get_dataset_count(self, user_org_map):
-        return DatasetV2.objects.filter(user_map__organization=user_org_map.organization.id, is_temp=False).count()
+        return serializer_counts.annotated(
+            user_org_map, "dataset_count", serializer_counts.organization_datasets(user_org_map.organization_id)
+        )
 
     def get_users_count(self, user_org_map):
-        return UserOrganizationMap.objects.filter(
-            user__status=True, organization_id=user_org_map.organization.id
-        ).count()
+        return serializer_counts.annotated(
+            user_org_map, "users_count", serializer_counts.organization_users(user_org_map.organization_id)
+        )
 
 
 class StandardisationTemplateViewSerializer(serializers.ModelSerializer):
@@ -1158,6 +1163,7 @@ class ResourceSerializer(serializers.ModelSerializer):
     )
     user = UserSerializer(allow_null=True, required=False, read_only=True, source="user_map.user")
     content_files_count = serializers.SerializerMethodField(method_name="get_content_files_count")
+    content_files_counts = staticmethod(serializer_counts.resource_content_files_counts)
 
     class Meta:
         model = Resource
@@ -1179,6 +1185,7 @@ class ResourceSerializer(serializers.ModelSerializer):
             "files",
             "country"
         )
+        list_serializer_class = ContentFilesCountListSerializer
     
     def get_categories(self, instance):
         category_and_sub_category = Category.objects.prefetch_related(
@@ -1193,7 +1200,9 @@ class ResourceSerializer(serializers.ModelSerializer):
         return serializer.data
     
     def get_content_files_count(self, resource):
-        return ResourceFile.objects.filter(resource=resource.id).values('type').annotate(count=Count('type'))
+        if hasattr(resource, "content_files_count"):
+            return resource.content_files_count
+        return serializer_counts.files_per_type(ResourceFile.objects.filter(resource=resource.id))
     
     def construct_file_path(self, instance, filename):
         # Generate a unique string to append to the filename
@@ -1429,6 +1438,7 @@ class ResourceAutoCatSerializer(serializers.ModelSerializer):
     )
     user = UserSerializer(allow_null=True, required=False, read_only=True, source="user_map.user")
     content_files_count = serializers.SerializerMethodField(method_name="get_content_files_count")
+    content_files_counts = staticmethod(serializer_counts.resource_content_files_counts)
 
     class Meta:
         model = Resource
@@ -1450,6 +1460,7 @@ class ResourceAutoCatSerializer(serializers.ModelSerializer):
             "files",
             "country"
         )
+        list_serializer_class = ContentFilesCountListSerializer
     
     def get_categories(self, instance):
         category_and_sub_category = Category.objects.prefetch_related(
@@ -1464,7 +1475,9 @@ class ResourceAutoCatSerializer(serializers.ModelSerializer):
         return serializer.data
     
     def get_content_files_count(self, resource):
-        return ResourceFile.objects.filter(resource=resource.id).values('type').annotate(count=Count('type'))
+        if hasattr(resource, "content_files_count"):
+            return resource.content_files_count
+        return serializer_counts.files_per_type(ResourceFile.objects.filter(resource=resource.id))
     
     def construct_file_path(self, filename):
         # Generate a unique string to append to the filename
@@ -1524,30 +1537,32 @@ class ParticipantCostewardSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserOrganizationMap
         exclude = Constants.EXCLUDE_DATES
+        list_serializer_class = ContentFilesCountListSerializer
 
     dataset_count = serializers.SerializerMethodField(method_name="get_dataset_count")
     content_files_count = serializers.SerializerMethodField(method_name="get_content_files_count")
     connector_count = serializers.SerializerMethodField(method_name="get_connector_count")
     number_of_participants = serializers.SerializerMethodField()
+    content_files_counts = staticmethod(serializer_counts.participant_content_files_counts)
 
     def get_dataset_count(self, user_org_map):
-        return DatasetV2.objects.filter(user_map_id=user_org_map.id, is_temp=False).count()
-    
+        return serializer_counts.annotated(
+            user_org_map, "dataset_count", serializer_counts.participant_datasets(user_org_map.id)
+        )
+
     def get_content_files_count(self, user_org_map):
-        return ResourceFile.objects.select_related("resource").filter(
-            Q(resource__user_map_id=user_org_map.id) |
-            Q(resource__user_map__user__on_boarded_by=user_org_map.user_id)
-                            ).values('type').annotate(count=Count('type'))
+        if hasattr(user_org_map, "content_files_count"):
+            return user_org_map.content_files_count
+        return serializer_counts.files_per_type(serializer_counts.participant_content_files(user_org_map))
  
     def get_connector_count(self, user_org_map):
-        return Connectors.objects.filter(user_map_id=user_org_map.id).count()
+        return serializer_counts.annotated(
+            user_org_map, "connector_count", serializer_counts.participant_connectors(user_org_map.id)
+        )
 
     def get_number_of_participants(self, user_org_map):
-        return (
-            UserOrganizationMap.objects.select_related(Constants.USER, Constants.ORGANIZATION)
-            .filter(user__status=True, user__on_boarded_by=user_org_map.user.id, user__role=3)
-            .all()
-            .count()
+        return serializer_counts.annotated(
+            user_org_map, "number_of_participants", serializer_counts.onboarded_participants(user_org_map.user_id)
         )
 
 class ResourceUsagePolicySerializer(serializers.ModelSerializer):
@@ -1601,13 +1616,17 @@ class ResourceListSerializer(serializers.ModelSerializer):
     )
     user = UserSerializer(allow_null=True, required=False, read_only=True, source="user_map.user")
     content_files_count = serializers.SerializerMethodField(method_name="get_content_files_count")
+    content_files_counts = staticmethod(serializer_counts.resource_content_files_counts)
 
     class Meta:
         model = Resource
         fields = "__all__"
+        list_serializer_class = ContentFilesCountListSerializer
    
     def get_content_files_count(self, resource):
-        return ResourceFile.objects.filter(resource=resource.id).values('type').annotate(count=Count('type'))
+        if hasattr(resource, "content_files_count"):
+            return resource.content_files_count
+        return serializer_counts.files_per_type(ResourceFile.objects.filter(resource=resource.id))
 
    
 class CategorySubcategoryInputSerializer(serializers.Serializer):
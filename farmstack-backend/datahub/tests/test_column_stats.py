@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from utils.column_stats import ColumnStatsEngine, value_counts_by
+from utils.file_operations import process_column
+
+
+class TestColumnStats(SimpleTestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            "Subcounty": ["B", "A", "A", None, "B", "A"],
+            "vc": ["Maize", "Beans", "N/A", "Maize", np.nan, "Maize"],
+            "Telephone": ["1", "2", "2", "3", "1", "4"],
+        })
+        self.engine = ColumnStatsEngine(max_workers=1)
+
+    def test_value_counts_by_skips_missing_values_and_groups(self):
+        assert value_counts_by(self.df["vc"], self.df["Subcounty"]) == {
+            "A": {"Beans": 1, "Maize": 1},
+            "B": {"Maize": 1},
+        }
+
+    def test_process_column_leaves_the_frame_untouched(self):
+        original = self.df.copy()
+        process_column(self.df, "vc", "Subcounty")
+        pd.testing.assert_frame_equal(self.df, original)
+
+    def test_weighted_counts(self):
+        counts = value_counts_by(["x", "y", "x"], ["g", "g", "g"], weights=[2, 1, 3])
+        assert counts == {"g": {"x": 5, "y": 1}}
+
+    def test_unique_counts_and_values(self):
+        assert self.engine.unique_counts(self.df, ["Telephone", "Subcounty"]) == {"Telephone": 4, "Subcounty": 3}
+        assert self.engine.unique_values(self.df, ["Telephone"])["Telephone"].tolist() == ["1", "2", "3", "4"]
+
+    def test_unknown_columns_fall_back_per_column(self):
+        result = self.engine.value_counts_by(self.df, ["vc", "missing"], "Subcounty")
+        assert result["missing"] == ""
+        assert result["vc"]["B"] == {"Maize": 1}
+        assert self.engine.unique_counts(self.df, ["missing"]) == {"missing": 0}
+
+    def test_process_pool_matches_inline(self):
+        pooled = ColumnStatsEngine(max_workers=2, process_threshold=0)
+        try:
+            assert pooled.value_counts_by(self.df, ["vc", "Telephone"], "Subcounty") == (
+                self.engine.value_counts_by(self.df, ["vc", "Telephone"], "Subcounty")
+            )
+            # workers are spawned, not forked from a process holding connections and threads
+            assert pooled._pool._mp_context.get_start_method() == "spawn"
+        finally:
+            pooled.shutdown()
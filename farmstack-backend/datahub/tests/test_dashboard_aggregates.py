@@ -0,0 +1,87 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from utils import dashboard_aggregates
+from utils.synthetic_datasets import kiamis_frame
+
+
+class TestDashboardCube(SimpleTestCase):
+    def setUp(self):
+        self.df = kiamis_frame()
+        self.cube = dashboard_aggregates.build_kiamis_cube(self.df)
+
+    def expected_rows(self, county=(), gender=(), value_chain=()):
+        df = self.df.copy()
+        df["Gender"] = df["Gender"].astype(str).map(dashboard_aggregates.GENDER_CHANGES)
+        if county:
+            df = df[df["County"].isin(county)]
+        if gender:
+            df = df[df["Gender"].isin(gender)]
+        if value_chain:
+            df = df[df[list(value_chain)].notna().any(axis=1)]
+        return df
+
+    def test_cube_answers_filter_combinations_like_the_raw_frame(self):
+        for data in [{}, {"county": ["MERU"]}, {"gender": ["FEMALE"], "value_chain": ["Beans", "Millet"]}]:
+            expected = self.expected_rows(data.get("county", []), data.get("gender", []), data.get("value_chain", []))
+            result = dashboard_aggregates.render_kiamis_dashboard(self.cube, data)
+            assert result["total_number_of_records"] == len(expected)
+            assert result["male_count"] == (expected["Gender"] == "MALE").sum()
+            assert result["farmer_mobile_numbers"] == expected["farmer_mobile_number"].nunique()
+            assert result["constituencies"] == expected["Constituency"].nunique()
+            assert result["farming_practices"]["crop_production"] == (
+                expected[expected["Crop Production"] == 1]["Gender"].value_counts().to_dict()
+            )
+            cows = expected[["Other Dual Cattle", "Cross breed Cattle", "Cattle boma"]].sum(axis=1)
+            assert result["livestock_and_poultry_production"]["cows"] == (
+                cows.groupby(expected["Gender"]).sum().astype(int).to_dict()
+            )
+
+    def test_merged_chunks_match_single_cube(self):
+        first = dashboard_aggregates.build_kiamis_cube(self.df.iloc[:250])
+        second = dashboard_aggregates.build_kiamis_cube(self.df.iloc[250:])
+        merged = first.merge(second)
+        data = {"county": ["KIAMBU", "NAKURU"], "value_chain": ["Cassava"]}
+        assert dashboard_aggregates.render_kiamis_dashboard(merged, data, True) == (
+            dashboard_aggregates.render_kiamis_dashboard(self.cube, data, True)
+        )
+
+    def test_filters_are_listed_only_when_requested(self):
+        assert dashboard_aggregates.render_kiamis_dashboard(self.cube, {})["filters"] == {}
+        filters = dashboard_aggregates.render_kiamis_dashboard(self.cube, {}, True)["filters"]
+        assert sorted(filters["gender"]) == ["FEMALE", "MALE"]
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestDashboardCubeBuild(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        dashboard_aggregates._RESIDENT_CUBES.clear()
+
+    def test_concurrent_requests_build_a_cube_once(self):
+        cube = dashboard_aggregates.build_kiamis_cube(kiamis_frame(50))
+
+        def slow_build(dataset_type, file_path):
+            time.sleep(0.05)
+            return cube
+
+        with mock.patch.object(dashboard_aggregates, "dataset_file_version", return_value="1"), mock.patch.object(
+            dashboard_aggregates, "build_dashboard_cube", side_effect=slow_build
+        ) as build:
+            results = []
+
+            def request():
+                results.append(dashboard_aggregates.get_dashboard_cube("kiamis", "k.csv"))
+
+            requests = [threading.Thread(target=request) for _ in range(8)]
+            for request in requests:
+                request.start()
+            for request in requests:
+                request.join()
+        assert build.call_count == 1
+        assert len(results) == 8 and all(len(result.cells) == len(cube.cells) for result in results)
+        assert dashboard_aggregates._BUILD_LOCKS == {}
@@ -0,0 +1,116 @@
+import threading
+from unittest import mock
+
+import fakeredis
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from accounts.models import User, UserRole
+from datahub.models import DatasetV2, DatasetV2File, Organization, UserOrganizationMap
+from utils import dashboard_cache
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+REDIS_CACHE = {
+    "default": {
+        "BACKEND": "utils.tiered_cache.TieredRedisCache",
+        "LOCATION": "redis://dashboard-cache-tests:6379/1",
+        "OPTIONS": {"connection_class": fakeredis.FakeConnection, "server": fakeredis.FakeServer()},
+    }
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TestDashboardCache(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_key_is_canonical_and_leaves_request_data_untouched(self):
+        data = {"county": ["MERU", "NAKURU"], "gender": [], "sub_county": None}
+        key = dashboard_cache.dashboard_cache_key("pk-1", data, "kiamis", "kiamis.csv", True)
+        assert data == {"county": ["MERU", "NAKURU"], "gender": [], "sub_county": None}
+        assert key == dashboard_cache.dashboard_cache_key("pk-1", {"county": ["NAKURU", "MERU"]}, "kiamis", "kiamis.csv", True)
+        assert key != dashboard_cache.dashboard_cache_key("pk-1", data, "kiamis", "kiamis.csv", False)
+        assert key != dashboard_cache.dashboard_cache_key("pk-2", data, "kiamis", "kiamis.csv", True)
+
+    def test_bump_generation_invalidates_keys_of_the_dataset_type(self):
+        kiamis = dashboard_cache.dashboard_cache_key("pk-1", {}, "kiamis", "kiamis.csv")
+        omfp = dashboard_cache.dashboard_cache_key("pk-2", {}, "omfp", "omfp.csv")
+        dashboard_cache.bump_generation("kiamis")
+        assert kiamis != dashboard_cache.dashboard_cache_key("pk-1", {}, "kiamis", "kiamis.csv")
+        assert omfp == dashboard_cache.dashboard_cache_key("pk-2", {}, "omfp", "omfp.csv")
+
+    def test_stats_count_hits_and_misses_per_dataset_type(self):
+        key = dashboard_cache.dashboard_cache_key("pk-1", {}, "fsp", "fsp.csv")
+        assert dashboard_cache.get_response(key, "fsp") is None
+        dashboard_cache.set_response(key, {"type": "fsp"})
+        assert dashboard_cache.get_response(key, "fsp") == {"type": "fsp"}
+        other = dashboard_cache.dashboard_cache_key("pk-2", {}, "fsp", "fsp.csv")
+        compute = mock.Mock(return_value={"type": "fsp", "pk": 2})
+        assert dashboard_cache.get_or_compute(other, "fsp", compute) == {"type": "fsp", "pk": 2}
+        assert dashboard_cache.get_or_compute(other, "fsp", compute) == {"type": "fsp", "pk": 2}
+        compute.assert_called_once()
+        stats = dashboard_cache.stats()
+        assert stats["fsp"]["hits"] == 2
+        assert stats["fsp"]["misses"] == 2
+        assert stats["kiamis"]["hits"] == 0
+
+    def test_popular_filters_are_ranked_by_requests(self):
+        for _ in range(3):
+            dashboard_cache.record_filters("knfd", {"county": ["A"]})
+        dashboard_cache.record_filters("knfd", {"gender": ["MALE"]})
+        assert dashboard_cache.popular_filters("knfd") == [{"county": ["A"]}, {"gender": ["MALE"]}]
+
+    def test_dataset_type_is_read_from_the_file_name(self):
+        assert dashboard_cache.dataset_type_of("Kenya/file/KIAMIS_2023.csv") == "kiamis"
+        assert dashboard_cache.dataset_type_of("other.csv") is None
+
+
+@override_settings(CACHES=REDIS_CACHE)
+class TestDashboardCacheOnRedis(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_popular_filters_are_ranked_by_requests(self):
+        for _ in range(3):
+            dashboard_cache.record_filters("knfd", {"county": ["A"]})
+        dashboard_cache.record_filters("knfd", {"gender": ["MALE"]})
+        assert dashboard_cache.popular_filters("knfd") == [{"county": ["A"]}, {"gender": ["MALE"]}]
+
+    def test_concurrent_requests_are_all_counted(self):
+        def requests():
+            for _ in range(50):
+                dashboard_cache.record_filters("kiamis", {"county": ["MERU"]})
+
+        workers = [threading.Thread(target=requests) for _ in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        dashboard_cache.record_filters("kiamis", {})
+        assert dashboard_cache.popular_filters("kiamis") == [{"county": ["MERU"]}, {}]
+        client, key = dashboard_cache._redis("dashboard:popular:kiamis")
+        assert client.zscore(key, dashboard_cache.canonical_filters({"county": ["MERU"]})) == 400
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TestDashboardCacheWarmup(TestCase):
+    def setUp(self):
+        cache.clear()
+        UserRole.objects.create(id=1, role_name="datahub_admin")
+        user = User.objects.create(email="admin@dg.org", role_id=1)
+        organization = Organization.objects.create(name="dg", org_email="admin@dg.org", address="{}")
+        user_map = UserOrganizationMap.objects.create(user=user, organization=organization)
+        self.dataset = DatasetV2.objects.create(name="kiamis", user_map=user_map, is_temp=False)
+
+    @mock.patch("datahub.models.index_preview_of_dataset_file")
+    @mock.patch("datahub.models.warm_dashboard_cache_for_dataset_file")
+    def test_only_uploaded_files_are_warmed(self, warm, index_preview):
+        with self.captureOnCommitCallbacks(execute=True):
+            dataset_file = DatasetV2File.objects.create(dataset=self.dataset, file="KIAMIS_2023.csv", source="file")
+        warm.assert_called_once_with(dataset_file.id)
+        assert dashboard_cache.generation("kiamis") == 1
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dataset_file.save()
+        warm.assert_called_once()
+        assert dashboard_cache.generation("kiamis") == 2
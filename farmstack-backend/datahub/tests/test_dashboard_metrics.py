@@ -0,0 +1,118 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import User, UserRole
+from connectors.models import Connectors, ConnectorsMap
+from datahub.models import Datasets, DatasetV2, DatasetV2File, Organization, UserOrganizationMap
+from participant.models import SupportTicket
+from utils import dashboard_metrics
+
+
+def create_user_map(email, role, on_boarded_by=None):
+    user = User.objects.create(email=email, role_id=role, on_boarded_by=on_boarded_by)
+    organization = Organization.objects.create(name=f"{email} org", org_email=email, address="{}")
+    return UserOrganizationMap.objects.create(user=user, organization=organization)
+
+
+def create_dataset(user_map, name, categories, state="Kenya", files=1):
+    dataset = DatasetV2.objects.create(
+        name=name,
+        user_map=user_map,
+        category={category: ["sub category"] for category in categories},
+        geography={"state": {"name": state}},
+        is_temp=False,
+    )
+    for number in range(files):
+        DatasetV2File.objects.create(dataset=dataset, file=f"{name}/file/{number}.csv", file_size=100, source="file")
+    return dataset
+
+
+def create_connector(user, name, left, right):
+    connector = Connectors.objects.create(user=user, name=name, description=name)
+    left_file, right_file = left.datasets.first(), right.datasets.first()
+    return ConnectorsMap.objects.create(connectors=connector, left_dataset_file=left_file, right_dataset_file=right_file)
+
+
+def dataset_query(on_boarded_by=None):
+    query = DatasetV2.objects.exclude(is_temp=True)
+    if on_boarded_by:
+        return query.filter(user_map__user__on_boarded_by=on_boarded_by)
+    return query.filter(user_map__user__on_boarded_by=None).exclude(user_map__user__role_id=6)
+
+
+class TestDashboardMetrics(TestCase):
+    def setUp(self):
+        for role, name in ((1, "datahub_admin"), (3, "datahub_participant_root"), (6, "datahub_co_steward")):
+            UserRole.objects.create(id=role, role_name=name)
+        self.admin = create_user_map("admin@dg.org", 1)
+        self.participant = create_user_map("participant@dg.org", 3)
+        self.co_steward = create_user_map("steward@dg.org", 6)
+        create_user_map("onboarded@dg.org", 3, on_boarded_by=self.co_steward.user)
+
+        self.crops = create_dataset(self.admin, "crops", ["Crops", "Soil"], files=2)
+        self.soil = create_dataset(self.admin, "soil", ["Soil"], state="Uganda")
+        self.farmers = create_dataset(self.participant, "farmers", ["Crops", "Livestock"])
+        create_dataset(self.co_steward, "steward", ["Weather"])
+        create_connector(self.admin.user, "admin connector", self.crops, self.farmers)
+        create_connector(self.participant.user, "participant connector", self.farmers, self.soil)
+
+    def test_participant_metrics(self):
+        assert dashboard_metrics.participant_metrics("None", "1", self.admin.user_id) == {
+            "co_steward_count": 1,
+            "participants_count": 1,
+        }
+        assert dashboard_metrics.participant_metrics("None", "6", self.co_steward.user_id) == {"participants_count": 1}
+
+    def test_dataset_metrics(self):
+        metrics = dashboard_metrics.dataset_metrics(dataset_query())
+        assert metrics["dataset_file_metrics"] == [
+            {"datasets__source": "file", "dataset_count": 3, "file_count": 4, "total_size": 400}
+        ]
+        assert sorted(metrics["dataset_state_metrics"], key=lambda state: state["state_name"]) == [
+            {"state_name": "Kenya", "dataset_count": 2},
+            {"state_name": "Uganda", "dataset_count": 1},
+        ]
+        assert metrics["total_dataset_count"] == 3
+        assert metrics["dataset_category_metrics"] == {"Crops": 2, "Livestock": 1, "Soil": 2}
+
+    def test_connector_metrics(self):
+        assert dashboard_metrics.connector_metrics(dataset_query(), self.admin.user_id, self.admin.id) == {
+            "total_connectors_count": 1,
+            "other_datasets_used_in_my_connectors": 1,
+            "my_dataset_used_in_connectors": 2,
+        }
+        assert dashboard_metrics.connector_metrics(dataset_query(), self.co_steward.user_id, self.co_steward.id) == {
+            "total_connectors_count": 0,
+            "other_datasets_used_in_my_connectors": 0,
+            "my_dataset_used_in_connectors": 0,
+        }
+
+    def test_legacy_category_and_ticket_metrics(self):
+        for category in ({"Crops": True, "Soil": False}, {"Crops": True, "Soil": 1, "Water": False}, ["Crops"]):
+            Datasets.objects.create(
+                user_map=self.admin, name=str(category), description="", category=category, geography="", status=True
+            )
+        assert dashboard_metrics.category_counts(Datasets.objects.filter(status=True), true_values=True) == {
+            "Crops": 2,
+            "Soil": 1,
+            "Water": 0,
+        }
+        for state in ("open", "open", "hold"):
+            SupportTicket.objects.create(user_map=self.admin, category="others", subject="", status=state)
+        assert dashboard_metrics.support_ticket_metrics() == {"open_requests": 2, "closed_requests": 0, "hold_requests": 1}
+
+    def test_statements_do_not_grow_with_categories_or_connectors(self):
+        def statements():
+            with CaptureQueriesContext(connection) as queries:
+                dashboard_metrics.participant_metrics("None", "1", self.admin.user_id)
+                dashboard_metrics.dataset_metrics(dataset_query())
+                dashboard_metrics.connector_metrics(dataset_query(), self.admin.user_id, self.admin.id)
+            return len(queries)
+
+        before = statements()
+        for number in range(20):
+            dataset = create_dataset(self.admin, f"dataset {number}", [f"Category {number}", f"Other {number}"])
+            create_connector(self.admin.user, f"connector {number}", dataset, self.farmers)
+        assert len(dashboard_metrics.dataset_metrics(dataset_query())["dataset_category_metrics"]) == 43
+        assert statements() == before == 5
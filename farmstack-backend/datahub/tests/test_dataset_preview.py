@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import pandas as pd
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+
+from accounts.models import User, UserRole
+from datahub.models import DatasetV2, DatasetV2File, DatasetV2FilePreview, Organization, UserOrganizationMap
+from utils import dataset_preview
+
+FARMERS = pd.DataFrame(
+    {
+        "farmer": ["Amina", "Bilal", "Chen", "Dara", "Esi"],
+        "phone": ["0711", "0722", "0733", "0744", "0755"],
+        "acres": [1.5, None, 3.0, 4.5, 2.0],
+        "crops": [2, 1, 3, 1, 2],
+    }
+)
+
+
+class TestDatasetPreview(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(DATASET_FILES_URL=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        UserRole.objects.create(id=1, role_name="datahub_admin")
+        user = User.objects.create(email="admin@dg.org", role_id=1)
+        organization = Organization.objects.create(name="dg", org_email="admin@dg.org", address="{}")
+        user_map = UserOrganizationMap.objects.create(user=user, organization=organization)
+        self.dataset = DatasetV2.objects.create(name="farmers", user_map=user_map, is_temp=False)
+
+    def create_file(self, name, frame, masked=()):
+        path = os.path.join(self.directory, name)
+        if name.endswith(".csv"):
+            frame.to_csv(path, index=False)
+        else:
+            frame.to_excel(path, index=False)
+        return DatasetV2File.objects.create(
+            dataset=self.dataset,
+            file=name,
+            standardised_file=name,
+            source="file",
+            standardised_configuration={column: {"masked": True} for column in masked},
+        )
+
+    def files(self):
+        return DatasetV2File.objects.select_related("preview").filter(dataset=self.dataset).order_by("created_at")
+
+    def test_preview_of_csv_and_xlsx_files(self):
+        expected = [
+            {"farmer": "Amina", "phone": "######", "acres": 1.5, "crops": 2},
+            {"farmer": "Bilal", "phone": "######", "acres": "", "crops": 1},
+        ]
+        for name in ("farmers.csv", "farmers.xlsx"):
+            dataset_file = self.create_file(name, FARMERS, masked=["phone"])
+            dataset_preview.index(dataset_file)
+            preview = DatasetV2FilePreview.objects.get(dataset_file=dataset_file)
+            assert dataset_preview.content(self.files().get(id=dataset_file.id)) == expected
+            assert preview.columns == ["farmer", "phone", "acres", "crops"]
+            assert preview.row_count == 5
+            assert preview.dtypes["acres"] == "float64" and preview.dtypes["crops"] == "int64"
+            # stored unmasked
+            assert preview.rows[0] == ["Amina", 711, 1.5, 2]
+
+    def test_current_preview_is_served_without_reading_the_file(self):
+        self.create_file("farmers.csv", FARMERS)
+        dataset_preview.index(self.files().get())
+
+        dataset_file = self.files().get()
+        with mock.patch.object(dataset_preview, "extract") as extract, self.assertNumQueries(0):
+            assert dataset_preview.content(dataset_file)[1]["farmer"] == "Bilal"
+        extract.assert_not_called()
+
+        # masking is applied when the preview is read
+        dataset_file.standardised_configuration = {"farmer": {"masked": True}}
+        assert dataset_preview.content(dataset_file)[1]["farmer"] == "######"
+
+    def test_missing_or_stale_previews_are_read_from_the_file_and_extracted_by_the_task(self):
+        dataset_file = self.create_file("farmers.csv", FARMERS, masked=["phone"])
+        with mock.patch.object(dataset_preview, "extract") as extract, self.captureOnCommitCallbacks() as callbacks:
+            assert dataset_preview.content(self.files().get())[0] == {
+                "farmer": "Amina", "phone": "######", "acres": 1.5, "crops": 2
+            }
+        extract.assert_not_called()
+        assert not DatasetV2FilePreview.objects.exists()
+        with mock.patch.object(dataset_preview, "index_preview_of_dataset_file") as schedule:
+            callbacks[0]()
+        schedule.assert_called_once_with(dataset_file.id)
+
+        dataset_preview.index(dataset_file)
+        FARMERS.iloc[::-1].to_csv(os.path.join(self.directory, "farmers.csv"), index=False, float_format="%.2f")
+        assert dataset_preview.content(self.files().get())[0]["farmer"] == "Esi"
+        dataset_preview.index(self.files().get())
+        assert DatasetV2FilePreview.objects.get().rows[0][0] == "Esi"
+
+    def test_concurrent_extraction_of_a_file_keeps_one_preview(self):
+        dataset_file = self.create_file("farmers.csv", FARMERS)
+        first, second = self.files().get(), self.files().get()
+        dataset_preview.index(first)
+        # the second extraction lost the race to insert the preview
+        with mock.patch.object(DatasetV2FilePreview.objects, "update_or_create", side_effect=IntegrityError):
+            assert dataset_preview.index(second) == DatasetV2FilePreview.objects.get(dataset_file=dataset_file)
+
+    def test_unreadable_and_other_files(self):
+        dataset_file = self.create_file("farmers.csv", FARMERS)
+        os.remove(os.path.join(self.directory, "farmers.csv"))
+        assert dataset_preview.content(dataset_file) == []
+        assert dataset_preview.index(dataset_file).row_count is None
+
+        dataset_file.standardised_file = "farmers.pdf"
+        assert dataset_preview.content(dataset_file) == []
@@ -0,0 +1,51 @@
+import uuid
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from utils import embeddings_creation, pgvector
+from utils.embeddings_creation import VectorDBBuilder, load_vector_db
+from utils.pgvector import PGVector, dispose_engines
+
+
+class TestLoadVectorDb(SimpleTestCase):
+    def setUp(self):
+        dispose_engines()
+        self.extension = mock.patch.object(PGVector, "create_vector_extension").start()
+        self.tables = mock.patch.object(PGVector, "create_tables_if_not_exists").start()
+        collection_store = pgvector._get_embedding_collection_store()[1]
+        self.get_or_create = mock.patch.object(
+            collection_store, "get_or_create", return_value=(mock.Mock(uuid=uuid.uuid4()), True)
+        ).start()
+        mock.patch.object(embeddings_creation, "get_embeddings").start()
+        self.addCleanup(mock.patch.stopall)
+        self.addCleanup(dispose_engines)
+
+    def test_stores_share_the_engine_and_are_bootstrapped_once(self):
+        filters = {"country": "Kenya"}
+        (retriever, first), (_, second) = load_vector_db(uuid.uuid4(), filters), load_vector_db(uuid.uuid4(), {})
+
+        assert first._bind is second._bind
+        assert (self.extension.call_count, self.tables.call_count, self.get_or_create.call_count) == (1, 1, 1)
+        assert retriever.search_kwargs == {"filter": filters, "score_threshold": 0.8}
+
+    def test_retrieval_without_chain_uses_the_similarity_search(self):
+        resource_id = uuid.uuid4()
+        with mock.patch(
+            "ai.retriever.manual_retrival.Retrival.get_input_embeddings", return_value=("answer", [], "query", 12)
+        ) as retrieval:
+            result = VectorDBBuilder.get_input_embeddings_test("query", "Asha", resource_id, None, {})
+        assert result == ("answer", [], "query", 12)
+        retrieval.assert_called_once_with("query", "Asha", resource_id, None)
+
+    def test_chain_retrieves_from_the_filtered_store(self):
+        qa = mock.Mock(ainvoke=mock.AsyncMock(return_value={"answer": "Sow in March", "generated_question": "When?"}))
+        history = mock.Mock(condensed_question="Which crop?", query_response="Wheat")
+        with mock.patch.object(embeddings_creation.ChainBuilder, "create_qa_chain", return_value=(qa, None)) as chain:
+            result = VectorDBBuilder.get_input_embeddings_using_chain(
+                "When do I sow?", "Asha", uuid.uuid4(), history, {"crop": "wheat"}
+            )
+
+        assert result == ("Sow in March", [], "When?", {})
+        assert chain.call_args.kwargs["vector_db"].search_kwargs["filter"] == {"crop": "wheat"}
+        assert qa.ainvoke.call_args.args[0]["chat_history"] == [("Which crop?", "Wheat")]
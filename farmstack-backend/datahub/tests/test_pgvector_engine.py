@@ -0,0 +1,53 @@
+import uuid
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from utils import pgvector
+from utils.pgvector import PGVector, dispose_engines, get_engine
+
+URL = "postgresql+psycopg2://postgres:postgres@db:5432/postgres"
+
+
+class NoEmbeddings:
+    pass
+
+
+class TestPGVectorEngineRegistry(SimpleTestCase):
+    def setUp(self):
+        dispose_engines()
+        self.extension = mock.patch.object(PGVector, "create_vector_extension").start()
+        self.tables = mock.patch.object(PGVector, "create_tables_if_not_exists").start()
+        self.collection_id = uuid.uuid4()
+        collection_store = pgvector._get_embedding_collection_store()[1]
+        self.get_or_create = mock.patch.object(
+            collection_store, "get_or_create", return_value=(mock.Mock(uuid=self.collection_id), True)
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+        self.addCleanup(dispose_engines)
+
+    def test_engines_are_shared_by_connection_string_and_arguments(self):
+        engine = get_engine(URL)
+        assert get_engine(URL) is engine
+        assert get_engine(URL, pool_size=20) is not engine
+        assert engine.pool.size() == pgvector.ENGINE_DEFAULTS["pool_size"]
+        assert engine.pool._pre_ping
+
+    def test_schema_and_collection_are_set_up_once_per_process(self):
+        stores = [PGVector(URL, NoEmbeddings(), collection_name="resource-file-1") for _ in range(3)]
+        assert len({id(store._bind) for store in stores}) == 1
+        assert self.extension.call_count == 1
+        assert self.tables.call_count == 1
+        assert self.get_or_create.call_count == 1
+        assert stores[0]._collection_id(session=None) == self.collection_id
+
+        PGVector(URL, NoEmbeddings(), collection_name="resource-file-2")
+        assert self.extension.call_count == 1
+        assert self.get_or_create.call_count == 2
+
+    def test_deleted_collections_are_looked_up_again(self):
+        store = PGVector(URL, NoEmbeddings(), collection_name="resource-file-1")
+        with mock.patch.object(PGVector, "get_collection", return_value=None):
+            store.delete_collection()
+        PGVector(URL, NoEmbeddings(), collection_name="resource-file-1")
+        assert self.get_or_create.call_count == 2
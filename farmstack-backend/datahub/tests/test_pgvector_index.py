@@ -0,0 +1,84 @@
+import io
+import struct
+import uuid
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from utils.pgvector import (
+    _COPY_HEADER,
+    _COPY_TRAILER,
+    DistanceStrategy,
+    IndexMethod,
+    PGVector,
+    VectorIndexManager,
+    _copy_field,
+    _vector_binary,
+    recommended_ivfflat_lists,
+    recommended_ivfflat_probes,
+)
+
+COLLECTION_ID = uuid.UUID("5f0c1c6e-3b8a-4d2e-9f41-0a7b6c5d4e3f")
+
+
+class TestVectorIndexManager(SimpleTestCase):
+    def test_hnsw_index_casts_the_embedding_to_its_dimensions(self):
+        statement = VectorIndexManager.index_definition(IndexMethod.HNSW, DistanceStrategy.COSINE, 1536, m=24)
+        assert statement == (
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_langchain_pg_embedding_hnsw_cosine_1536 "
+            "ON langchain_pg_embedding USING hnsw ((embedding::vector(1536)) vector_cosine_ops) "
+            "WITH (m = 24, ef_construction = 64)"
+        )
+
+    def test_ivfflat_partial_index_of_a_collection(self):
+        statement = VectorIndexManager.index_definition(
+            IndexMethod.IVFFLAT, DistanceStrategy.EUCLIDEAN, 768, COLLECTION_ID, lists=120, concurrently=False
+        )
+        assert statement == (
+            "CREATE INDEX IF NOT EXISTS ix_langchain_pg_embedding_ivfflat_l2_768_5f0c1c6e3b8a "
+            "ON langchain_pg_embedding USING ivfflat ((embedding::vector(768)) vector_l2_ops) "
+            f"WITH (lists = 120) WHERE collection_id = '{COLLECTION_ID}'"
+        )
+
+    def test_index_names_differ_by_method_strategy_dimensions_and_collection(self):
+        names = {
+            VectorIndexManager.index_name(method, strategy, dimensions, collection)
+            for method in IndexMethod
+            for strategy in DistanceStrategy
+            for dimensions in (768, 1536)
+            for collection in (None, COLLECTION_ID)
+        }
+        assert len(names) == 2 * 3 * 2 * 2
+        assert all(len(name) <= 63 for name in names)
+
+    def test_ivfflat_lists_and_probes_follow_the_table_size(self):
+        assert recommended_ivfflat_lists(0) == 1
+        assert recommended_ivfflat_lists(100_000) == 100
+        assert recommended_ivfflat_lists(1_000_000) == 1000
+        assert recommended_ivfflat_lists(4_000_000) == 2000
+        assert recommended_ivfflat_probes(100) == 10
+        assert recommended_ivfflat_probes(1) == 1
+
+
+class TestBinaryCopy(SimpleTestCase):
+    def test_vectors_are_dimensions_then_big_endian_floats(self):
+        for embedding in ([0.5, -1.25, 3.0], np.array([0.5, -1.25, 3.0], dtype=np.float32)):
+            assert _vector_binary(embedding) == struct.pack(">hhfff", 3, 0, 0.5, -1.25, 3.0)
+
+    def test_fields_are_length_prefixed_and_null_is_minus_one(self):
+        assert _copy_field("a\tb\n".encode()) == b"\x00\x00\x00\x04a\tb\n"
+        assert _copy_field(None) == b"\xff\xff\xff\xff"
+
+    def test_copy_uses_the_binary_format(self):
+        class FakeCursor:
+            def __init__(self):
+                self.copies = []
+
+            def copy_expert(self, statement, rows):
+                self.copies.append((statement, rows.read()))
+
+        cursor = FakeCursor()
+        PGVector._copy_embeddings(cursor, io.BytesIO(_COPY_HEADER + _COPY_TRAILER))
+        [(statement, data)] = cursor.copies
+        assert statement.endswith("FROM STDIN (FORMAT binary)")
+        assert data.startswith(b"PGCOPY\n\xff\r\n\x00") and data.endswith(b"\xff\xff")
@@ -0,0 +1,196 @@
+import json
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User, UserRole
+from datahub.models import Datasets, DatasetV2, Organization, Resource, ResourceFile, UserOrganizationMap
+from datahub.serializers import (
+    ParticipantCostewardSerializer,
+    ParticipantSerializer,
+    RecentDatasetListSerializer,
+    ResourceListSerializer,
+    micrositeOrganizationSerializer,
+)
+from datahub.views import DatahubDashboard, ParticipantViewSet, ResourceManagementViewSet
+from microsite.views import ParticipantMicrositeViewSet, ResourceMicrositeViewSet
+from participant.models import Connectors, Department
+from utils import serializer_counts
+
+
+def create_user_map(email, role, on_boarded_by=None, organization=None):
+    user = User.objects.create(email=email, role_id=role, on_boarded_by=on_boarded_by)
+    if organization is None:
+        organization = Organization.objects.create(name=f"{email} org", org_email=email, address="{}")
+    return UserOrganizationMap.objects.create(user=user, organization=organization)
+
+
+def create_resource(user_map, title, types):
+    resource = Resource.objects.create(title=title, description=title, user_map=user_map)
+    for number, file_type in enumerate(types):
+        ResourceFile.objects.create(resource=resource, type=file_type, url=f"https://{title}/{number}")
+    return resource
+
+
+def as_json(data):
+    return json.loads(json.dumps(data, cls=JSONEncoder))
+
+
+class TestSerializerCounts(TestCase):
+    def setUp(self):
+        for role, name in ((1, "datahub_admin"), (3, "datahub_participant_root"), (6, "datahub_co_steward")):
+            UserRole.objects.create(id=role, role_name=name)
+        self.department = Department.objects.create(
+            id="e459f452-2b4b-4129-ba8b-1e1180c87888", department_name="default", department_discription=""
+        )
+        self.admin = create_user_map("admin@dg.org", 1)
+        self.count = 0
+        self.add_participants(2)
+
+    def add_participants(self, number):
+        for _ in range(number):
+            self.count += 1
+            steward = create_user_map(f"steward{self.count}@dg.org", 6)
+            participant = create_user_map(f"participant{self.count}@dg.org", 3, on_boarded_by=steward.user)
+            create_user_map(f"colleague{self.count}@dg.org", 3, organization=steward.organization)
+            for user_map in (steward, participant):
+                DatasetV2.objects.create(name=f"{user_map.user.email} dataset", user_map=user_map, is_temp=False)
+                DatasetV2.objects.create(name=f"{user_map.user.email} draft", user_map=user_map, is_temp=True)
+                create_resource(user_map, f"{user_map.user.email} resource", ["youtube", "pdf", "pdf"])
+            dataset = Datasets.objects.create(
+                user_map=steward, name=f"dataset {self.count}", description="", category={}, geography="", status=True
+            )
+            for status in (True, False):
+                Connectors.objects.create(
+                    user_map=steward,
+                    dataset=dataset,
+                    connector_name=f"connector {self.count} {status}",
+                    connector_type="provider",
+                    docker_image_url="farmstack/connector",
+                    application_port=8080,
+                    usage_policy="",
+                    status=status,
+                )
+
+    def assert_constant_queries(self, serializer_class, queryset, annotate):
+        """The page of `annotate(queryset)` is serialized in as many queries for 2 as for 6 participants."""
+
+        def serialize():
+            with CaptureQueriesContext(connection) as queries:
+                data = serializer_class(annotate(queryset.all()), many=True).data
+            return as_json(data), len(queries)
+
+        data, small = serialize()
+        assert data == as_json([serializer_class(instance).data for instance in queryset.all()])
+        self.add_participants(4)
+        data, large = serialize()
+        assert len(data) > 2 and large == small
+        assert data == as_json([serializer_class(instance).data for instance in queryset.all()])
+        return data
+
+    def test_participant_serializers(self):
+        for role, serializer_class in ((6, ParticipantCostewardSerializer), (3, ParticipantSerializer)):
+            queryset = (
+                UserOrganizationMap.objects.select_related("user", "organization")
+                .filter(user__status=True, user__role=role)
+                .order_by("user__email")
+            )
+            data = self.assert_constant_queries(serializer_class, queryset, serializer_counts.annotate_participant_counts)
+            if role == 6:
+                assert {(row["dataset_count"], row["connector_count"], row["number_of_participants"]) for row in data} == {
+                    (1, 2, 1)
+                }
+                # the resources of the co-steward and of the participant onboarded by it
+                assert data[0]["content_files_count"] == [{"type": "pdf", "count": 4}, {"type": "youtube", "count": 2}]
+
+    def test_organization_serializer(self):
+        queryset = (
+            UserOrganizationMap.objects.select_related("user", "organization")
+            .filter(user__role=6, user__status=True)
+            .order_by("user__email")
+        )
+        data = self.assert_constant_queries(
+            micrositeOrganizationSerializer, queryset, serializer_counts.annotate_organization_counts
+        )
+        assert {(row["dataset_count"], row["users_count"]) for row in data} == {(1, 2)}
+
+    def test_resource_list_serializer(self):
+        queryset = Resource.objects.select_related("user_map__organization", "user_map__user").order_by("title")
+        data = self.assert_constant_queries(ResourceListSerializer, queryset, lambda resources: resources)
+        assert data[0]["content_files_count"] == [{"type": "pdf", "count": 2}, {"type": "youtube", "count": 1}]
+
+    def test_recent_dataset_list_serializer(self):
+        queryset = Datasets.objects.filter(status=True).order_by("name")
+        data = self.assert_constant_queries(
+            RecentDatasetListSerializer, queryset, serializer_counts.annotate_dataset_counts
+        )
+        assert {(row["connector_count"], row["activity"]) for row in data} == {(1, "Active")}
+
+
+    def get(self, viewset, action, **params):
+        refresh = RefreshToken.for_user(self.admin.user)
+        refresh["map_id"] = str(self.admin.id)
+        request = APIRequestFactory().get("/", params, HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        cache.clear()
+        response = viewset.as_view({"get": action})(request)
+        assert response.status_code == 200, response.data
+        return as_json(response.data)
+
+    def assert_constant_view_queries(self, viewset, action, rows=lambda data: data["results"], **params):
+        """The view serves its page in as many queries for 2 as for 6 participants (a page holds 5 rows)."""
+        with CaptureQueriesContext(connection) as queries:
+            small = rows(self.get(viewset, action, **params))
+        self.add_participants(4)
+        with self.assertNumQueries(len(queries)):
+            data = rows(self.get(viewset, action, **params))
+        assert len(small) < len(data) == 5
+        return data
+
+    def assert_participant_list(self, viewset):
+        data = self.assert_constant_view_queries(viewset, "list")
+        assert {row["dataset_count"] for row in data} <= {0, 1}
+
+    def assert_co_steward_list(self, viewset):
+        data = self.assert_constant_view_queries(viewset, "list", co_steward="true")
+        assert {(row["dataset_count"], row["connector_count"], row["number_of_participants"]) for row in data} == {
+            (1, 2, 1)
+        }
+
+    def assert_resource_list(self, viewset, **params):
+        data = self.assert_constant_view_queries(viewset, "list", **params)
+        assert {json.dumps(row["content_files_count"]) for row in data} == {
+            json.dumps([{"type": "pdf", "count": 2}, {"type": "youtube", "count": 1}])
+        }
+
+    def test_participant_list_view(self):
+        self.assert_participant_list(ParticipantViewSet)
+
+    def test_microsite_participant_list_view(self):
+        self.assert_participant_list(ParticipantMicrositeViewSet)
+
+    def test_co_steward_list_view(self):
+        self.assert_co_steward_list(ParticipantViewSet)
+
+    def test_microsite_co_steward_list_view(self):
+        self.assert_co_steward_list(ParticipantMicrositeViewSet)
+
+    def test_microsite_organization_list_view(self):
+        data = self.assert_constant_view_queries(ParticipantMicrositeViewSet, "organizations", co_steward="true")
+        assert {(row["dataset_count"], row["users_count"]) for row in data} == {(1, 2)}
+
+    def test_resource_list_view(self):
+        self.assert_resource_list(ResourceManagementViewSet, others="true")
+
+    def test_microsite_resource_list_view(self):
+        self.assert_resource_list(ResourceMicrositeViewSet)
+
+    def test_recent_dataset_list_view(self):
+        data = self.assert_constant_view_queries(
+            DatahubDashboard, "dashboard", rows=lambda data: data["datasets"]["results"]
+        )
+        assert {(row["connector_count"], row["activity"]) for row in data} == {(1, "Active")}
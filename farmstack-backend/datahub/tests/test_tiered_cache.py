@@ -0,0 +1,106 @@
+import threading
+import time
+from unittest import mock
+
+import fakeredis
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from utils import tiered_cache
+
+SERVER = fakeredis.FakeServer()
+TIERED_CACHE = {
+    "default": {
+        "BACKEND": "utils.tiered_cache.TieredRedisCache",
+        "LOCATION": "redis://tiered-cache-tests:6379/1",
+        "OPTIONS": {
+            "connection_class": fakeredis.FakeConnection,
+            "server": SERVER,
+            "LOCAL_KEY_PREFIXES": ["dashboard:response:"],
+            "COMPRESS_MIN_BYTES": 1024,
+        },
+    }
+}
+
+
+def redis():
+    return fakeredis.FakeRedis(server=SERVER, db=1)
+
+
+@override_settings(CACHES=TIERED_CACHE)
+class TestTieredRedisCache(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        tiered_cache.process_state(TIERED_CACHE["default"]["LOCATION"]).metrics.clear()
+
+    def test_values_round_trip_and_counters_stay_integers(self):
+        cache.set("otp:farmer@dg.org", {"otp": 1234, "otp_attempt": 1}, 60)
+        assert cache.get("otp:farmer@dg.org") == {"otp": 1234, "otp_attempt": 1}
+        assert cache.add("dashboard:stats:kiamis:hits", 0, None)
+        assert cache.incr("dashboard:stats:kiamis:hits") == 1
+        assert redis().get(":1:dashboard:stats:kiamis:hits") == b"1"
+        cache.delete("otp:farmer@dg.org")
+        assert cache.get("otp:farmer@dg.org") is None
+        assert cache.get_many(["dashboard:stats:kiamis:hits", "missing"]) == {"dashboard:stats:kiamis:hits": 1}
+
+    def test_large_values_are_compressed(self):
+        payload = {"county": {f"ward {number}": number for number in range(500)}}
+        cache.set("dashboard:response:kiamis:large", payload, 60)
+        cache.set("small", {"county": {}}, 60)
+        assert redis().get(":1:dashboard:response:kiamis:large").startswith(tiered_cache.ZSTD_MAGIC)
+        assert not redis().get(":1:small").startswith(tiered_cache.ZSTD_MAGIC)
+        cache.clear()
+        redis().set(":1:dashboard:response:kiamis:large", tiered_cache.CompressingSerializer(1024).dumps(payload))
+        assert cache.get("dashboard:response:kiamis:large") == payload
+
+    def test_only_local_keys_are_served_from_the_process(self):
+        cache.set("dashboard:response:kiamis:1", {"farmers": 10}, 60)
+        cache.set("otp:farmer@dg.org", {"otp": 1234}, 60)
+        # written by another process
+        redis().delete(":1:dashboard:response:kiamis:1", ":1:otp:farmer@dg.org")
+
+        assert cache.get("dashboard:response:kiamis:1") == {"farmers": 10}
+        assert cache.get("otp:farmer@dg.org") is None
+        assert cache.metrics() == {"sets": 2, "local_hits": 1, "misses": 1, "local_entries": 1}
+
+    def test_local_copy_does_not_outlive_the_redis_ttl(self):
+        now = time.monotonic()
+        cache.set("dashboard:response:fsp:1", [1], 2)
+        with mock.patch.object(tiered_cache.time, "monotonic", return_value=now + 3):
+            redis().delete(":1:dashboard:response:fsp:1")
+            assert cache.get("dashboard:response:fsp:1") is None
+
+    def test_get_or_set_computes_a_missing_value_once(self):
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"farmers": 10}
+
+        def request():
+            results.append(cache.get_or_set("dashboard:response:omfp:1", compute, 60))
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert results == [{"farmers": 10}] * 8
+        assert cache.metrics()["single_flight_computations"] == 1
+        assert cache.get_or_set("dashboard:response:omfp:1", compute, 60) == {"farmers": 10}
+
+
+class TestLocalTier(SimpleTestCase):
+    def test_least_recently_used_entries_are_evicted(self):
+        local = tiered_cache.LocalTier(max_entries=2, max_bytes=10)
+        local.set("a", b"1", 60)
+        local.set("b", b"2", 60)
+        local.get("a")
+        local.set("c", b"3", 60)
+        assert (local.get("a"), local.get("b"), local.get("c")) == (b"1", None, b"3")
+        local.set("d", b"123456789", 60)
+        assert (len(local), local.get("c"), local.get("d")) == (2, b"3", b"123456789")
+        local.set("e", b"12345678901", 60)
+        assert local.get("e") is None
@@ -39,11 +39,9 @@ from django.db.models import (
     CharField,
     Count,
     F,
-    Func,
     OuterRef,
     Q,
     Subquery,
-    Sum,
     Value,
 )
 from django.db.models.functions import Concat
@@ -93,7 +91,6 @@ from core.utils import (
     csv_and_xlsx_file_validatation,
     date_formater,
     generate_api_key,
-    generate_hash_key_for_dashboard,
     read_contents_from_csv_or_xlsx_file,
 )
 from datahub.models import (
@@ -105,6 +102,7 @@ from datahub.models import (
     Resource,
     StandardisationTemplate,
     UserOrganizationMap,
+    index_preview_of_dataset_file,
 )
 from datahub.serializers import (
     ResourceAutoCatSerializer,  # Added for Auto Categorizaion
@@ -148,13 +146,22 @@ from participant.serializers import (
     ParticipantSupportTicketSerializer,
     TicketSupportSerializer,
 )
-from utils import custom_exceptions, file_operations, string_functions, validators
+from utils import (
+    custom_exceptions,
+    dashboard_cache,
+    dashboard_metrics,
+    dataset_preview,
+    file_operations,
+    serializer_counts,
+    string_functions,
+    validators,
+)
 from utils.authentication_services import authenticate_user
 from utils.embeddings_creation import VectorDBBuilder
 from utils.file_operations import (
     check_file_name_length,
-    filter_dataframe_for_dashboard_counties,
     generate_fsp_dashboard,
+    generate_kiamis_dashboard,
     generate_knfd_dashboard,
     generate_omfp_dashboard,
 )
@@ -340,7 +347,7 @@ class OrganizationViewSet(GenericViewSet):
                 .filter(organization__status=True)
                 .all()
             )
-            page = self.paginate_queryset(user_org_queryset)
+            page = self.paginate_queryset(serializer_counts.annotate_participant_counts(user_org_queryset))
             user_organization_serializer = ParticipantSerializer(page, many=True)
             return self.get_paginated_response(user_organization_serializer.data)
         except Exception as error:
@@ -537,7 +544,7 @@ class ParticipantViewSet(GenericViewSet):
                 .order_by("-user__updated_at")
                 .all()
             )
-            page = self.paginate_queryset(roles)
+            page = self.paginate_queryset(serializer_counts.annotate_participant_counts(roles))
             participant_serializer = ParticipantCostewardSerializer(page, many=True)
             return self.get_paginated_response(participant_serializer.data)
         else:
@@ -554,7 +561,7 @@ class ParticipantViewSet(GenericViewSet):
                 .all()
             )
 
-        page = self.paginate_queryset(roles)
+        page = self.paginate_queryset(serializer_counts.annotate_participant_counts(roles))
         participant_serializer = ParticipantSerializer(page, many=True)
         return self.get_paginated_response(participant_serializer.data)
 
@@ -1549,7 +1556,7 @@ class DatahubDashboard(GenericViewSet):
             # total_participants = User.objects.filter(role_id=3, status=True).count()
             total_participants = (
                 UserOrganizationMap.objects.select_related(Constants.USER, Constants.ORGANIZATION)
-                .filter(user__role=3, user__status=True, is_temp=False)
+                .filter(user__role=3, user__status=True)
                 .count()
             )
             total_datasets = (
@@ -1561,39 +1568,22 @@ class DatahubDashboard(GenericViewSet):
             active_connectors = Connectors.objects.filter(status=True).count()
             total_data_exchange = {"total_data": 50, "unit": "Gbs"}
 
-            datasets = Datasets.objects.filter(status=True).values_list("category", flat=True)
-            categories = set()
-            categories_dict = {}
-
-            for data in datasets:
-                if data and type(data) == dict:
-                    for element in data.keys():
-                        categories.add(element)
-
-            categories_dict = {key: 0 for key in categories}
-            for data in datasets:
-                if data and type(data) == dict:
-                    for key, value in data.items():
-                        if value == True:
-                            categories_dict[key] += 1
-
-            open_support_tickets = SupportTicket.objects.filter(status="open").count()
-            closed_support_tickets = SupportTicket.objects.filter(status="closed").count()
-            hold_support_tickets = SupportTicket.objects.filter(status="hold").count()
+            categories_dict = dashboard_metrics.category_counts(Datasets.objects.filter(status=True), true_values=True)
+            ticket_metrics = dashboard_metrics.support_ticket_metrics()
 
             # retrieve 3 recent support tickets
             recent_tickets_queryset = SupportTicket.objects.order_by("updated_at")[0:3]
             recent_tickets_serializer = RecentSupportTicketSerializer(recent_tickets_queryset, many=True)
             support_tickets = {
-                "open_requests": open_support_tickets,
-                "closed_requests": closed_support_tickets,
-                "hold_requests": hold_support_tickets,
+                **ticket_metrics,
                 "recent_tickets": recent_tickets_serializer.data,
             }
 
             # retrieve 3 recent updated datasets
             # datasets_queryset = Datasets.objects.order_by("updated_at")[0:3]
-            datasets_queryset = Datasets.objects.filter(status=True).order_by("-updated_at").all()
+            datasets_queryset = serializer_counts.annotate_dataset_counts(
+                Datasets.objects.filter(status=True).order_by("-updated_at")
+            )
             datasets_queryset_pages = self.paginate_queryset(datasets_queryset)  # paginaged connectors list
             datasets_serializer = RecentDatasetListSerializer(datasets_queryset_pages, many=True)
 
@@ -1983,15 +1973,15 @@ class DatasetV2ViewSet(GenericViewSet):
         type = request.GET.get("type", None)
         obj = self.get_object()
         serializer = self.get_serializer(obj).data
-        dataset_file_obj = DatasetV2File.objects.prefetch_related("dataset_v2_file").filter(dataset_id=obj.id)
+        dataset_file_obj = (
+            DatasetV2File.objects.select_related("preview").prefetch_related("dataset_v2_file").filter(dataset_id=obj.id)
+        )
         data = []
         for file in dataset_file_obj:
             path_ = os.path.join(settings.DATASET_FILES_URL, str(file.standardised_file))
             file_path = {}
             file_path["id"] = file.id
-            file_path["content"] = read_contents_from_csv_or_xlsx_file(
-                os.path.join(settings.DATASET_FILES_URL, str(file.standardised_file)), file.standardised_configuration
-            )
+            file_path["content"] = dataset_preview.content(file)
             file_path["file"] = path_
             file_path["source"] = file.source
             file_path["file_size"] = file.file_size
@@ -2647,15 +2637,11 @@ class DatasetV2View(GenericViewSet):
                 "omfp": generate_omfp_dashboard,
                 "fsp": generate_fsp_dashboard,
                 "knfd": generate_knfd_dashboard,
-                "kiamis": "generate_kiamis_dashboard",
+                "kiamis": generate_kiamis_dashboard,
             }
 
             # Determine the dataset type based on the filename
-            dataset_type = None
-            for key in dataset_type_to_dashboard_function:
-                if key in dataset_file.lower():
-                    dataset_type = key
-                    break
+            dataset_type = dashboard_cache.dataset_type_of(dataset_file)
 
             # If dataset_type is not found, return an error response
             if dataset_type is None:
@@ -2664,121 +2650,21 @@ class DatasetV2View(GenericViewSet):
                     status=status.HTTP_200_OK,
                 )
 
-            # Generate the base hash key
-            hash_key = generate_hash_key_for_dashboard(
+            # The datahub admin sees the consolidated file of all datasets of the type
+            if role_id == str(1):
+                dataset_file = self.get_consolidated_file(dataset_type)
+                if isinstance(dataset_file, Response):
+                    return dataset_file
+
+            hash_key = dashboard_cache.dashboard_cache_key(
                 dataset_type if role_id == str(1) else pk,
-                request.data, role_id, filters
+                request.data, dataset_type, dataset_file, filters
             )
+            dashboard_cache.record_filters(dataset_type, request.data)
 
-            # Check if the data is already cached
-            cache_data = cache.get(hash_key, {})
-            if cache_data:
-                LOGGER.info("Dashboard details found in cache", exc_info=True)
-                return Response(cache_data, status=status.HTTP_200_OK)
-
-            # Get the appropriate dashboard generation function
+            # Answer from the cache, else from the pre-aggregated dashboard cube of the dataset file
             dashboard_generator = dataset_type_to_dashboard_function.get(dataset_type)
-
-            if dashboard_generator and dataset_type != 'kiamis':
-                # Generate the dashboard data using the selected function
-                return dashboard_generator(
-                    dataset_file if role_id != str(1) else self.get_consolidated_file(dataset_type),
-                    request.data, hash_key, filters
-                )
-
-            # serializer = DatahubDatasetFileDashboardFilterSerializer(data=request.data)
-            # serializer.is_valid(raise_exception=True)
-            counties = []
-            sub_counties = []
-            gender = []
-            value_chain = []
-
-            # if serializer.data.get("county"):
-            counties = request.data.get("county")
-
-            # if serializer.data.get("sub_county"):
-            sub_counties = request.data.get("sub_county")
-
-            # if serializer.data.get("gender"):
-            gender = request.data.get("gender")
-
-            # if serializer.data.get("value_chain"):
-            value_chain = request.data.get("value_chain")
-            cols_to_read = ['Gender', 'Constituency', 'Millet', 'County', 'Sub County', 'Crop Production',
-                            'farmer_mobile_number',
-                            'Livestock Production', 'Ducks', 'Other Sheep', 'Total Area Irrigation', 'Family',
-                            'Ward',
-                            'Other Money Lenders', 'Micro-finance institution', 'Self (Salary or Savings)',
-                            "Natural rivers and stream", "Water Pan",
-                            'NPK', 'Superphosphate', 'CAN',
-                            'Urea', 'Other', 'Do you insure your crops?',
-                            'Do you insure your farm buildings and other assets?', 'Other Dual Cattle',
-                            'Cross breed Cattle', 'Cattle boma',
-                            'Small East African Goats', 'Somali Goat', 'Other Goat', 'Chicken -Indigenous',
-                            'Chicken -Broilers', 'Chicken -Layers', 'Highest Level of Formal Education',
-                            'Maize food crop', "Beans", 'Cassava', 'Sorghum', 'Potatoes', 'Cowpeas']
-            if role_id == str(1):
-                dataset_file = self.get_consolidated_file("kiamis")
-            try:
-                if dataset_file.endswith(".xlsx") or dataset_file.endswith(".xls"):
-                    df = pd.read_excel(os.path.join(settings.DATASET_FILES_URL, dataset_file))
-                elif dataset_file.endswith(".csv"):
-                    df = pd.read_csv(os.path.join(settings.DATASET_FILES_URL, dataset_file), usecols=cols_to_read,
-                                     low_memory=False)
-                    # df.columns = df.columns.str.strip()
-                else:
-                    return Response(
-                        "Unsupported file please use .xls or .csv.",
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-                df['Ducks'] = pd.to_numeric(df['Ducks'], errors='coerce')
-                df['Other Sheep'] = pd.to_numeric(df['Other Sheep'], errors='coerce')
-                df['Family'] = pd.to_numeric(df['Family'], errors='coerce')
-                df['Other Money Lenders'] = pd.to_numeric(df['Other Money Lenders'], errors='coerce')
-                df['Micro-finance institution'] = pd.to_numeric(df['Micro-finance institution'], errors='coerce')
-                df['Self (Salary or Savings)'] = pd.to_numeric(df['Self (Salary or Savings)'], errors='coerce')
-                df['Natural rivers and stream'] = pd.to_numeric(df['Natural rivers and stream'], errors='coerce')
-                df["Water Pan"] = pd.to_numeric(df["Water Pan"], errors='coerce')
-                df['Total Area Irrigation'] = pd.to_numeric(df['Total Area Irrigation'], errors='coerce')
-                df['NPK'] = pd.to_numeric(df['NPK'], errors='coerce')
-                df['Superphosphate'] = pd.to_numeric(df['Superphosphate'], errors='coerce')
-                df['CAN'] = pd.to_numeric(df['CAN'], errors='coerce')
-                df['Urea'] = pd.to_numeric(df['Urea'], errors='coerce')
-                df['Other'] = pd.to_numeric(df['Other'], errors='coerce')
-                df['Other Dual Cattle'] = pd.to_numeric(df['Other Dual Cattle'], errors='coerce')
-                df['Cross breed Cattle'] = pd.to_numeric(df['Cross breed Cattle'], errors='coerce')
-                df['Cattle boma'] = pd.to_numeric(df['Cattle boma'], errors='coerce')
-                df['Small East African Goats'] = pd.to_numeric(df['Small East African Goats'], errors='coerce')
-                df['Somali Goat'] = pd.to_numeric(df['Somali Goat'], errors='coerce')
-                df['Other Goat'] = pd.to_numeric(df['Other Goat'], errors='coerce')
-                df['Chicken -Indigenous'] = pd.to_numeric(df['Chicken -Indigenous'], errors='coerce')
-                df['Chicken -Broilers'] = pd.to_numeric(df['Chicken -Broilers'], errors='coerce')
-                df['Chicken -Layers'] = pd.to_numeric(df['Chicken -Layers'], errors='coerce')
-                df['Do you insure your crops?'] = pd.to_numeric(df['Do you insure your crops?'], errors='coerce')
-                df['Highest Level of Formal Education'] = pd.to_numeric(df['Highest Level of Formal Education'],
-                                                                        errors='coerce')
-                df['Do you insure your farm buildings and other assets?'] = pd.to_numeric(
-                    df['Do you insure your farm buildings and other assets?'], errors='coerce')
-
-                data = filter_dataframe_for_dashboard_counties(
-                    df=df,
-                    counties=counties if counties else [],
-                    sub_counties=sub_counties if sub_counties else [],
-                    gender=gender if gender else [],
-                    value_chain=value_chain if value_chain else [],
-                    hash_key=hash_key,
-                    filters=filters
-                )
-            except Exception as e:
-                LOGGER.error(e, exc_info=True)
-                return Response(
-                    f"Something went wrong, please try again. {e}",
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            return Response(
-                data,
-                status=status.HTTP_200_OK,
-            )
+            return dashboard_generator(dataset_file, request.data, hash_key, filters)
 
         except DatasetV2File.DoesNotExist as e:
             LOGGER.error(e, exc_info=True)
@@ -2792,7 +2678,18 @@ class DatasetV2View(GenericViewSet):
                 f"Something went wrong, please try again. {e}",
                 status=status.HTTP_400_BAD_REQUEST,
             )
-    
+
+    @http_request_mutation
+    @action(detail=False, methods=["get"])
+    def dashboard_cache_stats(self, request, *args, **kwargs):
+        """Hit/miss counters of the dataset dashboard cache per dataset type, datahub admin only."""
+        if request.META.get("role_id") != str(1):
+            return Response(
+                "You don't have access to the dashboard cache stats.",
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        return Response(dashboard_cache.stats(), status=status.HTTP_200_OK)
+
     def get_consolidated_file(self, name):
         consolidated_file = f"consolidated_{name}.csv" 
         dataframes = []
@@ -2930,6 +2827,7 @@ class DatasetFileV2View(GenericViewSet):
             serializer.is_valid(raise_exception=True)
             serializer.save()
             DatasetV2File.objects.filter(id=serializer.data.get("id")).update(standardised_file=standardised_file_path)
+            transaction.on_commit(lambda: index_preview_of_dataset_file(instance.id))
             return Response(serializer.data, status=status.HTTP_200_OK)
         except ValidationError as e:
             return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
@@ -3005,49 +2903,10 @@ class DatahubNewDashboard(GenericViewSet):
     pagination_class = CustomPagination
 
     def participant_metics(self, data):
-        on_boarded_by = data.get("onboarded_by")
-        role_id = data.get("role_id")
-        user_id = data.get("user_id")
-        result = {}
         try:
-            if on_boarded_by != "None" or role_id == str(6):
-                result["participants_count"] = (
-                    UserOrganizationMap.objects.select_related(Constants.USER, Constants.ORGANIZATION)
-                    .filter(
-                        user__status=True,
-                        user__on_boarded_by=on_boarded_by if on_boarded_by != "None" else user_id,
-                        user__role=3,
-                        user__approval_status=True,
-                    )
-                    .count()
-                )
-            elif role_id == str(1):
-                result["co_steward_count"] = (
-                    UserOrganizationMap.objects.select_related(Constants.USER, Constants.ORGANIZATION)
-                    .filter(user__status=True, user__role=6)
-                    .count()
-                )
-                result["participants_count"] = (
-                    UserOrganizationMap.objects.select_related(Constants.USER, Constants.ORGANIZATION)
-                    .filter(
-                        user__status=True,
-                        user__role=3,
-                        user__on_boarded_by=None,
-                        user__approval_status=True,
-                    )
-                    .count()
-                )
-            else:
-                result["participants_count"] = (
-                    UserOrganizationMap.objects.select_related(Constants.USER, Constants.ORGANIZATION)
-                    .filter(
-                        user__status=True,
-                        user__role=3,
-                        user__on_boarded_by=None,
-                        user__approval_status=True,
-                    )
-                    .count()
-                )
+            result = dashboard_metrics.participant_metrics(
+                data.get("onboarded_by"), data.get("role_id"), data.get("user_id")
+            )
             LOGGER.info("Participants Metrics completed")
             return result
         except Exception as error:  # type: ignore
@@ -3087,47 +2946,11 @@ class DatahubNewDashboard(GenericViewSet):
             raise Exception(str(error))
 
     def connector_metrics(self, data, dataset_query, request):
-        # on_boarded_by = data.get("onboarded_by")
-        # role_id = data.get("role_id")
         user_id = data.get("user_id")
-        user_org_map = data.get("map_id")
-        my_dataset_used_in_connectors = (
-                dataset_query.prefetch_related("datasets__right_dataset_file")
-                .values("datasets__right_dataset_file")
-                .filter(datasets__right_dataset_file__connectors__user_id=user_id)
-                .distinct()
-                .count()
-                + dataset_query.prefetch_related("datasets__left_dataset_file")
-                .values("datasets__left_dataset_file")
-                .filter(datasets__left_dataset_file__connectors__user_id=user_id)
-                .distinct()
-                .count()
-        )
-        connectors_query = Connectors.objects.filter(user_id=user_id).all()
-
-        other_datasets_used_in_my_connectors = (
-                                                   dataset_query.prefetch_related("datasets__right_dataset_file")
-                                                   .select_related("datasets__right_dataset_file__connectors")
-                                                   .filter(datasets__right_dataset_file__connectors__user_id=user_id)
-                                                   .values("datasets__right_dataset_file")
-                                                   .exclude(user_map_id=user_org_map)
-                                                   .distinct()
-                                                   .count()
-                                               ) + (
-                                                   dataset_query.prefetch_related("datasets__left_dataset_file")
-                                                   .select_related("datasets__left_dataset_file__connectors")
-                                                   .filter(datasets__left_dataset_file__connectors__user_id=user_id)
-                                                   .values("datasets__left_dataset_file")
-                                                   .exclude(user_map_id=user_org_map)
-                                                   .distinct()
-                                                   .count()
-                                               )
         return {
-            "total_connectors_count": connectors_query.count(),
-            "other_datasets_used_in_my_connectors": other_datasets_used_in_my_connectors,
-            "my_dataset_used_in_connectors": my_dataset_used_in_connectors,
+            **dashboard_metrics.connector_metrics(dataset_query, user_id, data.get("map_id")),
             "recent_connectors": ConnectorsListSerializer(
-                connectors_query.order_by("-updated_at")[0:3], many=True
+                Connectors.objects.filter(user_id=user_id).order_by("-updated_at")[0:3], many=True
             ).data,
         }
 
@@ -3143,37 +2966,6 @@ class DatahubNewDashboard(GenericViewSet):
             connector_metrics = self.connector_metrics(data, dataset_query, request)
             if request.GET.get("my_org", False):
                 dataset_query = dataset_query.filter(user_map_id=data.get("map_id"))
-            dataset_file_metrics = (
-                dataset_query.values("datasets__source")
-                .annotate(
-                    dataset_count=Count("id", distinct=True),
-                    file_count=Count("datasets__file", distinct=True),
-                    total_size=Sum("datasets__file_size"),
-                )
-                .filter(file_count__gt=0)
-            )
-
-            dataset_state_metrics = dataset_query.values(state_name=F("geography__state__name")).annotate(
-                dataset_count=Count("id", distinct=True)
-            )
-            distinct_keys = (
-                DatasetV2.objects.annotate(
-                    key=Func(
-                        "category",
-                        function="JSONB_OBJECT_KEYS",
-                        output_field=CharField(),
-                    )
-                )
-                .values_list("key", flat=True)
-                .distinct()
-            )
-
-            # Iterate over the distinct keys and find the count for each key
-            dataset_category_metrics = {}
-            for key in distinct_keys:
-                dataset_count = dataset_query.filter(category__has_key=key).count()
-                if dataset_count:
-                    dataset_category_metrics[key] = dataset_count
             recent_datasets = DatasetV2ListNewSerializer(dataset_query.order_by("-updated_at")[0:3], many=True).data
             data = {
                 "user": UserOrganizationMap.objects.select_related("user", "organization")
@@ -3191,10 +2983,7 @@ class DatahubNewDashboard(GenericViewSet):
                 )
                 .first(),
                 "total_participants": participant_metrics,
-                "dataset_file_metrics": dataset_file_metrics,
-                "dataset_state_metrics": dataset_state_metrics,
-                "total_dataset_count": dataset_query.count(),
-                "dataset_category_metrics": dataset_category_metrics,
+                **dashboard_metrics.dataset_metrics(dataset_query),
                 "recent_datasets": recent_datasets,
                 **connector_metrics,
             }
@@ -3267,10 +3056,11 @@ class ResourceManagementViewSet(GenericViewSet):
     def list(self, request, *args, **kwargs):
         try:
             user_map = request.META.get("map_id")
+            resources = Resource.objects.select_related("user_map__organization", "user_map__user")
             if request.GET.get("others", None):
-                queryset = Resource.objects.exclude(user_map=user_map).order_by("-updated_at")
+                queryset = resources.exclude(user_map=user_map).order_by("-updated_at")
             else:
-                queryset = Resource.objects.filter(user_map=user_map).order_by("-updated_at")
+                queryset = resources.filter(user_map=user_map).order_by("-updated_at")
 
             page = self.paginate_queryset(queryset)
             serializer = ResourceListSerializer(page, many=True)
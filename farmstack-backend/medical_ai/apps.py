@@ -1,7 +1,17 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class MedicalAiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'medical_ai'
-    verbose_name = 'Medical AI Module'
\ No newline at end of file
+    verbose_name = 'Medical AI Module'
+
+    def ready(self):
+        if settings.MEDICAL_AI_SETTINGS.get('PRELOAD_MODEL'):
+            from .utils import get_skin_disease_model
+
+            # requests arriving meanwhile wait for the same load instead of starting another
+            threading.Thread(target=get_skin_disease_model, name='medical-ai-preload', daemon=True).start()
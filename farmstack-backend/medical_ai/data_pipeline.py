@@ -0,0 +1,294 @@
+"""
+Shared tf.data input pipeline for the Medical AI training and evaluation scripts
+
+Replaces Keras ``ImageDataGenerator.flow_from_directory``, which decodes and
+augments one image at a time in a single Python thread:
+
+- files are decoded and resized in parallel (``num_parallel_calls=AUTOTUNE``)
+- decoded, resized ``uint8`` images are cached in memory or in an on-disk
+  cache file, so later epochs skip JPEG decoding entirely
+- augmentation runs on whole batches, as one affine warp per image
+- batches are prefetched while the model trains on the previous one
+
+``image_split`` returns a DirectorySplit exposing the same ``samples``,
+``classes`` and ``class_indices`` attributes as the generators, and
+``StreamingEvaluation`` builds a confusion matrix batch by batch instead of
+keeping every prediction in memory.
+"""
+
+import os
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+AUTOTUNE = tf.data.AUTOTUNE
+# same extensions as flow_from_directory
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.ppm', '.tif', '.tiff')
+# not supported by tf.io.decode_image, decoded with PIL (as flow_from_directory does)
+PIL_EXTENSIONS = ('.ppm', '.tif', '.tiff')
+
+
+class DirectorySplit:
+    """A ``<directory>/<class name>/<image>`` dataset split and its batched tf.data pipeline"""
+
+    def __init__(self, dataset, paths, classes, class_indices, batch_size):
+        self.dataset = dataset
+        self.filepaths = paths
+        self.classes = classes
+        self.class_indices = class_indices
+        self.batch_size = batch_size
+
+    @property
+    def samples(self):
+        return len(self.classes)
+
+    @property
+    def steps(self):
+        """Batches per epoch, including the last partial batch"""
+        return -(-self.samples // self.batch_size)
+
+
+def list_images(directory, class_indices=None):
+    """
+    Image paths, integer labels and ``{class name: index}`` of a directory
+    with one subdirectory per class, in the order flow_from_directory uses
+    """
+    if class_indices is None:
+        names = sorted(entry.name for entry in os.scandir(directory) if entry.is_dir())
+        class_indices = {name: index for index, name in enumerate(names)}
+    paths, labels = [], []
+    for name, index in sorted(class_indices.items(), key=lambda item: item[1]):
+        class_dir = os.path.join(directory, name)
+        if not os.path.isdir(class_dir):
+            continue
+        for root, _, files in sorted(os.walk(class_dir, followlinks=True)):
+            for file_name in sorted(files):
+                if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(root, file_name))
+                    labels.append(index)
+    return paths, np.asarray(labels, dtype=np.int32), class_indices
+
+
+def augmentation(rotation_range=0, width_shift_range=0.0, height_shift_range=0.0, shear_range=0.0,
+                 zoom_range=0.0, horizontal_flip=False, vertical_flip=False, brightness_range=None,
+                 fill_mode='nearest', seed=None):
+    """
+    Batch augmentation function taking the ImageDataGenerator arguments of
+    the same name, applied to ``float32`` images in [0, 1].
+
+    Like ImageDataGenerator, rotation, shift, shear, zoom and flips are
+    composed into one affine transform per image, so each batch is warped by
+    a single ImageProjectiveTransform op instead of once per augmentation.
+    """
+    if isinstance(zoom_range, (int, float)):
+        zoom_range = (1 - zoom_range, 1 + zoom_range)
+    geometric = (rotation_range or width_shift_range or height_shift_range or shear_range
+                 or zoom_range != (1, 1) or horizontal_flip or vertical_flip)
+    if not geometric and not brightness_range:
+        return None
+
+    def uniform(batch, low, high):
+        return tf.random.uniform((batch,), low, high, seed=seed)
+
+    def flips(batch, enabled):
+        if not enabled:
+            return tf.ones((batch,))
+        return tf.where(uniform(batch, 0.0, 1.0) < 0.5, -1.0, 1.0)
+
+    def augment(images):
+        batch = tf.shape(images)[0]
+        height = tf.cast(tf.shape(images)[1], tf.float32)
+        width = tf.cast(tf.shape(images)[2], tf.float32)
+        if geometric:
+            theta = uniform(batch, -rotation_range, rotation_range) * (np.pi / 180)
+            shear = uniform(batch, -shear_range, shear_range) * (np.pi / 180)
+            shift_x = uniform(batch, -width_shift_range, width_shift_range) * width
+            shift_y = uniform(batch, -height_shift_range, height_shift_range) * height
+            zoom_x = uniform(batch, *zoom_range) * flips(batch, horizontal_flip)
+            zoom_y = uniform(batch, *zoom_range) * flips(batch, vertical_flip)
+            # output -> input pixel mapping: rotation . shear . zoom (with flips) about the image centre, then shift
+            cos, sin = tf.cos(theta), tf.sin(theta)
+            a0 = cos * zoom_x
+            a1 = (-cos * tf.sin(shear) - sin * tf.cos(shear)) * zoom_y
+            b0 = sin * zoom_x
+            b1 = (-sin * tf.sin(shear) + cos * tf.cos(shear)) * zoom_y
+            centre_x, centre_y = (width - 1) / 2, (height - 1) / 2
+            a2 = centre_x - a0 * centre_x - a1 * centre_y + shift_x
+            b2 = centre_y - b0 * centre_x - b1 * centre_y + shift_y
+            zeros = tf.zeros((batch,))
+            transforms = tf.stack([a0, a1, a2, b0, b1, b2, zeros, zeros], axis=1)
+            images = tf.raw_ops.ImageProjectiveTransformV3(
+                images=images, transforms=transforms, output_shape=tf.shape(images)[1:3], fill_value=0.0,
+                interpolation='BILINEAR', fill_mode=fill_mode.upper(),
+            )
+        if brightness_range:
+            # one random factor per image
+            low, high = brightness_range
+            factors = tf.reshape(uniform(batch, low, high), (-1, 1, 1, 1))
+            images = tf.clip_by_value(images * factors, 0.0, 1.0)
+        return images
+
+    return augment
+
+
+def _pil_rgb(path):
+    from PIL import Image
+
+    with Image.open(path.numpy().decode()) as image:
+        return np.asarray(image.convert('RGB'))
+
+
+def _decoder(img_size):
+    pil_pattern = '.*(' + '|'.join(extension.replace('.', r'\.') for extension in PIL_EXTENSIONS) + ')'
+
+    def pil_decode(path):
+        # runs under the GIL, only used for the rare TIFF/PPM files
+        image = tf.py_function(_pil_rgb, [path], tf.uint8)
+        image.set_shape((None, None, 3))
+        return image
+
+    def decode(path, label):
+        image = tf.cond(
+            tf.strings.regex_full_match(tf.strings.lower(path), pil_pattern),
+            lambda: pil_decode(path),
+            lambda: tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False),
+        )
+        # nearest neighbour like flow_from_directory, so the cached images stay uint8
+        image = tf.image.resize(image, (img_size, img_size), method='nearest')
+        return tf.cast(image, tf.uint8), label
+    return decode
+
+
+def image_split(directory, img_size=224, batch_size=32, training=False, class_indices=None, augment=None,
+                cache=True, shuffle_buffer=1024, seed=None):
+    """
+    DirectorySplit of ``directory`` yielding ``(images, one-hot labels)`` batches
+    of ``float32`` images rescaled to [0, 1].
+
+    ``cache`` is True to keep decoded images in memory, a file path prefix to
+    cache them on disk (reused by later runs, delete it when the images
+    change), or False. Training splits are reshuffled every epoch and passed
+    through ``augment`` (see ``augmentation``).
+    """
+    paths, labels, class_indices = list_images(directory, class_indices)
+    if not paths:
+        raise FileNotFoundError(f"No images found in {directory}")
+    num_classes = len(class_indices)
+
+    dataset = tf.data.Dataset.from_tensor_slices((paths, labels))
+    dataset = dataset.map(_decoder(img_size), num_parallel_calls=AUTOTUNE, deterministic=not training)
+    if cache:
+        if isinstance(cache, str):
+            os.makedirs(os.path.dirname(os.path.abspath(cache)), exist_ok=True)
+            dataset = dataset.cache(cache)
+        else:
+            dataset = dataset.cache()
+    if training:
+        dataset = dataset.shuffle(min(shuffle_buffer, len(paths)), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+
+    def prepare(images, batch_labels):
+        images = tf.cast(images, tf.float32) / 255.0
+        if training and augment is not None:
+            images = augment(images)
+        return images, tf.one_hot(batch_labels, num_classes)
+
+    dataset = dataset.map(prepare, num_parallel_calls=AUTOTUNE).prefetch(AUTOTUNE)
+    return DirectorySplit(dataset, paths, labels, class_indices, batch_size)
+
+
+class StreamingEvaluation:
+    """
+    Confusion matrix, loss, top-k accuracy and confidence statistics
+    accumulated batch by batch, so no prediction array is kept in memory
+    """
+
+    def __init__(self, num_classes, low_confidence=0.5):
+        self.num_classes = num_classes
+        self.low_confidence = low_confidence
+        self.confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+        self.count = 0
+        self.loss_sum = 0.0
+        self.top2_correct = 0
+        self.confidence_sum = 0.0
+        self.correct_confidence_sum = 0.0
+        self.low_confidence_count = 0
+
+    def update(self, y_true, probabilities):
+        """Add a batch of integer labels and predicted class probabilities"""
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        y_true = np.asarray(y_true, dtype=np.int64)
+        y_pred = probabilities.argmax(axis=1)
+        self.confusion += np.bincount(
+            y_true * self.num_classes + y_pred, minlength=self.num_classes ** 2
+        ).reshape(self.num_classes, self.num_classes)
+
+        rows = np.arange(len(y_true))
+        true_probability = probabilities[rows, y_true]
+        self.loss_sum += float(-np.log(np.clip(true_probability, 1e-7, 1.0)).sum())
+        if self.num_classes > 1:
+            top2 = np.argpartition(probabilities, -2, axis=1)[:, -2:]
+            self.top2_correct += int((top2 == y_true[:, None]).any(axis=1).sum())
+        else:
+            self.top2_correct += len(y_true)
+        confidences = probabilities[rows, y_pred]
+        self.confidence_sum += float(confidences.sum())
+        self.correct_confidence_sum += float(confidences[y_pred == y_true].sum())
+        self.low_confidence_count += int((confidences < self.low_confidence).sum())
+        self.count += len(y_true)
+
+    @property
+    def correct(self):
+        return int(np.trace(self.confusion))
+
+    @property
+    def accuracy(self):
+        return self.correct / self.count if self.count else 0.0
+
+    @property
+    def loss(self):
+        """Mean categorical cross-entropy, as reported by model.evaluate"""
+        return self.loss_sum / self.count if self.count else 0.0
+
+    @property
+    def top2_accuracy(self):
+        return self.top2_correct / self.count if self.count else 0.0
+
+    @property
+    def mean_confidence(self):
+        return self.confidence_sum / self.count if self.count else 0.0
+
+    @property
+    def mean_confidence_correct(self):
+        return self.correct_confidence_sum / self.correct if self.correct else 0.0
+
+    @property
+    def mean_confidence_wrong(self):
+        wrong = self.count - self.correct
+        return (self.confidence_sum - self.correct_confidence_sum) / wrong if wrong else 0.0
+
+    def classification_report(self, target_names, output_dict=False, digits=4):
+        """sklearn classification_report computed from the confusion matrix"""
+        from sklearn.metrics import classification_report
+
+        # one label pair per evaluated image, rebuilt from the matrix counts
+        labels = np.arange(self.num_classes)
+        counts = self.confusion.ravel()
+        y_true = np.repeat(np.repeat(labels, self.num_classes), counts)
+        y_pred = np.repeat(np.tile(labels, self.num_classes), counts)
+        return classification_report(
+            y_true, y_pred, labels=labels, target_names=target_names,
+            output_dict=output_dict, digits=digits, zero_division=0,
+        )
+
+
+def evaluate_split(model, split, low_confidence=0.5, verbose=True):
+    """Stream ``split`` through ``model`` once and return its StreamingEvaluation"""
+    evaluation = StreamingEvaluation(len(split.class_indices), low_confidence)
+    progress = keras.utils.Progbar(split.steps) if verbose else None
+    for images, labels in split.dataset:
+        evaluation.update(np.argmax(labels, axis=1), model.predict_on_batch(images))
+        if progress is not None:
+            progress.add(1, values=[('accuracy', evaluation.accuracy)])
+    return evaluation
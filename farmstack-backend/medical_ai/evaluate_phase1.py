@@ -7,11 +7,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from tensorflow import keras
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from sklearn.metrics import classification_report, confusion_matrix
 import json
 import os
 
+from data_pipeline import evaluate_split, image_split
+
 print("\n" + "="*70)
 print("📊 PHASE 1 MODEL EVALUATION")
 print("="*70)
@@ -32,33 +32,30 @@ for idx, name in enumerate(class_names):
 
 # Prepare validation data
 print("\n📊 Loading validation data...")
-val_datagen = ImageDataGenerator(rescale=1./255)
-validation_generator = val_datagen.flow_from_directory(
+validation_data = image_split(
     'data/skin_diseases_phase1_7cat/validation',
-    target_size=(224, 224),
+    img_size=224,
     batch_size=32,
-    class_mode='categorical',
-    shuffle=False
+    class_indices=class_indices,
+    cache=False
 )
 
-# Get predictions
+# Get predictions, streamed batch by batch into the confusion matrix
 print("\n🔮 Making predictions...")
-predictions = model.predict(validation_generator, verbose=1)
-y_pred = np.argmax(predictions, axis=1)
-y_true = validation_generator.classes
+evaluation = evaluate_split(model, validation_data)
 
 # Classification Report
 print("\n" + "="*70)
 print("📊 CLASSIFICATION REPORT")
 print("="*70)
-report = classification_report(y_true, y_pred, target_names=class_names, digits=4)
+report = evaluation.classification_report(class_names, digits=4)
 print(report)
 
 # Confusion Matrix
 print("\n" + "="*70)
 print("🔢 CONFUSION MATRIX")
 print("="*70)
-cm = confusion_matrix(y_true, y_pred)
+cm = evaluation.confusion
 
 # Print confusion matrix
 print(f"\n{'':20s}", end='')
@@ -140,11 +137,9 @@ print("\n" + "="*70)
 print("🎯 PREDICTION CONFIDENCE ANALYSIS")
 print("="*70)
 
-confidences = np.max(predictions, axis=1)
-avg_confidence = np.mean(confidences) * 100
-correct_mask = (y_pred == y_true)
-avg_conf_correct = np.mean(confidences[correct_mask]) * 100
-avg_conf_wrong = np.mean(confidences[~correct_mask]) * 100 if (~correct_mask).any() else 0
+avg_confidence = evaluation.mean_confidence * 100
+avg_conf_correct = evaluation.mean_confidence_correct * 100
+avg_conf_wrong = evaluation.mean_confidence_wrong * 100
 
 print(f"Average confidence (all):      {avg_confidence:.2f}%")
 print(f"Average confidence (correct):  {avg_conf_correct:.2f}%")
@@ -155,7 +150,7 @@ print("\n" + "="*70)
 print("📝 EVALUATION SUMMARY")
 print("="*70)
 print(f"✅ Overall Accuracy:     {overall_accuracy:.2f}%")
-print(f"✅ Top-2 Accuracy:       79.20%")
+print(f"✅ Top-2 Accuracy:       {evaluation.top2_accuracy * 100:.2f}%")
 print(f"✅ Average Confidence:   {avg_confidence:.2f}%")
 print(f"📊 Total Samples:        {total_samples}")
 print(f"✅ Correct Predictions:  {total_correct}")
@@ -11,11 +11,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from tensorflow import keras
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from sklearn.metrics import classification_report, confusion_matrix
 import json
 import os
 
+from data_pipeline import evaluate_split, image_split
+
 print("\n" + "="*70)
 print("📊 PHASE 1 MERGED MODEL EVALUATION (5 CATEGORIES)")
 print("="*70)
@@ -48,39 +48,36 @@ for idx, name in enumerate(class_names):
 
 # Prepare validation data
 print("\n📊 Loading validation data...")
-val_datagen = ImageDataGenerator(rescale=1./255)
 
 try:
-    validation_generator = val_datagen.flow_from_directory(
+    validation_data = image_split(
         'data/skin_diseases_phase1_5cat_merged/validation',
-        target_size=(224, 224),
+        img_size=224,
         batch_size=32,
-        class_mode='categorical',
-        shuffle=False
+        class_indices=class_indices,
+        cache=False
     )
-    print(f"✅ Validation samples: {validation_generator.samples}")
+    print(f"✅ Validation samples: {validation_data.samples}")
 except Exception as e:
     print(f"❌ Error loading validation data: {e}")
     exit(1)
 
-# Get predictions
+# Get predictions, streamed batch by batch into the confusion matrix
 print("\n🔮 Making predictions...")
-predictions = model.predict(validation_generator, verbose=1)
-y_pred = np.argmax(predictions, axis=1)
-y_true = validation_generator.classes
+evaluation = evaluate_split(model, validation_data)
 
 # Classification Report
 print("\n" + "="*70)
 print("📊 DETAILED CLASSIFICATION REPORT")
 print("="*70)
-report = classification_report(y_true, y_pred, target_names=class_names, digits=4)
+report = evaluation.classification_report(class_names, digits=4)
 print(report)
 
 # Confusion Matrix
 print("\n" + "="*70)
 print("🔢 CONFUSION MATRIX")
 print("="*70)
-cm = confusion_matrix(y_true, y_pred)
+cm = evaluation.confusion
 
 print(f"\n{'True ↓ / Pred →':<20s}", end='')
 for name in class_names:
@@ -192,11 +189,9 @@ print("\n" + "="*70)
 print("🎯 PREDICTION CONFIDENCE ANALYSIS")
 print("="*70)
 
-confidences = np.max(predictions, axis=1)
-avg_confidence = np.mean(confidences) * 100
-correct_mask = (y_pred == y_true)
-avg_conf_correct = np.mean(confidences[correct_mask]) * 100
-avg_conf_wrong = np.mean(confidences[~correct_mask]) * 100 if (~correct_mask).any() else 0
+avg_confidence = evaluation.mean_confidence * 100
+avg_conf_correct = evaluation.mean_confidence_correct * 100
+avg_conf_wrong = evaluation.mean_confidence_wrong * 100
 
 print(f"\nAverage confidence (all predictions):    {avg_confidence:.2f}%")
 print(f"Average confidence (correct predictions): {avg_conf_correct:.2f}%")
@@ -205,13 +200,11 @@ print(f"Confidence difference:                    {avg_conf_correct - avg_conf_w
 
 # Low confidence predictions
 low_conf_threshold = 50
-low_conf_count = np.sum(confidences * 100 < low_conf_threshold)
-print(f"\nLow confidence predictions (<{low_conf_threshold}%): {low_conf_count} ({low_conf_count/len(confidences)*100:.1f}%)")
+low_conf_count = evaluation.low_confidence_count
+print(f"\nLow confidence predictions (<{low_conf_threshold}%): {low_conf_count} ({low_conf_count/evaluation.count*100:.1f}%)")
 
 # Top-2 accuracy
-top_2_pred = np.argsort(predictions, axis=1)[:, -2:]
-top_2_correct = np.any(top_2_pred == y_true[:, np.newaxis], axis=1).sum()
-top_2_accuracy = (top_2_correct / len(y_true)) * 100
+top_2_accuracy = evaluation.top2_accuracy * 100
 
 print(f"\n✅ Top-2 Accuracy: {top_2_accuracy:.2f}%")
 print(f"   (Model's second guess is correct {top_2_accuracy:.1f}% of time)")
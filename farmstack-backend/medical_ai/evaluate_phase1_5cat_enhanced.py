@@ -9,15 +9,15 @@ Expected accuracy: 75-78%
 
 import tensorflow as tf
 from tensorflow import keras
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 import numpy as np
 import json
 import os
 from datetime import datetime
-from sklearn.metrics import classification_report, confusion_matrix
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from data_pipeline import evaluate_split, image_split
+
 # Configuration
 IMG_SIZE = 224
 BATCH_SIZE = 32
@@ -65,15 +65,14 @@ for idx in sorted(index_to_class.keys()):
 
 # Load validation data
 print(f"\n📊 Loading validation data from: {DATA_DIR}/validation")
-val_datagen = ImageDataGenerator(rescale=1./255)
 
 try:
-    val_gen = val_datagen.flow_from_directory(
+    val_gen = image_split(
         os.path.join(DATA_DIR, 'validation'),
-        target_size=(IMG_SIZE, IMG_SIZE),
+        img_size=IMG_SIZE,
         batch_size=BATCH_SIZE,
-        class_mode='categorical',
-        shuffle=False  # Important for correct evaluation
+        class_indices=class_indices,
+        cache=False
     )
     print(f"✅ Loaded {val_gen.samples} validation images")
 except Exception as e:
@@ -82,16 +81,15 @@ except Exception as e:
     print(f"   Please verify the path exists!")
     exit(1)
 
-# Evaluate
+# Evaluate: one streaming pass gives the loss, accuracies and confusion matrix
 print("\n🔄 Evaluating model on validation set...")
 print("   This may take 2-5 minutes...\n")
 
-steps = val_gen.samples // BATCH_SIZE
-results = model.evaluate(val_gen, steps=steps, verbose=1)
+evaluation = evaluate_split(model, val_gen)
 
-val_loss = results[0]
-val_acc = results[1]
-val_top2 = results[2] if len(results) > 2 else None
+val_loss = evaluation.loss
+val_acc = evaluation.accuracy
+val_top2 = evaluation.top2_accuracy
 
 print("\n" + "="*70)
 print("📊 OVERALL RESULTS")
@@ -101,38 +99,21 @@ print(f"   Validation Accuracy:    {val_acc:.4f} ({val_acc*100:.2f}%)")
 if val_top2:
     print(f"   Top-2 Accuracy:         {val_top2:.4f} ({val_top2*100:.2f}%)")
 
-# Get predictions for detailed analysis
-print("\n🔄 Generating predictions for detailed analysis...")
-val_gen.reset()
-predictions = model.predict(val_gen, steps=steps, verbose=1)
-predicted_classes = np.argmax(predictions, axis=1)
-true_classes = val_gen.classes[:len(predicted_classes)]
-
 # Classification report
 print("\n" + "="*70)
 print("📊 PER-CATEGORY PERFORMANCE")
 print("="*70)
 
 target_names = [index_to_class[i] for i in range(len(class_indices))]
-report = classification_report(
-    true_classes,
-    predicted_classes,
-    target_names=target_names,
-    digits=4
-)
+report = evaluation.classification_report(target_names, digits=4)
 print(report)
 
 # Save classification report
-report_dict = classification_report(
-    true_classes,
-    predicted_classes,
-    target_names=target_names,
-    output_dict=True
-)
+report_dict = evaluation.classification_report(target_names, output_dict=True)
 
 # Confusion Matrix
 print("\n🔄 Generating confusion matrix...")
-cm = confusion_matrix(true_classes, predicted_classes)
+cm = evaluation.confusion
 
 # Plot confusion matrix
 plt.figure(figsize=(10, 8))
@@ -164,9 +145,8 @@ print("-"*70)
 category_stats = {}
 for idx in range(len(class_indices)):
     class_name = index_to_class[idx]
-    mask = true_classes == idx
-    correct = np.sum(predicted_classes[mask] == idx)
-    total = np.sum(mask)
+    correct = cm[idx, idx]
+    total = cm[idx].sum()
     acc = (correct / total * 100) if total > 0 else 0
     
     category_stats[class_name] = {
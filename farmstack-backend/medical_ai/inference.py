@@ -0,0 +1,319 @@
+"""
+Process-resident model inference for the Medical AI module
+
+Models are loaded once per process through ``registry`` and warmed up on a
+dummy batch, so requests never pay for ``load_model``. Concurrent predictions
+are gathered by a MicroBatcher into batches of at most ``max_batch_size``
+images (waiting at most ``max_wait_ms`` for a batch to fill) and scored with a
+single forward pass.
+
+Besides Keras, a model can be served on CPU by ONNX Runtime or the TFLite
+interpreter after exporting the trained ``.h5``:
+
+    python medical_ai/inference.py --model medical_ai/models/skin_disease_model_best.h5 --format onnx
+"""
+
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger('medical_ai')
+
+EXTENSIONS = {'onnx': '.onnx', 'tflite': '.tflite'}
+
+
+class KerasBackend:
+    """Keras model loaded from an ``.h5`` file"""
+    name = 'keras'
+
+    def __init__(self, model_path, threads=None):
+        import tensorflow as tf
+
+        if threads:
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(threads)
+            except RuntimeError as e:
+                # only possible before TensorFlow runs its first operation
+                logger.warning(f"Could not set TensorFlow threads: {e}")
+        self.model = tf.keras.models.load_model(model_path, compile=False)
+
+    def predict(self, batch):
+        # calling the model directly skips the per-call dataset setup of model.predict
+        return np.asarray(self.model(batch, training=False))
+
+
+class OnnxBackend:
+    """ONNX Runtime CPU session"""
+    name = 'onnx'
+
+    def __init__(self, model_path, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class TFLiteBackend:
+    """TFLite interpreter, from tflite-runtime when installed, else from TensorFlow"""
+    name = 'tflite'
+
+    def __init__(self, model_path, threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+
+        self.interpreter = Interpreter(model_path=model_path, num_threads=threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self._shape = None
+
+    def predict(self, batch):
+        # the interpreter is not thread safe, the MicroBatcher worker is its only caller
+        if batch.shape != self._shape:
+            self.interpreter.resize_tensor_input(self.input['index'], batch.shape)
+            self.interpreter.allocate_tensors()
+            self._shape = batch.shape
+        self.interpreter.set_tensor(self.input['index'], batch)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output['index']).copy()
+
+
+BACKEND_CLASSES = {backend.name: backend for backend in (KerasBackend, OnnxBackend, TFLiteBackend)}
+
+
+class MicroBatcher:
+    """
+    Scores single inputs submitted from many threads in batches on one worker
+    thread. A batch is scored as soon as ``max_batch_size`` inputs are queued
+    or ``max_wait_ms`` after its first input arrived.
+    """
+
+    def __init__(self, predict, max_batch_size=8, max_wait_ms=10):
+        self.predict_batch = predict
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        # threads do not survive a fork, e.g. of a preloading gunicorn or celery parent
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._queue,), name='medical-ai-batcher', daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, item):
+        """Future of the prediction for one input"""
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+
+    def predict(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+
+    def _run(self, jobs):
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            batch = [job]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    job = jobs.get(timeout=max(deadline - time.monotonic(), 0)) if self.max_wait else jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._score(batch)
+                    return
+                batch.append(job)
+            self._score(batch)
+
+    def _score(self, batch):
+        batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            outputs = self.predict_batch(np.stack([item for item, _ in batch]))
+        except Exception as e:
+            logger.error(f"Batched prediction of {len(batch)} inputs failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), output in zip(batch, outputs):
+            future.set_result(output)
+
+
+class ResidentModel:
+    """A loaded, warmed up backend and the MicroBatcher feeding it"""
+
+    def __init__(self, backend, input_shape, max_batch_size=8, max_wait_ms=10):
+        self.backend = backend
+        self.input_shape = tuple(input_shape)
+        self.batcher = MicroBatcher(backend.predict, max_batch_size, max_wait_ms)
+
+    def warmup(self):
+        """Run the first (slow) forward passes on dummy inputs before serving"""
+        started = time.perf_counter()
+        for batch_size in sorted({1, self.batcher.max_batch_size}):
+            self.backend.predict(np.zeros((batch_size,) + self.input_shape, dtype=np.float32))
+        logger.info(f"Model warmed up in {time.perf_counter() - started:.2f}s ({self.backend.name} backend)")
+
+    def predict(self, image):
+        """Output for one preprocessed input, batched with concurrent requests"""
+        return self.batcher.predict(np.asarray(image, dtype=np.float32))
+
+    def predict_batch(self, images):
+        futures = [self.batcher.submit(np.asarray(image, dtype=np.float32)) for image in images]
+        return [future.result() for future in futures]
+
+
+class ModelRegistry:
+    """Process-wide ResidentModels, each loaded on first use"""
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """The model stored under ``key``, created by ``loader`` unless present; ``None`` results are not kept"""
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = loader()
+                    if model is not None:
+                        self._models[key] = model
+        return model
+
+    def loaded(self, key):
+        return key in self._models
+
+    def clear(self):
+        with self._lock:
+            models, self._models = self._models, {}
+        for model in models.values():
+            model.batcher.close()
+
+
+registry = ModelRegistry()
+
+
+def exported_path(model_path, backend):
+    return os.path.splitext(model_path)[0] + EXTENSIONS[backend]
+
+
+def load_resident_model(model_path, input_shape, backend='keras', backend_path=None, threads=None,
+                        max_batch_size=8, max_wait_ms=10, warmup=True):
+    """
+    Load ``model_path`` (an ``.h5``) with ``backend``, reading the exported
+    model at ``backend_path`` for ONNX/TFLite. Falls back to Keras when that
+    runtime or export is unavailable. Returns None when no model file exists.
+    """
+    if backend != 'keras':
+        backend_path = backend_path or exported_path(model_path, backend)
+        try:
+            if not os.path.exists(backend_path):
+                raise FileNotFoundError(f"{backend_path} not found, export it from {model_path} first")
+            loaded = BACKEND_CLASSES[backend](backend_path, threads)
+        except Exception as e:
+            logger.warning(f"{backend} backend unavailable ({e}), using keras")
+        else:
+            logger.info(f"Model loaded successfully from {backend_path} ({backend} backend)")
+            return _resident(loaded, input_shape, max_batch_size, max_wait_ms, warmup)
+    if not os.path.exists(model_path):
+        logger.warning(f"Model file not found at {model_path}")
+        return None
+    loaded = KerasBackend(model_path, threads)
+    logger.info(f"Model loaded successfully from {model_path}")
+    return _resident(loaded, input_shape, max_batch_size, max_wait_ms, warmup)
+
+
+def _resident(backend, input_shape, max_batch_size, max_wait_ms, warmup):
+    model = ResidentModel(backend, input_shape, max_batch_size, max_wait_ms)
+    if warmup:
+        model.warmup()
+    return model
+
+
+def export_model(model_path, backend, output_path=None, quantize=False):
+    """
+    Export the Keras ``.h5`` at ``model_path`` for the ``onnx`` or ``tflite``
+    backend (needs tf2onnx for ONNX). ``quantize`` applies TFLite dynamic range
+    quantization. Returns the written path.
+    """
+    import tensorflow as tf
+
+    output_path = output_path or exported_path(model_path, backend)
+    model = tf.keras.models.load_model(model_path, compile=False)
+    if backend == 'onnx':
+        import tf2onnx
+
+        signature = (tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name='input'),)
+        tf2onnx.convert.from_keras(model, input_signature=signature, opset=13, output_path=output_path)
+    elif backend == 'tflite':
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as saved_model_dir:
+            # Keras 3 models only convert reliably through an exported SavedModel
+            if hasattr(model, 'export'):
+                model.export(saved_model_dir)
+            else:
+                tf.saved_model.save(model, saved_model_dir)
+            converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+            if quantize:
+                converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            tflite_model = converter.convert()
+        with open(output_path, 'wb') as f:
+            f.write(tflite_model)
+    else:
+        raise ValueError(f"Cannot export to {backend}, choose one of {', '.join(EXTENSIONS)}")
+    logger.info(f"Exported {model_path} to {output_path}")
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a Keras .h5 model for the ONNX Runtime or TFLite backend')
+    parser.add_argument('--model', required=True, help='path of the .h5 model')
+    parser.add_argument('--format', choices=sorted(EXTENSIONS), default='onnx')
+    parser.add_argument('--output', help='defaults to the model path with the format extension')
+    parser.add_argument('--quantize', action='store_true', help='TFLite dynamic range quantization')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(export_model(args.model, args.format, args.output, args.quantize))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,164 +3,153 @@ Medical Report Analyzer
 Analyzes medical reports and provides simplified explanations
 """
 
-import cv2
-import pytesseract
-import numpy as np
-from PIL import Image
-import re
-import os
 import logging
 
+from ..ocr import TermMatcher, get_ocr_engine, load_page, preprocess_page
+
 logger = logging.getLogger('medical_ai')
 
+# Medical terms dictionary with simple explanations
+MEDICAL_TERMS = {
+    # Common CT/MRI terms
+    "lesion": "an area of abnormal tissue",
+    "nodule": "a small lump or growth",
+    "mass": "a lump or growth in the body",
+    "edema": "swelling caused by fluid buildup",
+    "inflammation": "redness and swelling due to body's response",
+    "hemorrhage": "bleeding inside the body",
+    "fracture": "a broken bone",
+    "stenosis": "narrowing of a passage or vessel",
+    "hypertrophy": "enlargement of an organ or tissue",
+    "atrophy": "shrinking or wasting away of tissue",
+
+    # Lab report terms
+    "elevated": "higher than normal",
+    "decreased": "lower than normal",
+    "hemoglobin": "protein that carries oxygen in blood",
+    "glucose": "blood sugar level",
+    "cholesterol": "fat-like substance in blood",
+    "creatinine": "waste product that shows kidney function",
+    "bilirubin": "yellow substance from broken down red blood cells",
+    "wbc": "white blood cells - fight infections",
+    "rbc": "red blood cells - carry oxygen",
+    "platelet": "cells that help blood clot",
+
+    # General terms
+    "benign": "not cancerous, not harmful",
+    "malignant": "cancerous, harmful",
+    "chronic": "long-lasting condition",
+    "acute": "sudden and severe",
+    "prognosis": "expected outcome of a disease"
+}
+
+REMEDIES = {
+    "elevated glucose": [
+        "Exercise regularly (30 minutes daily)",
+        "Reduce sugar and refined carbs intake",
+        "Drink plenty of water",
+        "Include fiber-rich foods in diet",
+        "Get adequate sleep (7-8 hours)"
+    ],
+    "elevated cholesterol": [
+        "Eat more omega-3 rich foods (fish, nuts)",
+        "Increase soluble fiber intake (oats, beans)",
+        "Exercise regularly",
+        "Avoid trans fats and processed foods",
+        "Maintain healthy weight"
+    ],
+    "low hemoglobin": [
+        "Eat iron-rich foods (spinach, red meat, lentils)",
+        "Include vitamin C to improve iron absorption",
+        "Eat folate-rich foods (leafy greens, citrus)",
+        "Consider vitamin B12 supplements",
+        "Avoid tea/coffee with meals"
+    ],
+    "inflammation": [
+        "Apply ice to reduce swelling",
+        "Rest the affected area",
+        "Take turmeric (natural anti-inflammatory)",
+        "Eat omega-3 rich foods",
+        "Stay hydrated"
+    ]
+}
+
+TERM_MATCHER = TermMatcher(MEDICAL_TERMS)
+REMEDY_MATCHER = TermMatcher(REMEDIES, plurals=False)
+
 
 class MedicalReportAnalyzer:
     """Analyze medical reports and provide simplified explanations"""
-    
-    def __init__(self):
-        # Set tesseract path for Windows
-        pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-        
-        # Medical terms dictionary with simple explanations
-        self.medical_terms = {
-            # Common CT/MRI terms
-            "lesion": "an area of abnormal tissue",
-            "nodule": "a small lump or growth",
-            "mass": "a lump or growth in the body",
-            "edema": "swelling caused by fluid buildup",
-            "inflammation": "redness and swelling due to body's response",
-            "hemorrhage": "bleeding inside the body",
-            "fracture": "a broken bone",
-            "stenosis": "narrowing of a passage or vessel",
-            "hypertrophy": "enlargement of an organ or tissue",
-            "atrophy": "shrinking or wasting away of tissue",
-            
-            # Lab report terms
-            "elevated": "higher than normal",
-            "decreased": "lower than normal",
-            "hemoglobin": "protein that carries oxygen in blood",
-            "glucose": "blood sugar level",
-            "cholesterol": "fat-like substance in blood",
-            "creatinine": "waste product that shows kidney function",
-            "bilirubin": "yellow substance from broken down red blood cells",
-            "wbc": "white blood cells - fight infections",
-            "rbc": "red blood cells - carry oxygen",
-            "platelet": "cells that help blood clot",
-            
-            # General terms
-            "benign": "not cancerous, not harmful",
-            "malignant": "cancerous, harmful",
-            "chronic": "long-lasting condition",
-            "acute": "sudden and severe",
-            "prognosis": "expected outcome of a disease"
-        }
-        
-        self.remedies = {
-            "elevated glucose": [
-                "Exercise regularly (30 minutes daily)",
-                "Reduce sugar and refined carbs intake",
-                "Drink plenty of water",
-                "Include fiber-rich foods in diet",
-                "Get adequate sleep (7-8 hours)"
-            ],
-            "elevated cholesterol": [
-                "Eat more omega-3 rich foods (fish, nuts)",
-                "Increase soluble fiber intake (oats, beans)",
-                "Exercise regularly",
-                "Avoid trans fats and processed foods",
-                "Maintain healthy weight"
-            ],
-            "low hemoglobin": [
-                "Eat iron-rich foods (spinach, red meat, lentils)",
-                "Include vitamin C to improve iron absorption",
-                "Eat folate-rich foods (leafy greens, citrus)",
-                "Consider vitamin B12 supplements",
-                "Avoid tea/coffee with meals"
-            ],
-            "inflammation": [
-                "Apply ice to reduce swelling",
-                "Rest the affected area",
-                "Take turmeric (natural anti-inflammatory)",
-                "Eat omega-3 rich foods",
-                "Stay hydrated"
-            ]
-        }
-    
+
+    medical_terms = MEDICAL_TERMS
+    remedies = REMEDIES
+
+    def __init__(self, ocr_engine=None):
+        # OCR runs on the process-wide worker pool, tesseract is found through settings or PATH
+        self.ocr_engine = ocr_engine or get_ocr_engine()
+
     def preprocess_image(self, image_path):
         """Preprocess image for better OCR results"""
         try:
-            img = cv2.imread(image_path)
-            if img is None:
-                logger.error(f"Could not read image: {image_path}")
-                return None
-                
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Apply thresholding
-            thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-            
-            # Denoise
-            denoised = cv2.medianBlur(thresh, 3)
-            
-            return denoised
+            with open(image_path, 'rb') as f:
+                return preprocess_page(load_page(f.read(), image_path))
         except Exception as e:
             logger.error(f"Error preprocessing image: {e}")
             return None
-    
+
     def extract_text(self, image_path):
-        """Extract text from medical report image"""
+        """Extract text from medical report image or PDF"""
+        try:
+            with open(image_path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            logger.error(f"Could not read report: {e}")
+            return ""
+        return self.extract_text_from_bytes(data, image_path)
+
+    def extract_text_from_bytes(self, data, name=''):
+        """Extract text from the contents of an uploaded report, all pages OCRed in parallel"""
         try:
-            processed_img = self.preprocess_image(image_path)
-            if processed_img is None:
-                return ""
-                
-            text = pytesseract.image_to_string(processed_img)
-            logger.info(f"Extracted {len(text)} characters from image")
-            return text
+            return self.ocr_engine.extract_text(data, name)
         except Exception as e:
             logger.error(f"Error extracting text: {e}")
             return ""
-    
+
     def analyze_report(self, image_path):
         """Analyze medical report and provide summary"""
         logger.info(f"Analyzing report: {image_path}")
-        
-        # Extract text
-        text = self.extract_text(image_path)
-        
+        return self.analyze_text(self.extract_text(image_path))
+
+    def analyze_report_bytes(self, data, name=''):
+        """Analyze an uploaded report without writing it to disk"""
+        logger.info(f"Analyzing report: {name}")
+        return self.analyze_text(self.extract_text_from_bytes(data, name))
+
+    def analyze_text(self, text):
+        """Summary of the OCRed text of a report"""
         if not text:
             return {
                 "success": False,
                 "message": "Unable to extract text from image. Please ensure the image is clear and readable."
             }
-        
-        # Convert to lowercase for analysis
-        text_lower = text.lower()
-        
+
         # Find medical terms
-        found_terms = {}
-        for term, explanation in self.medical_terms.items():
-            if term in text_lower:
-                found_terms[term] = explanation
-        
-        # Extract numerical values (for lab reports)
-        numbers = re.findall(r'(\w+)\s*[:-]?\s*(\d+\.?\d*)\s*(mg|mmol|g|dl)?', text_lower)
-        
+        found_terms = TERM_MATCHER.find(text)
+
         # Identify issues
         issues = []
         recommendations = []
-        
+
         for term in found_terms.keys():
             if term in ["elevated", "high", "increased"]:
                 issues.append("Some values are higher than normal")
             elif term in ["decreased", "low", "reduced"]:
                 issues.append("Some values are lower than normal")
-        
+
         # Get recommendations based on findings
-        for condition, remedies in self.remedies.items():
-            if condition in text_lower:
-                recommendations.extend(remedies)
-        
+        for remedies in REMEDY_MATCHER.find(text).values():
+            recommendations.extend(remedies)
+
         # Generate summary
         summary = {
             "success": True,
@@ -180,9 +169,4 @@ class MedicalReportAnalyzer:
     
     def simplify_text(self, medical_text):
         """Simplify medical terminology in text"""
-        simplified = medical_text
-        for term, explanation in self.medical_terms.items():
-            pattern = re.compile(re.escape(term), re.IGNORECASE)
-            simplified = pattern.sub(f"{term} ({explanation})", simplified)
-        
-        return simplified
\ No newline at end of file
+        return TERM_MATCHER.sub(lambda term, explanation, matched: f"{matched} ({explanation})", medical_text)
\ No newline at end of file
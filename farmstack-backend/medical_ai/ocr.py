@@ -0,0 +1,253 @@
+"""
+OCR engine for the Medical AI module
+
+The pages of a document (PDF pages, rendered with PyMuPDF, or frames of a
+multi-frame image such as a TIFF) are rendered, preprocessed and OCRed in
+parallel on a bounded process pool. Extracted text is cached by the SHA-256 of the uploaded bytes, so the
+same report uploaded twice is only OCRed once.
+
+The tesseract binary is taken from ``MEDICAL_AI_SETTINGS['TESSERACT_PATH']``
+(env ``MEDICAL_AI_TESSERACT_PATH``) and otherwise looked up on ``PATH``.
+"""
+
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger('medical_ai')
+
+PDF_DPI = 300
+
+
+def find_tesseract(configured=None):
+    """Path of the tesseract binary: ``configured`` when it exists, else the one on PATH"""
+    if configured and (os.path.isfile(configured) or shutil.which(configured)):
+        return configured
+    found = shutil.which('tesseract')
+    if configured and found:
+        logger.warning(f"Tesseract not found at {configured}, using {found}")
+    return found
+
+
+def is_pdf(data, name=''):
+    return data[:5] == b'%PDF-' or name.lower().endswith('.pdf')
+
+
+def count_pages(data, name=''):
+    """Number of pages of a document: PDF pages or frames of a (e.g. TIFF) image"""
+    if is_pdf(data, name):
+        import fitz
+
+        with fitz.open(stream=data, filetype='pdf') as pdf:
+            return pdf.page_count
+
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        return getattr(img, 'n_frames', 1)
+
+
+def load_page(data, name='', index=0):
+    """Grayscale array of one page; PDF pages are rendered at ``PDF_DPI``"""
+    import numpy as np
+
+    if is_pdf(data, name):
+        import fitz
+
+        with fitz.open(stream=data, filetype='pdf') as pdf:
+            pixmap = pdf[index].get_pixmap(dpi=PDF_DPI, colorspace=fitz.csGRAY)
+        rows = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.stride)
+        return rows[:, :pixmap.width]
+
+    if index == 0:
+        import cv2
+
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            return img
+
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.seek(index)
+        return np.asarray(img.convert('L'))
+
+
+def preprocess_page(gray):
+    """Otsu threshold and denoise a grayscale page for OCR"""
+    import cv2
+
+    thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    return cv2.medianBlur(thresh, 3)
+
+
+def tesseract_page(data, name, index, tesseract_cmd=None):
+    """Text of page ``index`` of a document, run in the pool workers"""
+    import pytesseract
+
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    return pytesseract.image_to_string(preprocess_page(load_page(data, name, index)))
+
+
+class OcrCache:
+    """Extracted text in the Django cache, keyed by the content hash of the document"""
+
+    def __init__(self, timeout=None, prefix='medical_ai:ocr:'):
+        self.timeout = timeout
+        self.prefix = prefix
+
+    def get(self, digest):
+        from django.core.cache import cache
+
+        return cache.get(self.prefix + digest)
+
+    def set(self, digest, text):
+        from django.core.cache import cache
+
+        cache.set(self.prefix + digest, text, self.timeout)
+
+
+class OcrEngine:
+    """
+    Bounded process pool OCRing the pages of a document in parallel.
+
+    ``page_ocr`` is a picklable ``(data, name, page_index, tesseract_cmd) -> text``
+    function, so rendering and preprocessing happen in the workers too; the pool is started on first use with the ``spawn`` method,
+    since forking a process that already runs TensorFlow or server threads
+    is unsafe.
+    """
+
+    def __init__(self, max_workers=None, tesseract_cmd=None, cache=None, page_ocr=tesseract_page):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.tesseract_cmd = tesseract_cmd
+        self.cache = cache
+        self.page_ocr = page_ocr
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn')
+                )
+                self._pid = os.getpid()
+            return self._pool
+
+    def _reset(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def ocr_pages(self, data, name='', pages=1):
+        """Texts of the first ``pages`` pages of a document, in page order"""
+        if not pages:
+            return []
+        pool = self._executor()
+        try:
+            return list(pool.map(
+                self.page_ocr, [data] * pages, [name] * pages, range(pages), [self.tesseract_cmd] * pages
+            ))
+        except BrokenProcessPool:
+            # a worker died (e.g. OOM killed), start a fresh pool for the next document
+            self._reset(pool)
+            raise
+
+    def extract_text(self, data, name=''):
+        """Text of a document given as bytes, from the cache when the same bytes were OCRed before"""
+        digest = hashlib.sha256(data).hexdigest()
+        if self.cache is not None:
+            text = self.cache.get(digest)
+            if text is not None:
+                logger.info(f"OCR cache hit for {name or digest[:12]}")
+                return text
+        pages = count_pages(data, name)
+        text = '\n'.join(self.ocr_pages(data, name, pages))
+        logger.info(f"Extracted {len(text)} characters from {pages} page(s)")
+        if self.cache is not None:
+            self.cache.set(digest, text)
+        return text
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+def trie_regex(words):
+    """Regex source matching any of ``words``, factored by common prefixes so each position is tried once"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+class TermMatcher:
+    """Finds any of a fixed set of terms in one pass of a single compiled regex"""
+
+    def __init__(self, terms, plurals=True):
+        self.terms = {term.lower(): value for term, value in terms.items()}
+        suffix = r'(?:s|es)?' if plurals else ''
+        source = rf'(?<![a-z0-9])({trie_regex(self.terms)}){suffix}(?![a-z0-9])'
+        # find() runs on lowercased text, which is much faster than re.IGNORECASE
+        self.pattern = re.compile(source)
+        self.pattern_ignorecase = re.compile(source, re.IGNORECASE)
+
+    def find(self, text):
+        """``{term: value}`` of the terms found in ``text``, in the order the terms were given"""
+        found = set(self.pattern.findall(text.lower()))
+        return {term: value for term, value in self.terms.items() if term in found}
+
+    def sub(self, replace, text):
+        """``text`` with every occurrence replaced by ``replace(term, value, matched_text)``"""
+        def substitute(match):
+            term = match.group(1).lower()
+            return replace(term, self.terms[term], match.group(0))
+
+        return self.pattern_ignorecase.sub(substitute, text)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine():
+    """Process-wide OcrEngine configured from ``MEDICAL_AI_SETTINGS``"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from django.conf import settings
+
+                config = settings.MEDICAL_AI_SETTINGS
+                tesseract_cmd = find_tesseract(config.get('TESSERACT_PATH'))
+                if tesseract_cmd is None:
+                    logger.error("Tesseract not found, set MEDICAL_AI_TESSERACT_PATH or add tesseract to PATH")
+                _engine = OcrEngine(
+                    max_workers=config.get('OCR_WORKERS'),
+                    tesseract_cmd=tesseract_cmd,
+                    cache=OcrCache(config.get('OCR_CACHE_TIMEOUT')),
+                )
+    return _engine
@@ -0,0 +1,64 @@
+import os
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase
+from PIL import Image
+from sklearn.metrics import classification_report, confusion_matrix
+
+from medical_ai.data_pipeline import StreamingEvaluation, augmentation, image_split
+
+
+class StreamingEvaluationTests(SimpleTestCase):
+    def test_batches_match_the_metrics_of_all_predictions(self):
+        rng = np.random.default_rng(0)
+        y_true = rng.integers(0, 4, 103)
+        probabilities = rng.dirichlet(np.ones(4), 103)
+        evaluation = StreamingEvaluation(4)
+        for start in range(0, 103, 32):
+            evaluation.update(y_true[start:start + 32], probabilities[start:start + 32])
+
+        y_pred = probabilities.argmax(axis=1)
+        np.testing.assert_array_equal(evaluation.confusion, confusion_matrix(y_true, y_pred, labels=range(4)))
+        self.assertAlmostEqual(evaluation.accuracy, np.mean(y_true == y_pred))
+        self.assertAlmostEqual(evaluation.loss, -np.mean(np.log(probabilities[np.arange(103), y_true])))
+        top2 = np.argsort(probabilities, axis=1)[:, -2:]
+        self.assertAlmostEqual(evaluation.top2_accuracy, np.mean((top2 == y_true[:, None]).any(axis=1)))
+        self.assertEqual(
+            evaluation.classification_report(list('abcd')),
+            classification_report(y_true, y_pred, target_names=list('abcd'), digits=4, zero_division=0),
+        )
+
+
+class ImageSplitTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for name, color in (('acne', 30), ('rash', 220)):
+            os.makedirs(os.path.join(self.directory, name))
+            for index in range(3):
+                Image.new('RGB', (50, 40), (color, color, color)).save(os.path.join(self.directory, name, f'{index}.png'))
+
+    def test_batches_are_rescaled_with_one_hot_labels_in_directory_order(self):
+        split = image_split(self.directory, img_size=16, batch_size=4)
+        self.assertEqual(split.class_indices, {'acne': 0, 'rash': 1})
+        self.assertEqual((split.samples, split.steps), (6, 2))
+        images, labels = np.concatenate([x for x, _ in split.dataset]), np.concatenate([y for _, y in split.dataset])
+        self.assertEqual(images.shape, (6, 16, 16, 3))
+        np.testing.assert_allclose(images[:, 0, 0, 0], [30 / 255] * 3 + [220 / 255] * 3, rtol=1e-6)
+        np.testing.assert_array_equal(labels.argmax(axis=1), split.classes)
+
+    def test_tiff_and_ppm_images_are_decoded(self):
+        for extension, color in (('tif', 90), ('tiff', 120), ('ppm', 150)):
+            Image.new('RGB', (50, 40), (color, color, color)).save(os.path.join(self.directory, 'acne', f'x.{extension}'))
+        split = image_split(self.directory, img_size=16, batch_size=9)
+        images = np.concatenate([x for x, _ in split.dataset])
+        self.assertEqual(images.shape, (9, 16, 16, 3))
+        # acne: 0.png 1.png 2.png x.ppm x.tif x.tiff
+        np.testing.assert_allclose(images[:6, 0, 0, 0] * 255, [30, 30, 30, 150, 90, 120], rtol=1e-5)
+
+    def test_training_split_is_augmented(self):
+        augment = augmentation(rotation_range=30, zoom_range=0.2, horizontal_flip=True, brightness_range=[0.5, 0.6])
+        split = image_split(self.directory, img_size=16, batch_size=6, training=True, augment=augment, seed=1)
+        images, labels = next(iter(split.dataset))
+        self.assertEqual(images.shape, (6, 16, 16, 3))
+        self.assertLess(float(np.max(images)), 220 / 255)
@@ -0,0 +1,87 @@
+import threading
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from medical_ai import inference
+
+
+class FakeBackend:
+    name = 'fake'
+
+    def __init__(self):
+        self.batch_sizes = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def predict(self, batch):
+        self.release.wait()
+        self.batch_sizes.append(len(batch))
+        # one "probability" row per input: its mean and its position in the batch
+        return np.stack([batch.reshape(len(batch), -1).mean(axis=1), np.arange(len(batch))], axis=1)
+
+
+class TestMicroBatcher(SimpleTestCase):
+    def setUp(self):
+        self.backend = FakeBackend()
+
+    def test_concurrent_requests_share_a_forward_pass(self):
+        batcher = inference.MicroBatcher(self.backend.predict, max_batch_size=4, max_wait_ms=200)
+        self.backend.release.clear()
+        futures = [batcher.submit(np.full((2, 2), value, dtype=np.float32)) for value in range(6)]
+        self.backend.release.set()
+        results = [future.result(timeout=5) for future in futures]
+        batcher.close()
+        assert [result[0] for result in results] == [0, 1, 2, 3, 4, 5]
+        assert sorted(self.backend.batch_sizes, reverse=True) == [4, 2]
+
+    def test_single_request_is_not_held_beyond_max_wait(self):
+        batcher = inference.MicroBatcher(self.backend.predict, max_batch_size=8, max_wait_ms=0)
+        assert batcher.predict(np.ones((2, 2), dtype=np.float32), timeout=5)[0] == 1
+        batcher.close()
+        assert self.backend.batch_sizes == [1]
+
+    def test_errors_reach_every_caller_of_the_batch(self):
+        def fail(batch):
+            raise RuntimeError('out of memory')
+
+        batcher = inference.MicroBatcher(fail, max_batch_size=2, max_wait_ms=0)
+        with self.assertRaises(RuntimeError):
+            batcher.predict(np.zeros(3), timeout=5)
+        batcher.close()
+
+
+class TestModelRegistry(SimpleTestCase):
+    def test_model_is_loaded_and_warmed_up_once(self):
+        registry = inference.ModelRegistry()
+        backend = FakeBackend()
+        loads = []
+
+        def load():
+            loads.append(1)
+            model = inference.ResidentModel(backend, (2, 2), max_batch_size=4, max_wait_ms=0)
+            model.warmup()
+            return model
+
+        threads = [threading.Thread(target=registry.get, args=('skin', load)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        model = registry.get('skin', load)
+        assert len(loads) == 1
+        assert backend.batch_sizes == [1, 4]
+        assert [row[0] for row in model.predict_batch([np.zeros((2, 2)), np.ones((2, 2))])] == [0, 1]
+        registry.clear()
+        assert not registry.loaded('skin')
+
+    def test_missing_models_are_not_cached(self):
+        registry = inference.ModelRegistry()
+        assert registry.get('skin', lambda: None) is None
+        assert registry.get('skin', lambda: 'loaded') == 'loaded'
+
+    def test_missing_export_falls_back_to_keras_and_missing_model_returns_none(self):
+        with self.assertLogs('medical_ai', level='WARNING') as logs:
+            assert inference.load_resident_model('/nonexistent/model.h5', (4, 4, 3), backend='onnx') is None
+        assert 'onnx backend unavailable' in logs.output[0]
+        assert 'Model file not found' in logs.output[1]
@@ -0,0 +1,101 @@
+import hashlib
+import io
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from medical_ai.models.report_analyzer import MedicalReportAnalyzer
+from medical_ai.ocr import OcrEngine, TermMatcher, count_pages, find_tesseract, load_page
+
+
+def page_digest(data, name, index, tesseract_cmd=None):
+    # stands in for tesseract in the pool workers, must be importable there
+    return hashlib.md5(load_page(data, name, index).tobytes()).hexdigest()
+
+
+def failing_ocr(data, name, index, tesseract_cmd=None):
+    raise AssertionError("page should have come from the cache")
+
+
+def pdf_bytes(pages):
+    import fitz
+
+    with fitz.open() as pdf:
+        for number in range(pages):
+            pdf.new_page().insert_text((72, 72), f"Glucose page {number}")
+        return pdf.tobytes()
+
+
+class DictCache:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, digest):
+        return self.values.get(digest)
+
+    def set(self, digest, text):
+        self.values[digest] = text
+
+
+class FakeEngine:
+    def __init__(self, text):
+        self.text = text
+
+    def extract_text(self, data, name=''):
+        return self.text
+
+
+class OcrEngineTests(SimpleTestCase):
+    def setUp(self):
+        self.engine = OcrEngine(max_workers=2, cache=DictCache(), page_ocr=page_digest)
+        self.addCleanup(self.engine.close)
+
+    def test_pdf_pages_are_ocred_in_parallel_in_page_order(self):
+        data = pdf_bytes(3)
+        self.assertEqual(count_pages(data), 3)
+        expected = [page_digest(data, 'report.pdf', index) for index in range(3)]
+        self.assertEqual(len(set(expected)), 3)
+        self.assertEqual(self.engine.extract_text(data, 'report.pdf'), '\n'.join(expected))
+
+    def test_frames_of_a_multipage_tiff_are_pages(self):
+        from PIL import Image
+
+        frames = [Image.new('L', (40, 20), color) for color in (0, 255)]
+        buffer = io.BytesIO()
+        frames[0].save(buffer, format='TIFF', save_all=True, append_images=frames[1:])
+        data = buffer.getvalue()
+        self.assertEqual(count_pages(data, 'scan.tiff'), 2)
+        self.assertEqual(load_page(data, 'scan.tiff', 1).shape, (20, 40))
+        self.assertEqual(load_page(data, 'scan.tiff', 1).min(), 255)
+
+    def test_same_bytes_are_served_from_the_cache(self):
+        data = pdf_bytes(2)
+        text = self.engine.extract_text(data)
+        self.engine.page_ocr = failing_ocr
+        self.assertEqual(self.engine.extract_text(data), text)
+        self.assertEqual(list(self.engine.cache.values), [hashlib.sha256(data).hexdigest()])
+
+    def test_configured_tesseract_falls_back_to_path(self):
+        with mock.patch('medical_ai.ocr.shutil.which', side_effect=lambda cmd: '/usr/bin/tesseract' if cmd == 'tesseract' else None):
+            with self.assertLogs('medical_ai', 'WARNING'):
+                self.assertEqual(find_tesseract(r'C:\Program Files\Tesseract-OCR\tesseract.exe'), '/usr/bin/tesseract')
+            self.assertEqual(find_tesseract(None), '/usr/bin/tesseract')
+
+
+class TermMatcherTests(SimpleTestCase):
+    def test_terms_are_matched_on_word_boundaries_with_plurals(self):
+        matcher = TermMatcher({'mass': 'a lump', 'platelet': 'clotting cells', 'elevated glucose': 'high sugar'})
+        found = matcher.find('Platelets normal. Elevated   glucose; ELEVATED GLUCOSE. Massive improvement.')
+        self.assertEqual(found, {'platelet': 'clotting cells', 'elevated glucose': 'high sugar'})
+
+    def test_simplify_keeps_the_matched_text(self):
+        analyzer = MedicalReportAnalyzer(ocr_engine=FakeEngine(''))
+        self.assertEqual(analyzer.simplify_text('Mild Edema.'), 'Mild Edema (swelling caused by fluid buildup).')
+
+    def test_report_findings_and_recommendations(self):
+        analyzer = MedicalReportAnalyzer(ocr_engine=FakeEngine('Result: elevated glucose 180 mg/dl, WBC normal'))
+        result = analyzer.analyze_report_bytes(b'...', 'lab.png')
+        self.assertTrue(result['success'])
+        self.assertEqual(list(result['medical_terms_found']), ['elevated', 'glucose', 'wbc'])
+        self.assertEqual(result['key_findings'], ['Some values are higher than normal'])
+        self.assertIn('Drink plenty of water', result['recommendations'])
@@ -15,7 +15,6 @@ Training time: ~3-4 hours
 
 import tensorflow as tf
 from tensorflow import keras
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping, ReduceLROnPlateau, CSVLogger
 from sklearn.utils.class_weight import compute_class_weight
 import numpy as np
@@ -23,6 +22,8 @@ import os
 import json
 from datetime import datetime
 
+from data_pipeline import augmentation, image_split
+
 # Configuration
 IMG_SIZE = 224
 BATCH_SIZE = 32
@@ -35,6 +36,8 @@ DATA_DIR = 'data/skin_diseases_phase1_enhanced_5cat'
 
 MODEL_DIR = 'models'
 LOGS_DIR = 'logs'
+# Decoded, resized images are cached here after the first epoch (delete when the dataset changes)
+CACHE_DIR = 'cache'
 
 print("\n" + "="*70)
 print("🚀 PHASE 1 ENHANCED: TRAINING 5 CATEGORIES (12,432 IMAGES)")
@@ -51,11 +54,10 @@ print(f"   Organized:   10,426 images (80/20 split)")
 os.makedirs(MODEL_DIR, exist_ok=True)
 os.makedirs(LOGS_DIR, exist_ok=True)
 
-# Prepare data generators with ENHANCED augmentation
-print("\n📊 Preparing data generators...")
+# Prepare tf.data pipelines with ENHANCED augmentation
+print("\n📊 Preparing data pipelines...")
 
-train_datagen = ImageDataGenerator(
-    rescale=1./255,
+train_augmentation = augmentation(
     rotation_range=25,           # Increased from 20
     width_shift_range=0.25,      # Increased from 0.2
     height_shift_range=0.25,     # Increased from 0.2
@@ -66,22 +68,21 @@ train_datagen = ImageDataGenerator(
     fill_mode='nearest'
 )
 
-val_datagen = ImageDataGenerator(rescale=1./255)
-
-train_gen = train_datagen.flow_from_directory(
+train_gen = image_split(
     os.path.join(DATA_DIR, 'train'),
-    target_size=(IMG_SIZE, IMG_SIZE),
+    img_size=IMG_SIZE,
     batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    shuffle=True
+    training=True,
+    augment=train_augmentation,
+    cache=os.path.join(CACHE_DIR, 'phase1_5cat_enhanced_train')
 )
 
-val_gen = val_datagen.flow_from_directory(
+val_gen = image_split(
     os.path.join(DATA_DIR, 'validation'),
-    target_size=(IMG_SIZE, IMG_SIZE),
+    img_size=IMG_SIZE,
     batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    shuffle=False
+    class_indices=train_gen.class_indices,
+    cache=os.path.join(CACHE_DIR, 'phase1_5cat_enhanced_validation')
 )
 
 num_classes = len(train_gen.class_indices)
@@ -151,8 +152,8 @@ callbacks = [
     )
 ]
 
-steps_per_epoch = train_gen.samples // BATCH_SIZE
-validation_steps = val_gen.samples // BATCH_SIZE
+steps_per_epoch = train_gen.steps
+validation_steps = val_gen.steps
 
 # ============================================================
 # PHASE 1.1: Train with FROZEN base (30 epochs)
@@ -200,11 +201,9 @@ print(f"   Steps per epoch: {steps_per_epoch}")
 print(f"   Validation steps: {validation_steps}")
 
 history1 = model.fit(
-    train_gen,
-    steps_per_epoch=steps_per_epoch,
+    train_gen.dataset,
     epochs=EPOCHS_PHASE1,
-    validation_data=val_gen,
-    validation_steps=validation_steps,
+    validation_data=val_gen.dataset,
     class_weight=class_weight_dict,
     callbacks=callbacks,
     verbose=1
@@ -244,12 +243,10 @@ print(f"   Base: PARTIALLY UNFROZEN (last 30 layers) ✅")
 print(f"\n🔄 Training Phase 1.2...")
 
 history2 = model.fit(
-    train_gen,
-    steps_per_epoch=steps_per_epoch,
+    train_gen.dataset,
     epochs=EPOCHS_TOTAL,
     initial_epoch=EPOCHS_PHASE1,
-    validation_data=val_gen,
-    validation_steps=validation_steps,
+    validation_data=val_gen.dataset,
     class_weight=class_weight_dict,
     callbacks=callbacks,
     verbose=1
@@ -264,8 +261,7 @@ print("="*70)
 
 # Evaluate on validation set
 print("\n🔮 Evaluating on validation set...")
-val_gen.reset()  # Reset generator to start from beginning
-val_loss, val_acc, val_top2 = model.evaluate(val_gen, steps=validation_steps, verbose=1)
+val_loss, val_acc, val_top2 = model.evaluate(val_gen.dataset, verbose=1)
 
 print(f"\n✅ PHASE 1 ENHANCED TRAINING COMPLETE!")
 print(f"   Validation Loss:     {val_loss:.4f}")
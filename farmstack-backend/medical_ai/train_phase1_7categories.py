@@ -6,7 +6,6 @@ Date: 2025-11-05 10:36:00 UTC
 
 import tensorflow as tf
 from tensorflow import keras
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping, ReduceLROnPlateau, CSVLogger
 from sklearn.utils.class_weight import compute_class_weight
 import numpy as np
@@ -14,6 +13,8 @@ import os
 import json
 from datetime import datetime
 
+from data_pipeline import augmentation, image_split
+
 # Configuration
 IMG_SIZE = 224
 BATCH_SIZE = 32
@@ -21,6 +22,8 @@ EPOCHS = 100  # Increased for 2-phase training
 DATA_DIR = 'data/skin_diseases_phase1_7cat'
 MODEL_DIR = 'models'
 LOGS_DIR = 'logs'
+# Decoded, resized images are cached here after the first epoch (delete when the dataset changes)
+CACHE_DIR = 'cache'
 
 print("\n" + "="*70)
 print("🚀 PHASE 1: TRAINING 7 CORE SKIN CONDITIONS (FIXED)")
@@ -33,10 +36,9 @@ os.makedirs(MODEL_DIR, exist_ok=True)
 os.makedirs(LOGS_DIR, exist_ok=True)
 
 # Prepare data
-print("\n📊 Preparing data generators...")
+print("\n📊 Preparing data pipelines...")
 
-train_datagen = ImageDataGenerator(
-    rescale=1./255,
+train_augmentation = augmentation(
     rotation_range=20,
     width_shift_range=0.2,
     height_shift_range=0.2,
@@ -46,22 +48,21 @@ train_datagen = ImageDataGenerator(
     fill_mode='nearest'
 )
 
-val_datagen = ImageDataGenerator(rescale=1./255)
-
-train_gen = train_datagen.flow_from_directory(
+train_gen = image_split(
     os.path.join(DATA_DIR, 'train'),
-    target_size=(IMG_SIZE, IMG_SIZE),
+    img_size=IMG_SIZE,
     batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    shuffle=True
+    training=True,
+    augment=train_augmentation,
+    cache=os.path.join(CACHE_DIR, 'phase1_7cat_train')
 )
 
-val_gen = val_datagen.flow_from_directory(
+val_gen = image_split(
     os.path.join(DATA_DIR, 'validation'),
-    target_size=(IMG_SIZE, IMG_SIZE),
+    img_size=IMG_SIZE,
     batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    shuffle=False
+    class_indices=train_gen.class_indices,
+    cache=os.path.join(CACHE_DIR, 'phase1_7cat_validation')
 )
 
 num_classes = len(train_gen.class_indices)
@@ -111,9 +112,6 @@ callbacks = [
     )
 ]
 
-steps_per_epoch = train_gen.samples // BATCH_SIZE
-validation_steps = val_gen.samples // BATCH_SIZE
-
 # ============================================================
 # PHASE 1: Train with frozen base (30 epochs)
 # ============================================================
@@ -159,11 +157,9 @@ print(f"   Base model: FROZEN ✅")
 
 # Train Phase 1.1
 history1 = model.fit(
-    train_gen,
-    steps_per_epoch=steps_per_epoch,
+    train_gen.dataset,
     epochs=30,
-    validation_data=val_gen,
-    validation_steps=validation_steps,
+    validation_data=val_gen.dataset,
     class_weight=class_weight_dict,
     callbacks=callbacks,
     verbose=1
@@ -196,12 +192,10 @@ print(f"   Base model: PARTIALLY UNFROZEN (last 30 layers) ✅")
 
 # Train Phase 1.2
 history2 = model.fit(
-    train_gen,
-    steps_per_epoch=steps_per_epoch,
+    train_gen.dataset,
     epochs=70,
     initial_epoch=30,
-    validation_data=val_gen,
-    validation_steps=validation_steps,
+    validation_data=val_gen.dataset,
     class_weight=class_weight_dict,
     callbacks=callbacks,
     verbose=1
@@ -212,7 +206,7 @@ print("\n" + "="*70)
 print("📊 PHASE 1 FINAL EVALUATION")
 print("="*70)
 
-val_loss, val_acc, val_top2 = model.evaluate(val_gen, steps=validation_steps)
+val_loss, val_acc, val_top2 = model.evaluate(val_gen.dataset)
 
 print(f"\n✅ PHASE 1 TRAINING COMPLETE!")
 print(f"   Validation Loss: {val_loss:.4f}")
@@ -6,7 +6,6 @@ Optimized for DermNet dataset with 5741 images
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.callbacks import (
     ModelCheckpoint, EarlyStopping, ReduceLROnPlateau, 
     TensorBoard, CSVLogger
@@ -16,6 +15,8 @@ import os
 import json
 from datetime import datetime
 
+from data_pipeline import augmentation, image_split
+
 # Configuration
 IMG_SIZE = 224
 BATCH_SIZE = 32
@@ -23,6 +24,8 @@ EPOCHS = 100
 DATA_DIR = 'data/skin_diseases_organized'  # Updated path
 MODEL_DIR = 'models'
 LOGS_DIR = 'logs'
+# Decoded, resized images are cached here after the first epoch (delete when the dataset changes)
+CACHE_DIR = 'cache'
 
 class SkinDiseaseTrainer:
     def __init__(self):
@@ -88,11 +91,10 @@ class SkinDiseaseTrainer:
     
     def prepare_data(self):
         """Prepare training and validation data with augmentation"""
-        print("\n📊 Preparing data generators...")
+        print("\n📊 Preparing data pipelines...")
         
-        # Training data augmentation
-        train_datagen = ImageDataGenerator(
-            rescale=1./255,
+        # Training data augmentation, applied to whole batches
+        train_augmentation = augmentation(
             rotation_range=30,
             width_shift_range=0.2,
             height_shift_range=0.2,
@@ -101,30 +103,28 @@ class SkinDiseaseTrainer:
             horizontal_flip=True,
             vertical_flip=False,
             fill_mode='nearest',
-            brightness_range=[0.8, 1.2]
+            brightness_range=[0.8, 1.2],
+            seed=42
         )
         
-        # Validation data - only rescaling
-        val_datagen = ImageDataGenerator(rescale=1./255)
-        
         # Load training data
-        train_generator = train_datagen.flow_from_directory(
+        train_generator = image_split(
             os.path.join(self.data_dir, 'train'),
-            target_size=(self.img_size, self.img_size),
+            img_size=self.img_size,
             batch_size=self.batch_size,
-            class_mode='categorical',
-            shuffle=True,
+            training=True,
+            augment=train_augmentation,
+            cache=os.path.join(CACHE_DIR, 'skin_train'),
             seed=42
         )
         
-        # Load validation data
-        validation_generator = val_datagen.flow_from_directory(
+        # Load validation data - only rescaling
+        validation_generator = image_split(
             os.path.join(self.data_dir, 'validation'),
-            target_size=(self.img_size, self.img_size),
+            img_size=self.img_size,
             batch_size=self.batch_size,
-            class_mode='categorical',
-            shuffle=False,
-            seed=42
+            class_indices=train_generator.class_indices,
+            cache=os.path.join(CACHE_DIR, 'skin_validation')
         )
         
         print(f"✅ Training samples: {train_generator.samples}")
@@ -200,8 +200,8 @@ class SkinDiseaseTrainer:
         callbacks = self.get_callbacks()
         
         # Calculate steps
-        steps_per_epoch = train_gen.samples // self.batch_size
-        validation_steps = val_gen.samples // self.batch_size
+        steps_per_epoch = train_gen.steps
+        validation_steps = val_gen.steps
         
         print("\n📈 Training configuration:")
         print(f"   Epochs: {self.epochs}")
@@ -215,11 +215,9 @@ class SkinDiseaseTrainer:
         print("="*70)
         
         history_phase1 = model.fit(
-            train_gen,
-            steps_per_epoch=steps_per_epoch,
+            train_gen.dataset,
             epochs=30,
-            validation_data=val_gen,
-            validation_steps=validation_steps,
+            validation_data=val_gen.dataset,
             callbacks=callbacks,
             verbose=1
         )
@@ -240,12 +238,10 @@ class SkinDiseaseTrainer:
         )
         
         history_phase2 = model.fit(
-            train_gen,
-            steps_per_epoch=steps_per_epoch,
+            train_gen.dataset,
             epochs=self.epochs,
             initial_epoch=30,
-            validation_data=val_gen,
-            validation_steps=validation_steps,
+            validation_data=val_gen.dataset,
             callbacks=callbacks,
             verbose=1
         )
@@ -263,7 +259,7 @@ class SkinDiseaseTrainer:
         
         # Evaluate on validation set
         print("\n📊 Final Evaluation:")
-        val_loss, val_acc, val_top2 = model.evaluate(val_gen, steps=validation_steps)
+        val_loss, val_acc, val_top2 = model.evaluate(val_gen.dataset)
         print(f"   Validation Loss: {val_loss:.4f}")
         print(f"   Validation Accuracy: {val_acc:.4f} ({val_acc*100:.2f}%)")
         print(f"   Top-2 Accuracy: {val_top2:.4f} ({val_top2*100:.2f}%)")
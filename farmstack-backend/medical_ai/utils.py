@@ -5,15 +5,43 @@ Includes skin disease detection
 
 import cv2
 import numpy as np
-from tensorflow import keras
 from PIL import Image
-import os
 import logging
 from django.conf import settings
 
+from .inference import load_resident_model, registry
+
 logger = logging.getLogger('medical_ai')
 
 
+def get_skin_disease_model(model_path=None):
+    """
+    The process-wide skin disease model, loaded and warmed up on first use
+    (or at worker start with MEDICAL_AI_SETTINGS['PRELOAD_MODEL']).
+    Returns None while no model file exists.
+    """
+    config = settings.MEDICAL_AI_SETTINGS
+    model_path = model_path or config['MODEL_PATH']
+    backend = config.get('INFERENCE_BACKEND', 'keras')
+
+    def load():
+        try:
+            return load_resident_model(
+                model_path,
+                input_shape=(config['IMG_SIZE'], config['IMG_SIZE'], 3),
+                backend=backend,
+                backend_path=config.get(f'{backend.upper()}_MODEL_PATH'),
+                threads=config.get('INFERENCE_THREADS'),
+                max_batch_size=config.get('MAX_BATCH_SIZE', 8),
+                max_wait_ms=config.get('MAX_BATCH_WAIT_MS', 10),
+            )
+        except Exception as e:
+            logger.error(f"Error loading model: {e}")
+            return None
+
+    return registry.get(('skin_disease', model_path, backend), load)
+
+
 class SkinDiseaseDetector:
     """Detect and classify skin diseases from images"""
     
@@ -81,24 +109,15 @@ class SkinDiseaseDetector:
         self._load_model()
     
     def _load_model(self):
-        """Load the trained model"""
-        try:
-            if os.path.exists(self.model_path):
-                self.model = keras.models.load_model(self.model_path)
-                logger.info(f"Model loaded successfully from {self.model_path}")
-            else:
-                logger.warning(f"Model file not found at {self.model_path}")
-                self.model = None
-        except Exception as e:
-            logger.error(f"Error loading model: {e}")
-            self.model = None
+        """Use the resident model of this process, loading it on first use"""
+        self.model = get_skin_disease_model(self.model_path)
     
     def preprocess_image(self, image_path):
         """Preprocess image for model prediction"""
         try:
             img = Image.open(image_path).convert('RGB')
             img = img.resize((self.img_size, self.img_size))
-            img_array = np.array(img) / 255.0
+            img_array = np.asarray(img, dtype=np.float32) / 255.0
             img_array = np.expand_dims(img_array, axis=0)
             return img_array
         except Exception as e:
@@ -110,50 +129,74 @@ class SkinDiseaseDetector:
         try:
             # Check if model is loaded
             if self.model is None:
-                return {
-                    'success': False,
-                    'error': 'Model not loaded',
-                    'message': 'The AI model is not available. Please ensure the model has been trained and is located at the correct path.'
-                }
+                return self._model_not_loaded()
             
             # Preprocess image
             logger.info(f"Processing image: {image_path}")
             img_array = self.preprocess_image(image_path)
             
-            # Make prediction
-            predictions = self.model.predict(img_array, verbose=0)
-            predicted_class_idx = np.argmax(predictions[0])
-            confidence = float(predictions[0][predicted_class_idx])
-            predicted_class = self.classes[predicted_class_idx]
-            
-            # Get all probabilities
-            all_predictions = {
-                self.classes[i]: float(predictions[0][i]) 
-                for i in range(len(self.classes))
-            }
-            
-            logger.info(f"Prediction: {predicted_class} ({confidence*100:.2f}%)")
-            
-            result = {
-                'success': True,
-                'disease': predicted_class,
-                'confidence': confidence,
-                'all_predictions': all_predictions,
-                'description': self.descriptions[predicted_class],
-                'home_remedies': self.remedies[predicted_class],
-                'recommendation': self._get_recommendation(predicted_class, confidence),
-                'disclaimer': '⚠️ This is an AI-based analysis and should not replace professional medical advice. Please consult a dermatologist for proper diagnosis and treatment.'
-            }
-            
-            return result
+            # Make prediction, batched with concurrent requests
+            return self._result(self.model.predict(img_array[0]))
             
         except Exception as e:
-            logger.error(f"Error during prediction: {e}")
-            return {
-                'success': False,
-                'error': str(e),
-                'message': 'Error processing image. Please try again with a clear image.'
-            }
+            return self._error(e)
+    
+    def predict_batch(self, image_paths):
+        """Predict skin disease for several images with one forward pass per micro-batch"""
+        if self.model is None:
+            return [self._model_not_loaded() for _ in image_paths]
+        images = {}
+        results = {}
+        for image_path in image_paths:
+            try:
+                images[image_path] = self.preprocess_image(image_path)[0]
+            except Exception as e:
+                results[image_path] = self._error(e)
+        try:
+            predictions = self.model.predict_batch(list(images.values()))
+            results.update((path, self._result(prediction)) for path, prediction in zip(images, predictions))
+        except Exception as e:
+            results.update((path, self._error(e)) for path in images)
+        return [results[image_path] for image_path in image_paths]
+    
+    def _result(self, predictions):
+        predicted_class_idx = int(np.argmax(predictions))
+        confidence = float(predictions[predicted_class_idx])
+        predicted_class = self.classes[predicted_class_idx]
+        
+        # Get all probabilities
+        all_predictions = {
+            self.classes[i]: float(predictions[i]) 
+            for i in range(len(self.classes))
+        }
+        
+        logger.info(f"Prediction: {predicted_class} ({confidence*100:.2f}%)")
+        
+        return {
+            'success': True,
+            'disease': predicted_class,
+            'confidence': confidence,
+            'all_predictions': all_predictions,
+            'description': self.descriptions[predicted_class],
+            'home_remedies': self.remedies[predicted_class],
+            'recommendation': self._get_recommendation(predicted_class, confidence),
+            'disclaimer': '⚠️ This is an AI-based analysis and should not replace professional medical advice. Please consult a dermatologist for proper diagnosis and treatment.'
+        }
+    
+    def _model_not_loaded(self):
+        return {
+            'success': False,
+            'error': 'Model not loaded',
+            'message': 'The AI model is not available. Please ensure the model has been trained and is located at the correct path.'
+        }
+    
+    def _error(self, e):
+        logger.error(f"Error during prediction: {e}")
+        return {
+            'success': False,
+            'error': str(e),
+            'message': 'Error processing image. Please try again with a clear image.'
+        }
     
     def _get_recommendation(self, disease, confidence):
         """Get recommendation based on disease and confidence"""
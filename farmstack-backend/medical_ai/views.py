@@ -123,35 +123,14 @@ class MedicalReportAnalysisView(APIView):
             )
         
         try:
-            # Save uploaded report
             report = serializer.validated_data['report']
             report_type = serializer.validated_data.get('report_type', 'other')
-            file_name = f'report_{request.user.id}_{report.name}'
-            file_path = os.path.join(settings.MEDICAL_AI_UPLOADS, file_name)
-            
-            # Ensure directory exists
-            os.makedirs(settings.MEDICAL_AI_UPLOADS, exist_ok=True)
-            
-            # Save file
-            with open(file_path, 'wb+') as destination:
-                for chunk in report.chunks():
-                    destination.write(chunk)
-            
-            logger.info(f"Report saved to: {file_path}")
-            
-            # Analyze report
+
+            # Analyze report in memory, the OCR pool splits PDFs into pages
             analyzer = MedicalReportAnalyzer()
-            result = analyzer.analyze_report(file_path)
+            result = analyzer.analyze_report_bytes(report.read(), report.name)
             result['report_type'] = report_type
             
-            # Clean up uploaded file
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Cleaned up temporary file: {file_path}")
-            except Exception as e:
-                logger.warning(f"Could not delete temporary file: {e}")
-            
             if result['success']:
                 logger.info("Report analysis successful")
                 return Response(result, status=status.HTTP_200_OK)
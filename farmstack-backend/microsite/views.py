@@ -36,8 +36,6 @@ from core.utils import (
     Utils,
     csv_and_xlsx_file_validatation,
     date_formater,
-    generate_hash_key_for_dashboard,
-    read_contents_from_csv_or_xlsx_file,
 )
 from datahub.models import (
     Category,
@@ -86,12 +84,12 @@ from microsite.serializers import (
     UserDataMicrositeSerializer,
     UserSerializer,
 )
-from utils import custom_exceptions, file_operations
+from utils import custom_exceptions, dashboard_cache, dataset_preview, file_operations, serializer_counts
 from utils.embeddings_creation import VectorDBBuilder
 from utils.file_operations import (
     check_file_name_length,
-    filter_dataframe_for_dashboard_counties,
     generate_fsp_dashboard,
+    generate_kiamis_dashboard,
     generate_knfd_dashboard,
     generate_omfp_dashboard,
 )
@@ -217,12 +215,12 @@ class DatasetsMicrositeViewSet(GenericViewSet):
         obj = self.get_object()
         serializer = self.get_serializer(obj).data
 
-        dataset_file_obj = DatasetV2File.objects.filter(dataset_id=obj.id)
+        dataset_file_obj = DatasetV2File.objects.select_related("preview").filter(dataset_id=obj.id)
         data = []
         for file in dataset_file_obj:
             path_ = os.path.join(settings.DATASET_FILES_URL, str(file.standardised_file))
             file_path = {}
-            file_path["content"] = read_contents_from_csv_or_xlsx_file(path_, file.standardised_configuration)
+            file_path["content"] = dataset_preview.content(file)
             # Omitted the actual name of the file so the user can't manually download the file
             # Added file name : As they need to show the file name in frontend.
             file_path["id"] = file.id
@@ -427,121 +425,25 @@ class DatasetsMicrositeViewSet(GenericViewSet):
     @action(detail=True, methods=["post"])
     def get_dashboard_chart_data(self, request, pk, *args, **kwargs):
         try:
-            hash_key = generate_hash_key_for_dashboard(pk, request.data)
-            cache_data = cache.get(hash_key, {})
-            if cache_data:
-                LOGGER.info("Dashboard details found in cache", exc_info=True)
-                return Response(
-                cache_data,
-                status=status.HTTP_200_OK,
-                )
             dataset_file_object = DatasetV2File.objects.get(id=pk)
             dataset_file = str(dataset_file_object.file)
-
-            if "omfp" in dataset_file.lower():
-                return generate_omfp_dashboard(dataset_file, request.data, hash_key, False)
-            if "fsp" in dataset_file.lower():
-                return generate_fsp_dashboard(dataset_file, request.data, hash_key, False)
-            if "knfd" in dataset_file.lower():
-                return generate_knfd_dashboard(dataset_file, request.data, hash_key, False)
-            if not "kiamis" in dataset_file.lower():
-                 return Response(
+            dataset_type = dashboard_cache.dataset_type_of(dataset_file)
+            if dataset_type is None:
+                return Response(
                     "Requested resource is currently unavailable. Please try again later.",
                     status=status.HTTP_200_OK,
                 )
-            # serializer = DatahubDatasetFileDashboardFilterSerializer(data=request.data)
-            # serializer.is_valid(raise_exception=True)
-
-            counties = []
-            sub_counties = []
-            gender = []
-            value_chain = []
-
-        # if serializer.data.get("county"):
-            counties = request.data.get("county")
-
-        # if serializer.data.get("sub_county"):
-            sub_counties = request.data.get("sub_county")
-
-        # if serializer.data.get("gender"):
-            gender = request.data.get("gender")
-
-        # if serializer.data.get("value_chain"):
-            value_chain = request.data.get("value_chain")
-
-            cols_to_read = ['Gender', 'Constituency', 'Millet', 'County', 'Sub County', 'Crop Production',
-                            'farmer_mobile_number',
-                            'Livestock Production', 'Ducks', 'Other Sheep', 'Total Area Irrigation', 'Family',
-                            'Ward',
-                            'Other Money Lenders', 'Micro-finance institution', 'Self (Salary or Savings)',
-                            "Natural rivers and stream", "Water Pan",
-                            'NPK', 'Superphosphate', 'CAN',
-                            'Urea', 'Other', 'Do you insure your crops?',
-                            'Do you insure your farm buildings and other assets?', 'Other Dual Cattle',
-                            'Cross breed Cattle', 'Cattle boma',
-                            'Small East African Goats', 'Somali Goat', 'Other Goat', 'Chicken -Indigenous',
-                            'Chicken -Broilers', 'Chicken -Layers', 'Highest Level of Formal Education',
-                            'Maize food crop', "Beans", 'Cassava', 'Sorghum', 'Potatoes', 'Cowpeas']
-            try:
-                if dataset_file.endswith(".xlsx") or dataset_file.endswith(".xls"):
-                    df = pd.read_excel(os.path.join(settings.DATASET_FILES_URL, dataset_file))
-                elif dataset_file.endswith(".csv"):
-                    df = pd.read_csv(os.path.join(settings.DATASET_FILES_URL, dataset_file), usecols=cols_to_read,
-                                     low_memory=False)
-                    # df.columns = df.columns.str.strip()
-                else:
-                    return Response(
-                        "Unsupported file please use .xls or .csv.",
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-                df['Ducks'] = pd.to_numeric(df['Ducks'], errors='coerce')
-                df['Other Sheep'] = pd.to_numeric(df['Other Sheep'], errors='coerce')
-                df['Family'] = pd.to_numeric(df['Family'], errors='coerce')
-                df['Other Money Lenders'] = pd.to_numeric(df['Other Money Lenders'], errors='coerce')
-                df['Micro-finance institution'] = pd.to_numeric(df['Micro-finance institution'], errors='coerce')
-                df['Self (Salary or Savings)'] = pd.to_numeric(df['Self (Salary or Savings)'], errors='coerce')
-                df['Natural rivers and stream'] = pd.to_numeric(df['Natural rivers and stream'], errors='coerce')
-                df["Water Pan"] = pd.to_numeric(df["Water Pan"], errors='coerce')
-                df['Total Area Irrigation'] = pd.to_numeric(df['Total Area Irrigation'], errors='coerce')
-                df['NPK'] = pd.to_numeric(df['NPK'], errors='coerce')
-                df['Superphosphate'] = pd.to_numeric(df['Superphosphate'], errors='coerce')
-                df['CAN'] = pd.to_numeric(df['CAN'], errors='coerce')
-                df['Urea'] = pd.to_numeric(df['Urea'], errors='coerce')
-                df['Other'] = pd.to_numeric(df['Other'], errors='coerce')
-                df['Other Dual Cattle'] = pd.to_numeric(df['Other Dual Cattle'], errors='coerce')
-                df['Cross breed Cattle'] = pd.to_numeric(df['Cross breed Cattle'], errors='coerce')
-                df['Cattle boma'] = pd.to_numeric(df['Cattle boma'], errors='coerce')
-                df['Small East African Goats'] = pd.to_numeric(df['Small East African Goats'], errors='coerce')
-                df['Somali Goat'] = pd.to_numeric(df['Somali Goat'], errors='coerce')
-                df['Other Goat'] = pd.to_numeric(df['Other Goat'], errors='coerce')
-                df['Chicken -Indigenous'] = pd.to_numeric(df['Chicken -Indigenous'], errors='coerce')
-                df['Chicken -Broilers'] = pd.to_numeric(df['Chicken -Broilers'], errors='coerce')
-                df['Chicken -Layers'] = pd.to_numeric(df['Chicken -Layers'], errors='coerce')
-                df['Do you insure your crops?'] = pd.to_numeric(df['Do you insure your crops?'], errors='coerce')
-                df['Highest Level of Formal Education'] = pd.to_numeric(df['Highest Level of Formal Education'],
-                                                                        errors='coerce')
-                df['Do you insure your farm buildings and other assets?'] = pd.to_numeric(
-                    df['Do you insure your farm buildings and other assets?'], errors='coerce')
-
-                data = filter_dataframe_for_dashboard_counties(
-                    df=df,
-                    counties=counties if counties else [],
-                    sub_counties=sub_counties if sub_counties else [],
-                    gender=gender if gender else [],
-                    value_chain=value_chain if value_chain else [],
-                    hash_key=hash_key,
-                    filters=True
-                )
-            except Exception as e:
-                LOGGER.error(f"Error occured in kiamis dashboard generation ERROR: {e}", exc_info=True)
-                return Response(
-                    f"Something went wrong, please try again. {e}",
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            return Response(
-                data,
-                status=status.HTTP_200_OK,
-            )
+            # only the kiamis dashboard lists the filter options to guests
+            filters = dataset_type == "kiamis"
+            hash_key = dashboard_cache.dashboard_cache_key(pk, request.data, dataset_type, dataset_file, filters)
+            dashboard_cache.record_filters(dataset_type, request.data)
+            dashboard_generator = {
+                "omfp": generate_omfp_dashboard,
+                "fsp": generate_fsp_dashboard,
+                "knfd": generate_knfd_dashboard,
+                "kiamis": generate_kiamis_dashboard,
+            }[dataset_type]
+            return dashboard_generator(dataset_file, request.data, hash_key, filters)
         except DatasetV2File.DoesNotExist:
             return Response(
                 "No dataset file for the provided id.",
@@ -668,7 +570,7 @@ class ParticipantMicrositeViewSet(GenericViewSet):
                     .order_by("-user__updated_at")
                     .all()
                 )
-                page = self.paginate_queryset(roles)
+                page = self.paginate_queryset(serializer_counts.annotate_participant_counts(roles))
                 participant_serializer = ParticipantCostewardSerializer(page, many=True)
                 return self.get_paginated_response(participant_serializer.data)
             else:
@@ -684,7 +586,7 @@ class ParticipantMicrositeViewSet(GenericViewSet):
                     .order_by("-user__updated_at")
                     .all()
                 )
-            page = self.paginate_queryset(roles)
+            page = self.paginate_queryset(serializer_counts.annotate_participant_counts(roles))
             participant_serializer = ParticipantSerializer(page, many=True)
             return self.get_paginated_response(participant_serializer.data)
         except Exception as error:
@@ -724,7 +626,7 @@ class ParticipantMicrositeViewSet(GenericViewSet):
                     .filter((Q(user__role=3) | Q(user__role=1)), user__status=True)
                     .all()
                 )
-            page = self.paginate_queryset(roles)
+            page = self.paginate_queryset(serializer_counts.annotate_organization_counts(roles))
             participant_serializer = micrositeOrganizationSerializer(page, many=True)
             return self.get_paginated_response(participant_serializer.data)
         except Exception as error:
@@ -1122,7 +1024,9 @@ class ResourceMicrositeViewSet(GenericViewSet):
     # @http_request_mutation
     def list(self, request, *args, **kwargs):
         try:
-            page = self.paginate_queryset(self.get_queryset().order_by("-updated_at"))
+            page = self.paginate_queryset(
+                self.get_queryset().select_related("user_map__organization", "user_map__user").order_by("-updated_at")
+            )
             serializer = ResourceListSerializer(page, many=True)
             return self.get_paginated_response(serializer.data)
         except ValidationError as e:
@@ -1,18 +1,10 @@
 
-import psycopg2
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from dotenv import load_dotenv
-import os
 import datetime
-load_dotenv()
 
-db_name = os.getenv("DB_NAME")
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-db_host = os.getenv("DB_HOST")
-db_port = os.getenv("DB_PORT")
+import warehouse
 
 
 st.set_page_config(
@@ -22,76 +14,13 @@ st.set_page_config(
         page_icon=None,
     )
 
-def connect_to_database():
-    """Connect to the PostgreSQL database."""
-    conn = psycopg2.connect(
-        dbname=db_name,
-        user=db_user,
-        password=db_password,
-        host=db_host,
-        port=db_port
-    )
-
-    return conn
-
-def fetch_data(query):
-    """Fetch data from the database and return as a DataFrame."""
-    conn = connect_to_database()
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
-
 st.header("Telegram BOT Dashboard")
 
-query = """
-SELECT 	da.id as da_id, da.name as da_name,da.gender as da_gender, k.id as kebele_id, k.name as kebele_name, 
-		w.name as woreda_name, z.name as zone_name, rg.name as region_name, w.id as woreda_id, 
-		z.id as zone_id, rg.id as region_id, ofp.gender as gender, 
-		p.id as practice_id, a.id as advisory_id, r.id as reach_id, 
-		ofp.id as farmer_id,a.label as advisory_label,p.name as practice_name,ad.id as adoption_id,
-        r.created_at as created_at, vc.id AS value_chain_id, vc.name AS value_chain_name, vcc.id AS value_chain_category_id, vcc.name AS value_chain_category_name
-FROM 
-    integration_developmentagent da
-INNER JOIN 
-    integration_kebele k ON k.id = da.kebele_id
-INNER JOIN 
-	integration_woreda w ON w.id=k.woreda_id
-INNER JOIN 
-	integration_zone z ON z.id=w.zone_id
-INNER JOIN 
-	integration_region rg ON rg.id=z.region_id
-INNER JOIN 
-    core_outboundfarmerprofile ofp ON ofp.kebele_id = k.id
-INNER JOIN 
-    core_reach r ON r.farmer_id = ofp.id
-INNER JOIN 
-    core_advisory a ON r.advisory_id = a.id
-INNER JOIN 
-    core_valuechain vc ON a.value_chain_id = vc.id
-INNER JOIN 
-    core_valuechaincategory vcc ON vc.category_id = vcc.id
-INNER JOIN 
-	core_subpractice s ON a.sub_practice_id=s.id
-INNER JOIN 
-	core_practice p ON s.practice_id=p.id
-LEFT JOIN 
-    core_adoption ad ON ad.farmer_id = ofp.id AND ad.advisory_id = r.advisory_id
-"""
-
-@st.cache_data
-def cached_data(query):
-    return fetch_data(query)
-
-
-df = cached_data(query)
-df['created_at'] = pd.to_datetime(df['created_at'])
-
-
-
-
-#########
-min_created_at = df['created_at'].min()
-max_created_at = df['created_at'].max()
+version = warehouse.facts_version()
+options = warehouse.dashboard_options(version)
+
+min_created_at = options["min_created_at"]
+max_created_at = options["max_created_at"]
 
 col1, col2 = st.columns(2)
 
@@ -103,47 +32,21 @@ with col2:
     if end_date < start_date:
         st.error("End Date must be greater than Start Date.")
 
-#Region
-unique_regions = df.groupby(['region_id', 'region_name']).size().reset_index(name='count')
-unique_regions = unique_regions.drop(columns=['count'])
-region_list = unique_regions.to_dict(orient='records')
-# print("Unique Regions:", region_list)
-
-#Zone
-unique_zones=df.groupby(['region_id','zone_id', 'zone_name']).size().reset_index(name='count')
-unique_zones = unique_zones.drop(columns=['count'])
-zone_list = unique_zones.to_dict(orient='records')
-# print("Unique Zones:", zone_list)
-
-#Woreda
-unique_woreda=df.groupby(['zone_id','woreda_id', 'woreda_name']).size().reset_index(name='count')
-unique_woreda = unique_woreda.drop(columns=['count'])
-woreda_list = unique_woreda.to_dict(orient='records')
-# print("Unique Woreda:", len(woreda_list))
-
-#Kebele
-unique_kebele=df.groupby(['woreda_id','kebele_id', 'kebele_name']).size().reset_index(name='count')
-unique_kebele = unique_kebele.drop(columns=['count'])
-kebele_list = unique_kebele.to_dict(orient='records')
-# print("Unique Kebele:", len(kebele_list))
-
-#DA
-unique_da=df.groupby(['da_id', 'da_name']).size().reset_index(name='count')
-unique_da = unique_da.drop(columns=['count'])
-da_list = unique_da.to_dict(orient='records')
-# print("Unique DA:", len(da_list))
-
-#Advisory
-unique_advisory=df.groupby(['advisory_id', 'advisory_label']).size().reset_index(name='count')
-unique_advisory = unique_advisory.drop(columns=['count'])
-advisory_list = unique_advisory.to_dict(orient='records')
-# print("Unique advisory:", len(advisory_list))
-
-#Practice
-unique_practice=df.groupby(['practice_id', 'practice_name']).size().reset_index(name='count')
-unique_practice = unique_practice.drop(columns=['count'])
-practice_list = unique_practice.to_dict(orient='records')
-# print("Unique practice:", len(practice_list))
+def names_by_id(df, id_column, name_column):
+    """Display name of every id of a filter, in the order of the options."""
+    df = df.drop_duplicates(subset=id_column)
+    return dict(zip(df[id_column], df[name_column]))
+
+locations = options["locations"]
+filters = {
+    "Location": names_by_id(locations, 'region_id', 'region_name'),
+    "Zone": names_by_id(locations, 'zone_id', 'zone_name'),
+    "Woreda": names_by_id(locations, 'woreda_id', 'woreda_name'),
+    "Kebele": names_by_id(locations, 'kebele_id', 'kebele_name'),
+    "DA": names_by_id(options["das"], 'da_id', 'da_name'),
+    "Advisory": names_by_id(options["advisories"], 'advisory_id', 'advisory_label'),
+    "Practice": names_by_id(options["practices"], 'practice_id', 'practice_name')
+}
 
 placeholders = {
     "Region": "Select Region",
@@ -155,292 +58,44 @@ placeholders = {
     "Practice": "Select Practice"
 }
 
-filters = {
-    "Location": region_list,
-    "Zone": zone_list,
-    "Woreda": woreda_list,
-    "Kebele": kebele_list,
-    "DA": da_list,
-    "Advisory": advisory_list,
-    "Practice": practice_list
-}
+def select_filter(placeholder, names):
+    """Selectbox over the ids of a filter showing their names, None until one is selected."""
+    return st.selectbox(placeholder, options=[None] + list(names), format_func=lambda value: placeholder if value is None else names[value])
 
 
 col1, col2, col3, col4 = st.columns(4)
 with col1:
-    selected_region = st.selectbox("Select Region", options=[placeholders["Region"]] + [region['region_name'] for region in filters['Location']])
+    selected_region = select_filter(placeholders["Region"], filters['Location'])
 with col2:
-    selected_zone = st.selectbox("Select Zone", options=[placeholders["Zone"]] + [zone['zone_name'] for zone in filters['Zone']])
+    selected_zone = select_filter(placeholders["Zone"], filters['Zone'])
 with col3:
-    selected_woreda = st.selectbox("Select Woreda", options=[placeholders["Woreda"]] + [woreda['woreda_name'] for woreda in filters['Woreda']])
+    selected_woreda = select_filter(placeholders["Woreda"], filters['Woreda'])
 with col4:
-    selected_kebele = st.selectbox("Select Kebele", options=[placeholders["Kebele"]] + [kebele['kebele_name'] for kebele in filters['Kebele']])
+    selected_kebele = select_filter(placeholders["Kebele"], filters['Kebele'])
 
 
 col5, col6, col7 = st.columns(3)
 with col5:
-    selected_da = st.selectbox("Select DA", options=[placeholders["DA"]] + [da['da_name'] for da in filters['DA']])
+    selected_da = select_filter(placeholders["DA"], filters['DA'])
 with col6:
-    selected_advisory = st.selectbox("Select Advisory", options=[placeholders["Advisory"]] + [advisory['advisory_label'] for advisory in filters['Advisory']])
+    selected_advisory = select_filter(placeholders["Advisory"], filters['Advisory'])
 with col7:
-    selected_practice = st.selectbox("Select Practice", options=[placeholders["Practice"]] + [practice['practice_name'] for practice in filters['Practice']])
-
-
-# Function to calculate reach & adoption counts for male and female genders
-def calculate_reach_counts(data):
-
-    ############# Reach ##############
-    total_reach_count = data['reach_id'].nunique()
-    male_reach_count = data[data['gender'] == 'male']['reach_id'].nunique()
-    female_reach_count= data[data['gender'] == 'female']['reach_id'].nunique()
-
-    ############ Adoption ############
-    total_adoption_count = data['adoption_id'].nunique()
-    male_adoption_count = data[data['gender'] == 'male']['adoption_id'].nunique()
-    female_adoption_count= data[data['gender'] == 'female']['adoption_id'].nunique()
-
+    selected_practice = select_filter(placeholders["Practice"], filters['Practice'])
 
-    ############### DA ##############
-    male_das = data[data['da_gender'] == 'Male']['da_id'].nunique()
-    female_das = data[data['da_gender'] == 'Female']['da_id'].nunique()
-    total_das = data['da_id'].nunique()
-
-
-    practice_counts = {}
-    unique_practices = data['practice_name'].unique()
-
-    for practice in unique_practices:
-        practice_df = data[data['practice_name'] == practice]
-
-        male_reach_count_practice = practice_df[(practice_df['gender'] == 'male') & (practice_df['reach_id'])]['reach_id'].nunique()
-        female_reach_count_practice = practice_df[(practice_df['gender'] == 'female') & (practice_df['reach_id'])]['reach_id'].nunique()
-        male_adoption_count_practice = practice_df[(practice_df['gender'] == 'male') & (practice_df['adoption_id'])]['adoption_id'].nunique()
-        female_adoption_count_practice = practice_df[(practice_df['gender'] == 'female') & (practice_df['adoption_id'])]['adoption_id'].nunique()
-
-        
-        practice_counts[practice] = {
-            'male_reach_count_by_practice': male_reach_count_practice,
-            'female_reach_count_by_practice': female_reach_count_practice,
-            'male_adoption_count_by_practice': male_adoption_count_practice,
-            'female_adoption_count_by_practice': female_adoption_count_practice
-        }
-
-    advisory_counts = {}
-    unique_advisories = data['advisory_label'].unique()
-    for advisory in unique_advisories:
-        advisory_df = data[data['advisory_label'] == advisory]
-        male_reach_count_advisory = len(advisory_df[(advisory_df['gender'] == 'male') & (~advisory_df['reach_id'].isnull())]['reach_id'].unique())
-        female_reach_count_advisory = len(advisory_df[(advisory_df['gender'] == 'female') & (~advisory_df['reach_id'].isnull())]['reach_id'].unique())
-        male_adoption_count_advisory = len(advisory_df[(advisory_df['gender'] == 'male') & (~advisory_df['adoption_id'].isnull())]['adoption_id'].unique())
-        female_adoption_count_advisory = len(advisory_df[(advisory_df['gender'] == 'female') & (~advisory_df['adoption_id'].isnull())]['adoption_id'].unique())
-        
-        advisory_counts[advisory] = {
-            'male_reach_count': male_reach_count_advisory,
-            'female_reach_count': female_reach_count_advisory,
-            'male_adoption_count': male_adoption_count_advisory,
-            'female_adoption_count': female_adoption_count_advisory
-        }
-    total_male_farmers = len(data[data['gender'] == 'male'])
-    total_female_farmers = len(data[data['gender'] == 'female'])
-
-    data['created_date'] = data['created_at'].dt.date
-
-
-    male_reach_counts_created_at = data[data['gender'] == 'male'].groupby('created_date')['reach_id'].nunique()
-    female_reach_counts_created_at = data[data['gender'] == 'female'].groupby('created_date')['reach_id'].nunique()
-
-    male_adoption_counts_created_at = data[data['gender'] == 'male'].groupby('created_date')['adoption_id'].nunique()
-    female_adoption_counts_created_at = data[data['gender'] == 'female'].groupby('created_date')['adoption_id'].nunique()
-
-    time_based_counts={
-        "male_reach_counts_created_at":male_reach_counts_created_at,
-        "female_reach_counts_created_at":female_reach_counts_created_at,
-        "male_adoption_counts_created_at":male_adoption_counts_created_at,
-        "female_adoption_counts_created_at":female_adoption_counts_created_at
-    }
-    unique_regions = data.groupby(['region_id', 'region_name']).size().reset_index(name='count')
-    region_counts = {}
-
-    for _, region_row in unique_regions.iterrows():
-        region_id = region_row['region_id']
-        region_name = region_row['region_name']
-        
-        region_data = data[data['region_id'] == region_id]
-        
-        male_reach_count_by_region = region_data[region_data['gender'] == 'male']['reach_id'].nunique()
-        female_reach_count_by_region = region_data[region_data['gender'] == 'female']['reach_id'].nunique()
-        male_adoption_count_by_region = region_data[region_data['gender'] == 'male']['adoption_id'].nunique()
-        female_adoption_count_by_region = region_data[region_data['gender'] == 'female']['adoption_id'].nunique()
-        
-        region_counts[region_name] = {
-            "male_reach_count_by_region": male_reach_count_by_region,
-            "female_reach_count_by_region": female_reach_count_by_region,
-            "male_adoption_count_by_region": male_adoption_count_by_region,
-            "female_adoption_count_by_region": female_adoption_count_by_region
-        }
-    unique_zones = data.groupby(['zone_id', 'zone_name']).size().reset_index(name='count')
-    zone_counts = {}
-
-    for _, zone_row in unique_zones.iterrows():
-        zone_id = zone_row['zone_id']
-        zone_name = zone_row['zone_name']
-        
-        zone_data = data[data['zone_id'] == zone_id]
-        
-        male_reach_count_by_zone = zone_data[zone_data['gender'] == 'male']['reach_id'].nunique()
-        female_reach_count_by_zone = zone_data[zone_data['gender'] == 'female']['reach_id'].nunique()
-        male_adoption_count_by_zone = zone_data[zone_data['gender'] == 'male']['adoption_id'].nunique()
-        female_adoption_count_by_zone = zone_data[zone_data['gender'] == 'female']['adoption_id'].nunique()
-        
-        zone_counts[zone_name] = {
-            "male_reach_count_by_zone": male_reach_count_by_zone,
-            "female_reach_count_by_zone": female_reach_count_by_zone,
-            "male_adoption_count_by_zone": male_adoption_count_by_zone,
-            "female_adoption_count_by_zone": female_adoption_count_by_zone
-        }
-    unique_woredas = data.groupby(['woreda_id', 'woreda_name']).size().reset_index(name='count')
-    woreda_counts = {}
-
-    for _, woreda_row in unique_woredas.iterrows():
-        woreda_id = woreda_row['woreda_id']
-        woreda_name = woreda_row['woreda_name']
-        
-        woreda_data = data[data['woreda_id'] == woreda_id]
-        
-        male_reach_count_by_woreda = woreda_data[woreda_data['gender'] == 'male']['reach_id'].nunique()
-        female_reach_count_by_woreda = woreda_data[woreda_data['gender'] == 'female']['reach_id'].nunique()
-        male_adoption_count_by_woreda = woreda_data[woreda_data['gender'] == 'male']['adoption_id'].nunique()
-        female_adoption_count_by_woreda = woreda_data[woreda_data['gender'] == 'female']['adoption_id'].nunique()
-        
-        woreda_counts[woreda_name] = {
-            "male_reach_count_by_woreda": male_reach_count_by_woreda,
-            "female_reach_count_by_woreda": female_reach_count_by_woreda,
-            "male_adoption_count_by_woreda": male_adoption_count_by_woreda,
-            "female_adoption_count_by_woreda": female_adoption_count_by_woreda
-        }
-    
-    # Get unique kebeles
-    unique_kebeles = data.groupby(['kebele_id', 'kebele_name']).size().reset_index(name='count')
-    kebele_counts = {}
-
-    for _, kebele_row in unique_kebeles.iterrows():
-        kebele_id = kebele_row['kebele_id']
-        kebele_name = kebele_row['kebele_name']
-        
-        kebele_data = data[data['kebele_id'] == kebele_id]
-        
-        male_reach_count_by_kebele = kebele_data[kebele_data['gender'] == 'male']['reach_id'].nunique()
-        female_reach_count_by_kebele = kebele_data[kebele_data['gender'] == 'female']['reach_id'].nunique()
-        male_adoption_count_by_kebele = kebele_data[kebele_data['gender'] == 'male']['adoption_id'].nunique()
-        female_adoption_count_by_kebele = kebele_data[kebele_data['gender'] == 'female']['adoption_id'].nunique()
-        
-        kebele_counts[kebele_name] = {
-            "male_reach_count_by_kebele": male_reach_count_by_kebele,
-            "female_reach_count_by_kebele": female_reach_count_by_kebele,
-            "male_adoption_count_by_kebele": male_adoption_count_by_kebele,
-            "female_adoption_count_by_kebele": female_adoption_count_by_kebele
-        }
-
-    return {
-        "total_reach_count": total_reach_count,
-        "male_reach_count": male_reach_count,
-        "female_reach_count": female_reach_count,
-        "male_adoption_count": male_adoption_count,
-        "female_adoption_count": female_adoption_count,
-        "total_adoption_count": total_adoption_count,
-        "male_das":male_das,
-        "female_das":female_das,
-        "total_das":total_das,
-        "practice_counts": practice_counts,
-        "advisory_counts": advisory_counts,
-        "total_male_farmers": total_male_farmers,
-        "total_female_farmers": total_female_farmers,
-        "time_based_counts":time_based_counts,
-        "zone_counts":zone_counts,
-        "woreda_counts":woreda_counts,
-        "kebele_counts":kebele_counts,
-        "region_counts":region_counts
-
-
-    }
-
-reach_and_adoption_counts= calculate_reach_counts(df)
-
-
-# Function to get the region ID based on the region name
-def get_region_id(region_name):
-    for region in region_list:
-        if region['region_name'] == region_name:
-            return region['region_id']
-    return None
-
-def get_zone_id(zone_name):
-    for zone in zone_list:
-        if zone['zone_name'] == zone_name:
-            return zone['zone_id']
-    return None
-
-def get_woreda_id(woreda_name):
-    for woreda in woreda_list:
-        if woreda['woreda_name'] == woreda_name:
-            return woreda['woreda_id']
-    return None
-
-def get_zones_for_region(selected_region_id):
-    zones_for_selected_region = [zone['zone_name']for zone in zone_list if zone['region_id'] == selected_region_id]
-    return zones_for_selected_region
-
-def get_woreda_for_zone(selected_zone_id):
-    woredas_for_selected_zone = [woreda['woreda_name']for woreda in woreda_list if woreda['zone_id'] == selected_zone_id]
-    return woredas_for_selected_zone
-
-
-def get_kebele_for_woreda(selected_woreda_id):
-    kebele_for_selected_woreda = [kebele['kebele_name']for kebele in kebele_list if kebele['woreda_id'] == selected_woreda_id]
-    return kebele_for_selected_woreda
-
-
-# Apply filters
-if selected_region or selected_zone or selected_woreda or selected_kebele or selected_da or selected_advisory or selected_practice or (start_date and end_date):
-    filtered_df = df.copy() 
-    if selected_region and selected_region != placeholders["Region"]:
-        filtered_df = filtered_df[filtered_df['region_name'] == selected_region]
-        selected_region_id = get_region_id(selected_region)
-        zones_under_selected_region=get_zones_for_region(selected_region_id)
-        # print("zones_under_selected_region---->",zones_under_selected_region)
-
-
-    if selected_zone and selected_zone != placeholders["Zone"]:
-        filtered_df = filtered_df[filtered_df['zone_name'] == selected_zone]
-        selected_zone_id = get_zone_id(selected_zone)
-        woreda_under_selected_zone=get_woreda_for_zone(selected_zone_id)
-        # print("woreda_under_selected_zone---->",woreda_under_selected_zone)
-
-    if selected_woreda and selected_woreda != placeholders["Woreda"]:
-        filtered_df = filtered_df[filtered_df['woreda_name'] == selected_woreda]
-        selected_woreda_id = get_woreda_id(selected_woreda)
-        
-        kebele_under_selected_woreda=get_kebele_for_woreda(selected_woreda_id)
-        # print("kebele_under_selected_woreda---->",kebele_under_selected_woreda)
-
-    if selected_kebele and selected_kebele != placeholders["Kebele"]:
-        filtered_df = filtered_df[filtered_df['kebele_name'] == selected_kebele]
-
-    if selected_da and selected_da != placeholders["DA"]:
-        filtered_df = filtered_df[filtered_df['da_name'] == selected_da]
-    if selected_advisory and selected_advisory != placeholders["Advisory"]:
-        filtered_df = filtered_df[filtered_df['advisory_label'] == selected_advisory]
-    if selected_practice and selected_practice != placeholders["Practice"]:
-        filtered_df = filtered_df[filtered_df['practice_name'] == selected_practice]
-    if start_date and end_date :
-        if start_date <= end_date:
-            filtered_df = filtered_df[(filtered_df['created_at'].dt.date >= start_date) & (filtered_df['created_at'].dt.date <= end_date)]
-
-    reach_and_adoption_counts= calculate_reach_counts(filtered_df)
-
-else:
-    reach_and_adoption_counts=reach_and_adoption_counts
 
+# Filters and reach & adoption counts for male and female genders are computed in SQL
+dates_selected = bool(start_date and end_date and start_date <= end_date)
+reach_and_adoption_counts = warehouse.reach_and_adoption_counts({
+    "start_date": start_date if dates_selected else None,
+    "end_date": end_date if dates_selected else None,
+    "region_id": selected_region,
+    "zone_id": selected_zone,
+    "woreda_id": selected_woreda,
+    "kebele_id": selected_kebele,
+    "da_id": selected_da,
+    "advisory_id": selected_advisory,
+    "practice_id": selected_practice,
+}, version)
 
 
 data = reach_and_adoption_counts["time_based_counts"]
@@ -644,10 +299,10 @@ with st.container(border=True):
 ######################################## Location Based Segregation ######################################
 
 
-if (selected_region == placeholders["Region"] and 
-    selected_zone == placeholders["Zone"] and 
-    selected_woreda == placeholders["Woreda"] and 
-    selected_kebele == placeholders["Kebele"]):
+if (selected_region is None and 
+    selected_zone is None and 
+    selected_woreda is None and 
+    selected_kebele is None):
 
     region_df = pd.DataFrame(reach_and_adoption_counts.get("region_counts", {})).transpose()
     if not region_df.empty:
@@ -675,7 +330,7 @@ if (selected_region == placeholders["Region"] and
         st.warning("No data available for regions.")
 
 
-elif (selected_woreda != placeholders["Woreda"] and selected_woreda) or (selected_kebele != placeholders["Kebele"] and selected_kebele) :
+elif selected_woreda is not None or selected_kebele is not None :
     kebele_df = pd.DataFrame(reach_and_adoption_counts.get("kebele_counts", {})).transpose()
     if not kebele_df.empty:
         col1, col2 = st.columns(2)
@@ -703,7 +358,7 @@ elif (selected_woreda != placeholders["Woreda"] and selected_woreda) or (selecte
         st.warning("No data available for kebeles.")
 
 
-elif selected_zone != placeholders["Zone"] and selected_zone :
+elif selected_zone is not None :
     woreda_df = pd.DataFrame(reach_and_adoption_counts.get("woreda_counts", {})).transpose()
     if not woreda_df.empty:
         if len(woreda_df):
@@ -729,7 +384,7 @@ elif selected_zone != placeholders["Zone"] and selected_zone :
     else:
         st.warning("No data available for woredas.")
 
-elif selected_region != placeholders["Region"] and selected_region :
+elif selected_region is not None :
     zone_df = pd.DataFrame(reach_and_adoption_counts.get("zone_counts", {})).transpose()
     if not zone_df.empty:
         if len(zone_df):
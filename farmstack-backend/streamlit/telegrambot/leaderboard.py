@@ -0,0 +1,93 @@
+"""
+Rankings of the Leaderboard page.
+
+``warehouse.leaderboard_counts`` aggregates the reaches of a period in SQL, one
+row per DA, kebele and practice, and every ranking is then a sort of one of
+those three tables: the counts of a DA (or of the female DAs among the DAs of a
+name) are never computed from the reach rows in pandas.
+
+``leaderboards`` caches the tables of a period with ``st.cache_data``, so the
+three tabs and every session asking for the same period share one computation.
+"""
+import pandas as pd
+import streamlit as st
+
+import warehouse
+
+DA_KEYS = ["DA Full Name", "woreda_name"]
+KEBELE_KEYS = ["kebele_id", "kebele_name"]
+PRACTICE_KEYS = ["value_chain_name", "practice_name"]
+
+
+def _ranked(counts, keys, *columns, total=None):
+    """``keys`` and ``columns`` of ``counts`` sorted by ``total`` (or the last column), best first."""
+    table = counts[keys + list(columns)].copy()
+    if total:
+        table[total] = table[list(columns)].sum(axis=1)
+    by = total or columns[-1]
+    return table.sort_values(by=by, ascending=False, kind="stable").reset_index(drop=True)
+
+
+def _prefixed(table, keys, prefix):
+    """``keys`` and the ``prefix`` columns of ``table``, with the prefix removed."""
+    columns = [column for column in table.columns if column.startswith(prefix)]
+    return table[keys + columns].rename(columns={column: column[len(prefix):] for column in columns})
+
+
+def compute_leaderboards(counts):
+    """
+    Every ranking of the Leaderboard page from the grouped counts of
+    ``warehouse.leaderboard_counts``, each sorted best first.
+
+    **Parameters**
+    ``counts`` (dict): ``da``, ``kebele`` and ``practice`` DataFrames of counts
+
+    **Returns**
+    ``dict`` of ranking name to DataFrame
+    """
+    by_da, by_kebele, by_practice = counts["da"], counts["kebele"], counts["practice"]
+    by_practice = by_practice.assign(access_count=pd.to_numeric(by_practice["access_count"], errors="coerce"))
+    # counts restricted to female DAs, for the DA groups having one
+    female_das = _prefixed(by_da[by_da["has_female_da"]], DA_KEYS, "female_da_")
+    popular_content = by_practice[PRACTICE_KEYS + ["access_count"]].sort_values(
+        by="access_count", ascending=False, kind="stable", na_position="last"
+    ).reset_index(drop=True)
+    return {
+        "da_reach": _ranked(by_da, DA_KEYS, "male_reach_count", "female_reach_count", total="total_reach_count"),
+        "female_da_reach": _ranked(
+            female_das, DA_KEYS, "male_reach_count", "female_reach_count", total="total_reach_count"
+        ),
+        # DAs reaching at least one female farmer
+        "female_advocate_reach": _ranked(by_da[by_da["female_reach_count"] > 0], DA_KEYS, "female_reach_count"),
+        "da_adoption": _ranked(
+            by_da, DA_KEYS, "male_adoption_count", "female_adoption_count", total="total_adoption_count"
+        ),
+        "female_da_adoption": _ranked(
+            female_das, DA_KEYS, "male_adoption_count", "female_adoption_count", total="total_adoption_count"
+        ),
+        "female_da_female_adoption": _ranked(female_das, DA_KEYS, "female_adoption_count"),
+        "kebele_reach": _ranked(
+            by_kebele, KEBELE_KEYS, "male_reach_count", "female_reach_count", total="total_reach_count"
+        ),
+        "kebele_female_reach": _ranked(by_kebele, KEBELE_KEYS, "female_reach_count"),
+        "kebele_adoption": _ranked(
+            by_kebele, KEBELE_KEYS, "male_adoption_count", "female_adoption_count", total="total_adoption_count"
+        ),
+        "kebele_female_adoption": _ranked(by_kebele, KEBELE_KEYS, "female_adoption_count"),
+        "popular_content": popular_content,
+        "practice_reach": _ranked(
+            by_practice, PRACTICE_KEYS, "male_reach_count", "female_reach_count", total="total_reach_count"
+        ),
+        "practice_adoption": _ranked(
+            by_practice, PRACTICE_KEYS, "male_adoption_count", "female_adoption_count", total="total_adoption_count"
+        ),
+    }
+
+
+@st.cache_data(ttl=warehouse.CACHE_TTL, show_spinner=False)
+def leaderboards(start_date, end_date=None, version=None):
+    """Rankings of the reaches created within the period, empty when there are none."""
+    counts = warehouse.leaderboard_counts(start_date, end_date, version)
+    if counts["kebele"].empty:
+        return {}
+    return compute_leaderboards(counts)
@@ -1,21 +1,11 @@
 
 import math
-import psycopg2
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from dotenv import load_dotenv
-import os
 import datetime
 
-load_dotenv()
-
-db_name = os.getenv("DB_NAME")
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-db_host = os.getenv("DB_HOST")
-db_port = os.getenv("DB_PORT")
-streamlit_cache_ttl=os.getenv("STREAMLIT_CACHE_TTL")
+import warehouse
 
 st.set_page_config(
         layout="wide",
@@ -24,142 +14,9 @@ st.set_page_config(
         page_icon=None,
     )
 
-def connect_to_database():
-    """Connect to the PostgreSQL database."""
-    conn = psycopg2.connect(
-        dbname=db_name,
-        user=db_user,
-        password=db_password,
-        host=db_host,
-        port=db_port
-    )
-
-    return conn
-
-def fetch_data(query):
-    """Fetch data from the database and return as a DataFrame."""
-    conn = connect_to_database()
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
-
-
-queries = {
-    "query1": """
-    SELECT DISTINCT 
-        da.details->'data'->>'da' AS da_id,
-        da.details->'data'->'advisory_body'->'location'->>'id' AS location_id,
-        da.details->'data'->'advisory_body'->'location'->>'name' AS location_level,
-        da.created_at AS created_at,
-        dev.id AS dev_id,
-        dev.name AS da_name,
-        dev.father_name AS da_father_name,
-        dev.grand_father_name AS da_grand_father_name,
-        dev.gender AS da_gender,
-        dev.phone_number AS da_phone_number,
-        keb.id AS kebele_id,
-        keb.name AS kebele_name,
-        wor.name AS woreda_name,
-        wor.id AS woreda_id,
-        zon.name AS zone_name,
-        zon.id AS zone_id,
-        reg.name AS region_name,
-        reg.id AS region_id
-
-    FROM 
-        core_telegraminteractionlog AS da
-    JOIN 
-        integration_developmentagent AS dev
-    ON 
-        da.details->'data'->>'da' = dev.id::text
-    LEFT JOIN 
-        integration_kebele AS keb
-    ON 
-        dev.kebele_id = keb.id
-    LEFT JOIN 
-        integration_woreda AS wor
-    ON 
-        keb.woreda_id = wor.id
-    LEFT JOIN 
-        integration_zone AS zon
-    ON 
-        wor.zone_id = zon.id
-    LEFT JOIN 
-        integration_region AS reg
-    ON 
-        zon.region_id = reg.id
-
-    WHERE 
-        da.action = 'ADVISORY_ACCESS_DA';
-     """,
-
-    "query2": """
-SELECT DISTINCT 
-        da.details->'data'->>'da' AS da_id,
-        da.details->'data'->'advisory_body'->'location'->>'id' AS location_id,
-        da.details->'data'->'advisory_body'->'location'->>'name' AS location_level,
-        da.created_at AS created_at,
-        dev.id AS dev_id,
-        dev.first_name AS da_name,
-        dev.father_name AS da_father_name,
-        dev.grand_father_name AS da_grand_father_name,
-        dev.sex AS da_gender,
-        dev.phone_number AS da_phone_number,
-        keb.id AS kebele_id,
-        keb.name AS kebele_name,
-        wor.name AS woreda_name,
-        wor.id AS woreda_id,
-        zon.name AS zone_name,
-        zon.id AS zone_id,
-        reg.name AS region_name,
-        reg.id AS region_id
-
-    FROM 
-        core_telegraminteractionlog AS da
-    JOIN 
-        core_outbounddaprofile AS dev
-    ON 
-        da.details->'data'->>'da' = dev.id::text
-    LEFT JOIN 
-        integration_kebele AS keb
-    ON 
-        dev.kebele_id = keb.id
-    LEFT JOIN 
-        integration_woreda AS wor
-    ON 
-        keb.woreda_id = wor.id
-    LEFT JOIN 
-        integration_zone AS zon
-    ON 
-        wor.zone_id = zon.id
-    LEFT JOIN 
-        integration_region AS reg
-    ON 
-        zon.region_id = reg.id
-
-    WHERE 
-        da.action = 'ADVISORY_ACCESS_DA'
-
-    """
-}
-
-# @st.cache_data(ttl=int(streamlit_cache_ttl))
-def cached_data(query):
-    return fetch_data(query)
-
 st.header("Engagements")
 # user_role = st.selectbox("User Role", ["National User", "Regional User", "Zone User", "Woreda User"])
 user_role="Woreda User"
-query_one_output = cached_data(queries["query1"])
-query_two_output = cached_data(queries["query2"])
-
-concatenated_output = pd.concat([query_one_output, query_two_output], ignore_index=True)
-concatenated_output['DA Full Name'] = (concatenated_output['da_name'] + ' ' + 
-                                       concatenated_output['da_father_name'] + ' ' + 
-                                       concatenated_output['da_grand_father_name'])
-# st.write(concatenated_output)
-# concatenated_output.index = range(1, len(concatenated_output) + 1)
-concatenated_output=concatenated_output.drop_duplicates(subset="da_id")
 
 column_mapping = {
     'DA Full Name': 'DA Name',
@@ -188,62 +45,49 @@ def select_period(index):
         start_date = today - datetime.timedelta(days=365)
 
     return start_date
-today_utc = pd.Timestamp(datetime.date.today(), tz='UTC')
+today = datetime.date.today()
 
 
-concatenated_output = concatenated_output.rename(columns=column_mapping)
-print(concatenated_output.columns)
+locations = warehouse.engagement_locations().rename(columns=column_mapping)
 
 if user_role=='National User':
     col1, col2 = st.columns([1, 1])
     with col1:
         start_date = select_period(1)
-    start_date_utc = pd.Timestamp(start_date, tz='UTC')
     with col2:
         
-        selected_region = st.selectbox("Select Region", ["All"] + sorted(concatenated_output["Region"].dropna().unique().tolist()))
+        selected_region = st.selectbox("Select Region", ["All"] + sorted(locations["Region"].dropna().unique().tolist()))
+    level, location = "Region", selected_region
     columns_to_show = ["DA Name", "Gender", "Phone Number",'Region','Zone','Woreda','Kebele']
 elif user_role=='Regional User':
     col3, col4= st.columns([1, 1])
     with col3:
         start_date = select_period(1)
-    start_date_utc = pd.Timestamp(start_date, tz='UTC')
     with col4:
-        selected_zone = st.selectbox("Select Zone", ["All"] + sorted(concatenated_output["Zone"].dropna().unique().tolist()))
+        selected_zone = st.selectbox("Select Zone", ["All"] + sorted(locations["Zone"].dropna().unique().tolist()))
+    level, location = "Zone", selected_zone
     columns_to_show = ["DA Name", "Gender", "Phone Number",'Zone','Woreda','Kebele']
 
 elif user_role=='Zone User':
     col5,col6=st.columns([1,1])
     with col5:
         start_date = select_period(1)
-    start_date_utc = pd.Timestamp(start_date, tz='UTC')
     with col6:
-        selected_woreda = st.selectbox("Select Woreda", ["All"] + sorted(concatenated_output["Woreda"].dropna().unique().tolist()))
+        selected_woreda = st.selectbox("Select Woreda", ["All"] + sorted(locations["Woreda"].dropna().unique().tolist()))
+    level, location = "Woreda", selected_woreda
     columns_to_show = ["DA Name", "Gender", "Phone Number",'Woreda','Kebele']
 elif user_role=='Woreda User':
     col7,col8=st.columns([1,1])
     with col7:
         start_date = select_period(1)
-    start_date_utc = pd.Timestamp(start_date, tz='UTC')
     with col8:
-        selected_kebele = st.selectbox("Select Kebele", ["All"] + sorted(concatenated_output["Kebele"].dropna().unique().tolist()))
+        selected_kebele = st.selectbox("Select Kebele", ["All"] + sorted(locations["Kebele"].dropna().unique().tolist()))
+    level, location = "Kebele", selected_kebele
     columns_to_show = ["DA Name", "Gender", "Phone Number",'Kebele']
 
-filtered_df = concatenated_output
-filtered_df = filtered_df[(filtered_df['created_at'] >= start_date_utc) & (filtered_df['created_at'] <= today_utc)]
-if user_role=='National User':
-    if selected_region != "All":
-        filtered_df = filtered_df[filtered_df["Region"] == selected_region]
-if user_role=='Regional User':
-    if selected_zone != "All":
-        filtered_df = filtered_df[filtered_df["Zone"] == selected_zone]
-if user_role=='Zone User':
-    if selected_woreda != "All":
-        filtered_df = filtered_df[filtered_df["Woreda"] == selected_woreda]
-if user_role=='Woreda User':
-    if selected_kebele != "All":
-        filtered_df = filtered_df[filtered_df["Kebele"] == selected_kebele]
-
+# DAs who accessed advisories within the period, filtered by location in SQL
+filtered_df = warehouse.engaged_development_agents(start_date, today, level, None if location == "All" else location)
+filtered_df = filtered_df.rename(columns=column_mapping)
 filtered_df = filtered_df.reset_index(drop=True)
 filtered_df.index = range(1, len(filtered_df) + 1)
 filtered_df['Gender'] = filtered_df['Gender'].str.lower()
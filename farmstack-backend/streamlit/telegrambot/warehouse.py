@@ -0,0 +1,848 @@
+"""
+Data access layer of the Telegram bot dashboards.
+
+Reach and adoption rows are kept in ``telegram_reach_facts``, a table holding
+the result of the advisory/practice/value chain/location join once per reach
+(and adoption) instead of re-running the 12-table join on every page load.
+It is refreshed incrementally: only reaches at or after the newest loaded one
+are re-inserted and adoptions recorded for older reaches are patched in.
+
+Every page filter (dates, locations, DAs, practices, value chains) and every
+grouped reach/adoption count is evaluated in SQL, so pages only receive the
+rows they display. Connections come from one pool per server process and
+query results are cached with ``st.cache_data``, which is shared by all pages
+and sessions, for ``STREAMLIT_CACHE_TTL`` seconds.
+
+Run ``python warehouse.py`` (optionally with ``--rebuild``) from cron to keep
+the facts table fresh, and vacuumed, outside of dashboard traffic.
+"""
+import argparse
+import datetime
+import os
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+from dotenv import load_dotenv
+from psycopg2.pool import ThreadedConnectionPool
+
+load_dotenv()
+
+db_name = os.getenv("DB_NAME")
+db_user = os.getenv("DB_USER")
+db_password = os.getenv("DB_PASSWORD")
+db_host = os.getenv("DB_HOST")
+db_port = os.getenv("DB_PORT")
+
+CACHE_TTL = int(os.getenv("STREAMLIT_CACHE_TTL") or 600)
+REFRESH_INTERVAL = int(os.getenv("TELEGRAM_FACTS_REFRESH_INTERVAL") or CACHE_TTL)
+POOL_MIN_CONNECTIONS = int(os.getenv("DB_POOL_MIN_CONNECTIONS") or 1)
+POOL_MAX_CONNECTIONS = int(os.getenv("DB_POOL_MAX_CONNECTIONS") or 10)
+
+FACTS_TABLE = "telegram_reach_facts"
+# pg_advisory_xact_lock key, keeps concurrent refreshes (several pages, sessions
+# or servers) from loading the same rows twice
+REFRESH_LOCK_KEY = 7291029
+
+FACTS_QUERY = """
+SELECT
+    r.id AS reach_id,
+    ad.id AS adoption_id,
+    ofp.id AS farmer_id,
+    ofp.gender AS gender,
+    k.id AS kebele_id,
+    w.id AS woreda_id,
+    z.id AS zone_id,
+    rg.id AS region_id,
+    a.id AS advisory_id,
+    s.id AS subpractice_id,
+    p.id AS practice_id,
+    vc.id AS value_chain_id,
+    vcc.id AS value_chain_category_id,
+    r.created_at AS created_at
+FROM
+    core_reach r
+INNER JOIN
+    core_outboundfarmerprofile ofp ON ofp.id = r.farmer_id
+INNER JOIN
+    integration_kebele k ON k.id = ofp.kebele_id
+INNER JOIN
+    integration_woreda w ON w.id = k.woreda_id
+INNER JOIN
+    integration_zone z ON z.id = w.zone_id
+INNER JOIN
+    integration_region rg ON rg.id = z.region_id
+INNER JOIN
+    core_advisory a ON r.advisory_id = a.id
+INNER JOIN
+    core_valuechain vc ON a.value_chain_id = vc.id
+INNER JOIN
+    core_valuechaincategory vcc ON vc.category_id = vcc.id
+INNER JOIN
+    core_subpractice s ON a.sub_practice_id = s.id
+INNER JOIN
+    core_practice p ON s.practice_id = p.id
+LEFT JOIN
+    core_adoption ad ON ad.farmer_id = ofp.id AND ad.advisory_id = r.advisory_id
+"""
+
+FACTS_INDEXES = {
+    "created_at": "created_at",
+    "kebele_counts": "kebele_id, created_at",
+    "reach": "reach_id",
+    "advisory": "advisory_id",
+    "practice": "practice_id",
+    "value_chain": "value_chain_id",
+}
+# non-key columns stored in an index, the per-kebele counts of the Leaderboard
+# are answered from the index alone
+FACTS_INDEX_INCLUDES = {
+    "kebele_counts": "woreda_id, gender, reach_id, adoption_id",
+}
+
+# DAs of both registries, as joined by the engagement and performance pages
+DEVELOPMENT_AGENTS = """
+SELECT 1 AS source, id::text AS da_id, name AS da_name, father_name AS da_father_name,
+    grand_father_name AS da_grand_father_name, gender AS da_gender,
+    phone_number AS da_phone_number, kebele_id
+FROM integration_developmentagent
+UNION ALL
+SELECT 2 AS source, id::text AS da_id, first_name AS da_name, father_name AS da_father_name,
+    grand_father_name AS da_grand_father_name, sex AS da_gender,
+    phone_number AS da_phone_number, kebele_id
+FROM core_outbounddaprofile
+"""
+
+ADVISORY_ACCESS = f"""
+core_telegraminteractionlog l
+INNER JOIN ({DEVELOPMENT_AGENTS}) AS dev ON dev.da_id = l.details->'data'->>'da'
+"""
+
+
+@st.cache_resource
+def connection_pool():
+    """One pool per server process, shared by every page and session."""
+    return ThreadedConnectionPool(
+        POOL_MIN_CONNECTIONS,
+        POOL_MAX_CONNECTIONS,
+        dbname=db_name,
+        user=db_user,
+        password=db_password,
+        host=db_host,
+        port=db_port,
+    )
+
+
+@contextmanager
+def connection():
+    """Borrow a pooled connection, any open transaction is rolled back on return."""
+    pool = connection_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        if conn.closed:
+            pool.putconn(conn, close=True)
+        else:
+            conn.rollback()
+            pool.putconn(conn)
+
+
+def _frame(cursor, query, params=None):
+    cursor.execute(query, params)
+    columns = [column.name for column in cursor.description]
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+
+
+def fetch_data(query, params=None):
+    """Fetch data from the database and return as a DataFrame."""
+    with connection() as conn, conn.cursor() as cursor:
+        return _frame(cursor, query, params)
+
+
+def refresh_reach_facts(rebuild=False):
+    """
+    Bring ``telegram_reach_facts`` up to date with the reach and adoption tables.
+
+    Reaches created at or after the newest loaded reach are reloaded, adoptions
+    recorded since their reach was loaded replace its reach-only row. Returns
+    False when another refresh holds the lock.
+
+    **Parameters**
+    ``rebuild`` (bool): reload every reach, e.g. after reaches were deleted or
+        locations, advisories or farmers were edited
+    """
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (REFRESH_LOCK_KEY,))
+        if not cursor.fetchone()[0]:
+            return False
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {FACTS_TABLE} AS {FACTS_QUERY} WITH NO DATA")
+        for name, columns in FACTS_INDEXES.items():
+            include = f" INCLUDE ({FACTS_INDEX_INCLUDES[name]})" if name in FACTS_INDEX_INCLUDES else ""
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {FACTS_TABLE}_{name}_idx ON {FACTS_TABLE} ({columns}){include}")
+        # superseded by the kebele_counts index
+        cursor.execute(f"DROP INDEX IF EXISTS {FACTS_TABLE}_kebele_idx")
+
+        cursor.execute(f"SELECT max(created_at) FROM {FACTS_TABLE}")
+        watermark = cursor.fetchone()[0]
+        if rebuild or watermark is None:
+            cursor.execute(f"TRUNCATE {FACTS_TABLE}")
+            cursor.execute(f"INSERT INTO {FACTS_TABLE} {FACTS_QUERY}")
+        else:
+            params = {"watermark": watermark}
+            cursor.execute(f"DELETE FROM {FACTS_TABLE} WHERE created_at >= %(watermark)s", params)
+            cursor.execute(f"INSERT INTO {FACTS_TABLE} {FACTS_QUERY} WHERE r.created_at >= %(watermark)s", params)
+            cursor.execute(
+                f"""
+                INSERT INTO {FACTS_TABLE} {FACTS_QUERY}
+                WHERE r.created_at < %(watermark)s AND ad.id IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM {FACTS_TABLE} f WHERE f.reach_id = r.id AND f.adoption_id = ad.id
+                )
+                """,
+                params,
+            )
+            cursor.execute(
+                f"""
+                DELETE FROM {FACTS_TABLE} f
+                WHERE f.adoption_id IS NULL AND f.created_at < %(watermark)s AND EXISTS (
+                    SELECT 1 FROM {FACTS_TABLE} g WHERE g.reach_id = f.reach_id AND g.adoption_id IS NOT NULL
+                )
+                """,
+                params,
+            )
+        conn.commit()
+    return True
+
+
+def vacuum_reach_facts():
+    """
+    Update the visibility map and statistics of ``telegram_reach_facts``, so
+    counts answered from its covering indexes skip the table after a refresh.
+    """
+    with connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"VACUUM (ANALYZE) {FACTS_TABLE}")
+        finally:
+            conn.autocommit = False
+
+
+@st.cache_data(ttl=REFRESH_INTERVAL, show_spinner=False)
+def facts_version():
+    """
+    Refresh the facts table at most once per ``REFRESH_INTERVAL`` and return a
+    token identifying the refresh; cached queries take it as an argument so a
+    refresh starts a new generation of cache entries.
+    """
+    refresh_reach_facts()
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _period(start_date=None, end_date=None, column="f.created_at"):
+    """Conditions keeping ``column`` within the given dates, both inclusive."""
+    clauses, params = [], {}
+    if start_date:
+        clauses.append(f"{column} >= %(start_date)s")
+        params["start_date"] = start_date
+    if end_date:
+        clauses.append(f"{column} < %(end_date)s")
+        params["end_date"] = end_date + datetime.timedelta(days=1)
+    return clauses, params
+
+
+def _matching(column, name, value, params):
+    """Condition comparing ``column`` with one value or any of a tuple of values."""
+    params[name] = value
+    if isinstance(value, (list, tuple)):
+        params[name] = tuple(value)
+        return f"{column} IN %({name})s"
+    return f"{column} = %({name})s"
+
+
+def _where(clauses):
+    return " AND ".join(clauses) or "TRUE"
+
+
+def _fact_filters(filters):
+    """
+    SQL conditions on ``telegram_reach_facts f`` for a dict of page filters.
+    Empty values are ignored, tuples match any of their values.
+    """
+    clauses, params = _period(filters.get("start_date"), filters.get("end_date"))
+    for name in (
+        "region_id", "zone_id", "woreda_id", "kebele_id", "advisory_id",
+        "practice_id", "value_chain_id", "value_chain_category_id",
+    ):
+        value = filters.get(name)
+        if value is None or value == ():
+            continue
+        clauses.append(_matching(f"f.{name}", name, value, params))
+    return clauses, params
+
+
+def _with_development_agents(clauses, params, da_id=None):
+    """Only reaches of kebeles served by a DA (the selected one, if any)."""
+    da_clause = "TRUE"
+    if da_id is not None:
+        da_clause = _matching("da.id", "da_id", da_id, params)
+    return clauses + [f"f.kebele_id IN (SELECT da.kebele_id FROM integration_developmentagent da WHERE {da_clause})"]
+
+
+def _has_reaches(column, value):
+    return f"EXISTS (SELECT 1 FROM {FACTS_TABLE} f WHERE f.{column} = {value})"
+
+
+############################# Telegram BOT Dashboard #############################
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def dashboard_options(version=None):
+    """Date range and the locations, DAs, advisories and practices that have reaches."""
+    locations = fetch_data(
+        f"""
+        SELECT rg.id AS region_id, rg.name AS region_name, z.id AS zone_id, z.name AS zone_name,
+            w.id AS woreda_id, w.name AS woreda_name, k.id AS kebele_id, k.name AS kebele_name
+        FROM integration_kebele k
+        INNER JOIN integration_woreda w ON w.id = k.woreda_id
+        INNER JOIN integration_zone z ON z.id = w.zone_id
+        INNER JOIN integration_region rg ON rg.id = z.region_id
+        WHERE {_has_reaches("kebele_id", "k.id")}
+            AND EXISTS (SELECT 1 FROM integration_developmentagent da WHERE da.kebele_id = k.id)
+        ORDER BY rg.id, z.id, w.id, k.id
+        """
+    )
+    das = fetch_data(
+        f"""
+        SELECT da.id AS da_id, da.name AS da_name, da.kebele_id
+        FROM integration_developmentagent da
+        WHERE {_has_reaches("kebele_id", "da.kebele_id")}
+        ORDER BY da.id
+        """
+    )
+    advisories = fetch_data(
+        f"SELECT a.id AS advisory_id, a.label AS advisory_label FROM core_advisory a "
+        f"WHERE {_has_reaches('advisory_id', 'a.id')} ORDER BY a.id"
+    )
+    practices = fetch_data(
+        f"SELECT p.id AS practice_id, p.name AS practice_name FROM core_practice p "
+        f"WHERE {_has_reaches('practice_id', 'p.id')} ORDER BY p.id"
+    )
+    dates = fetch_data(f"SELECT min(created_at) AS min_created_at, max(created_at) AS max_created_at FROM {FACTS_TABLE}")
+    return {
+        "locations": locations,
+        "das": das,
+        "advisories": advisories,
+        "practices": practices,
+        "min_created_at": dates["min_created_at"].iloc[0],
+        "max_created_at": dates["max_created_at"].iloc[0],
+    }
+
+
+REACH_COUNTS = """
+    COUNT(DISTINCT reach_id) AS total_reach_count,
+    COUNT(DISTINCT reach_id) FILTER (WHERE gender = 'male') AS male_reach_count,
+    COUNT(DISTINCT reach_id) FILTER (WHERE gender = 'female') AS female_reach_count,
+    COUNT(DISTINCT adoption_id) AS total_adoption_count,
+    COUNT(DISTINCT adoption_id) FILTER (WHERE gender = 'male') AS male_adoption_count,
+    COUNT(DISTINCT adoption_id) FILTER (WHERE gender = 'female') AS female_adoption_count
+"""
+
+# grouping set of each breakdown, in the order of the GROUPING() bits
+BREAKDOWNS = ("practice", "advisory", "created_date", "region", "zone", "woreda", "kebele")
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def reach_and_adoption_counts(filters, version=None):
+    """
+    Reach, adoption, DA and farmer counts of the dashboard for the given filters,
+    in total and broken down by practice, advisory, day and location; every
+    breakdown is one grouping set of a single query.
+
+    **Parameters**
+    ``filters`` (dict): ``start_date``/``end_date`` (date), ``region_id``,
+        ``zone_id``, ``woreda_id``, ``kebele_id``, ``da_id``, ``advisory_id``
+        and ``practice_id``, ``None`` for no filter
+    """
+    clauses, params = _fact_filters(filters)
+    clauses = _with_development_agents(clauses, params, filters.get("da_id"))
+    counts = fetch_data(
+        f"""
+        WITH facts AS (
+            SELECT f.*, f.created_at::date AS created_date, p.name AS practice_name,
+                a.label AS advisory_label, rg.name AS region_name, z.name AS zone_name,
+                w.name AS woreda_name, k.name AS kebele_name
+            FROM {FACTS_TABLE} f
+            INNER JOIN core_practice p ON p.id = f.practice_id
+            INNER JOIN core_advisory a ON a.id = f.advisory_id
+            INNER JOIN integration_region rg ON rg.id = f.region_id
+            INNER JOIN integration_zone z ON z.id = f.zone_id
+            INNER JOIN integration_woreda w ON w.id = f.woreda_id
+            INNER JOIN integration_kebele k ON k.id = f.kebele_id
+            WHERE {_where(clauses)}
+        )
+        SELECT
+            GROUPING(practice_name, advisory_label, created_date, region_id, zone_id, woreda_id, kebele_id) AS grouping,
+            practice_name, advisory_label, created_date, region_name, zone_name, woreda_name, kebele_name,
+            {REACH_COUNTS},
+            COUNT(DISTINCT farmer_id) FILTER (WHERE gender = 'male') AS total_male_farmers,
+            COUNT(DISTINCT farmer_id) FILTER (WHERE gender = 'female') AS total_female_farmers
+        FROM facts
+        GROUP BY GROUPING SETS (
+            (), (practice_name), (advisory_label), (created_date), (region_id, region_name),
+            (zone_id, zone_name), (woreda_id, woreda_name), (kebele_id, kebele_name)
+        )
+        ORDER BY region_id, zone_id, woreda_id, kebele_id
+        """,
+        params,
+    )
+    da_clauses, da_params = _fact_filters(filters)
+    da_filter = "TRUE"
+    if filters.get("da_id") is not None:
+        da_filter = _matching("da.id", "da_id", filters["da_id"], da_params)
+    das = fetch_data(
+        f"""
+        SELECT da.gender, COUNT(DISTINCT da.id) AS count
+        FROM integration_developmentagent da
+        WHERE {da_filter} AND EXISTS (
+            SELECT 1 FROM {FACTS_TABLE} f WHERE f.kebele_id = da.kebele_id AND {_where(da_clauses)}
+        )
+        GROUP BY da.gender
+        """,
+        da_params,
+    )
+    return _reach_counts_from_rows(counts, das)
+
+
+def _breakdown(counts, breakdown):
+    """Rows of one grouping set: every bit but the breakdown's own is set."""
+    all_bits = (1 << len(BREAKDOWNS)) - 1
+    bit = 1 << (len(BREAKDOWNS) - 1 - BREAKDOWNS.index(breakdown))
+    return counts[counts["grouping"] == all_bits ^ bit]
+
+
+def _counts_by(counts, breakdown, key, suffix):
+    names = {
+        "male_reach_count": f"male_reach_count{suffix}",
+        "female_reach_count": f"female_reach_count{suffix}",
+        "male_adoption_count": f"male_adoption_count{suffix}",
+        "female_adoption_count": f"female_adoption_count{suffix}",
+    }
+    rows = _breakdown(counts, breakdown)
+    return {row[key]: {name: int(row[column]) for column, name in names.items()} for _, row in rows.iterrows()}
+
+
+def _reach_counts_from_rows(counts, das):
+    """Shape the grouped rows like the dashboard's ``reach_and_adoption_counts``."""
+    totals = counts[counts["grouping"] == (1 << len(BREAKDOWNS)) - 1]
+    total = totals.iloc[0] if len(totals) else pd.Series(dtype=object)
+
+    def count(column):
+        return int(total.get(column, 0) or 0)
+
+    days = _breakdown(counts, "created_date").set_index("created_date")
+    time_based_counts = {}
+    for column in ("male_reach_count", "female_reach_count", "male_adoption_count", "female_adoption_count"):
+        series = days[column].astype(int)
+        time_based_counts[f"{column.replace('_count', '_counts')}_created_at"] = series[series > 0]
+    da_counts = dict(zip(das["gender"], das["count"].astype(int)))
+
+    return {
+        "total_reach_count": count("total_reach_count"),
+        "male_reach_count": count("male_reach_count"),
+        "female_reach_count": count("female_reach_count"),
+        "male_adoption_count": count("male_adoption_count"),
+        "female_adoption_count": count("female_adoption_count"),
+        "total_adoption_count": count("total_adoption_count"),
+        "male_das": da_counts.get("Male", 0),
+        "female_das": da_counts.get("Female", 0),
+        "total_das": sum(da_counts.values()),
+        "practice_counts": _counts_by(counts, "practice", "practice_name", "_by_practice"),
+        "advisory_counts": _counts_by(counts, "advisory", "advisory_label", ""),
+        "total_male_farmers": count("total_male_farmers"),
+        "total_female_farmers": count("total_female_farmers"),
+        "time_based_counts": time_based_counts,
+        "zone_counts": _counts_by(counts, "zone", "zone_name", "_by_zone"),
+        "woreda_counts": _counts_by(counts, "woreda", "woreda_name", "_by_woreda"),
+        "kebele_counts": _counts_by(counts, "kebele", "kebele_name", "_by_kebele"),
+        "region_counts": _counts_by(counts, "region", "region_name", "_by_region"),
+    }
+
+
+################################## Leaderboard ##################################
+
+
+PERFORMANCE_COUNTS = """
+    COUNT(DISTINCT f.reach_id) FILTER (WHERE lower(f.gender) = 'male') AS male_reach_count,
+    COUNT(DISTINCT f.reach_id) FILTER (WHERE lower(f.gender) = 'female') AS female_reach_count,
+    COUNT(DISTINCT f.adoption_id) FILTER (WHERE lower(f.gender) = 'male') AS male_adoption_count,
+    COUNT(DISTINCT f.adoption_id) FILTER (WHERE lower(f.gender) = 'female') AS female_adoption_count
+"""
+COUNT_COLUMNS = ("male_reach_count", "female_reach_count", "male_adoption_count", "female_adoption_count")
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def leaderboard_counts(start_date, end_date=None, version=None):
+    """
+    Male/female reach and adoption counts of the reaches created within the
+    period in the kebeles served by a DA, one row per group of each Leaderboard
+    ranking: ``{"da": ..., "kebele": ..., "practice": ...}``.
+
+    A reach and its adoptions belong to the kebele of their farmer, so the
+    counts of a DA are the sums of the counts of the kebeles it serves, and the
+    facts are never joined with the DAs. The ``female_da_`` counts of a DA only
+    sum the kebeles where a DA of that name is a woman. Likewise a reach has
+    one subpractice, so practices sum the counts of their subpractices and
+    only those few rows are joined with the names.
+    """
+    clauses, params = _period(start_date, end_date)
+    clauses = _with_development_agents(clauses, params)
+    da_sums = ",\n".join(
+        f"SUM(c.{column})::bigint AS {column}, "
+        f"COALESCE(SUM(c.{column}) FILTER (WHERE d.female_da), 0)::bigint AS female_da_{column}"
+        for column in COUNT_COLUMNS
+    )
+    with connection() as conn, conn.cursor() as cursor:
+        # dropped when the connection is returned, its transaction being rolled back
+        cursor.execute(
+            f"""
+            CREATE TEMPORARY TABLE leaderboard_kebele_counts ON COMMIT DROP AS
+            SELECT f.kebele_id, f.woreda_id, {PERFORMANCE_COUNTS}
+            FROM {FACTS_TABLE} f
+            WHERE {_where(clauses)}
+            GROUP BY f.kebele_id, f.woreda_id
+            """,
+            params,
+        )
+        das = _frame(
+            cursor,
+            f"""
+            WITH da_kebeles AS (
+                SELECT
+                    da.name || ' ' || da.father_name || ' ' || da.grand_father_name AS full_name,
+                    da.kebele_id,
+                    bool_or(lower(da.gender) = 'female') AS female_da
+                FROM integration_developmentagent da
+                GROUP BY 1, da.kebele_id
+            )
+            SELECT
+                d.full_name AS "DA Full Name",
+                w.name AS woreda_name,
+                {da_sums},
+                COALESCE(bool_or(d.female_da), FALSE) AS has_female_da
+            FROM da_kebeles d
+            INNER JOIN leaderboard_kebele_counts c ON c.kebele_id = d.kebele_id
+            INNER JOIN integration_woreda w ON w.id = c.woreda_id
+            WHERE d.full_name IS NOT NULL
+            GROUP BY d.full_name, w.name
+            ORDER BY d.full_name, w.name
+            """,
+        )
+        kebeles = _frame(
+            cursor,
+            f"""
+            SELECT k.id AS kebele_id, k.name AS kebele_name, {", ".join(f"c.{column}" for column in COUNT_COLUMNS)}
+            FROM leaderboard_kebele_counts c
+            INNER JOIN integration_kebele k ON k.id = c.kebele_id
+            ORDER BY k.id, k.name
+            """,
+        )
+        practices = _frame(
+            cursor,
+            f"""
+            WITH telegram_data AS (
+                SELECT
+                    details->'data'->'advisory_body'->>'value_chain' AS value_chain_id,
+                    details->'data'->'advisory_body'->>'sub_practice' AS sub_practice_id,
+                    COUNT(*) AS count
+                FROM
+                    core_telegraminteractionlog
+                WHERE
+                    action = 'ADVISORY_ACCESS_DA'
+                GROUP BY
+                    details->'data'->'advisory_body'->>'value_chain',
+                    details->'data'->'advisory_body'->>'sub_practice'
+            ),
+            subpractice_counts AS (
+                SELECT f.value_chain_id, f.practice_id, f.subpractice_id, {PERFORMANCE_COUNTS}
+                FROM {FACTS_TABLE} f
+                WHERE {_where(clauses)}
+                GROUP BY f.value_chain_id, f.practice_id, f.subpractice_id
+            )
+            SELECT
+                vc.name AS value_chain_name,
+                p.name AS practice_name,
+                {", ".join(f"SUM(c.{column})::bigint AS {column}" for column in COUNT_COLUMNS)},
+                MAX(tg.count) AS access_count
+            FROM subpractice_counts c
+            INNER JOIN core_practice p ON p.id = c.practice_id
+            INNER JOIN core_valuechain vc ON vc.id = c.value_chain_id
+            LEFT JOIN telegram_data tg ON tg.value_chain_id::uuid = c.value_chain_id AND tg.sub_practice_id::uuid = c.subpractice_id
+            GROUP BY vc.name, p.name
+            ORDER BY vc.name, p.name
+            """,
+            params,
+        )
+    return {"da": das, "kebele": kebeles, "practice": practices}
+
+
+################################## Engagements ##################################
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def engagement_locations():
+    """Region, zone, woreda and kebele names of the DAs who accessed advisories."""
+    return fetch_data(
+        f"""
+        SELECT DISTINCT reg.name AS region_name, zon.name AS zone_name, wor.name AS woreda_name, keb.name AS kebele_name
+        FROM {ADVISORY_ACCESS}
+        LEFT JOIN integration_kebele AS keb ON dev.kebele_id = keb.id
+        LEFT JOIN integration_woreda AS wor ON keb.woreda_id = wor.id
+        LEFT JOIN integration_zone AS zon ON wor.zone_id = zon.id
+        LEFT JOIN integration_region AS reg ON zon.region_id = reg.id
+        WHERE l.action = 'ADVISORY_ACCESS_DA'
+        """
+    )
+
+
+ENGAGEMENT_LOCATIONS = {
+    "Region": "reg.name",
+    "Zone": "zon.name",
+    "Woreda": "wor.name",
+    "Kebele": "keb.name",
+}
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def engaged_development_agents(start_date, end_date=None, level=None, location=None):
+    """
+    One row per DA who accessed an advisory within the period, optionally only
+    the DAs of the ``location`` named region, zone, woreda or kebele (``level``).
+    """
+    clauses, params = _period(start_date, end_date, column="l.created_at")
+    if level and location:
+        clauses.append(_matching(ENGAGEMENT_LOCATIONS[level], "location", location, params))
+    return fetch_data(
+        f"""
+        SELECT DISTINCT ON (dev.da_id)
+            dev.da_id,
+            dev.da_name || ' ' || dev.da_father_name || ' ' || dev.da_grand_father_name AS "DA Full Name",
+            dev.da_gender,
+            dev.da_phone_number,
+            keb.name AS kebele_name,
+            wor.name AS woreda_name,
+            zon.name AS zone_name,
+            reg.name AS region_name
+        FROM {ADVISORY_ACCESS}
+        LEFT JOIN integration_kebele AS keb ON dev.kebele_id = keb.id
+        LEFT JOIN integration_woreda AS wor ON keb.woreda_id = wor.id
+        LEFT JOIN integration_zone AS zon ON wor.zone_id = zon.id
+        LEFT JOIN integration_region AS reg ON zon.region_id = reg.id
+        WHERE l.action = 'ADVISORY_ACCESS_DA' AND {_where(clauses)}
+        ORDER BY dev.da_id, dev.source
+        """,
+        params,
+    )
+
+
+################################## Performance ##################################
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def performance_options(version=None):
+    """Kebeles and DAs with advisory accesses, practices and value chains with reaches."""
+    kebeles = fetch_data(
+        f"""
+        SELECT DISTINCT k.woreda_id, k.id AS kebele_id, k.name AS kebele_name
+        FROM {ADVISORY_ACCESS}
+        INNER JOIN integration_kebele k ON k.id = dev.kebele_id
+        WHERE l.action = 'ADVISORY_ACCESS_DA'
+            AND {_has_reaches("kebele_id", "k.id")}
+        ORDER BY k.woreda_id, k.id
+        """
+    )
+    das = fetch_data(
+        f"""
+        SELECT DISTINCT dev.da_id, dev.da_name
+        FROM {ADVISORY_ACCESS}
+        WHERE l.action = 'ADVISORY_ACCESS_DA'
+            AND {_has_reaches("kebele_id", "dev.kebele_id")}
+        ORDER BY dev.da_id, dev.da_name
+        """
+    )
+    practices = fetch_data(
+        f"SELECT p.id AS practice_id, p.name AS practice_name FROM core_practice p "
+        f"WHERE {_has_reaches('practice_id', 'p.id')} ORDER BY p.id"
+    )
+    value_chains = fetch_data(
+        f"""
+        SELECT vc.id AS value_chain_id, vc.name AS value_chain_name,
+            vcc.id AS value_chain_category_id, vcc.name AS value_chain_category_name
+        FROM core_valuechain vc
+        INNER JOIN core_valuechaincategory vcc ON vcc.id = vc.category_id
+        WHERE {_has_reaches("value_chain_id", "vc.id")}
+        ORDER BY vc.id
+        """
+    )
+    return {"kebeles": kebeles, "das": das, "practices": practices, "value_chains": value_chains}
+
+
+def _performance_facts(filters):
+    """
+    ``access`` (advisory accesses of DAs) and ``facts`` (reaches of the kebeles
+    of those DAs) common table expressions for the performance filters:
+    ``start_date``/``end_date``, ``kebele_id``, ``da_id``, ``practice_id``,
+    ``value_chain_id`` and ``value_chain_category_id``.
+    """
+    access_clauses, params = _period(filters.get("start_date"), filters.get("end_date"), column="l.created_at")
+    for name in ("kebele_id", "da_id"):
+        if filters.get(name) not in (None, ()):
+            access_clauses.append(_matching(f"dev.{name}", name, filters[name], params))
+    fact_clauses = []
+    for name in ("practice_id", "value_chain_id", "value_chain_category_id"):
+        if filters.get(name) not in (None, ()):
+            fact_clauses.append(_matching(f"f.{name}", name, filters[name], params))
+    ctes = f"""
+        WITH access AS (
+            SELECT dev.da_id, dev.da_name, dev.kebele_id, l.created_at
+            FROM {ADVISORY_ACCESS}
+            WHERE l.action = 'ADVISORY_ACCESS_DA' AND {_where(access_clauses)}
+        ),
+        facts AS (
+            SELECT f.*
+            FROM {FACTS_TABLE} f
+            WHERE f.kebele_id IN (SELECT kebele_id FROM access) AND {_where(fact_clauses)}
+        )
+    """
+    return ctes, params
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def advisory_access(filters, version=None):
+    """
+    Per kebele, practice, value chain and category: the DAs who accessed
+    advisories, the access count and the male/female reach and adoption counts.
+    The access count is the number of (access, reach) pairs, as when the
+    accesses were joined with the reaches of the DA's kebele.
+    """
+    ctes, params = _performance_facts(filters)
+    return fetch_data(
+        f"""
+        {ctes},
+        access_by_kebele AS (
+            SELECT kebele_id, COUNT(*) AS access_count, COUNT(DISTINCT da_id) AS distinct_das
+            FROM access
+            GROUP BY kebele_id
+        ),
+        fact_groups AS (
+            SELECT f.kebele_id, f.practice_id, f.value_chain_id, f.value_chain_category_id,
+                COUNT(*) AS fact_count,
+                {PERFORMANCE_COUNTS}
+            FROM facts f
+            GROUP BY f.kebele_id, f.practice_id, f.value_chain_id, f.value_chain_category_id
+        )
+        SELECT
+            k.id AS kebele_id, k.name AS kebele_name,
+            p.id AS practice_id, p.name AS practice_name,
+            vc.id AS value_chain_id, vc.name AS value_chain_name,
+            vcc.id AS value_chain_category_id, vcc.name AS value_chain_category_name,
+            a.distinct_das,
+            a.access_count * g.fact_count AS access_count,
+            g.male_reach_count, g.female_reach_count, g.male_adoption_count, g.female_adoption_count
+        FROM fact_groups g
+        INNER JOIN access_by_kebele a ON a.kebele_id = g.kebele_id
+        INNER JOIN integration_kebele k ON k.id = g.kebele_id
+        INNER JOIN core_practice p ON p.id = g.practice_id
+        INNER JOIN core_valuechain vc ON vc.id = g.value_chain_id
+        INNER JOIN core_valuechaincategory vcc ON vcc.id = g.value_chain_category_id
+        ORDER BY k.id, k.name, p.id, p.name, vc.id, vc.name, vcc.id, vcc.name
+        """,
+        params,
+    )
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def access_over_time(filters, version=None):
+    """Number of (access, reach) pairs per kebele and access time."""
+    ctes, params = _performance_facts(filters)
+    return fetch_data(
+        f"""
+        {ctes},
+        facts_by_kebele AS (
+            SELECT f.kebele_id, COUNT(*) AS fact_count FROM facts f GROUP BY f.kebele_id
+        )
+        SELECT k.name AS kebele_name, a.created_at, SUM(fk.fact_count)::bigint AS access_count
+        FROM access a
+        INNER JOIN facts_by_kebele fk ON fk.kebele_id = a.kebele_id
+        INNER JOIN integration_kebele k ON k.id = a.kebele_id
+        GROUP BY k.name, a.created_at
+        ORDER BY k.name, a.created_at
+        """,
+        params,
+    )
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def da_performance(filters, version=None):
+    """Male/female reach and adoption counts and access count per DA name and kebele."""
+    ctes, params = _performance_facts(filters)
+    return fetch_data(
+        f"""
+        {ctes},
+        access_by_da AS (
+            SELECT da_name, kebele_id, COUNT(*) AS access_count FROM access GROUP BY da_name, kebele_id
+        )
+        SELECT a.da_name, k.name AS kebele_name,
+            {PERFORMANCE_COUNTS},
+            SUM(a.access_count)::bigint AS access_count
+        FROM access_by_da a
+        INNER JOIN facts f ON f.kebele_id = a.kebele_id
+        INNER JOIN integration_kebele k ON k.id = a.kebele_id
+        GROUP BY a.da_name, k.name
+        ORDER BY a.da_name, k.name
+        """,
+        params,
+    )
+
+
+VALUE_CHAIN_REPORT_COLUMNS = {
+    "kebele_name": "k.name",
+    "region_name": "rg.name",
+    "zone_name": "z.name",
+    "woreda_name": "w.name",
+    "practice_name": "p.name",
+}
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def value_chain_report(filters, by=("kebele_name", "practice_name"), version=None):
+    """Male/female reach and adoption counts grouped by the ``by`` location/practice names."""
+    ctes, params = _performance_facts(filters)
+    columns = ", ".join(f"{VALUE_CHAIN_REPORT_COLUMNS[name]} AS {name}" for name in by)
+    group_by = ", ".join(VALUE_CHAIN_REPORT_COLUMNS[name] for name in by)
+    return fetch_data(
+        f"""
+        {ctes}
+        SELECT {columns},
+            {PERFORMANCE_COUNTS}
+        FROM facts f
+        INNER JOIN integration_kebele k ON k.id = f.kebele_id
+        INNER JOIN integration_woreda w ON w.id = f.woreda_id
+        INNER JOIN integration_zone z ON z.id = f.zone_id
+        INNER JOIN integration_region rg ON rg.id = f.region_id
+        INNER JOIN core_practice p ON p.id = f.practice_id
+        GROUP BY {group_by}
+        ORDER BY {group_by}
+        """,
+        params,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f"Refresh the {FACTS_TABLE} table of the Telegram bot dashboards.")
+    parser.add_argument("--rebuild", action="store_true", help="reload every reach instead of only the new ones")
+    args = parser.parse_args()
+    refreshed = refresh_reach_facts(rebuild=args.rebuild)
+    if refreshed:
+        vacuum_reach_facts()
+    print(f"{FACTS_TABLE} refreshed" if refreshed else f"{FACTS_TABLE} is being refreshed by another process")
@@ -0,0 +1,163 @@
+"""
+Vectorized per-column statistics for dataset files.
+
+Every column is factorized once into integer codes; distinct counts and
+distinct values come straight from the factorization and grouped value counts
+are a single ``np.bincount`` over the combined (group, value) codes. Columns
+are processed one after another in the calling thread, or on a shared process
+pool for frames with at least ``process_threshold`` rows. The pool is started
+on first use with the ``spawn`` method, since forking a Django or Celery
+process that holds database connections and threads is unsafe, and shut down
+at exit.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+MISSING_VALUES = ["nan", "N/A", "NA", "NAN", "NaN"]
+PROCESS_POOL_THRESHOLD = 2000000
+
+
+def _codes(values, sort=True):
+    """Integer codes and uniques of ``values``, missing values get their own code."""
+    return pd.factorize(values, sort=sort, use_na_sentinel=False)
+
+
+def unique_count(values):
+    return len(_codes(values, sort=False)[1])
+
+
+def unique_values(values):
+    return np.asarray(_codes(values)[1])
+
+
+def value_counts_by(values, groups, weights=None, missing_values=MISSING_VALUES):
+    """
+    Nested ``{group: {value: count}}`` of the filled ``values`` per ``group``.
+    Values that are missing or spelled like a missing value are skipped, as
+    are rows without a group. ``weights`` gives the number of rows each entry
+    stands for, e.g. when counting over pre-aggregated cells.
+    """
+    return _value_counts_by_codes(values, pd.factorize(groups, sort=True), weights, missing_values)
+
+
+def _value_counts_by_codes(values, factorized_groups, weights=None, missing_values=MISSING_VALUES):
+    group_codes, group_uniques = factorized_groups
+    value_codes, value_uniques = pd.factorize(values, sort=True)
+    if not len(group_uniques) or not len(value_uniques):
+        return {}
+    # missing-like spellings are looked up on the few distinct values, not on every row
+    skipped = pd.Index(value_uniques).isin(missing_values)
+    keep = (group_codes >= 0) & (value_codes >= 0)
+    keep[keep] = ~skipped[value_codes[keep]]
+    counts = np.bincount(
+        group_codes[keep].astype(np.int64) * len(value_uniques) + value_codes[keep],
+        weights=None if weights is None else np.asarray(weights)[keep],
+        minlength=len(group_uniques) * len(value_uniques),
+    ).reshape(len(group_uniques), len(value_uniques))
+    group_uniques, value_uniques = group_uniques.tolist(), value_uniques.tolist()
+    result = {}
+    for group_code, value_code in zip(*np.nonzero(counts)):
+        result.setdefault(group_uniques[group_code], {})[value_uniques[value_code]] = int(counts[group_code, value_code])
+    return result
+
+
+def _column_task(task):
+    """Statistic of one column, returned as ``(succeeded, result or error message)``."""
+    kind, values, groups = task
+    try:
+        if kind == "size":
+            return True, unique_count(values)
+        if kind == "unique":
+            return True, unique_values(values)
+        return True, _value_counts_by_codes(values, groups)
+    except Exception as e:
+        return False, str(e)
+
+
+class ColumnStatsEngine:
+    """
+    Computes the statistics of many columns of a DataFrame in one call.
+
+    **Parameters**
+    ``max_workers`` (int): size of the process pool used for very large frames,
+        defaults to the number of CPUs; 1 disables the pool
+    ``process_threshold`` (int): minimum number of rows before the pool is used
+    """
+
+    FALLBACKS = {"size": 0, "unique": [], "grouped": ""}
+
+    def __init__(self, max_workers: int = None, process_threshold: int = PROCESS_POOL_THRESHOLD):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.process_threshold = process_threshold
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                if self._pid is None:
+                    atexit.register(self.shutdown)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+                self._pid = os.getpid()
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None and self._pid == os.getpid():
+            pool.shutdown()
+
+    def _run(self, kind: str, df, columns: list, group_by: str = None):
+        # the grouping column is factorized once and shared by every column
+        groups = pd.factorize(df[group_by], sort=True) if group_by else None
+        results = {}
+        tasks = {}
+        for column in columns:
+            if column not in df.columns:
+                LOGGER.error(f"Error column {column} not found during {kind} statistics")
+                results[column] = self.FALLBACKS[kind]
+                continue
+            tasks[column] = (kind, df[column].to_numpy(), groups)
+
+        outcomes = None
+        if self.max_workers > 1 and len(tasks) > 1 and len(df) >= self.process_threshold:
+            try:
+                outcomes = list(self._executor().map(_column_task, tasks.values()))
+            except Exception as e:
+                # e.g. daemonic celery workers cannot start child processes
+                LOGGER.warning(f"Column statistics process pool unavailable, computing inline ERROR: {e}")
+        if outcomes is None:
+            outcomes = map(_column_task, tasks.values())
+        for column, (succeeded, result) in zip(tasks, outcomes):
+            if not succeeded:
+                LOGGER.error(f"Error {result} during {kind} statistics, column:{column}")
+                result = self.FALLBACKS[kind]
+            results[column] = result
+        return results
+
+    def unique_counts(self, df, columns: list):
+        """Number of distinct values of each column."""
+        return self._run("size", df, columns)
+
+    def unique_values(self, df, columns: list):
+        """Sorted distinct values of each column."""
+        return self._run("unique", df, columns)
+
+    def value_counts_by(self, df, columns: list, group_by: str):
+        """``{column: {group: {value: count}}}`` of each column grouped by ``group_by``."""
+        return self._run("grouped", df, columns, group_by)
+
+
+ENGINE = ColumnStatsEngine()
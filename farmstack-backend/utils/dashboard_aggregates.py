@@ -0,0 +1,516 @@
+"""
+Pre-aggregated cubes for the KIAMIS/OMFP/FSP/KNFD dataset dashboards.
+
+A cube is computed once per dataset file version (path + mtime + size) by
+grouping the raw file over its filter dimensions (county, sub county, gender,
+value chains, ...) and summing every metric column. Any filter combination is
+then answered by selecting cube cells and summing them, so dashboard requests
+never touch the raw file again until it changes.
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+
+from utils import column_stats
+from utils.dashboard_cache import dataset_file_version
+
+LOGGER = logging.getLogger(__name__)
+
+CUBE_FORMAT_VERSION = 1
+CUBE_CACHE_TIMEOUT = 172800
+CUBE_CHUNK_SIZE = 200000
+MAX_RESIDENT_CUBES = 8
+
+COUNT = "_count"
+VALUE_CHAIN = "_value_chain"
+
+GENDER_CHANGES = {"1": "MALE", "2": "FEMALE", "1.0": "MALE", "2.0": "FEMALE"}
+EDUCATION_LEVELS = {
+    1: "None",
+    2: "Primary",
+    3: "Secondary",
+    4: "Certificate",
+    5: "Diploma",
+    6: "University Degree",
+    7: "Post Graduate Degree,Masters and Above",
+}
+KIAMIS_VALUE_CHAINS = ["Millet", "Maize food crop", "Beans", "Cassava", "Sorghum", "Potatoes", "Cowpeas"]
+KIAMIS_NUMERIC_COLUMNS = [
+    "Ducks", "Other Sheep", "Family", "Other Money Lenders", "Micro-finance institution",
+    "Self (Salary or Savings)", "Natural rivers and stream", "Water Pan", "Total Area Irrigation",
+    "NPK", "Superphosphate", "CAN", "Urea", "Other", "Other Dual Cattle", "Cross breed Cattle",
+    "Cattle boma", "Small East African Goats", "Somali Goat", "Other Goat", "Chicken -Indigenous",
+    "Chicken -Broilers", "Chicken -Layers", "Do you insure your crops?",
+    "Highest Level of Formal Education", "Do you insure your farm buildings and other assets?",
+]
+KIAMIS_COLUMNS = [
+    "Gender", "Constituency", "County", "Sub County", "Crop Production", "farmer_mobile_number",
+    "Livestock Production", "Ward",
+] + KIAMIS_NUMERIC_COLUMNS + KIAMIS_VALUE_CHAINS
+
+# metric name -> (source column, predicate) for the "count farmers by gender" widgets
+KIAMIS_INDICATORS = {
+    "crop_production": ("Crop Production", lambda s: s == 1),
+    "livestock_production": ("Livestock Production", lambda s: s == 1),
+    "relatives": ("Family", lambda s: s > 0),
+    "Other Money Lenders": ("Other Money Lenders", lambda s: s > 0),
+    "Micro-finance institution": ("Micro-finance institution", lambda s: s > 0),
+    "Self (Salary or Savings)": ("Self (Salary or Savings)", lambda s: s > 0),
+    "irrigation": ("Total Area Irrigation", lambda s: s > 0),
+    "rivers": ("Natural rivers and stream", lambda s: s > 0),
+    "water_pan": ("Water Pan", lambda s: s > 0),
+    "insured_crops": ("Do you insure your crops?", lambda s: s > 0),
+    "insured_machinery": ("Do you insure your farm buildings and other assets?", lambda s: s > 0),
+    "npk": ("NPK", lambda s: s > 0),
+    "ssp": ("Superphosphate", lambda s: s > 0),
+    "can": ("CAN", lambda s: s > 0),
+    "urea": ("Urea", lambda s: s > 0),
+    "Others": ("Other", lambda s: s > 0),
+}
+KIAMIS_LIVESTOCK = {
+    "cows": ["Other Dual Cattle", "Cross breed Cattle", "Cattle boma"],
+    "goats": ["Small East African Goats", "Somali Goat", "Other Goat"],
+    "chickens": ["Chicken -Indigenous", "Chicken -Broilers", "Chicken -Layers"],
+    "ducks": ["Ducks"],
+    "sheep": ["Other Sheep"],
+}
+KIAMIS_SECTIONS = {
+    "farming_practices": ["crop_production", "livestock_production"],
+    "financial_livelihood": ["relatives", "Other Money Lenders", "Micro-finance institution", "Self (Salary or Savings)"],
+    "water_sources": ["irrigation", "rivers", "water_pan"],
+    "insurance_information": ["insured_crops", "insured_machinery"],
+    "popular_fertilizer_used": ["npk", "ssp", "can", "urea", "Others"],
+}
+
+
+def _ordered_union(first: list, second: list):
+    seen = set(first)
+    return list(first) + [value for value in second if not (value in seen or seen.add(value))]
+
+
+class DashboardCube:
+    """
+    Grouped aggregates of one dataset file.
+
+    ``cells`` holds one row per distinct combination of ``dimensions`` with the
+    row count and the sum of every metric. ``tables`` holds, per detail column
+    (phone numbers, value chains, education, ...), the row counts grouped by
+    ``dimensions`` plus that column; they answer distinct counts and
+    breakdowns that are not additive across cells. ``domains`` keeps the
+    values offered in the dashboard filter drop downs.
+    """
+
+    def __init__(self, dimensions: list, cells, tables: dict, domains: dict, value_chains: list = None):
+        self.dimensions = list(dimensions)
+        self.cells = cells
+        self.tables = tables
+        self.domains = domains
+        self.value_chains = list(value_chains or [])
+
+    @classmethod
+    def from_frame(cls, df, dimensions: list, metrics: dict = None, tables: list = (), domains: list = (),
+                   value_chains: list = None):
+        """
+        Build a cube from an already normalised DataFrame.
+
+        **Parameters**
+        ``df`` (DataFrame): normalised rows of the dataset file
+        ``dimensions`` (list): columns the dashboard can be filtered on
+        ``metrics`` (dict): metric name -> Series aligned with ``df`` to be summed
+        ``tables`` (list): detail columns kept per cell for distinct counts and breakdowns
+        ``domains`` (list): columns whose distinct values are listed as filter options
+        ``value_chains`` (list): columns folded into a bitmask dimension, a row matches a
+            value chain filter when any of the selected columns is filled
+        """
+        dimensions = list(dimensions)
+        frame = df[dimensions].copy()
+        if value_chains:
+            bits = np.zeros(len(df), dtype=np.int64)
+            for position, column in enumerate(value_chains):
+                if column in df.columns:
+                    bits |= df[column].notna().to_numpy().astype(np.int64) << position
+            frame[VALUE_CHAIN] = bits
+            dimensions = dimensions + [VALUE_CHAIN]
+        frame[COUNT] = 1
+        for name, series in (metrics or {}).items():
+            frame[name] = pd.to_numeric(series, errors="coerce").fillna(0).to_numpy()
+        cells = frame.groupby(dimensions, dropna=False, sort=False).sum().reset_index()
+
+        grouped = {}
+        for column in tables:
+            table = frame[dimensions].copy()
+            table[column] = df[column].to_numpy()
+            table[COUNT] = 1
+            grouped[column] = table.groupby(dimensions + [column], dropna=False, sort=False)[COUNT].sum().reset_index()
+        domain_values = {column: pd.unique(df[column]).tolist() for column in domains}
+        return cls(dimensions, cells, grouped, domain_values, value_chains)
+
+    def merge(self, other: "DashboardCube"):
+        """Fold the cube of another chunk of the same dataset into this one."""
+        if other.dimensions != self.dimensions:
+            raise ValueError("Cannot merge dashboard cubes with different dimensions")
+        cells = (
+            pd.concat([self.cells, other.cells], ignore_index=True)
+            .groupby(self.dimensions, dropna=False, sort=False)
+            .sum()
+            .reset_index()
+        )
+        tables = {}
+        for column in set(self.tables) | set(other.tables):
+            frames = [cube.tables[column] for cube in (self, other) if column in cube.tables]
+            tables[column] = (
+                pd.concat(frames, ignore_index=True)
+                .groupby(self.dimensions + [column], dropna=False, sort=False)[COUNT]
+                .sum()
+                .reset_index()
+            )
+        domains = {
+            column: _ordered_union(self.domains.get(column, []), other.domains.get(column, []))
+            for column in set(self.domains) | set(other.domains)
+        }
+        return DashboardCube(self.dimensions, cells, tables, domains, self.value_chains)
+
+    def slice(self, selections: dict, value_chain: list = None):
+        """Return the cells matching ``selections`` (column -> accepted values) and ``value_chain``."""
+        return CubeSlice(self, {column: values for column, values in selections.items() if values}, value_chain)
+
+    def value_chain_bits(self, value_chain: list):
+        return sum(1 << self.value_chains.index(column) for column in value_chain if column in self.value_chains)
+
+
+class CubeSlice:
+    """Cells of a cube selected by one filter combination."""
+
+    def __init__(self, cube: DashboardCube, selections: dict, value_chain: list = None):
+        self.cube = cube
+        self.selections = selections
+        self.value_chain = value_chain or []
+
+    def _mask(self, frame):
+        mask = np.ones(len(frame), dtype=bool)
+        for column, values in self.selections.items():
+            mask &= frame[column].isin(values).to_numpy()
+        if self.value_chain:
+            bits = self.cube.value_chain_bits(self.value_chain)
+            mask &= (frame[VALUE_CHAIN].to_numpy() & bits) != 0
+        return mask
+
+    def cells(self):
+        return self.cube.cells[self._mask(self.cube.cells)]
+
+    def table(self, column: str):
+        table = self.cube.tables[column]
+        return table[self._mask(table)]
+
+    def distinct(self, column: str, dropna=False):
+        if column in self.cube.tables:
+            return int(self.table(column)[column].nunique(dropna=dropna))
+        return int(self.cells()[column].nunique(dropna=dropna))
+
+
+def _sorted_domain(values: list):
+    try:
+        return np.unique(np.array(values)).tolist()
+    except TypeError:
+        return sorted(values, key=str)
+
+
+def _gender_pivot(frame, group_column: str, gender_column: str, fill=True):
+    pivot = frame.groupby([group_column, gender_column])[COUNT].sum().unstack()
+    if fill:
+        pivot = pivot.fillna(0).astype(int)
+    return pivot.to_dict(orient="index")
+
+
+def _breakdown(frame, group_column: str, column: str):
+    """Nested {group: {value: count}} of the filled values of ``column``, as used by value chain charts."""
+    return column_stats.value_counts_by(frame[column], frame[group_column], weights=frame[COUNT])
+
+
+def read_dashboard_file(file_path: str, columns: list = None):
+    """Yield the dataset file in chunks so large CSVs are aggregated without loading them whole."""
+    if file_path.endswith(".xlsx") or file_path.endswith(".xls"):
+        df = pd.read_excel(file_path)
+        yield df[[column for column in columns if column in df.columns]] if columns else df
+    elif file_path.endswith(".csv"):
+        yield from pd.read_csv(file_path, usecols=columns, low_memory=False, chunksize=CUBE_CHUNK_SIZE)
+    else:
+        raise ValueError("Unsupported file please use .xls or .csv.")
+
+
+def build_kiamis_cube(df):
+    df = df.copy()
+    for column in KIAMIS_NUMERIC_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+    df["Gender"] = df["Gender"].astype(str).map(GENDER_CHANGES)
+    df["Highest Level of Formal Education"] = df["Highest Level of Formal Education"].map(EDUCATION_LEVELS)
+    metrics = {name: predicate(df[column]).astype(int) for name, (column, predicate) in KIAMIS_INDICATORS.items()}
+    for name, columns in KIAMIS_LIVESTOCK.items():
+        metrics[name] = df[columns].sum(axis=1)
+    cube = DashboardCube.from_frame(
+        df,
+        dimensions=["County", "Sub County", "Gender"],
+        metrics=metrics,
+        tables=["farmer_mobile_number", "Constituency", "Highest Level of Formal Education"],
+        value_chains=KIAMIS_VALUE_CHAINS,
+    )
+    cube.domains = {column: pd.unique(df[column].astype(str)).tolist() for column in ["County", "Sub County", "Gender"]}
+    return cube
+
+
+def render_kiamis_dashboard(cube: DashboardCube, data: dict, filters=False):
+    gender = data.get("gender") or []
+    value_chain = data.get("value_chain") or []
+    selected = cube.slice(
+        {"County": data.get("county") or [], "Sub County": data.get("sub_county") or [], "Gender": gender},
+        value_chain,
+    )
+    across_counties = cube.slice({"Gender": gender}, value_chain)
+    cells = selected.cells()
+    metrics = [COUNT] + list(KIAMIS_INDICATORS) + list(KIAMIS_LIVESTOCK)
+    by_gender = cells.groupby("Gender")[metrics].sum()
+
+    def counts(metric):
+        return {key: int(value) for key, value in by_gender[metric].items() if value > 0}
+
+    obj = {
+        "male_count": int(by_gender[COUNT].get("MALE", 0)),
+        "female_count": int(by_gender[COUNT].get("FEMALE", 0)),
+        "farmer_mobile_numbers": selected.distinct("farmer_mobile_number"),
+        "gender_by_sub_county": _gender_pivot(across_counties.cells(), "Sub County", "Gender", fill=False),
+    }
+    for section, metrics in KIAMIS_SECTIONS.items():
+        obj[section] = {metric: counts(metric) for metric in metrics}
+    obj["livestock_and_poultry_production"] = {
+        name: by_gender[name].astype(int).to_dict() for name in KIAMIS_LIVESTOCK
+    }
+    obj["education_level"] = _gender_pivot(
+        selected.table("Highest Level of Formal Education"), "Highest Level of Formal Education", "Gender"
+    )
+    obj["total_number_of_records"] = int(cells[COUNT].sum())
+    obj["counties"] = selected.distinct("County")
+    obj["constituencies"] = selected.distinct("Constituency", dropna=True)
+    obj["sub_counties"] = selected.distinct("Sub County")
+    obj["filters"] = {
+        "county": cube.domains["County"],
+        "sub_county": cube.domains["Sub County"],
+        "gender": cube.domains["Gender"],
+    } if filters else {}
+    obj["type"] = "kiamis"
+    return obj
+
+
+def _normalise_strings(df, columns: list, upper: list):
+    df = df.copy()
+    df[columns] = df[columns].astype(str)
+    for column in upper:
+        df[column] = df[column].str.upper().str.strip()
+    return df
+
+
+def build_omfp_cube(df):
+    df = _normalise_strings(df, ["County", "Sub County", "Telephone", "Gender", "Primary Value Chain"],
+                            ["Gender", "Sub County", "County"])
+    return DashboardCube.from_frame(
+        df,
+        dimensions=["Cohort", "County", "Sub County", "Gender"],
+        tables=["Telephone", "Primary Value Chain"],
+        domains=["Cohort", "County", "Sub County", "Gender"],
+    )
+
+
+def render_omfp_dashboard(cube: DashboardCube, data: dict, filters=False):
+    selected = cube.slice({
+        "Cohort": data.get("cohort", []),
+        "County": data.get("county", []),
+        "Sub County": data.get("sub_county", []),
+        "Gender": data.get("gender", []),
+    })
+    cells = selected.cells()
+    gender_counts = cells.groupby("Gender")[COUNT].sum()
+    return {
+        "total_number_of_records": int(cells[COUNT].sum()),
+        "counties": selected.distinct("County"),
+        "sub_counties": selected.distinct("Sub County"),
+        "filters": {
+            "cohort": _sorted_domain(cube.domains["Cohort"]),
+            "county": _sorted_domain(cube.domains["County"]),
+            "sub_county": _sorted_domain(cube.domains["Sub County"]),
+            "gender": _sorted_domain(cube.domains["Gender"]),
+        } if filters else {},
+        "male_count": int(gender_counts.get("MALE", 0)),
+        "female_count": int(gender_counts.get("FEMALE", 0)),
+        "farmer_mobile_numbers": selected.distinct("Telephone"),
+        "gender_by_sub_county": _gender_pivot(cells, "Sub County", "Gender"),
+        "primary_value_chain_by_sub_county": _breakdown(
+            selected.table("Primary Value Chain"), "Sub County", "Primary Value Chain"
+        ),
+        "type": "omfp",
+    }
+
+
+def build_fsp_cube(df):
+    df = df.copy()
+    df["Farmer_Sex"] = df["Farmer_Sex"].astype(str).map(GENDER_CHANGES).fillna("")
+    df = _normalise_strings(df, ["County", "Subcounty", "Farmer_TelephoneNumebr", "vc", "vc_two", "vc_three"],
+                            ["Subcounty", "County"])
+    return DashboardCube.from_frame(
+        df,
+        dimensions=["County", "Subcounty", "Farmer_Sex"],
+        tables=["Farmer_TelephoneNumebr", "vc", "vc_two", "vc_three"],
+        domains=["County", "Subcounty", "Farmer_Sex"],
+    )
+
+
+def render_fsp_dashboard(cube: DashboardCube, data: dict, filters=False):
+    selected = cube.slice({
+        "County": data.get("county", []),
+        "Subcounty": data.get("sub_county", []),
+        "Farmer_Sex": data.get("gender", []),
+    })
+    cells = selected.cells()
+    gender_counts = cells.groupby("Farmer_Sex")[COUNT].sum()
+    return {
+        "total_number_of_records": int(cells[COUNT].sum()),
+        "counties": selected.distinct("County"),
+        "sub_counties": selected.distinct("Subcounty"),
+        "filters": {
+            "county": _sorted_domain(cube.domains["County"]),
+            "sub_county": _sorted_domain(cube.domains["Subcounty"]),
+            "gender": _sorted_domain(cube.domains["Farmer_Sex"]),
+        } if filters else {},
+        "male_count": int(gender_counts.get("MALE", 0)),
+        "female_count": int(gender_counts.get("FEMALE", 0)),
+        "farmer_mobile_numbers": selected.distinct("Farmer_TelephoneNumebr"),
+        "gender_by_sub_county": _gender_pivot(cells, "Subcounty", "Farmer_Sex"),
+        "primary_value_chain_by_sub_county": _breakdown(selected.table("vc"), "Subcounty", "vc"),
+        "second_value_chain_by_sub_county": _breakdown(selected.table("vc_two"), "Subcounty", "vc_two"),
+        "third_value_chain_by_sub_county": _breakdown(selected.table("vc_three"), "Subcounty", "vc_three"),
+        "type": "fsp",
+    }
+
+
+def build_knfd_cube(df):
+    df = _normalise_strings(df, ["County", "Sub-County", "Telephone", "Gender", "PrimaryValueChain"], ["Gender"])
+    return DashboardCube.from_frame(
+        df,
+        dimensions=["County", "Sub-County", "Gender"],
+        tables=["Telephone", "PrimaryValueChain"],
+        domains=["County", "Sub-County", "Gender"],
+    )
+
+
+def render_knfd_dashboard(cube: DashboardCube, data: dict, filters=False):
+    selected = cube.slice({
+        "County": data.get("county", []),
+        "Sub-County": data.get("sub_county", []),
+        "Gender": data.get("gender", []),
+    })
+    cells = selected.cells()
+    gender_counts = cells.groupby("Gender")[COUNT].sum()
+    return {
+        "total_number_of_records": int(cells[COUNT].sum()),
+        "counties": selected.distinct("County"),
+        "sub_counties": selected.distinct("Sub-County"),
+        "filters": {
+            "county": _sorted_domain(cube.domains["County"]),
+            "sub_county": _sorted_domain(cube.domains["Sub-County"]),
+            "gender": _sorted_domain(cube.domains["Gender"]),
+        } if filters else {},
+        "male_count": int(gender_counts.get("MALE", 0)),
+        "female_count": int(gender_counts.get("FEMALE", 0)),
+        "farmer_mobile_numbers": selected.distinct("Telephone"),
+        "gender_by_sub_county": _gender_pivot(cells, "Sub-County", "Gender"),
+        "primary_value_chain_by_sub_county": _breakdown(
+            selected.table("PrimaryValueChain"), "Sub-County", "PrimaryValueChain"
+        ),
+        "type": "knfd",
+    }
+
+
+# dataset type -> (columns to read, cube builder, renderer)
+DASHBOARD_TYPES = {
+    "kiamis": (KIAMIS_COLUMNS, build_kiamis_cube, render_kiamis_dashboard),
+    "omfp": (None, build_omfp_cube, render_omfp_dashboard),
+    "fsp": (None, build_fsp_cube, render_fsp_dashboard),
+    "knfd": (None, build_knfd_cube, render_knfd_dashboard),
+}
+
+_RESIDENT_CUBES = OrderedDict()
+_RESIDENT_LOCK = threading.Lock()
+# cube key: [lock serializing its build, number of requests holding or waiting for it]
+_BUILD_LOCKS = {}
+_BUILD_LOCKS_GUARD = threading.Lock()
+
+
+def cube_cache_key(dataset_type: str, dataset_file: str, version: str):
+    digest = hashlib.sha256(f"{CUBE_FORMAT_VERSION}|{dataset_type}|{dataset_file}|{version}".encode("utf-8"))
+    return f"dashboard_cube:{digest.hexdigest()}"
+
+
+@contextmanager
+def _build_lock(key: str):
+    """Hold the build lock of ``key``, dropped once no request holds or waits for it."""
+    with _BUILD_LOCKS_GUARD:
+        entry = _BUILD_LOCKS.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _BUILD_LOCKS_GUARD:
+            entry[1] -= 1
+            if not entry[1]:
+                del _BUILD_LOCKS[key]
+
+
+def build_dashboard_cube(dataset_type: str, file_path: str):
+    """Aggregate a dataset file chunk by chunk into a single cube."""
+    columns, builder, _ = DASHBOARD_TYPES[dataset_type]
+    cube = None
+    for chunk in read_dashboard_file(file_path, columns):
+        chunk_cube = builder(chunk)
+        cube = chunk_cube if cube is None else cube.merge(chunk_cube)
+    LOGGER.info(f"Dashboard cube built for {file_path} with {len(cube.cells)} cells")
+    return cube
+
+
+def get_dashboard_cube(dataset_type: str, dataset_file: str):
+    """
+    Return the cube for the current version of ``dataset_file``.
+
+    Cubes are kept in process memory and in the shared cache, keyed by the
+    file version, so they are only rebuilt when the file changes.
+    """
+    file_path = os.path.join(settings.DATASET_FILES_URL, dataset_file)
+    key = cube_cache_key(dataset_type, dataset_file, dataset_file_version(file_path))
+    with _RESIDENT_LOCK:
+        cube = _RESIDENT_CUBES.get(key)
+        if cube is not None:
+            _RESIDENT_CUBES.move_to_end(key)
+            return cube
+    with _build_lock(key):
+        cube = cache.get(key)
+        if cube is None:
+            cube = build_dashboard_cube(dataset_type, file_path)
+            cache.set(key, cube, CUBE_CACHE_TIMEOUT)
+        with _RESIDENT_LOCK:
+            _RESIDENT_CUBES[key] = cube
+            while len(_RESIDENT_CUBES) > MAX_RESIDENT_CUBES:
+                _RESIDENT_CUBES.popitem(last=False)
+    return cube
+
+
+def generate_dashboard(dataset_type: str, dataset_file: str, data: dict, filters=False):
+    """Dashboard details of ``dataset_file`` for the filters selected in ``data``."""
+    _, _, renderer = DASHBOARD_TYPES[dataset_type]
+    return renderer(get_dashboard_cube(dataset_type, dataset_file), data, filters)
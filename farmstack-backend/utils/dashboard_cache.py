@@ -0,0 +1,190 @@
+"""
+Response cache of the KIAMIS/OMFP/FSP/KNFD dataset dashboards.
+
+Keys are a SHA-256 digest of the canonical JSON of the request filters, the
+version of the dataset file that answers them and a generation counter per
+dataset type. They are therefore identical across gunicorn workers and
+restarts, and every cached response of a dataset type is invalidated as soon
+as one of its ``DatasetV2File`` rows is saved or deleted.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+
+LOGGER = logging.getLogger(__name__)
+
+DASHBOARD_CACHE_TIMEOUT = 172800
+POPULAR_FILTERS_LIMIT = 10
+POPULAR_FILTERS_TRACKED = 100
+# order matters, the first type found in the file name wins
+DASHBOARD_TYPES = ("omfp", "fsp", "knfd", "kiamis")
+
+_POPULAR_LOCK = threading.Lock()
+
+
+def dataset_type_of(file_name: str):
+    """Return the dashboard type of a dataset file from its name, or None."""
+    file_name = str(file_name).lower()
+    return next((dataset_type for dataset_type in DASHBOARD_TYPES if dataset_type in file_name), None)
+
+
+def dataset_file_version(file_path: str):
+    """Version of a dataset file on disk, changes whenever the file is rewritten."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return ""
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def canonical_filters(data: dict):
+    """
+    Canonical JSON of the dashboard filters in a request body. Empty filters
+    are dropped and the selected values are sorted, since neither changes the
+    response. The caller's data is left untouched.
+    """
+    filters = {}
+    for key, value in dict(data or {}).items():
+        if value in (None, "", [], {}):
+            continue
+        filters[str(key)] = sorted(value, key=str) if isinstance(value, (list, tuple)) else value
+    return json.dumps(filters, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def generation(dataset_type: str):
+    return cache.get(f"dashboard:generation:{dataset_type}", 0)
+
+
+def bump_generation(dataset_type: str):
+    """Invalidate every cached dashboard response of ``dataset_type``."""
+    key = f"dashboard:generation:{dataset_type}"
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+    LOGGER.info(f"Dashboard cache invalidated for {dataset_type} datasets")
+
+
+def dashboard_cache_key(scope, data: dict, dataset_type: str, dataset_file: str, filters=False):
+    """
+    Deterministic cache key of a dashboard response.
+
+    **Parameters**
+    ``scope`` (str): dataset file id, or the dataset type for the consolidated admin view
+    ``data`` (dict): filters selected in the request
+    ``dataset_type`` (str): one of ``DASHBOARD_TYPES``
+    ``dataset_file`` (str): dataset file answering the request, relative to ``DATASET_FILES_URL``
+    ``filters`` (bool): whether the response lists the filter options
+    """
+    payload = "|".join([
+        str(scope),
+        canonical_filters(data),
+        str(bool(filters)),
+        str(dataset_file),
+        dataset_file_version(os.path.join(settings.DATASET_FILES_URL, str(dataset_file))),
+        str(generation(dataset_type)),
+    ])
+    return f"dashboard:response:{dataset_type}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def _count(dataset_type: str, outcome: str):
+    key = f"dashboard:stats:{dataset_type}:{outcome}"
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_response(key: str, dataset_type: str):
+    """Cached dashboard response for ``key``, counting the hit or miss."""
+    value = cache.get(key)
+    _count(dataset_type, "hits" if value else "misses")
+    return value
+
+
+def set_response(key: str, value):
+    cache.set(key, value, DASHBOARD_CACHE_TIMEOUT)
+
+
+def get_or_compute(key: str, dataset_type: str, function):
+    """
+    Cached response for ``key``, else the result of ``function()`` cached,
+    counting the hit or miss. With the tiered cache concurrent misses of a key
+    compute it only once.
+    """
+    computed = []
+
+    def compute():
+        computed.append(True)
+        return function()
+
+    value = cache.get_or_set(key, compute, DASHBOARD_CACHE_TIMEOUT)
+    _count(dataset_type, "misses" if computed else "hits")
+    return value
+
+
+def _redis(key: str):
+    """Redis client and full key of ``key`` when the default cache is a Redis cache, else ``(None, None)``."""
+    backend = caches["default"]
+    if not isinstance(backend, RedisCache):
+        return None, None
+    full_key = backend.make_and_validate_key(key)
+    return backend._cache.get_client(full_key, write=True), full_key
+
+
+def record_filters(dataset_type: str, data: dict):
+    """
+    Count how often a filter combination is requested, used to pick what to
+    warm. On Redis the counters are a sorted set incremented with ZINCRBY, so
+    concurrent requests of every worker are all counted.
+    """
+    key = f"dashboard:popular:{dataset_type}"
+    filters = canonical_filters(data)
+    client, full_key = _redis(key)
+    if client is not None:
+        pipeline = client.pipeline()
+        pipeline.zincrby(full_key, 1, filters)
+        pipeline.zremrangebyrank(full_key, 0, -POPULAR_FILTERS_TRACKED - 1)
+        pipeline.execute()
+        return
+    # other backends (local development, tests) only count the requests of this process exactly
+    with _POPULAR_LOCK:
+        popular = cache.get(key, {})
+        popular[filters] = popular.get(filters, 0) + 1
+        if len(popular) > POPULAR_FILTERS_TRACKED:
+            popular = dict(sorted(popular.items(), key=lambda item: item[1], reverse=True)[:POPULAR_FILTERS_TRACKED])
+        cache.set(key, popular, None)
+
+
+def popular_filters(dataset_type: str, limit: int = POPULAR_FILTERS_LIMIT):
+    """Most requested filter combinations of ``dataset_type``, most popular first."""
+    key = f"dashboard:popular:{dataset_type}"
+    client, full_key = _redis(key)
+    if client is not None:
+        return [json.loads(filters) for filters in client.zrevrange(full_key, 0, limit - 1)]
+    popular = cache.get(key, {})
+    ranked = sorted(popular.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [json.loads(filters) for filters, _ in ranked]
+
+
+def stats():
+    """Hit/miss counters of the dashboard cache per dataset type."""
+    result = {}
+    for dataset_type in DASHBOARD_TYPES:
+        hits = cache.get(f"dashboard:stats:{dataset_type}:hits", 0)
+        misses = cache.get(f"dashboard:stats:{dataset_type}:misses", 0)
+        result[dataset_type] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0,
+            "generation": generation(dataset_type),
+        }
+    return result
@@ -0,0 +1,112 @@
+"""
+Aggregate metrics of the datahub dashboards.
+
+Every group of metrics is a fixed number of aggregate statements, whatever the
+number of categories, states, sources or connectors: conditional counts
+(``COUNT(...) FILTER (WHERE ...)``) for the participant, connector and support
+ticket counters, and one ``GROUP BY`` over ``jsonb_each`` for the category
+counts, formerly a COUNT per category key or a loop over every category dict.
+"""
+import logging
+
+from django.db import connections
+from django.db.models import Count, F, Q, Sum
+
+from connectors.models import Connectors
+from datahub.models import UserOrganizationMap
+from participant.models import SupportTicket
+
+LOGGER = logging.getLogger(__name__)
+
+# JSON values counted as true by the former `value == True` of the category loop
+TRUE_VALUES = "('true', '1')"
+
+
+def category_counts(queryset, field="category", true_values=False):
+    """
+    {key: number of rows of `queryset` whose JSON object `field` has the key},
+    sorted by key. With `true_values` only the rows where the key is true are
+    counted, keys without any are still returned with 0.
+    """
+    sql, params = queryset.order_by().values(field).query.sql_with_params()
+    column = f'source."{field}"'
+    count = f"COUNT(*) FILTER (WHERE item.value IN {TRUE_VALUES})" if true_values else "COUNT(*)"
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f"SELECT item.key, {count} FROM ({sql}) AS source CROSS JOIN LATERAL jsonb_each("
+            f"CASE WHEN jsonb_typeof({column}) = 'object' THEN {column} ELSE '{{}}'::jsonb END) AS item "
+            f"GROUP BY item.key ORDER BY item.key",
+            params,
+        )
+        return dict(cursor.fetchall())
+
+
+def participant_metrics(on_boarded_by, role_id, user_id):
+    """Participants (and co-stewards for the datahub admin) visible to the user, in one statement."""
+    participants = Q(user__role=3, user__approval_status=True)
+    counts = {}
+    if on_boarded_by != "None" or role_id == str(6):
+        onboarder = on_boarded_by if on_boarded_by != "None" else user_id
+        counts["participants_count"] = Count("id", filter=participants & Q(user__on_boarded_by=onboarder))
+    else:
+        if role_id == str(1):
+            counts["co_steward_count"] = Count("id", filter=Q(user__role=6))
+        counts["participants_count"] = Count("id", filter=participants & Q(user__on_boarded_by=None))
+    return UserOrganizationMap.objects.filter(user__status=True).aggregate(**counts)
+
+
+def dataset_metrics(dataset_query):
+    """File metrics by source, dataset counts by state and category and their total, in three statements."""
+    file_metrics = list(
+        dataset_query.values("datasets__source")
+        .annotate(
+            dataset_count=Count("id", distinct=True),
+            file_count=Count("datasets__file", distinct=True),
+            total_size=Sum("datasets__file_size"),
+        )
+        .filter(file_count__gt=0)
+    )
+    state_metrics = list(
+        dataset_query.values(state_name=F("geography__state__name")).annotate(dataset_count=Count("id", distinct=True))
+    )
+    return {
+        "dataset_file_metrics": file_metrics,
+        "dataset_state_metrics": state_metrics,
+        # every dataset is in exactly one state group, the one of a null state included
+        "total_dataset_count": sum(state["dataset_count"] for state in state_metrics),
+        "dataset_category_metrics": category_counts(dataset_query),
+    }
+
+
+def connector_metrics(dataset_query, user_id, user_org_map):
+    """
+    Connectors of the user and their maps over the datasets of `dataset_query`
+    (the maps over datasets of other organizations for ``other_...``), in one statement.
+    """
+    datasets = dataset_query.order_by().values("id")
+    others = datasets.exclude(user_map_id=user_org_map)
+
+    def maps_over(side, ids):
+        return Count("connectorsmap", filter=Q(**{f"connectorsmap__{side}_dataset_file__dataset__in": ids}), distinct=True)
+
+    counts = Connectors.objects.filter(user_id=user_id).aggregate(
+        total_connectors_count=Count("id", distinct=True),
+        right=maps_over("right", datasets),
+        left=maps_over("left", datasets),
+        other_right=maps_over("right", others),
+        other_left=maps_over("left", others),
+    )
+    return {
+        "total_connectors_count": counts["total_connectors_count"],
+        "other_datasets_used_in_my_connectors": counts["other_right"] + counts["other_left"],
+        "my_dataset_used_in_connectors": counts["right"] + counts["left"],
+    }
+
+
+def support_ticket_metrics():
+    """Open, closed and on hold support tickets in one statement."""
+    return SupportTicket.objects.aggregate(
+        open_requests=Count("id", filter=Q(status="open")),
+        closed_requests=Count("id", filter=Q(status="closed")),
+        hold_requests=Count("id", filter=Q(status="hold")),
+    )
@@ -0,0 +1,188 @@
+"""
+Preview index of the standardised dataset files.
+
+The dataset detail views show the first rows of every file of a dataset. They
+used to read every file on every request, which for a workbook means loading
+it with openpyxl (shared strings and styles included) to keep two rows. The
+header, first rows, dtypes and row count of a file are now extracted once, when
+the file is saved, into a ``DatasetV2FilePreview`` row keyed by the path and the
+version (mtime and size) of the file. The views read it with the dataset files;
+a file whose preview is missing or stale is read directly, first rows only,
+until a Celery task has extracted it again.
+
+Masking from ``standardised_configuration`` is applied when the preview is read,
+so changing the masked columns does not need a new extraction.
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from datahub.models import DatasetV2FilePreview, index_preview_of_dataset_file
+from utils import dashboard_cache
+
+LOGGER = logging.getLogger(__name__)
+
+# rows shown by the dataset detail views
+PREVIEW_ROWS = 2
+# rows of a workbook the dtypes are inferred from, CSV dtypes cover the whole file
+DTYPE_SAMPLE_ROWS = 1000
+CSV_CHUNK_ROWS = 100000
+MASK = "######"
+
+
+def file_path_of(dataset_file):
+    return os.path.join(settings.DATASET_FILES_URL, str(dataset_file.standardised_file))
+
+
+def is_previewable(file_path):
+    return file_path.endswith((".csv", ".xlsx", ".xls"))
+
+
+def _kept_columns(frame):
+    return frame.drop(frame.filter(regex="Unnamed").columns, axis=1)
+
+
+def _rows(frame):
+    """Rows of the preview as ``read_contents_from_csv_or_xlsx_file`` returned them, before masking."""
+    frame = _kept_columns(frame).fillna("")
+    frame.columns = frame.columns.astype(str)
+    return list(frame.columns), frame.to_dict(orient="split")["data"]
+
+
+def _dtypes(frame):
+    frame = _kept_columns(frame)
+    return {str(column): dtype for column, dtype in frame.dtypes.items()}
+
+
+def _merge_dtypes(dtypes, chunk_dtypes):
+    """Dtypes of two chunks of a CSV file: numeric columns widen, any other mismatch is object."""
+    for column, dtype in chunk_dtypes.items():
+        previous = dtypes.setdefault(column, dtype)
+        if previous == dtype:
+            continue
+        numeric = pd.api.types.is_numeric_dtype(previous) and pd.api.types.is_numeric_dtype(dtype)
+        dtypes[column] = np.result_type(previous, dtype) if numeric else np.dtype(object)
+
+
+def _extract_csv(file_path):
+    # the rows are read on their own so their values are parsed as they always were
+    columns, rows = _rows(pd.read_csv(file_path, index_col=False, nrows=PREVIEW_ROWS))
+    dtypes, row_count = {}, 0
+    for chunk in pd.read_csv(file_path, index_col=False, chunksize=CSV_CHUNK_ROWS):
+        _merge_dtypes(dtypes, _dtypes(chunk))
+        row_count += len(chunk)
+    return columns, rows, dtypes, row_count
+
+
+def _sheet_rows(excel):
+    """Rows of the first sheet including the header, from the dimension of the sheet when it has one."""
+    if excel.engine == "openpyxl":
+        sheet = excel.book.worksheets[0]
+        if sheet.max_row is not None:
+            return sheet.max_row
+        return sum(1 for _ in sheet.iter_rows(values_only=True))
+    return excel.book.sheet_by_index(0).nrows
+
+
+def _extract_excel(file_path):
+    with pd.ExcelFile(file_path) as excel:
+        row_count = max(_sheet_rows(excel) - 1, 0)
+        columns, rows = _rows(excel.parse(index_col=None, nrows=PREVIEW_ROWS))
+        dtypes = _dtypes(excel.parse(index_col=None, nrows=DTYPE_SAMPLE_ROWS))
+    return columns, rows, dtypes, row_count
+
+
+def extract(file_path):
+    """
+    ``(columns, rows, dtypes, row_count)`` of a CSV or Excel file. A file that
+    cannot be read has no columns, rows or dtypes and no row count.
+    """
+    try:
+        if file_path.endswith((".xlsx", ".xls")):
+            columns, rows, dtypes, row_count = _extract_excel(file_path)
+        else:
+            columns, rows, dtypes, row_count = _extract_csv(file_path)
+    except Exception as error:
+        LOGGER.error("Invalid file ERROR: %s", error)
+        return [], [], {}, None
+    return columns, rows, {column: str(dtype) for column, dtype in dtypes.items()}, row_count
+
+
+def index(dataset_file):
+    """Extract the preview of the standardised file of `dataset_file`, unless the stored one is current."""
+    file_path = file_path_of(dataset_file)
+    if not is_previewable(file_path):
+        return None
+    preview = current_preview(dataset_file, file_path)
+    if preview:
+        return preview
+    version = dashboard_cache.dataset_file_version(file_path)
+    columns, rows, dtypes, row_count = extract(file_path)
+    try:
+        preview, _ = DatasetV2FilePreview.objects.update_or_create(
+            dataset_file=dataset_file,
+            defaults={
+                "file_path": file_path,
+                "file_version": version,
+                "columns": columns,
+                "rows": rows,
+                "dtypes": dtypes,
+                "row_count": row_count,
+            },
+        )
+    except IntegrityError:
+        # created meanwhile by a concurrent extraction of the same file
+        preview = DatasetV2FilePreview.objects.get(dataset_file=dataset_file)
+    dataset_file.preview = preview
+    return preview
+
+
+def current_preview(dataset_file, file_path):
+    preview = getattr(dataset_file, "preview", None)
+    if preview and preview.file_path == file_path:
+        if preview.file_version == dashboard_cache.dataset_file_version(file_path):
+            return preview
+    return None
+
+
+def read_preview(file_path):
+    """``(columns, rows)`` of the first rows of a file read directly, as the views did before the index."""
+    try:
+        if file_path.endswith((".xlsx", ".xls")):
+            frame = pd.read_excel(file_path, index_col=None, nrows=PREVIEW_ROWS)
+        else:
+            frame = pd.read_csv(file_path, index_col=False, nrows=PREVIEW_ROWS)
+    except Exception as error:
+        LOGGER.error("Invalid file ERROR: %s", error)
+        return [], []
+    return _rows(frame)
+
+
+def content(dataset_file):
+    """
+    First rows of the standardised file of `dataset_file` as records with the
+    masked columns of its ``standardised_configuration`` masked, from the
+    preview index. Select the files with ``select_related("preview")``.
+
+    A file without a current preview is read directly (its first rows only)
+    and its extraction is left to ``core.utils.index_dataset_file_preview``.
+    """
+    file_path = file_path_of(dataset_file)
+    if not is_previewable(file_path):
+        return []
+    preview = current_preview(dataset_file, file_path)
+    if preview:
+        columns, rows = preview.columns, preview.rows
+    else:
+        columns, rows = read_preview(file_path)
+        transaction.on_commit(lambda: index_preview_of_dataset_file(dataset_file.id))
+    records = [dict(zip(columns, row)) for row in rows[:PREVIEW_ROWS]]
+    configuration = dataset_file.standardised_configuration or {}
+    masked = [key for key, value in configuration.items() if isinstance(value, dict) and value.get("masked", False)]
+    for record in records:
+        record.update(dict.fromkeys(masked, MASK))
+    return records
@@ -0,0 +1,240 @@
+"""
+Outbox of the transactional emails (OTPs, invitations, approvals).
+
+``Utils.send_email`` used to connect to the SMTP server, STARTTLS, log in and
+send from the request handler, so a slow or unreachable server held up the
+login and invite endpoints. ``enqueue`` now writes an ``OutboxEmail`` row in
+the transaction of the request and schedules ``core.utils.drain_email_outbox``
+once it commits. The worker sends the due emails in batches over one SMTP
+connection per process, kept open between drains and reopened when the server
+dropped it. The beat schedule drains every minute as well, so an email whose
+task was never published is still sent.
+
+A failed email is retried ``RETRY_BASE_DELAY`` seconds later, doubled at every
+attempt up to ``RETRY_MAX_DELAY``. It is dead-lettered (kept with status
+``dead`` and its last error) after ``MAX_ATTEMPTS`` attempts or on a permanent
+(5xx) SMTP reply. When the server cannot be reached at all the drain stops and
+leaves the emails pending without counting an attempt. ``purge`` deletes the
+sent emails after ``SENT_RETENTION_DAYS`` days and the dead ones, which may
+hold an OTP, ``DEAD_RETENTION_DAYS`` days after their last attempt.
+"""
+import logging
+import smtplib
+import threading
+import time
+from datetime import timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.models import OutboxEmail
+
+LOGGER = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 6 * 3600
+SMTP_TIMEOUT = 30
+# an open connection idle for longer is likely closed by the server already
+SMTP_MAX_IDLE = 60
+SENT_RETENTION_DAYS = 30
+DEAD_RETENTION_DAYS = 7
+
+
+class SmtpUnavailable(Exception):
+    """The SMTP server could not be connected to, or refused the TLS handshake or the login."""
+
+
+def enqueue(to_email, content=None, subject=None):
+    """
+    Write an email to the outbox in the current transaction and schedule its
+    delivery for when the transaction commits.
+
+    **Parameters**
+    ``to_email`` (str or list): recipient(s)
+    ``content`` (str): HTML body
+    ``subject`` (str): subject line
+    """
+    recipients = [to_email] if isinstance(to_email, str) else [email for email in to_email or [] if email]
+    if not recipients:
+        LOGGER.warning(f"Email {subject} not queued, it has no recipient")
+        return None
+    email = OutboxEmail.objects.create(to_emails=recipients, subject=subject or "", content=content or "")
+    transaction.on_commit(schedule_drain)
+    return email
+
+
+def schedule_drain():
+    from core.utils import drain_email_outbox
+
+    # called from the request, a broker that is down must not hold it up
+    try:
+        drain_email_outbox.apply_async(retry=False)
+    except Exception as error:
+        LOGGER.error(f"Failed to schedule the email outbox drain, left to the beat schedule ERROR: {error}")
+
+
+def message_of(email):
+    message = MIMEMultipart()
+    message["From"] = settings.SMTP_USER
+    message["To"] = ", ".join(email.to_emails)
+    message["Subject"] = email.subject
+    message.attach(MIMEText(email.content, "html"))
+    return message.as_string()
+
+
+class SmtpConnection:
+    """Connection to the SMTP server of the settings, opened on first use and reused until it is dropped."""
+
+    def __init__(self, timeout=SMTP_TIMEOUT, max_idle=SMTP_MAX_IDLE):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.server = None
+        self.used_at = 0
+        self.lock = threading.Lock()
+
+    def open(self):
+        try:
+            server = smtplib.SMTP(settings.SMTP_SERVER, settings.SMTP_PORT, timeout=self.timeout)
+        except OSError as error:
+            raise SmtpUnavailable(error) from error
+        try:
+            if settings.SMTP_USE_TLS:
+                server.starttls()
+            if settings.SMTP_PASSWORD:
+                server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        except OSError as error:
+            server.close()
+            raise SmtpUnavailable(error) from error
+        self.server = server
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except OSError:
+                self.server.close()
+            self.server = None
+
+    def send(self, email):
+        """Send an ``OutboxEmail``, reconnecting once if the server closed the connection in the meantime."""
+        message = message_of(email)
+        if self.server is not None and time.monotonic() - self.used_at > self.max_idle:
+            self.close()
+        for retry in (False, True):
+            if self.server is None:
+                self.open()
+            try:
+                refused = self.server.sendmail(settings.SMTP_USER, email.to_emails, message)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self.server.close()
+                self.server = None
+                if retry:
+                    raise
+                continue
+            except TimeoutError:
+                # the state of the SMTP session is unknown
+                self.server.close()
+                self.server = None
+                raise
+            self.used_at = time.monotonic()
+            if refused:
+                LOGGER.warning(f"Email {email.id} refused for {', '.join(refused)}")
+            return
+
+
+CONNECTION = SmtpConnection()
+
+
+def is_permanent(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def retry_delay(attempts):
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def deliver(emails, connection):
+    """
+    Send `emails` over `connection` and update their status, attempts and error.
+    Returns the emails attempted, every email unless the server is unavailable.
+    """
+    attempted = []
+    for email in emails:
+        now = timezone.now()
+        try:
+            connection.send(email)
+        except SmtpUnavailable as error:
+            LOGGER.error(f"SMTP server unavailable, {len(emails) - len(attempted)} emails left pending ERROR: {error}")
+            break
+        except Exception as error:
+            # any other error fails this email only, the batch goes on
+            email.attempts += 1
+            email.last_error = f"{type(error).__name__}: {error}"
+            if is_permanent(error) or email.attempts >= MAX_ATTEMPTS:
+                email.status = OutboxEmail.DEAD
+                LOGGER.error(f"Email {email.id} dead-lettered after {email.attempts} attempts ERROR: {error}")
+            else:
+                email.next_attempt_at = now + timedelta(seconds=retry_delay(email.attempts))
+                LOGGER.warning(f"Email {email.id} failed, attempt {email.attempts} ERROR: {error}")
+        else:
+            email.attempts += 1
+            email.status = OutboxEmail.SENT
+            email.sent_at = now
+            email.last_error = ""
+        email.updated_at = now
+        attempted.append(email)
+    return attempted
+
+
+def drain(batch_size=BATCH_SIZE, connection=None):
+    """
+    Send the due pending emails of the outbox, `batch_size` per transaction.
+    The rows of a batch are locked with SKIP LOCKED, so concurrent drains send
+    disjoint emails. Returns the number of emails sent.
+    """
+    connection = connection or CONNECTION
+    sent = 0
+    with connection.lock:
+        while True:
+            with transaction.atomic():
+                emails = list(
+                    OutboxEmail.objects.select_for_update(skip_locked=True)
+                    .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=timezone.now())
+                    .order_by("next_attempt_at")[:batch_size]
+                )
+                attempted = deliver(emails, connection)
+                OutboxEmail.objects.bulk_update(
+                    attempted, ["status", "attempts", "next_attempt_at", "last_error", "sent_at", "updated_at"]
+                )
+            sent += sum(email.status == OutboxEmail.SENT for email in attempted)
+            if len(attempted) < batch_size:
+                return sent
+
+
+def requeue(ids=None):
+    """Send dead-lettered emails (all of them by default) again with fresh attempts."""
+    emails = OutboxEmail.objects.filter(status=OutboxEmail.DEAD)
+    if ids is not None:
+        emails = emails.filter(id__in=ids)
+    count = emails.update(status=OutboxEmail.PENDING, attempts=0, next_attempt_at=timezone.now())
+    if count:
+        transaction.on_commit(schedule_drain)
+    return count
+
+
+def purge(days=SENT_RETENTION_DAYS, dead_days=DEAD_RETENTION_DAYS):
+    """Delete the emails sent more than `days` days ago and those dead-lettered more than `dead_days` days ago."""
+    now = timezone.now()
+    deleted, _ = OutboxEmail.objects.filter(
+        Q(status=OutboxEmail.SENT, sent_at__lt=now - timedelta(days=days))
+        | Q(status=OutboxEmail.DEAD, updated_at__lt=now - timedelta(days=dead_days))
+    ).delete()
+    return deleted
@@ -1,73 +1,18 @@
+import asyncio
 import logging
 import os
-import tempfile
-import argparse
-import concurrent.futures
-import csv
-import json
-import re
-import subprocess
-import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from contextlib import contextmanager
+from functools import lru_cache
 from urllib.parse import quote_plus
-from uuid import UUID
 
-import certifi
 import openai
-import pytube
-import pytz
-import requests
-from bs4 import BeautifulSoup
-from django.db import models
-from django.db.models import OuterRef, Subquery
-from django.db.models.functions import Cast
-from docx import Document
-
 from dotenv import load_dotenv
-
-from langchain_community.document_loaders import (
-    BSHTMLLoader, CSVLoader, JSONLoader, PyMuPDFLoader, UnstructuredHTMLLoader
-)
 from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores.pgvector import DistanceStrategy
-from langchain.text_splitter import (
-    CharacterTextSplitter,
-    RecursiveCharacterTextSplitter,
-)
-from pgvector.django import CosineDistance, L2Distance
-from psycopg.conninfo import make_conninfo
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.pdfgen import canvas
-from reportlab.platypus import Paragraph, SimpleDocTemplate
-
-from requests import Request, Session
-from requests.adapters import HTTPAdapter
-from sqlalchemy.dialects.postgresql import dialect
-from urllib3.util import Retry
-
-from celery import shared_task
+from langchain_core.prompts import PromptTemplate
+
 from core import settings
 from core.constants import Constants
-from datahub.models import LangchainPgCollection, LangchainPgEmbedding, OutputParser, ResourceFile
 from utils.chain_builder import ChainBuilder
-from langchain.prompts import PromptTemplate
 from utils.pgvector import PGVector
-from langchain.retrievers.merger_retriever import MergerRetriever
-
-from langchain.retrievers import (
-    ContextualCompressionRetriever,
-    MergerRetriever,
-)
-from langchain.retrievers.document_compressors import DocumentCompressorPipeline
-
-from langchain_community.document_transformers import (
-    EmbeddingsClusteringFilter,
-    EmbeddingsRedundantFilter,
-)
-from langchain_core.output_parsers import JsonOutputParser
 
 LOGGING = logging.getLogger(__name__)
 
@@ -76,7 +21,6 @@ os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
 openai.api_key = settings.OPENAI_API_KEY
 
 embedding_model = "text-embedding-ada-002"
-embeddings = OpenAIEmbeddings(model=embedding_model, openai_api_key=settings.OPENAI_API_KEY)
 
 db_settings = settings.DATABASES['default']
 encoded_user = quote_plus(db_settings['USER'])
@@ -85,54 +29,26 @@ retriever = ''
 
 connectionString = f"postgresql://{encoded_user}:{encoded_password}@{db_settings['HOST']}:{db_settings['PORT']}/{db_settings['NAME']}"
 
+@lru_cache(maxsize=None)
+def get_embeddings():
+    """OpenAI embeddings client, built on first use so importing this module needs no API key"""
+    return OpenAIEmbeddings(model=embedding_model, openai_api_key=settings.OPENAI_API_KEY)
+
 def load_vector_db(resource_id, filters):
-    embeddings = OpenAIEmbeddings(model=embedding_model, openai_api_key=settings.OPENAI_API_KEY)
-
-    LOGGING.info("Looking into resource: {resource_id} embeddings")
-    collection_ids = LangchainPgCollection.objects.filter(
-        name__in=Subquery(
-            ResourceFile.objects.filter(resource=resource_id)
-            .annotate(string_id=Cast('id', output_field=models.CharField()))
-            .values('string_id')
-        )
-    ).values_list('uuid', flat=True)
+    """
+    Retriever and store of the "ALL" collection, searched with `filters`. The store runs on the engine shared
+    by the process (utils.pgvector.get_engine), so after the first call it runs no statement when built.
+    """
+    LOGGING.info(f"Looking into resource: {resource_id} embeddings")
     vector_db = PGVector(
         collection_name="ALL",
         connection_string=connectionString,
-        embedding_function=embeddings,
+        embedding_function=get_embeddings(),
+        engine_args=settings.PGVECTOR_ENGINE_ARGS,
     )
     retriever = vector_db.as_retriever(search_args={'k': 5}, search_type="similarity_score_threshold", search_kwargs={"filter": filters, "score_threshold": 0.8})
     return retriever, vector_db
 
-    embeddings = OpenAIEmbeddings(model=embedding_model, openai_api_key=settings.OPENAI_API_KEY)
-
-    def setup_retriever(collection_id):
-        vector_db = PGVector(
-            collection_name=str(collection_id),
-            connection_string=connectionString,
-            embedding_function=embeddings,
-        )
-        retriever = vector_db.as_retriever(search_type="similarity", search_args={'k': 5})
-        return retriever
-    retrievals = []
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_collection_id = {executor.submit(setup_retriever, collection_id): collection_id for collection_id in collection_ids}
-        for future in as_completed(future_to_collection_id):
-            collection_id = future_to_collection_id[future]
-            try:
-                retriever = future.result()
-                retrievals.append(retriever)
-            except Exception as exc:
-                LOGGING.error(f'{collection_id} generated an exception: {exc}')
-
-    merge_retriever = MergerRetriever(retrievers=retrievals)
-    filter = EmbeddingsRedundantFilter(embeddings=embeddings)
-    pipeline = DocumentCompressorPipeline(transformers=[filter])
-    compression_retriever = ContextualCompressionRetriever(
-        base_compressor=pipeline, base_retriever=merge_retriever)
-    a = compression_retriever.similarity_search_with_score("Tell me about wheat varities")
-    return compression_retriever
-
 def transcribe_audio(audio_bytes, language="en-US"):
     try:
         transcript = openai.Audio.translate(file=audio_bytes, model="whisper-1")
@@ -141,13 +57,52 @@ def transcribe_audio(audio_bytes, language="en-US"):
         print("Transcription error:", str(e))
         return str(e)
 
-class VectorBuilder:
-    # ... rest is unchanged ...
-    # [For brevity, include the unchanged class implementation from your file]
+class VectorDBBuilder:
+    """
+    Entry points of the datahub and microsite chat views: embeddings of a resource file and the answers to a
+    query over the embeddings of a resource, returned as (answer, chunks, condensed question, metadata).
+    """
+
+    def create_vector_db(resource_file, chunk_size=1000, chunk_overlap=200):
+        from ai.vector_db_builder.vector_build import create_vector_db
+
+        return create_vector_db(resource_file, chunk_size, chunk_overlap)
+
+    def get_input_embeddings(text, user_name=None, resource_id=None, chat_history=None):
+        from ai.retriever.manual_retrival import Retrival
 
-    # When you instantiate OpenAIEmbeddings anywhere else in this file, do it like:
-    # embeddings = OpenAIEmbeddings(model=embedding_model, openai_api_key=settings.OPENAI_API_KEY)
+        return Retrival.get_input_embeddings(text, user_name, resource_id, chat_history)
 
-# The rest of your file remains unchanged except:
-# - Update all `OpenAIEmbeddings()` calls to: `OpenAIEmbeddings(model=embedding_model, openai_api_key=settings.OPENAI_API_KEY)`
-# - All `langchain.document_loaders` imports replaced with `langchain_community.document_loaders`
\ No newline at end of file
+    def get_input_embeddings_test(text, user_name=None, resource_id=None, chat_history=None, filters=None):
+        # the similarity search of get_input_embeddings does not filter on metadata
+        return VectorDBBuilder.get_input_embeddings(text, user_name, resource_id, chat_history)
+
+    def get_input_embeddings_using_chain(text, user_name=None, resource_id=None, chat_history=None, filters=None):
+        prompt_template = PromptTemplate(
+            input_variables=["name_1", "context", "input"],
+            template=Constants.LATEST_PROMPT,
+        )
+        complete_history = []
+        if chat_history:
+            complete_history.append((chat_history.condensed_question, chat_history.query_response))
+        retriever, _ = load_vector_db(resource_id, filters or {})
+        qa, _ = ChainBuilder.create_qa_chain(
+            vector_db=retriever,
+            retriever_count=5,
+            model_name=Constants.GPT_3_5_TURBO,
+            temperature=Constants.TEMPERATURE,
+            max_tokens=Constants.MAX_TOKENS,
+            chain_type="stuff",
+            prompt_template=prompt_template,
+        )
+        result = asyncio.run(
+            qa.ainvoke(
+                {
+                    "question": text,
+                    "chat_history": complete_history,
+                    "input": text,
+                    "name_1": user_name,
+                }
+            )
+        )
+        return result["answer"], [], result["generated_question"], {}
@@ -2,8 +2,16 @@ from __future__ import annotations
 
 import contextlib
 import enum
+import io
+import itertools
+import json
 import logging
+import os
+import re
+import struct
+import threading
 import uuid
+import weakref
 from typing import (
     Any,
     Callable,
@@ -60,6 +68,7 @@ class BaseModel(Base):
 
 
 _classes: Any = None
+_classes_lock = threading.Lock()
 
 class Document:
     def __init__(self, page_content, metadata, embeddings_id='', score=0):
@@ -71,6 +80,14 @@ class Document:
         return f"Document(embeddings_id={self.embeddings_id}, metadata={self.metadata}, page_content={self.page_content[:100]}...)"
 
 def _get_embedding_collection_store(vector_dimension: Optional[int] = None) -> Any:
+    if _classes is not None:
+        return _classes
+    # the first stores of a process may be built by several threads at once
+    with _classes_lock:
+        return _define_embedding_collection_store(vector_dimension)
+
+
+def _define_embedding_collection_store(vector_dimension: Optional[int] = None) -> Any:
     global _classes
     if _classes is not None:
         return _classes
@@ -156,6 +173,292 @@ def _results_to_docs(docs_and_scores: Any) -> List[Document]:
     return [doc for doc, _ in docs_and_scores]
 
 
+class IndexMethod(str, enum.Enum):
+    """Approximate nearest neighbour index methods of pgvector."""
+
+    HNSW = "hnsw"
+    IVFFLAT = "ivfflat"
+
+
+_OPERATOR_CLASSES = {
+    DistanceStrategy.EUCLIDEAN: "vector_l2_ops",
+    DistanceStrategy.COSINE: "vector_cosine_ops",
+    DistanceStrategy.MAX_INNER_PRODUCT: "vector_ip_ops",
+}
+
+_EMBEDDING_TABLE = "langchain_pg_embedding"
+
+# rows per COPY batch of add_embeddings
+COPY_BATCH_SIZE = 5000
+
+
+def recommended_ivfflat_lists(rows: int) -> int:
+    """Lists of an IVFFlat index of `rows` rows: rows / 1000 up to 1M rows, sqrt(rows) above (pgvector)."""
+    if rows <= 1_000_000:
+        return max(rows // 1000, 1)
+    return int(rows**0.5)
+
+
+def recommended_ivfflat_probes(lists: int) -> int:
+    """Probes of an IVFFlat search with `lists` lists: sqrt(lists) (pgvector)."""
+    return max(int(lists**0.5), 1)
+
+
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_COPY_TRAILER = struct.pack(">h", -1)
+_NULL_FIELD = struct.pack(">i", -1)
+
+
+def _copy_field(value: Optional[bytes]) -> bytes:
+    """`value` as a field of COPY ... FROM STDIN (FORMAT binary)."""
+    if value is None:
+        return _NULL_FIELD
+    return struct.pack(">i", len(value)) + value
+
+
+def _vector_binary(embedding: Any) -> bytes:
+    """`embedding` in the binary format of pgvector: dimensions, unused, big-endian float4s."""
+    values = np.asarray(embedding, dtype=">f4")
+    return struct.pack(">hh", values.shape[0], 0) + values.tobytes()
+
+
+class VectorIndexManager:
+    """Creates and maintains the ANN indexes of ``langchain_pg_embedding``.
+
+    One index per (method, distance strategy, dimensions), optionally restricted to
+    a collection (a partial index, for collections searched on their own). The
+    ``embedding`` column has no dimensions unless the store was created with an
+    ``embedding_length``, so the indexed expression is
+    ``(embedding::vector(<dimensions>))`` and the queries of `PGVector` use the
+    same cast (see `PGVector.index_dimensions`) for the planner to pick the index.
+
+    Args:
+        bind: SQLAlchemy engine or connection of the vector store.
+    """
+
+    def __init__(self, bind: Any) -> None:
+        self._bind = bind
+
+    @staticmethod
+    def index_name(
+        method: IndexMethod,
+        distance_strategy: DistanceStrategy,
+        dimensions: int,
+        collection_id: Optional[Any] = None,
+    ) -> str:
+        name = f"ix_{_EMBEDDING_TABLE}_{IndexMethod(method).value}_{DistanceStrategy(distance_strategy).value}_{dimensions}"
+        if collection_id is not None:
+            name += "_" + str(collection_id).replace("-", "")[:12]
+        return name
+
+    @staticmethod
+    def index_definition(
+        method: IndexMethod,
+        distance_strategy: DistanceStrategy,
+        dimensions: int,
+        collection_id: Optional[Any] = None,
+        m: int = 16,
+        ef_construction: int = 64,
+        lists: int = 100,
+        concurrently: bool = True,
+    ) -> str:
+        """CREATE INDEX statement of an index."""
+        method = IndexMethod(method)
+        if method == IndexMethod.HNSW:
+            options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+        else:
+            options = f"lists = {int(lists)}"
+        statement = (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+            f"{VectorIndexManager.index_name(method, distance_strategy, dimensions, collection_id)} "
+            f"ON {_EMBEDDING_TABLE} USING {method.value} "
+            f"((embedding::vector({int(dimensions)})) {_OPERATOR_CLASSES[DistanceStrategy(distance_strategy)]}) "
+            f"WITH ({options})"
+        )
+        if collection_id is not None:
+            statement += f" WHERE collection_id = '{uuid.UUID(str(collection_id))}'"
+        return statement
+
+    def _execute(self, *statements: str, autocommit: bool = False) -> List[Any]:
+        """Run the statements on one connection, return the rows of the last one."""
+        rows: List[Any] = []
+        if isinstance(self._bind, sqlalchemy.engine.Connection):
+            for statement in statements:
+                result = self._bind.execute(sqlalchemy.text(statement))
+                rows = list(result) if result.returns_rows else []
+            return rows
+        with self._bind.connect() as connection:
+            if autocommit:
+                # CREATE INDEX CONCURRENTLY cannot run in a transaction
+                connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+            for statement in statements:
+                result = connection.execute(sqlalchemy.text(statement))
+                rows = list(result) if result.returns_rows else []
+            if not autocommit:
+                connection.commit()
+            return rows
+
+    def indexes(self) -> Dict[str, Dict[str, Any]]:
+        """The ANN indexes of the table: name -> method, definition, options and validity."""
+        rows = self._execute(
+            "SELECT i.relname, am.amname, pg_get_indexdef(i.oid), i.reloptions, x.indisvalid "
+            "FROM pg_index x "
+            "JOIN pg_class i ON i.oid = x.indexrelid "
+            "JOIN pg_am am ON am.oid = i.relam "
+            f"WHERE x.indrelid = '{_EMBEDDING_TABLE}'::regclass AND am.amname IN ('hnsw', 'ivfflat')"
+        )
+        return {
+            name: {
+                "method": method,
+                "definition": definition,
+                "options": dict(option.split("=", 1) for option in options or []),
+                "valid": valid,
+            }
+            for name, method, definition, options, valid in rows
+        }
+
+    def row_count(self, collection_id: Optional[Any] = None) -> int:
+        statement = f"SELECT count(*) FROM {_EMBEDDING_TABLE}"
+        if collection_id is not None:
+            statement += f" WHERE collection_id = '{uuid.UUID(str(collection_id))}'"
+        return self._execute(statement)[0][0]
+
+    def ensure_index(
+        self,
+        method: IndexMethod = IndexMethod.HNSW,
+        distance_strategy: DistanceStrategy = DEFAULT_DISTANCE_STRATEGY,
+        dimensions: int = 1536,
+        collection_id: Optional[Any] = None,
+        m: int = 16,
+        ef_construction: int = 64,
+        lists: Optional[int] = None,
+        concurrently: bool = True,
+        maintenance_work_mem: Optional[str] = None,
+    ) -> str:
+        """Create the index if it does not exist (or was left invalid by a failed build), return its name.
+
+        `lists` of an IVFFlat index defaults to `recommended_ivfflat_lists` of the
+        rows indexed now: build IVFFlat indexes once the table is loaded. HNSW builds
+        are much faster while the graph fits in `maintenance_work_mem` (e.g. "1GB",
+        the server setting by default).
+        """
+        name = self.index_name(method, distance_strategy, dimensions, collection_id)
+        existing = self.indexes().get(name)
+        if existing is not None:
+            if existing["valid"]:
+                return name
+            self.drop_index(name, concurrently=concurrently)
+        if IndexMethod(method) == IndexMethod.IVFFLAT and lists is None:
+            lists = recommended_ivfflat_lists(self.row_count(collection_id))
+        statements = []
+        if maintenance_work_mem:
+            if not re.fullmatch(r"\d+\s*[kMGT]?B", maintenance_work_mem):
+                raise ValueError(f"Invalid maintenance_work_mem: {maintenance_work_mem}")
+            statements.append(f"SET maintenance_work_mem = '{maintenance_work_mem}'")
+        statements.append(
+            self.index_definition(
+                method,
+                distance_strategy,
+                dimensions,
+                collection_id,
+                m=m,
+                ef_construction=ef_construction,
+                lists=lists or 100,
+                concurrently=concurrently,
+            )
+        )
+        if maintenance_work_mem:
+            # the connection goes back to the pool
+            statements.append("RESET maintenance_work_mem")
+        self._execute(*statements, autocommit=concurrently)
+        return name
+
+    def drop_index(self, name: str, concurrently: bool = True) -> None:
+        self._execute(
+            f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {name}",
+            autocommit=concurrently,
+        )
+
+    def maintain(self, concurrently: bool = True) -> List[str]:
+        """Rebuild the IVFFlat indexes whose lists are off by more than 2x for their rows now, return their names.
+
+        IVFFlat lists are chosen at build time, so an index built on a small table
+        searches ever larger lists as the table grows. HNSW indexes stay balanced
+        as rows are added and are left alone.
+        """
+        rebuilt = []
+        for name, index in self.indexes().items():
+            if index["method"] != IndexMethod.IVFFLAT.value:
+                continue
+            collection = re.search(r"collection_id = '([0-9a-f-]{36})'", index["definition"])
+            rows = self.row_count(collection.group(1) if collection else None)
+            lists = int(index["options"].get("lists", 100))
+            recommended = recommended_ivfflat_lists(rows)
+            if max(lists, recommended) <= 2 * min(lists, recommended):
+                continue
+            self.drop_index(name, concurrently=concurrently)
+            self._execute(
+                re.sub(r"lists='?\d+'?", f"lists='{recommended}'", index["definition"]).replace(
+                    "CREATE INDEX ", "CREATE INDEX CONCURRENTLY " if concurrently else "CREATE INDEX ", 1
+                ),
+                autocommit=concurrently,
+            )
+            rebuilt.append(name)
+        return rebuilt
+
+
+# pooled connections of the engines shared by the PGVector instances of the process
+ENGINE_DEFAULTS: Dict[str, Any] = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,
+}
+
+_engines: Dict[Tuple[str, str], sqlalchemy.engine.Engine] = {}
+# engines whose database has the vector extension and the tables
+_bootstrapped: "weakref.WeakSet[sqlalchemy.engine.Engine]" = weakref.WeakSet()
+# engine: {collection name: collection uuid}
+_collection_ids: "weakref.WeakKeyDictionary[sqlalchemy.engine.Engine, Dict[str, Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+_registry_lock = threading.RLock()
+
+
+def get_engine(connection_string: str, **engine_args: Any) -> sqlalchemy.engine.Engine:
+    """The engine of the process for `connection_string` and `engine_args`
+    (on top of `ENGINE_DEFAULTS`), created on first use."""
+    engine_args = {**ENGINE_DEFAULTS, **engine_args}
+    key = (connection_string, repr(sorted(engine_args.items())))
+    engine = _engines.get(key)
+    if engine is None:
+        with _registry_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = _engines[key] = sqlalchemy.create_engine(url=connection_string, **engine_args)
+    return engine
+
+
+def dispose_engines() -> None:
+    """Close the pooled connections of the engines and forget what was bootstrapped."""
+    with _registry_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _bootstrapped.clear()
+        _collection_ids.clear()
+
+
+def _forget_parent_connections() -> None:
+    # a forked worker (celery prefork, gunicorn) must not share the sockets of its parent
+    for engine in _engines.values():
+        engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_parent_connections)
+
+
 class PGVector(VectorStore):
     """`Postgres`/`PGVector` vector store.
 
@@ -176,7 +479,16 @@ class PGVector(VectorStore):
         distance_strategy: The distance strategy to use. (default: COSINE)
         pre_delete_collection: If True, will delete the collection if it exists.
             (default: False). Useful for testing.
-        engine_args: SQLAlchemy's create engine arguments.
+        engine_args: SQLAlchemy's create engine arguments, on top of
+            `ENGINE_DEFAULTS`. The stores of a process share one engine per
+            connection string and engine arguments (see `get_engine`).
+        index_dimensions: Dimensions of the ANN indexes to search (see
+            `VectorIndexManager`), the embeddings are then compared as
+            ``embedding::vector(<index_dimensions>)``. (default: embedding_length)
+        ef_search: ``hnsw.ef_search`` of the searches, candidates kept by an HNSW
+            index scan (pgvector default: 40).
+        probes: ``ivfflat.probes`` of the searches, lists scanned by an IVFFlat
+            index scan (pgvector default: 1).
 
     Example:
         .. code-block:: python
@@ -211,6 +523,9 @@ class PGVector(VectorStore):
         *,
         connection: Optional[sqlalchemy.engine.Connection] = None,
         engine_args: Optional[dict[str, Any]] = None,
+        index_dimensions: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
     ) -> None:
         self.connection_string = connection_string
         self.embedding_function = embedding_function
@@ -222,6 +537,9 @@ class PGVector(VectorStore):
         self.logger = logger or logging.getLogger(__name__)
         self.override_relevance_score_fn = relevance_score_fn
         self.engine_args = engine_args or {}
+        self.index_dimensions = index_dimensions or embedding_length
+        self.ef_search = ef_search
+        self.probes = probes
         self._bind = connection if connection else self._create_engine()
         self.__post_init__()
 
@@ -229,16 +547,29 @@ class PGVector(VectorStore):
         self,
     ) -> None:
         """Initialize the store."""
-        self.create_vector_extension()
-
         EmbeddingStore, CollectionStore = _get_embedding_collection_store(
             self._embedding_length
         )
         self.CollectionStore = CollectionStore
         self.EmbeddingStore = EmbeddingStore
-        self.create_tables_if_not_exists()
+        self.bootstrap()
         self.create_collection()
 
+    @property
+    def _engine(self) -> sqlalchemy.engine.Engine:
+        return self._bind.engine
+
+    def bootstrap(self) -> None:
+        """Create the vector extension and the tables, once per engine and process."""
+        if self._engine in _bootstrapped:
+            return
+        with _registry_lock:
+            if self._engine in _bootstrapped:
+                return
+            self.create_vector_extension()
+            self.create_tables_if_not_exists()
+            _bootstrapped.add(self._engine)
+
     def __del__(self) -> None:
         # Closing Session Manually
         print(f"Closing PG Vector Session")
@@ -251,7 +582,7 @@ class PGVector(VectorStore):
         return self.embedding_function
 
     def _create_engine(self) -> sqlalchemy.engine.Engine:
-        return sqlalchemy.create_engine(url=self.connection_string, **self.engine_args)
+        return get_engine(self.connection_string, **self.engine_args)
 
     def create_vector_extension(self) -> None:
         try:
@@ -283,13 +614,17 @@ class PGVector(VectorStore):
     def create_collection(self) -> None:
         if self.pre_delete_collection:
             self.delete_collection()
+        elif self.collection_name in _collection_ids.get(self._engine, {}):
+            return
         with Session(self._bind) as session:  # type: ignore[arg-type]
-            self.CollectionStore.get_or_create(
+            collection, _ = self.CollectionStore.get_or_create(
                 session, self.collection_name, cmetadata=self.collection_metadata
             )
+            self._remember_collection(collection.uuid)
 
     def delete_collection(self) -> None:
         self.logger.debug("Trying to delete collection")
+        self._remember_collection(None)
         with Session(self._bind) as session:  # type: ignore[arg-type]
             collection = self.get_collection(session)
             if not collection:
@@ -298,6 +633,26 @@ class PGVector(VectorStore):
             session.delete(collection)
             session.commit()
 
+    def _remember_collection(self, collection_id: Optional[Any]) -> None:
+        with _registry_lock:
+            collection_ids = _collection_ids.setdefault(self._engine, {})
+            if collection_id is None:
+                collection_ids.pop(self.collection_name, None)
+            else:
+                collection_ids[self.collection_name] = collection_id
+
+    def _collection_id(self, session: Session) -> Any:
+        """uuid of the collection, looked up once per process (searches only:
+        writes look the collection up again in case it was recreated)."""
+        collection_id = _collection_ids.get(self._engine, {}).get(self.collection_name)
+        if collection_id is None:
+            collection = self.get_collection(session)
+            if not collection:
+                raise ValueError("Collection not found")
+            collection_id = collection.uuid
+            self._remember_collection(collection_id)
+        return collection_id
+
     @contextlib.contextmanager
     def _make_session(self) -> Generator[Session, None, None]:
         """Create a context manager for the session, bind to _conn string."""
@@ -341,6 +696,36 @@ class PGVector(VectorStore):
     def get_collection(self, session: Session) -> Any:
         return self.CollectionStore.get_by_name(session, self.collection_name)
 
+    @property
+    def index_manager(self) -> VectorIndexManager:
+        return VectorIndexManager(self._bind)
+
+    def create_index(
+        self,
+        method: IndexMethod = IndexMethod.HNSW,
+        collection_only: bool = False,
+        **kwargs: Any,
+    ) -> str:
+        """Create the ANN index searched by this store (see `VectorIndexManager.ensure_index`).
+
+        Args:
+            method: HNSW (the default) or IVFFlat.
+            collection_only: Index the rows of the collection only (a partial index).
+            kwargs: m and ef_construction (HNSW) or lists (IVFFlat), concurrently.
+        """
+        if not self.index_dimensions:
+            raise ValueError("index_dimensions (or embedding_length) is required to index the embeddings")
+        collection_id = None
+        if collection_only:
+            with Session(self._bind) as session:  # type: ignore[arg-type]
+                collection = self.get_collection(session)
+                if not collection:
+                    raise ValueError("Collection not found")
+                collection_id = collection.uuid
+        return self.index_manager.ensure_index(
+            method, self._distance_strategy, self.index_dimensions, collection_id, **kwargs
+        )
+
     @classmethod
     def __from(
         cls,
@@ -403,22 +788,56 @@ class PGVector(VectorStore):
         with Session(self._bind) as session:  # type: ignore[arg-type]
             collection = self.get_collection(session)
             if not collection:
+                self._remember_collection(None)
                 raise ValueError("Collection not found")
-            documents = []
-            for text, metadata, embedding, id in zip(texts, metadatas, embeddings, ids):
-                embedding_store = self.EmbeddingStore(
-                    embedding=embedding,
-                    document=text,
-                    cmetadata=metadata,
-                    custom_id=id,
-                    collection_id=collection.uuid,
-                )
-                documents.append(embedding_store)
-            session.bulk_save_objects(documents)
+            self._remember_collection(collection.uuid)
+            # binary COPY in batches on the connection of the session, committed at once
+            collection_id = _copy_field(uuid.UUID(str(collection.uuid)).bytes)
+            cursor = session.connection().connection.cursor()
+            try:
+                rows = zip(texts, metadatas, embeddings, ids)
+                while True:
+                    batch = io.BytesIO()
+                    batch.write(_COPY_HEADER)
+                    for text, metadata, embedding, id in itertools.islice(rows, COPY_BATCH_SIZE):
+                        batch.write(
+                            b"".join(
+                                (
+                                    b"\x00\x06",
+                                    _copy_field(uuid.uuid4().bytes),
+                                    collection_id,
+                                    _copy_field(_vector_binary(embedding)),
+                                    _copy_field(text.encode() if text is not None else None),
+                                    _copy_field(json.dumps(metadata).encode() if metadata is not None else None),
+                                    _copy_field(str(id).encode() if id is not None else None),
+                                )
+                            )
+                        )
+                    if batch.tell() == len(_COPY_HEADER):
+                        break
+                    batch.write(_COPY_TRAILER)
+                    batch.seek(0)
+                    self._copy_embeddings(cursor, batch)
+            finally:
+                cursor.close()
             session.commit()
 
         return ids
 
+    @staticmethod
+    def _copy_embeddings(cursor: Any, rows: io.BytesIO) -> None:
+        statement = (
+            f"COPY {_EMBEDDING_TABLE} (uuid, collection_id, embedding, document, cmetadata, custom_id) "
+            "FROM STDIN (FORMAT binary)"
+        )
+        if hasattr(cursor, "copy_expert"):
+            # psycopg2
+            cursor.copy_expert(statement, rows)
+        else:
+            # psycopg 3
+            with cursor.copy(statement) as copy:
+                copy.write(rows.getvalue())
+
     def add_texts(
         self,
         texts: Iterable[str],
@@ -487,14 +906,23 @@ class PGVector(VectorStore):
         )
         return docs
 
+    @property
+    def _searched_embedding(self) -> Any:
+        """The embedding column as indexed (see `VectorIndexManager`)."""
+        if not self.index_dimensions:
+            return self.EmbeddingStore.embedding
+        from pgvector.sqlalchemy import Vector
+
+        return sqlalchemy.cast(self.EmbeddingStore.embedding, Vector(self.index_dimensions))
+
     @property
     def distance_strategy(self) -> Any:
         if self._distance_strategy == DistanceStrategy.EUCLIDEAN:
-            return self.EmbeddingStore.embedding.l2_distance
+            return self._searched_embedding.l2_distance
         elif self._distance_strategy == DistanceStrategy.COSINE:
-            return self.EmbeddingStore.embedding.cosine_distance
+            return self._searched_embedding.cosine_distance
         elif self._distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
-            return self.EmbeddingStore.embedding.max_inner_product
+            return self._searched_embedding.max_inner_product
         else:
             raise ValueError(
                 f"Got unexpected value for distance: {self._distance_strategy}. "
@@ -597,10 +1025,7 @@ class PGVector(VectorStore):
     ) -> List[Any]:
         """Query the collection."""
         with Session(self._bind) as session:  # type: ignore[arg-type]
-            collection = self.get_collection(session)
-            if not collection:
-                raise ValueError("Collection not found")
-            filter_by = self.EmbeddingStore.collection_id == collection.uuid
+            filter_by = self.EmbeddingStore.collection_id == self._collection_id(session)
 
             if filter is not None:
                 filter_clauses = []
@@ -619,8 +1044,13 @@ class PGVector(VectorStore):
 
                 filter_by = sqlalchemy.and_(filter_by, *filter_clauses)
 
-            _type = self.EmbeddingStore
+            # for this transaction only, the connection goes back to the pool afterwards
+            if self.ef_search:
+                session.execute(sqlalchemy.text(f"SET LOCAL hnsw.ef_search = {int(self.ef_search)}"))
+            if self.probes:
+                session.execute(sqlalchemy.text(f"SET LOCAL ivfflat.probes = {int(self.probes)}"))
 
+            # collection_id is filtered on directly, joining the collection only got in the way of the index scans
             results: List[Any] = (
                 session.query(
                     self.EmbeddingStore,
@@ -628,10 +1058,6 @@ class PGVector(VectorStore):
                 )
                 .filter(filter_by)
                 .order_by(sqlalchemy.asc("distance"))
-                .join(
-                    self.CollectionStore,
-                    self.EmbeddingStore.collection_id == self.CollectionStore.uuid,
-                )
                 .limit(k)
                 .all()
             )
@@ -0,0 +1,133 @@
+"""
+Batched count fields of the datahub list serializers.
+
+List views annotate their querysets with the ``annotate_*`` functions, one
+correlated COUNT subquery per count field, computed for the rows of the page
+only, and the serializers read the annotated attribute instead of running a
+COUNT per row. Instances that were not annotated (retrieve, create, ...) are
+still counted one by one by `annotated`.
+
+The content files count of a row is a list of counts per file type: the
+``*_content_files_counts`` functions compute it for a whole page in one grouped
+query, run by the list serializer of the serializers that show it.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+
+from datahub.models import DatasetV2, ResourceFile, UserOrganizationMap
+from participant.models import Connectors
+
+
+class SubqueryCount(Subquery):
+    """Number of rows of a correlated queryset."""
+
+    template = "(SELECT COUNT(*) FROM (%(subquery)s) AS counted)"
+    output_field = IntegerField()
+
+    def __init__(self, queryset, **extra):
+        super().__init__(queryset.order_by().values("pk"), **extra)
+
+
+def annotated(instance, name, queryset):
+    """The count `name` annotated on `instance` by a list view, else the count of `queryset`."""
+    if hasattr(instance, name):
+        return getattr(instance, name)
+    return queryset.count()
+
+
+def participant_datasets(user_map_id):
+    return DatasetV2.objects.filter(user_map_id=user_map_id, is_temp=False)
+
+
+def participant_connectors(user_map_id):
+    return Connectors.objects.filter(user_map_id=user_map_id)
+
+
+def onboarded_participants(user_id):
+    return UserOrganizationMap.objects.filter(user__status=True, user__on_boarded_by=user_id, user__role=3)
+
+
+def organization_datasets(organization_id):
+    return DatasetV2.objects.filter(user_map__organization=organization_id, is_temp=False)
+
+
+def organization_users(organization_id):
+    return UserOrganizationMap.objects.filter(user__status=True, organization_id=organization_id)
+
+
+def dataset_connectors(dataset_id):
+    return Connectors.objects.filter(status=True, dataset_id=dataset_id)
+
+
+def annotate_participant_counts(queryset):
+    """Counts of `ParticipantSerializer` and `ParticipantCostewardSerializer` on UserOrganizationMap rows."""
+    return queryset.annotate(
+        dataset_count=SubqueryCount(participant_datasets(OuterRef("pk"))),
+        connector_count=SubqueryCount(participant_connectors(OuterRef("pk"))),
+        number_of_participants=SubqueryCount(onboarded_participants(OuterRef("user_id"))),
+    )
+
+
+def annotate_organization_counts(queryset):
+    """Counts of `micrositeOrganizationSerializer` on UserOrganizationMap rows."""
+    return queryset.annotate(
+        dataset_count=SubqueryCount(organization_datasets(OuterRef("organization_id"))),
+        users_count=SubqueryCount(organization_users(OuterRef("organization_id"))),
+    )
+
+
+def annotate_dataset_counts(queryset):
+    """Counts of `RecentDatasetListSerializer` on Datasets rows."""
+    return queryset.annotate(connector_count=SubqueryCount(dataset_connectors(OuterRef("pk"))))
+
+
+def participant_content_files(user_map):
+    """Files of the resources of `user_map` and of the participants onboarded by its user."""
+    return ResourceFile.objects.filter(
+        Q(resource__user_map_id=user_map.id) | Q(resource__user_map__user__on_boarded_by=user_map.user_id)
+    )
+
+
+def files_per_type(files):
+    """[{"type", "count"}] of the ResourceFile queryset `files`, the content files count of a single row."""
+    return files.values("type").annotate(count=Count("type")).order_by("type")
+
+
+def _per_type(rows):
+    counts = defaultdict(int)
+    for row in rows:
+        counts[row["type"]] += row["count"]
+    return [{"type": file_type, "count": count} for file_type, count in counts.items()]
+
+
+def participant_content_files_counts(user_maps):
+    """{user map id: [{"type", "count"}]} of `participant_content_files` for every map, in one query."""
+    rows = list(
+        ResourceFile.objects.filter(
+            Q(resource__user_map_id__in=[user_map.id for user_map in user_maps])
+            | Q(resource__user_map__user__on_boarded_by__in=[user_map.user_id for user_map in user_maps])
+        )
+        .values("type", user_map=F("resource__user_map_id"), on_boarded_by=F("resource__user_map__user__on_boarded_by"))
+        .annotate(count=Count("type"))
+        .order_by("type")
+    )
+    return {
+        user_map.id: _per_type(
+            row for row in rows if row["user_map"] == user_map.id or row["on_boarded_by"] == user_map.user_id
+        )
+        for user_map in user_maps
+    }
+
+
+def resource_content_files_counts(resources):
+    """{resource id: [{"type", "count"}]} of the files of every resource, in one query."""
+    rows = defaultdict(list)
+    for row in (
+        ResourceFile.objects.filter(resource__in=[resource.id for resource in resources])
+        .values("resource_id", "type")
+        .annotate(count=Count("type"))
+        .order_by("type")
+    ):
+        rows[row["resource_id"]].append(row)
+    return {resource.id: _per_type(rows[resource.id]) for resource in resources}
@@ -0,0 +1,25 @@
+"""Synthetic dataset frames shared by the tests and the benchmarks."""
+import numpy as np
+import pandas as pd
+
+from utils import dashboard_aggregates
+
+
+def kiamis_frame(rows=600, seed=7):
+    """A KIAMIS-shaped frame of ``rows`` farmers with random answers."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {column: rng.integers(0, 3, rows).astype(float) for column in dashboard_aggregates.KIAMIS_NUMERIC_COLUMNS}
+    )
+    df["Highest Level of Formal Education"] = rng.integers(1, 8, rows)
+    df["Gender"] = rng.choice([1, 2], rows)
+    df["County"] = rng.choice(["NAKURU", "KIAMBU", "MERU"], rows)
+    df["Sub County"] = rng.choice(["S1", "S2", "S3", "S4"], rows)
+    df["Constituency"] = rng.choice(["C1", "C2", "C3"], rows)
+    df["Ward"] = "W1"
+    df["Crop Production"] = rng.integers(0, 2, rows)
+    df["Livestock Production"] = rng.integers(0, 2, rows)
+    df["farmer_mobile_number"] = rng.integers(0, 400, rows)
+    for column in dashboard_aggregates.KIAMIS_VALUE_CHAINS:
+        df[column] = np.where(rng.random(rows) < 0.3, 1.0, np.nan)
+    return df
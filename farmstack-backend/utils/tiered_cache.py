@@ -0,0 +1,348 @@
+"""
+Two-tier Django cache backend: an in-process LRU in front of a shared Redis.
+
+Every entry lives in Redis, shared by the gunicorn workers, the Celery workers
+and across restarts. Entries whose key starts with one of ``LOCAL_KEY_PREFIXES``
+are also kept in a bounded LRU of the process for at most ``LOCAL_TIMEOUT``
+seconds (never longer than their Redis TTL), so repeated reads of them cost no
+network round trip. Only put immutable, content-addressed keys there (dashboard
+responses, OCR text): a value changed or deleted by another process is still
+served from the LRU until it expires there. Mutable state such as OTPs, counters
+and generations is always read from Redis.
+
+Values of at least ``COMPRESS_MIN_BYTES`` once pickled are stored zstd
+compressed. ``get_or_set`` with a callable computes a missing value once per key:
+threads of the process wait on a lock and other processes on a Redis lock, then
+read what the first caller stored. ``metrics()`` returns the hit/miss counters of
+the process.
+
+    CACHES = {
+        "default": {
+            "BACKEND": "utils.tiered_cache.TieredRedisCache",
+            "LOCATION": "redis://localhost:6379/1",
+            "OPTIONS": {"LOCAL_KEY_PREFIXES": ["dashboard:response:"]},
+        }
+    }
+"""
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+import zstandard
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.redis import RedisCache, RedisCacheClient, RedisSerializer
+
+LOGGER = logging.getLogger(__name__)
+
+LOCAL_MAX_ENTRIES = 10000
+LOCAL_MAX_BYTES = 64 * 2**20
+LOCAL_TIMEOUT = 300
+COMPRESS_MIN_BYTES = 4096
+COMPRESSION_LEVEL = 3
+LOCK_TIMEOUT = 60
+# first bytes of a zstd frame, a pickle starts with 0x80
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_MISSING = object()
+
+
+class CompressingSerializer(RedisSerializer):
+    """Pickles like ``RedisSerializer`` and zstd compresses the pickles of at least `min_bytes`."""
+
+    def __init__(self, min_bytes=COMPRESS_MIN_BYTES, level=COMPRESSION_LEVEL, protocol=None):
+        super().__init__(protocol)
+        self.min_bytes = min_bytes
+        self.level = level
+
+    def dumps(self, obj):
+        data = super().dumps(obj)
+        if isinstance(data, bytes) and len(data) >= self.min_bytes:
+            return zstandard.compress(data, self.level)
+        return data
+
+    def loads(self, data):
+        if isinstance(data, bytes) and data.startswith(ZSTD_MAGIC):
+            data = zstandard.decompress(data)
+        return super().loads(data)
+
+
+class LocalTier:
+    """Thread-safe LRU of serialized values with a deadline per key, bounded in entries and bytes."""
+
+    def __init__(self, max_entries=LOCAL_MAX_ENTRIES, max_bytes=LOCAL_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _size(value):
+        return len(value) if isinstance(value, bytes) else 8
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, timeout):
+        size = self._size(value)
+        with self._lock:
+            self._pop(key)
+            if timeout <= 0 or size > self.max_bytes:
+                return
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= self._size(entry[1])
+
+
+class ProcessState:
+    """Local tier, counters and in-flight computations shared by the threads of a process for one cache."""
+
+    def __init__(self, max_entries=LOCAL_MAX_ENTRIES, max_bytes=LOCAL_MAX_BYTES):
+        self.local = LocalTier(max_entries, max_bytes)
+        self.metrics = Counter()
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def count(self, name, amount=1):
+        if amount:
+            with self.lock:
+                self.metrics[name] += amount
+
+    @contextmanager
+    def flight(self, key):
+        """Hold the in-process lock of `key`, shared by every thread computing it."""
+        with self.lock:
+            lock, holders = self.flights.get(key, (threading.Lock(), 0))
+            self.flights[key] = (lock, holders + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self.lock:
+                lock, holders = self.flights[key]
+                if holders == 1:
+                    del self.flights[key]
+                else:
+                    self.flights[key] = (lock, holders - 1)
+
+
+# Django creates a cache backend per thread, the state of a process is kept per LOCATION
+_STATES = {}
+_STATES_LOCK = threading.Lock()
+
+
+def process_state(location, max_entries=LOCAL_MAX_ENTRIES, max_bytes=LOCAL_MAX_BYTES):
+    with _STATES_LOCK:
+        if location not in _STATES:
+            _STATES[location] = ProcessState(max_entries, max_bytes)
+        return _STATES[location]
+
+
+class TieredRedisCacheClient(RedisCacheClient):
+    """``RedisCacheClient`` keeping the values of the local keys in the local tier of the process as well."""
+
+    def __init__(self, servers, state, local_key_prefixes=(), local_timeout=LOCAL_TIMEOUT, **options):
+        super().__init__(servers, **options)
+        self.state = state
+        self.local = state.local
+        self.local_key_prefixes = tuple(local_key_prefixes)
+        self.local_timeout = local_timeout
+
+    def is_local(self, key):
+        # keys are "<KEY_PREFIX>:<version>:<key>", see django.core.cache.backends.base.default_key_func
+        return bool(self.local_key_prefixes) and key.split(":", 2)[-1].startswith(self.local_key_prefixes)
+
+    def _keep(self, key, value, timeout):
+        """Keep a serialized value locally for the local timeout, `timeout` (seconds, None forever) at most."""
+        if self.is_local(key):
+            self.local.set(key, value, self.local_timeout if timeout is None else min(timeout, self.local_timeout))
+
+    def _forget(self, keys):
+        for key in keys:
+            if self.is_local(key):
+                self.local.delete(key)
+
+    def _read(self, keys):
+        """{key: (serialized value, remaining TTL in seconds or None)} of the keys found in Redis."""
+        local = [key for key in keys if self.is_local(key)]
+        if not local:
+            return {key: (value, None) for key, value in zip(keys, self.get_client(None).mget(keys)) if value is not None}
+        pipeline = self.get_client(None).pipeline(transaction=False)
+        pipeline.mget(keys)
+        for key in local:
+            pipeline.pttl(key)
+        values, *ttls = pipeline.execute()
+        ttls = {key: None if ttl < 0 else ttl / 1000 for key, ttl in zip(local, ttls)}
+        return {key: (value, ttls.get(key)) for key, value in zip(keys, values) if value is not None}
+
+    def get(self, key, default):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        found, remote = {}, []
+        for key in keys:
+            value = self.local.get(key) if self.is_local(key) else None
+            if value is None:
+                remote.append(key)
+            else:
+                found[key] = value
+        self.state.count("local_hits", len(found))
+        if remote:
+            read = self._read(remote)
+            for key, (value, ttl) in read.items():
+                self._keep(key, value, ttl)
+                found[key] = value
+            self.state.count("remote_hits", len(read))
+            self.state.count("misses", len(remote) - len(read))
+        return {key: self._serializer.loads(value) for key, value in found.items()}
+
+    def add(self, key, value, timeout):
+        value = self._serializer.dumps(value)
+        client = self.get_client(key, write=True)
+        if timeout == 0:
+            if added := bool(client.set(key, value, nx=True)):
+                client.delete(key)
+            return added
+        added = bool(client.set(key, value, ex=timeout, nx=True))
+        if added:
+            self._keep(key, value, timeout)
+        else:
+            self._forget([key])
+        return added
+
+    def set(self, key, value, timeout):
+        self.state.count("sets")
+        self._forget([key])
+        if timeout == 0:
+            self.get_client(key, write=True).delete(key)
+            return
+        value = self._serializer.dumps(value)
+        self.get_client(key, write=True).set(key, value, ex=timeout)
+        self._keep(key, value, timeout)
+
+    def set_many(self, data, timeout):
+        self.state.count("sets", len(data))
+        data = {key: self._serializer.dumps(value) for key, value in data.items()}
+        pipeline = self.get_client(None, write=True).pipeline()
+        pipeline.mset(data)
+        if timeout is not None:
+            for key in data:
+                pipeline.expire(key, timeout)
+        pipeline.execute()
+        for key, value in data.items():
+            self._forget([key])
+            self._keep(key, value, timeout)
+
+    def touch(self, key, timeout):
+        self._forget([key])
+        return super().touch(key, timeout)
+
+    def delete(self, key):
+        self._forget([key])
+        return super().delete(key)
+
+    def delete_many(self, keys):
+        self._forget(keys)
+        super().delete_many(keys)
+
+    def incr(self, key, delta):
+        self._forget([key])
+        return super().incr(key, delta)
+
+    def clear(self):
+        self.local.clear()
+        return super().clear()
+
+
+class TieredRedisCache(RedisCache):
+    """
+    ``RedisCache`` with a local tier for the keys of ``LOCAL_KEY_PREFIXES``,
+    compression of large values and a single-flight ``get_or_set``.
+
+    **OPTIONS** (besides those of ``RedisCache``)
+    ``LOCAL_KEY_PREFIXES`` (list): prefixes of the keys kept in the process, none by default
+    ``LOCAL_TIMEOUT`` (int): seconds a key is kept in the process at most
+    ``LOCAL_MAX_ENTRIES`` / ``LOCAL_MAX_BYTES`` (int): bounds of the LRU of the process
+    ``COMPRESS_MIN_BYTES`` (int): pickles from this size on are zstd compressed
+    ``LOCK_TIMEOUT`` (int): seconds ``get_or_set`` waits for, and holds, the lock of a key
+    """
+
+    def __init__(self, server, params):
+        options = dict(params.get("OPTIONS", {}))
+        self._state = process_state(
+            str(server), options.pop("LOCAL_MAX_ENTRIES", LOCAL_MAX_ENTRIES), options.pop("LOCAL_MAX_BYTES", LOCAL_MAX_BYTES)
+        )
+        self._lock_timeout = options.pop("LOCK_TIMEOUT", LOCK_TIMEOUT)
+        options.setdefault("serializer", CompressingSerializer(options.pop("COMPRESS_MIN_BYTES", COMPRESS_MIN_BYTES)))
+        options.update(
+            state=self._state,
+            local_key_prefixes=options.pop("LOCAL_KEY_PREFIXES", ()),
+            local_timeout=options.pop("LOCAL_TIMEOUT", LOCAL_TIMEOUT),
+        )
+        super().__init__(server, {**params, "OPTIONS": options})
+        self._class = TieredRedisCacheClient
+
+    def metrics(self):
+        """Hit, miss, set and single-flight counters of this process, with the size of its local tier."""
+        with self._state.lock:
+            metrics = dict(self._state.metrics)
+        metrics["local_entries"] = len(self._state.local)
+        return metrics
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        value = self.get(key, _MISSING, version=version)
+        if value is not _MISSING or not callable(default):
+            return super().get_or_set(key, default, timeout, version) if value is _MISSING else value
+        full_key = self.make_and_validate_key(key, version=version)
+        with self._state.flight(full_key):
+            value = self.get(key, _MISSING, version=version)
+            if value is not _MISSING:
+                self._state.count("single_flight_waits")
+                return value
+            remote_lock = self._cache.get_client(full_key, write=True).lock(
+                f"{full_key}:lock", timeout=self._lock_timeout, blocking_timeout=self._lock_timeout
+            )
+            locked = remote_lock.acquire()
+            try:
+                value = self.get(key, _MISSING, version=version)
+                if value is not _MISSING:
+                    self._state.count("single_flight_waits")
+                    return value
+                self._state.count("single_flight_computations")
+                value = default()
+                if value is not None:
+                    self.set(key, value, timeout, version=version)
+                return value
+            finally:
+                if locked:
+                    try:
+                        remote_lock.release()
+                    except Exception as error:
+                        LOGGER.warning(f"Lock of cache key {key} expired before it was released: {error}")
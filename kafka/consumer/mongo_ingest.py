@@ -2,24 +2,42 @@
 """
 Kafka consumer -> MongoDB ingest
 
-- Consume messages from Kafka topic
+- Poll messages from the Kafka topic in batches
 - Basic validation
-- Compute embedding with sentence-transformers
-- Upsert into existing MongoDB collection (use same DB as FarmStack/servviapvt)
+- Skip articles whose content_hash (and embedding model) is unchanged in Mongo
+- Split long articles into overlapping chunks and embed every chunk of a batch
+  in one batched sentence-transformers pass
+- Upsert the batch with a single bulk_write into the existing MongoDB collection
+  (use same DB as FarmStack/servviapvt) and commit the Kafka offsets only after
+  the write succeeded; a failed batch is rewound and retried with backoff
+- A batch still failing after INGEST_MAX_RETRIES attempts (other than a lost
+  Mongo connection) is written message by message, the messages that fail
+  alone go to the KAFKA_DEAD_LETTER_TOPIC topic (or only to the log) and the
+  offsets are committed past them
+- Print throughput (docs/s) and consumer lag every INGEST_METRICS_INTERVAL
+  seconds, and serve them to Prometheus on INGEST_METRICS_PORT when set
 
 Notes:
-- For production, consider content hashing dedupe, chunking, bulk writes, and using Atlas Vector Search or FAISS for ANN.
+- For production vector search, consider Atlas Vector Search or FAISS for ANN.
 """
 
 import os
 import json
+import time
 import hashlib
 from datetime import datetime
+
+import numpy as np
 from dotenv import load_dotenv
-from kafka import KafkaConsumer
-from sentence_transformers import SentenceTransformer
-from pymongo import MongoClient
-from pymongo.errors import PyMongoError
+from kafka import KafkaConsumer, KafkaProducer
+from kafka.errors import KafkaError
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import ConnectionFailure
+
+try:
+    from prometheus_client import Counter, Gauge, start_http_server
+except ImportError:  # metrics are still printed
+    start_http_server = None
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 load_dotenv(os.path.join(BASE_DIR, '..', '.env'), override=False)
@@ -28,6 +46,8 @@ load_dotenv(os.path.join(BASE_DIR, '..', '.env'), override=False)
 KAFKA_BOOTSTRAP = os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092')
 KAFKA_TOPIC = os.getenv('KAFKA_TOPIC', 'medical-articles')
 KAFKA_GROUP = os.getenv('KAFKA_GROUP_ID', 'medical-ingest-group')
+# messages that cannot be written, empty to only log them
+KAFKA_DEAD_LETTER_TOPIC = os.getenv('KAFKA_DEAD_LETTER_TOPIC', f'{KAFKA_TOPIC}.dead-letter')
 
 # Mongo
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017')
@@ -38,23 +58,34 @@ MONGO_COLLECTION = os.getenv('MONGO_COLLECTION', 'medical_articles')
 EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
 MIN_TEXT_LEN = int(os.getenv('SCRAPER_MIN_TEXT_LENGTH', '300'))
 
-print(f"[ingest] loading model {EMBEDDING_MODEL}")
-model = SentenceTransformer(EMBEDDING_MODEL)
-vec_dim = model.get_sentence_embedding_dimension()
-print(f"[ingest] model loaded (dim={vec_dim})")
+# Batching
+BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '64'))
+POLL_TIMEOUT_MS = int(os.getenv('INGEST_POLL_TIMEOUT_MS', '1000'))
+ENCODE_BATCH_SIZE = int(os.getenv('INGEST_ENCODE_BATCH_SIZE', '32'))
+# characters per chunk, roughly the 256 token window of MiniLM
+CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', '1000'))
+CHUNK_OVERLAP = int(os.getenv('INGEST_CHUNK_OVERLAP', '100'))
+RETRY_BACKOFF_MAX = float(os.getenv('INGEST_RETRY_BACKOFF_MAX', '30'))
+MAX_RETRIES = int(os.getenv('INGEST_MAX_RETRIES', '5'))
+
+# Metrics
+METRICS_INTERVAL = float(os.getenv('INGEST_METRICS_INTERVAL', '30'))
+METRICS_PORT = int(os.getenv('INGEST_METRICS_PORT', '0'))
 
-# Mongo client
-mongo = MongoClient(MONGO_URI)
-db = mongo[MONGO_DB]
-collection = db[MONGO_COLLECTION]
 
 def validate_message(msg):
+    if not isinstance(msg, dict):
+        return False, "not a JSON object"
     required = ['url', 'title', 'text', 'source', 'scraped_at']
     for k in required:
         if k not in msg:
             return False, f"missing {k}"
-    if not isinstance(msg['text'], str) or len(msg['text']) < MIN_TEXT_LEN:
-        return False, f"text too short ({len(msg.get('text') or '')})"
+    if not isinstance(msg['url'], str) or not msg['url']:
+        return False, "url is not a non-empty string"
+    if not isinstance(msg['text'], str):
+        return False, "text is not a string"
+    if len(msg['text']) < MIN_TEXT_LEN:
+        return False, f"text too short ({len(msg['text'])})"
     return True, None
 
 def content_hash(text):
@@ -62,55 +93,350 @@ def content_hash(text):
     h.update(text.encode('utf-8'))
     return h.hexdigest()
 
-def upsert_to_mongo(msg, embedding):
-    now = datetime.utcnow().isoformat() + "Z"
-    doc = {
-        "url": msg['url'],
-        "title": msg.get('title'),
-        "text": msg.get('text'),
-        "source": msg.get('source'),
-        "scraped_at": msg.get('scraped_at'),
-        "ingested_at": now,
-        "embedding": embedding,
-        "content_hash": content_hash(msg.get('text', ''))
-    }
+def chunk_spans(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """(start, end) offsets of overlapping chunks of at most ``size`` characters, cut on whitespace."""
+    if len(text) <= size:
+        return [(0, len(text))]
+    spans = []
+    start = 0
+    while True:
+        end = min(start + size, len(text))
+        if end < len(text):
+            cut = text.rfind(' ', start + overlap + 1, end)
+            if cut > start:
+                end = cut
+        spans.append((start, end))
+        if end >= len(text):
+            return spans
+        start = max(end - overlap, start + 1)
+
+def decode_record(record):
+    """JSON message of a Kafka record, or None when it cannot be decoded."""
     try:
-        res = collection.update_one(
-            {"url": msg['url']},
-            {"$set": doc, "$setOnInsert": {"_created_at": now}},
-            upsert=True
-        )
+        value = record.value
+        if isinstance(value, (bytes, bytearray)):
+            value = value.decode('utf-8')
+        return json.loads(value) if isinstance(value, str) else value
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+def load_encoder(model_name=EMBEDDING_MODEL):
+    from sentence_transformers import SentenceTransformer
+
+    print(f"[ingest] loading model {model_name}")
+    model = SentenceTransformer(model_name)
+    print(f"[ingest] model loaded (dim={model.get_sentence_embedding_dimension()})")
+    return model
+
+
+class IngestMetrics:
+    """
+    Counters of the ingest loop. Throughput is the number of documents handled
+    (written or unchanged) per second since the previous report; lag is the
+    number of messages between the consumer position and the partition end.
+    """
+
+    COUNTERS = ("received", "invalid", "unchanged", "written", "failed_batches", "dead_lettered")
+
+    def __init__(self, interval=METRICS_INTERVAL, port=METRICS_PORT, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self.totals = dict.fromkeys(self.COUNTERS, 0)
+        self.lag = {}
+        self.docs_per_second = 0.0
+        self._window_start = clock()
+        self._window_docs = 0
+        self._prometheus = None
+        if port and start_http_server is not None:
+            start_http_server(port)
+            self._prometheus = {
+                name: Counter(f"ingest_{name}_total", f"Kafka ingest {name.replace('_', ' ')}")
+                for name in self.COUNTERS
+            }
+            self._prometheus["docs_per_second"] = Gauge("ingest_docs_per_second", "Documents ingested per second")
+            self._prometheus["lag"] = Gauge("ingest_consumer_lag", "Messages behind the partition end", ["partition"])
+            print(f"[metrics] serving Prometheus metrics on :{port}")
+        elif port:
+            print("[metrics] prometheus_client is not installed, metrics are only printed")
+
+    def add(self, **counts):
+        for name, count in counts.items():
+            self.totals[name] += count
+            if self._prometheus and count:
+                self._prometheus[name].inc(count)
+        self._window_docs += counts.get("written", 0) + counts.get("unchanged", 0)
+
+    def record_lag(self, lag):
+        self.lag = lag
+        if self._prometheus:
+            for partition, behind in lag.items():
+                self._prometheus["lag"].labels(partition=partition).set(behind)
+
+    def maybe_report(self, force=False):
+        elapsed = self.clock() - self._window_start
+        if not force and elapsed < self.interval:
+            return False
+        self.docs_per_second = self._window_docs / elapsed if elapsed > 0 else 0.0
+        if self._prometheus:
+            self._prometheus["docs_per_second"].set(self.docs_per_second)
+        totals = ", ".join(f"{name}={count}" for name, count in self.totals.items())
+        print(f"[metrics] {self.docs_per_second:.1f} docs/s, lag={sum(self.lag.values())} {self.lag}, {totals}")
+        self._window_start = self.clock()
+        self._window_docs = 0
         return True
-    except PyMongoError as e:
-        print(f"[mongo] upsert error: {e}")
+
+
+class DeadLetterTopic:
+    """
+    Sends a record that cannot be written, unchanged, to ``topic`` with the
+    reason and its origin in headers, and waits for the broker to ack it.
+    """
+
+    def __init__(self, producer, topic, timeout=30):
+        self.producer = producer
+        self.topic = topic
+        self.timeout = timeout
+
+    def __call__(self, record, reason):
+        value = record.value
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        headers = [
+            ("reason", reason.encode('utf-8')),
+            ("source", f"{record.topic}-{record.partition}@{record.offset}".encode('utf-8')),
+        ]
+        self.producer.send(self.topic, value=value, headers=headers).get(timeout=self.timeout)
+
+
+class IngestEngine:
+    """
+    Batched Kafka -> Mongo ingest with at-least-once delivery: offsets are only
+    committed once the batch is written, so a redelivered batch is upserted
+    again, and mostly skipped as unchanged.
+
+    ``consumer`` is a KafkaConsumer with auto commit disabled, ``collection`` a
+    pymongo collection and ``encoder`` a SentenceTransformer, or stand-ins with
+    the same methods. ``dead_letter`` is called with a record and the reason
+    it failed once it is given up on, e.g. a ``DeadLetterTopic``.
+
+    A lost Mongo connection is retried until it comes back. Any other failure
+    of the same batch is retried ``max_retries`` times, then its messages are
+    written one at a time so only those failing alone (a document Mongo
+    rejects, a text the encoder cannot handle) are dead-lettered.
+    """
+
+    def __init__(self, consumer, collection, encoder, metrics=None, model_name=EMBEDDING_MODEL,
+                 batch_size=BATCH_SIZE, poll_timeout_ms=POLL_TIMEOUT_MS, encode_batch_size=ENCODE_BATCH_SIZE,
+                 chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, retry_backoff_max=RETRY_BACKOFF_MAX,
+                 max_retries=MAX_RETRIES, dead_letter=None, sleep=time.sleep):
+        self.consumer = consumer
+        self.collection = collection
+        self.encoder = encoder
+        self.metrics = metrics or IngestMetrics(port=0)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.poll_timeout_ms = poll_timeout_ms
+        self.encode_batch_size = encode_batch_size
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.retry_backoff_max = retry_backoff_max
+        self.max_retries = max_retries
+        self.dead_letter = dead_letter
+        self.sleep = sleep
+        self._failures = 0
+        # first offsets of the batch that keeps failing, and its failed attempts
+        self._failing_batch = None
+        self._batch_failures = 0
+
+    def _valid_messages(self, records):
+        """Valid messages of the batch by url, the latest one wins."""
+        messages = {}
+        invalid = 0
+        for record in records:
+            msg = decode_record(record)
+            valid, reason = validate_message(msg)
+            if not valid:
+                print(f"[validate] skip: {reason}")
+                invalid += 1
+                continue
+            messages[msg['url']] = msg
+        self.metrics.add(received=len(records), invalid=invalid)
+        return list(messages.values())
+
+    def _changed(self, messages):
+        """Messages whose text hash or embedding model differs from the stored document."""
+        hashes = {msg['url']: content_hash(msg['text']) for msg in messages}
+        stored = {
+            doc['url']: doc
+            for doc in self.collection.find(
+                {"url": {"$in": list(hashes)}}, {"url": 1, "content_hash": 1, "embedding_model": 1, "_id": 0}
+            )
+        }
+        changed = []
+        for msg in messages:
+            doc = stored.get(msg['url'])
+            # documents ingested before embedding_model was stored used the default model
+            if (doc and doc.get('content_hash') == hashes[msg['url']]
+                    and doc.get('embedding_model', EMBEDDING_MODEL) == self.model_name):
+                continue
+            changed.append((msg, hashes[msg['url']]))
+        self.metrics.add(unchanged=len(messages) - len(changed))
+        return changed
+
+    def _operations(self, changed):
+        """One upsert per changed message, every chunk embedded in a single encode call."""
+        spans = [chunk_spans(msg['text'], self.chunk_size, self.chunk_overlap) for msg, _ in changed]
+        texts = [msg['text'][start:end] for (msg, _), doc_spans in zip(changed, spans) for start, end in doc_spans]
+        vectors = np.asarray(self.encoder.encode(texts, batch_size=self.encode_batch_size, show_progress_bar=False))
+        now = datetime.utcnow().isoformat() + "Z"
+        operations = []
+        position = 0
+        for (msg, text_hash), doc_spans in zip(changed, spans):
+            doc_vectors = vectors[position:position + len(doc_spans)]
+            position += len(doc_spans)
+            doc = {
+                "url": msg['url'],
+                "title": msg.get('title'),
+                "text": msg.get('text'),
+                "source": msg.get('source'),
+                "scraped_at": msg.get('scraped_at'),
+                "ingested_at": now,
+                # mean of the chunk embeddings, the embedding itself for short articles
+                "embedding": doc_vectors.mean(axis=0).tolist(),
+                "embedding_model": self.model_name,
+                "content_hash": text_hash,
+            }
+            update = {"$set": doc, "$setOnInsert": {"_created_at": now}}
+            if len(doc_spans) > 1:
+                doc["chunks"] = [
+                    {"start": start, "end": end, "embedding": vector.tolist()}
+                    for (start, end), vector in zip(doc_spans, doc_vectors)
+                ]
+            else:
+                update["$unset"] = {"chunks": ""}
+            operations.append(UpdateOne({"url": msg['url']}, update, upsert=True))
+        return operations
+
+    def _rewind(self, batches):
+        for partition, records in batches.items():
+            self.consumer.seek(partition, records[0].offset)
+
+    def _record_lag(self):
+        lag = {}
+        for partition in self.consumer.assignment():
+            highwater = self.consumer.highwater(partition)
+            if highwater is not None:
+                lag[f"{partition.topic}-{partition.partition}"] = max(highwater - self.consumer.position(partition), 0)
+        self.metrics.record_lag(lag)
+
+    def _write(self, records):
+        changed = self._changed(self._valid_messages(records))
+        if changed:
+            result = self.collection.bulk_write(self._operations(changed), ordered=False)
+            self.metrics.add(written=len(changed))
+            print(f"[ingest] upserted {result.upserted_count + result.modified_count} of {len(changed)} changed articles")
+
+    def _write_one_by_one(self, records):
+        """Write each record on its own, dead-lettering those that fail."""
+        for record in records:
+            try:
+                self._write([record])
+            except ConnectionFailure:
+                raise
+            except Exception as e:
+                reason = f"{type(e).__name__}: {e}"
+                print(f"[dead-letter] offset {record.offset}: {reason}")
+                if self.dead_letter is not None:
+                    self.dead_letter(record, reason)
+                self.metrics.add(dead_lettered=1)
+
+    def _retry(self, batches, records, error):
+        # nothing is committed, the batch is polled again after a backoff
+        self._failures += 1
+        self.metrics.add(failed_batches=1)
+        backoff = min(2 ** (self._failures - 1), self.retry_backoff_max)
+        print(f"[ingest] batch of {len(records)} failed ({error}), retrying in {backoff:.0f}s")
+        self._rewind(batches)
+        self.sleep(backoff)
         return False
 
+    def _gives_up(self, batches):
+        """Count a failed attempt of the batch, True once it failed ``max_retries`` times."""
+        batch = {partition: records[0].offset for partition, records in batches.items()}
+        if batch != self._failing_batch:
+            self._failing_batch, self._batch_failures = batch, 0
+        self._batch_failures += 1
+        return self._batch_failures > self.max_retries
+
+    def process(self, batches):
+        """
+        Write one polled batch (``{TopicPartition: [records]}``) and commit its
+        offsets. Returns False when the batch was rewound to be polled again.
+        """
+        records = [record for partition_records in batches.values() for record in partition_records]
+        if not records:
+            return True
+        try:
+            self._write(records)
+        except ConnectionFailure as e:
+            return self._retry(batches, records, e)
+        except Exception as e:
+            if not self._gives_up(batches):
+                return self._retry(batches, records, e)
+            print(f"[ingest] batch of {len(records)} failed {self._batch_failures} times ({e}), writing it message by message")
+            try:
+                self._write_one_by_one(records)
+            except (ConnectionFailure, KafkaError) as e:
+                return self._retry(batches, records, e)
+        self._failures = 0
+        self._failing_batch, self._batch_failures = None, 0
+        try:
+            self.consumer.commit()
+        except KafkaError as e:
+            # e.g. a rebalance: the new owner re-reads the batch and finds it unchanged
+            print(f"[kafka] offset commit failed: {e}")
+        return True
+
+    def run_once(self):
+        batches = self.consumer.poll(timeout_ms=self.poll_timeout_ms, max_records=self.batch_size)
+        processed = self.process(batches)
+        if batches:
+            self._record_lag()
+        self.metrics.maybe_report()
+        return processed
+
+    def run(self):
+        while True:
+            self.run_once()
+
+
 def consume_and_ingest():
     consumer = KafkaConsumer(
         KAFKA_TOPIC,
         bootstrap_servers=KAFKA_BOOTSTRAP.split(','),
         group_id=KAFKA_GROUP,
-        value_deserializer=lambda v: json.loads(v.decode('utf-8')),
         auto_offset_reset='earliest',
-        enable_auto_commit=True
+        enable_auto_commit=False,
+        max_poll_records=BATCH_SIZE,
     )
+    collection = MongoClient(MONGO_URI)[MONGO_DB][MONGO_COLLECTION]
+    collection.create_index("url")
+    producer = None
+    dead_letter = None
+    if KAFKA_DEAD_LETTER_TOPIC:
+        producer = KafkaProducer(bootstrap_servers=KAFKA_BOOTSTRAP.split(','))
+        dead_letter = DeadLetterTopic(producer, KAFKA_DEAD_LETTER_TOPIC)
+    engine = IngestEngine(consumer, collection, load_encoder(), metrics=IngestMetrics(), dead_letter=dead_letter)
     print(f"[kafka] listening to {KAFKA_TOPIC} on {KAFKA_BOOTSTRAP} ...")
-    for record in consumer:
-        try:
-            msg = record.value
-            valid, reason = validate_message(msg)
-            if not valid:
-                print(f"[validate] skip: {reason}")
-                continue
-            text = msg['text']
-            emb = model.encode(text).tolist()
-            ok = upsert_to_mongo(msg, emb)
-            if ok:
-                print(f"[ingest] upserted {msg.get('url')}")
-            else:
-                print(f"[ingest] failed to upsert {msg.get('url')}")
-        except Exception as e:
-            print(f"[ingest] error: {e}")
+    try:
+        engine.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.metrics.maybe_report(force=True)
+        consumer.close()
+        if producer is not None:
+            producer.close()
 
 if __name__ == "__main__":
-    consume_and_ingest()
\ No newline at end of file
+    consume_and_ingest()
@@ -1,21 +1,34 @@
 #!/usr/bin/env python3
 """
-Simple scraper producer:
+Scraper producer:
 - Loads kafka/config/whitelist.json
-- Fetches homepages and discovers a few internal links
+- Discovers article links from each domain's sitemaps (robots.txt Sitemap
+  lines or /sitemap.xml), RSS/Atom feeds and homepage links
+- Fetches pages concurrently, at most SCRAPER_DOMAIN_CONCURRENCY at a time and
+  one every SCRAPER_DOMAIN_DELAY seconds (or the robots.txt Crawl-delay) per
+  domain, skipping URLs disallowed by the cached robots.txt
+- Sends conditional requests (ETag / Last-Modified) and only produces articles
+  whose content hash is new or changed, tracked in a local SQLite state store
 - Extracts title + paragraph text (basic)
-- Produces JSON messages to Kafka topic
+- Produces JSON messages to Kafka in compressed batches, flushed once at the end
 
 Notes:
-- Development starter only. Add robots.txt checks, rate-limiting, site-specific parsers, sitemaps/RSS for production.
+- Development starter only. Add site-specific parsers for production.
 - Place a .env at repo root from kafka/.env.example
 """
 
 import os
+import gzip
 import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse, urljoin
+from urllib.robotparser import RobotFileParser
 from datetime import datetime
-from time import sleep
 
 import requests
 from bs4 import BeautifulSoup
@@ -28,24 +41,29 @@ load_dotenv(os.path.join(BASE_DIR, '..', '.env'), override=False)
 
 KAFKA_BOOTSTRAP = os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092')
 KAFKA_TOPIC = os.getenv('KAFKA_TOPIC', 'medical-articles')
+KAFKA_LINGER_MS = int(os.getenv('KAFKA_LINGER_MS', '50'))
+KAFKA_BATCH_SIZE = int(os.getenv('KAFKA_BATCH_SIZE', '262144'))
+KAFKA_COMPRESSION = os.getenv('KAFKA_COMPRESSION', 'gzip') or None
 USER_AGENT = os.getenv('SCRAPER_USER_AGENT', 'servvia-scraper/1.0')
 MIN_TEXT_LENGTH = int(os.getenv('SCRAPER_MIN_TEXT_LENGTH', '300'))
+MAX_WORKERS = int(os.getenv('SCRAPER_MAX_WORKERS', '8'))
+DOMAIN_CONCURRENCY = int(os.getenv('SCRAPER_DOMAIN_CONCURRENCY', '2'))
+DOMAIN_DELAY = float(os.getenv('SCRAPER_DOMAIN_DELAY', '0.5'))
+MAX_PAGES_PER_DOMAIN = int(os.getenv('SCRAPER_MAX_PAGES_PER_DOMAIN', '25'))
+MAX_SITEMAPS_PER_DOMAIN = int(os.getenv('SCRAPER_MAX_SITEMAPS_PER_DOMAIN', '5'))
+ROBOTS_TTL = int(os.getenv('SCRAPER_ROBOTS_TTL', '86400'))
 WHITELIST_PATH = os.path.join(BASE_DIR, '..', 'config', 'whitelist.json')
+STATE_PATH = os.getenv('SCRAPER_STATE_PATH', os.path.join(BASE_DIR, '..', 'state', 'scraper_state.sqlite'))
 
 HEADERS = {"User-Agent": USER_AGENT}
+FEED_TYPES = ('application/rss+xml', 'application/atom+xml')
 
 def load_whitelist(path=WHITELIST_PATH):
     with open(path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def fetch(url, timeout=15):
-    try:
-        r = requests.get(url, headers=HEADERS, timeout=timeout)
-        r.raise_for_status()
-        return r.text
-    except Exception as e:
-        print(f"[fetch] {url} -> {e}")
-        return None
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
 def extract_text(html):
     soup = BeautifulSoup(html, 'lxml')
@@ -61,63 +79,363 @@ def extract_text(html):
     text = ' '.join(text.split())
     return title, text
 
+def same_site(url, domain):
+    p = urlparse(url)
+    return p.scheme.startswith('http') and domain in p.netloc and len(p.path) > 1
+
 def discover_links(html, base_url, max_links=8):
     soup = BeautifulSoup(html, 'lxml')
-    parsed = urlparse(base_url)
-    domain = parsed.netloc
+    domain = urlparse(base_url).netloc
     links = []
     for a in soup.find_all('a', href=True):
-        href = a['href']
-        full = urljoin(base_url, href)
-        p = urlparse(full)
-        if p.scheme.startswith('http') and domain in p.netloc and len(p.path) > 1:
+        full = urljoin(base_url, a['href'])
+        if same_site(full, domain):
             links.append(full)
             if len(links) >= max_links:
                 break
     return list(dict.fromkeys(links))
 
+def discover_feeds(html, base_url):
+    """RSS/Atom feed URLs advertised in the page head."""
+    soup = BeautifulSoup(html, 'lxml')
+    return [
+        urljoin(base_url, link['href'])
+        for link in soup.find_all('link', href=True)
+        if (link.get('type') or '').lower() in FEED_TYPES
+    ]
+
+def parse_sitemap(content):
+    """(nested sitemap URLs, page URLs newest first) of a sitemap or sitemap index."""
+    if content[:2] == b'\x1f\x8b':
+        content = gzip.decompress(content)
+    soup = BeautifulSoup(content, 'xml')
+    if soup.find('sitemapindex'):
+        return [loc.get_text(strip=True) for loc in soup.find_all('loc')], []
+    entries = []
+    for url in soup.find_all('url'):
+        loc = url.find('loc')
+        if loc:
+            lastmod = url.find('lastmod')
+            entries.append((lastmod.get_text(strip=True) if lastmod else '', loc.get_text(strip=True)))
+    # ISO 8601 dates sort chronologically as strings
+    entries.sort(key=lambda entry: entry[0], reverse=True)
+    return [], [loc for _, loc in entries]
+
+def parse_feed(content):
+    """Item links of an RSS or Atom feed."""
+    soup = BeautifulSoup(content, 'xml')
+    links = []
+    for item in soup.find_all(['item', 'entry']):
+        link = item.find('link')
+        if link is None:
+            continue
+        href = link.get('href') or link.get_text(strip=True)
+        if href:
+            links.append(href)
+    return links
+
+
+class StateStore:
+    """
+    SQLite file remembering, per URL, the validators (ETag / Last-Modified)
+    and content hash of the last successful fetch, plus the robots.txt of
+    every domain.
+    """
+
+    def __init__(self, path=STATE_PATH):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, content_hash TEXT, fetched_at TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS robots (domain TEXT PRIMARY KEY, body TEXT, fetched_at REAL)"
+            )
+
+    def page(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        return dict(zip(('etag', 'last_modified', 'content_hash'), row)) if row else {}
+
+    def save_page(self, url, etag=None, last_modified=None, content_hash=None):
+        """Store the validators of ``url``; ``content_hash`` None keeps the stored one."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO pages (url, etag, last_modified, content_hash, fetched_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified, "
+                "content_hash = COALESCE(excluded.content_hash, pages.content_hash), fetched_at = excluded.fetched_at",
+                (url, etag, last_modified, content_hash, datetime.utcnow().isoformat() + "Z"),
+            )
+
+    def robots(self, domain, max_age):
+        with self._lock:
+            row = self._conn.execute("SELECT body, fetched_at FROM robots WHERE domain = ?", (domain,)).fetchone()
+        if row and time.time() - row[1] < max_age:
+            return row[0]
+        return None
+
+    def save_robots(self, domain, body):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO robots (domain, body, fetched_at) VALUES (?, ?, ?)", (domain, body, time.time())
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+class DomainLimiter:
+    """At most ``concurrency`` requests in flight and one request start every ``delay`` seconds."""
+
+    def __init__(self, concurrency=DOMAIN_CONCURRENCY, delay=DOMAIN_DELAY, clock=time.monotonic, sleep=time.sleep):
+        self.delay = delay
+        self.clock = clock
+        self.sleep = sleep
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    @contextmanager
+    def slot(self):
+        with self._slots:
+            with self._lock:
+                now = self.clock()
+                start = max(now, self._next_start)
+                self._next_start = start + self.delay
+            if start > now:
+                self.sleep(start - now)
+            yield
+
+
+class Scraper:
+    """
+    Discovers and fetches the pages of whitelisted domains. ``session_factory``
+    returns a requests.Session (one is kept per thread).
+    """
+
+    def __init__(self, state, session_factory=requests.Session, max_pages=MAX_PAGES_PER_DOMAIN,
+                 concurrency=DOMAIN_CONCURRENCY, delay=DOMAIN_DELAY, robots_ttl=ROBOTS_TTL, timeout=15,
+                 sleep=time.sleep):
+        self.state = state
+        self.session_factory = session_factory
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.delay = delay
+        self.robots_ttl = robots_ttl
+        self.timeout = timeout
+        self.sleep = sleep
+        self._local = threading.local()
+        self._robots = {}
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = self.session_factory()
+            self._local.session.headers.update(HEADERS)
+        return self._local.session
+
+    def robots(self, domain):
+        """Parsed robots.txt of ``domain``, from memory, the state store or the site."""
+        with self._lock:
+            parser = self._robots.get(domain)
+        if parser is not None:
+            return parser
+        body = self.state.robots(domain, self.robots_ttl)
+        if body is None:
+            body = ''
+            try:
+                r = self.session.get(f"https://{domain}/robots.txt", timeout=self.timeout)
+                if r.status_code == 200:
+                    body = r.text
+            except requests.RequestException as e:
+                print(f"[robots] {domain} -> {e}")
+            self.state.save_robots(domain, body)
+        parser = RobotFileParser()
+        parser.parse(body.splitlines())
+        with self._lock:
+            self._robots[domain] = parser
+        return parser
+
+    def limiter(self, domain):
+        with self._lock:
+            limiter = self._limiters.get(domain)
+        if limiter is None:
+            delay = max(self.delay, float(self.robots(domain).crawl_delay(USER_AGENT) or 0))
+            with self._lock:
+                limiter = self._limiters.setdefault(domain, DomainLimiter(self.concurrency, delay, sleep=self.sleep))
+        return limiter
+
+    def allowed(self, url, domain):
+        return self.robots(domain).can_fetch(USER_AGENT, url)
+
+    def fetch(self, url, domain, validators=None):
+        """Response of a rate limited GET, conditional when ``validators`` are given; None on errors."""
+        headers = {}
+        if validators and validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators and validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        try:
+            with self.limiter(domain).slot():
+                r = self.session.get(url, headers=headers, timeout=self.timeout)
+            if r.status_code != 304:
+                r.raise_for_status()
+            return r
+        except requests.RequestException as e:
+            print(f"[fetch] {url} -> {e}")
+            return None
+
+    def _sitemap_links(self, domain):
+        queue = self.robots(domain).site_maps() or [f"https://{domain}/sitemap.xml"]
+        links = []
+        fetched = 0
+        while queue and fetched < MAX_SITEMAPS_PER_DOMAIN and len(links) < self.max_pages:
+            sitemap_url = queue.pop(0)
+            if not self.allowed(sitemap_url, domain):
+                continue
+            fetched += 1
+            r = self.fetch(sitemap_url, domain)
+            if r is None or r.status_code != 200:
+                continue
+            try:
+                nested, pages = parse_sitemap(r.content)
+            except Exception as e:
+                print(f"[sitemap] {sitemap_url} -> {e}")
+                continue
+            queue.extend(nested)
+            links.extend(pages)
+        return links
+
+    def _feed_links(self, html, base_url, domain):
+        links = []
+        for feed_url in discover_feeds(html, base_url)[:2]:
+            r = self.fetch(feed_url, domain)
+            if r is not None and r.status_code == 200:
+                links.extend(parse_feed(r.content))
+        return links
+
+    def discover(self, domain):
+        """
+        Homepage response and up to ``max_pages`` article URLs of ``domain``,
+        sitemap entries (newest first) before feed items and homepage links.
+        """
+        base_url = f"https://{domain}"
+        home = self.fetch(base_url, domain) if self.allowed(base_url, domain) else None
+        links = self._sitemap_links(domain)
+        if home is not None:
+            links += self._feed_links(home.text, base_url, domain)
+            links += discover_links(home.text, base_url, max_links=self.max_pages)
+        candidates = [
+            url for url in dict.fromkeys(links)
+            if url != base_url and same_site(url, domain) and self.allowed(url, domain)
+        ]
+        return home, candidates[:self.max_pages]
+
+    def page(self, url, domain, response=None):
+        """
+        ``(message, validators)`` of a new or changed article, ``(None, None)``
+        otherwise. Validators of unchanged pages are stored right away; those
+        of produced articles once the message is delivered.
+        """
+        stored = self.state.page(url)
+        if response is None:
+            response = self.fetch(url, domain, stored)
+        if response is None or response.status_code == 304:
+            return None, None
+        validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        title, text = extract_text(response.text)
+        if not text or len(text) < MIN_TEXT_LENGTH:
+            self.state.save_page(url, **validators)
+            return None, None
+        text_hash = content_hash(text)
+        if text_hash == stored.get('content_hash'):
+            self.state.save_page(url, **validators)
+            return None, None
+        return build_msg(url, title, text, domain, text_hash), dict(validators, content_hash=text_hash)
+
 def create_producer():
     return KafkaProducer(
         bootstrap_servers=KAFKA_BOOTSTRAP.split(','),
+        key_serializer=lambda k: k.encode('utf-8'),
         value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+        linger_ms=KAFKA_LINGER_MS,
+        batch_size=KAFKA_BATCH_SIZE,
+        compression_type=KAFKA_COMPRESSION,
+        acks='all',
         retries=5
     )
 
-def build_msg(url, title, text, source):
+def build_msg(url, title, text, source, text_hash=None):
     return {
         "url": url,
         "title": title,
         "text": text,
         "source": source,
-        "scraped_at": datetime.utcnow().isoformat() + "Z"
+        "scraped_at": datetime.utcnow().isoformat() + "Z",
+        "content_hash": text_hash or content_hash(text),
     }
 
-def scrape_and_produce():
-    whitelist = load_whitelist()
-    producer = create_producer()
-    for entry in whitelist:
-        domain = entry.get('domain')
-        base_url = f"https://{domain}"
-        print(f"[scrape] {domain}")
-        home_html = fetch(base_url)
-        if not home_html:
-            print(f"[scrape] could not fetch {base_url}")
-            continue
-        candidates = [base_url] + discover_links(home_html, base_url, max_links=6)
-        for url in tqdm(candidates, desc=domain, leave=False):
-            html = fetch(url)
-            if not html:
-                continue
-            title, text = extract_text(html)
-            if not text or len(text) < MIN_TEXT_LENGTH:
+def scrape_and_produce(scraper=None, producer=None, whitelist=None, max_workers=MAX_WORKERS):
+    whitelist = whitelist if whitelist is not None else load_whitelist()
+    own_state = scraper is None
+    scraper = scraper or Scraper(StateStore())
+    producer = producer or create_producer()
+    sent = []
+    skipped = 0
+
+    def produce(url, message, validators):
+        nonlocal skipped
+        if message is None:
+            skipped += 1
+            return
+        sent.append((url, validators, producer.send(KAFKA_TOPIC, key=url, value=message)))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        discoveries = {pool.submit(scraper.discover, entry['domain']): entry['domain'] for entry in whitelist}
+        pages = {}
+        for future in as_completed(discoveries):
+            domain = discoveries[future]
+            try:
+                home, candidates = future.result()
+            except Exception as e:
+                print(f"[scrape] could not discover {domain}: {e}")
                 continue
-            msg = build_msg(url, title, text, domain)
-            producer.send(KAFKA_TOPIC, msg)
-            producer.flush()
-            print(f"[produce] {url} -> sent ({len(text)} chars)")
-            sleep(0.5)
+            print(f"[scrape] {domain}: {len(candidates)} candidate pages")
+            if home is not None:
+                pages[pool.submit(scraper.page, f"https://{domain}", domain, home)] = f"https://{domain}"
+            for url in candidates:
+                pages[pool.submit(scraper.page, url, domain)] = url
+        for future in tqdm(as_completed(pages), total=len(pages), desc="pages", leave=False):
+            try:
+                produce(pages[future], *future.result())
+            except Exception as e:
+                print(f"[scrape] {pages[future]} -> {e}")
+
+    producer.flush()
+    delivered = 0
+    for url, validators, future in sent:
+        # validators are only stored for delivered messages, failed ones are produced again next run
+        if future.succeeded():
+            scraper.state.save_page(url, **validators)
+            delivered += 1
+        else:
+            print(f"[produce] {url} -> failed: {future.exception}")
     producer.close()
-    print("[scrape] finished")
+    if own_state:
+        scraper.state.close()
+    print(f"[scrape] finished: {delivered} new or changed articles sent, {skipped} pages unchanged or skipped")
+    return delivered
 
 if __name__ == "__main__":
-    scrape_and_produce()
\ No newline at end of file
+    scrape_and_produce()
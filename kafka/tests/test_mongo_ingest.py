@@ -0,0 +1,239 @@
+import json
+import os
+import sys
+import unittest
+from collections import namedtuple
+
+import numpy as np
+from kafka.structs import TopicPartition
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "consumer"))
+
+import mongo_ingest  # noqa: E402
+
+Record = namedtuple("Record", ["offset", "value"])
+PARTITION = TopicPartition("medical-articles", 0)
+
+
+def article(url, text="word " * 100):
+    return {"url": url, "title": url, "text": text, "source": "who.int", "scraped_at": "2024-01-01T00:00:00Z"}
+
+
+class FakeConsumer:
+    def __init__(self, *batches):
+        self.batches = list(batches)
+        self.commits = 0
+        self.seeks = []
+        self.offset = 0
+        self.last = None
+
+    def poll(self, timeout_ms=0, max_records=None):
+        if not self.batches:
+            return {}
+        self.last = self.batches.pop(0)
+        records = []
+        for msg in self.last:
+            value = msg if isinstance(msg, bytes) else json.dumps(msg).encode("utf-8")
+            records.append(Record(self.offset, value))
+            self.offset += 1
+        return {PARTITION: records}
+
+    def commit(self):
+        self.commits += 1
+
+    def seek(self, partition, offset):
+        # the rewound batch is polled again
+        self.seeks.append((partition, offset))
+        self.batches.insert(0, self.last)
+        self.offset = offset
+
+    def assignment(self):
+        return {PARTITION}
+
+    def highwater(self, partition):
+        return 10
+
+    def position(self, partition):
+        return self.offset
+
+
+class BulkWriteResult:
+    def __init__(self, upserted_count, modified_count):
+        self.upserted_count = upserted_count
+        self.modified_count = modified_count
+
+
+class FakeCollection:
+    def __init__(self, docs=(), fail=0, reject=()):
+        self.docs = {doc["url"]: doc for doc in docs}
+        self.fail = fail
+        self.reject = set(reject)
+        self.bulk_writes = []
+
+    def find(self, query, projection=None):
+        return [dict(self.docs[url]) for url in query["url"]["$in"] if url in self.docs]
+
+    def bulk_write(self, operations, ordered=True):
+        if self.fail:
+            self.fail -= 1
+            raise AutoReconnect("connection lost")
+        rejected = [operation for operation in operations if operation._filter["url"] in self.reject]
+        if rejected:
+            raise BulkWriteError({"writeErrors": [{"errmsg": "document too large"}], "nInserted": 0})
+        self.bulk_writes.append(operations)
+        upserted = 0
+        for operation in operations:
+            url = operation._filter["url"]
+            upserted += url not in self.docs
+            doc = self.docs.setdefault(url, {})
+            doc.update(operation._doc["$set"])
+            for field in operation._doc.get("$unset", {}):
+                doc.pop(field, None)
+        return BulkWriteResult(upserted, len(operations) - upserted)
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False):
+        self.calls.append(list(texts))
+        return np.array([[len(text), 1.0] for text in texts])
+
+
+class TestMongoIngest(unittest.TestCase):
+    def engine(self, consumer, collection, **kwargs):
+        self.sleeps = []
+        self.encoder = FakeEncoder()
+        metrics = mongo_ingest.IngestMetrics(interval=3600, port=0)
+        return mongo_ingest.IngestEngine(consumer, collection, self.encoder, metrics=metrics, sleep=self.sleeps.append, **kwargs)
+
+    def test_batch_is_encoded_once_and_written_with_one_bulk_write(self):
+        consumer = FakeConsumer([article("https://a"), article("https://b"), article("https://c", "x" * 2500)])
+        collection = FakeCollection()
+        engine = self.engine(consumer, collection, chunk_size=1000, chunk_overlap=100)
+        assert engine.run_once()
+        assert len(self.encoder.calls) == 1
+        assert len(collection.bulk_writes) == 1
+        assert consumer.commits == 1
+        long_doc = collection.docs["https://c"]
+        assert len(long_doc["chunks"]) == 3
+        assert long_doc["embedding"] == np.mean([chunk["embedding"] for chunk in long_doc["chunks"]], axis=0).tolist()
+        assert "chunks" not in collection.docs["https://a"]
+        assert engine.metrics.totals["written"] == 3
+
+    def test_unchanged_articles_are_skipped(self):
+        text = "word " * 100
+        stored = {"url": "https://a", "content_hash": mongo_ingest.content_hash(text)}
+        consumer = FakeConsumer([article("https://a", text), article("https://b")])
+        collection = FakeCollection([stored])
+        engine = self.engine(consumer, collection)
+        engine.run_once()
+        assert len(self.encoder.calls[0]) == 1
+        assert [op._filter["url"] for op in collection.bulk_writes[0]] == ["https://b"]
+        assert engine.metrics.totals["unchanged"] == 1
+        assert consumer.commits == 1
+
+    def test_all_unchanged_commits_without_writing(self):
+        text = "word " * 100
+        consumer = FakeConsumer([article("https://a", text)])
+        collection = FakeCollection([{"url": "https://a", "content_hash": mongo_ingest.content_hash(text)}])
+        engine = self.engine(consumer, collection)
+        engine.run_once()
+        assert self.encoder.calls == []
+        assert collection.bulk_writes == []
+        assert consumer.commits == 1
+
+    def test_failed_write_is_rewound_and_not_committed(self):
+        consumer = FakeConsumer([article("https://a"), article("https://b")])
+        collection = FakeCollection(fail=1)
+        engine = self.engine(consumer, collection)
+        assert not engine.run_once()
+        assert consumer.commits == 0
+        assert consumer.seeks == [(PARTITION, 0)]
+        assert self.sleeps == [1]
+        assert engine.metrics.totals["failed_batches"] == 1
+
+    def test_batch_failing_past_max_retries_dead_letters_only_the_failing_message(self):
+        consumer = FakeConsumer([article("https://a"), article("https://bad"), article("https://c")])
+        collection = FakeCollection(reject=["https://bad"])
+        dead_letters = []
+        engine = self.engine(consumer, collection, max_retries=2,
+                             dead_letter=lambda record, reason: dead_letters.append((record.offset, reason)))
+        assert not engine.run_once()
+        assert not engine.run_once()
+        assert engine.run_once()
+        assert [offset for offset, _ in dead_letters] == [1]
+        assert dead_letters[0][1].startswith("BulkWriteError")
+        assert set(collection.docs) == {"https://a", "https://c"}
+        assert consumer.commits == 1
+        assert engine.metrics.totals["dead_lettered"] == 1
+        assert consumer.poll() == {}
+
+    def test_lost_connection_is_retried_without_dead_lettering(self):
+        consumer = FakeConsumer([article("https://a")])
+        collection = FakeCollection(fail=4)
+        dead_letters = []
+        engine = self.engine(consumer, collection, max_retries=1,
+                             dead_letter=lambda record, reason: dead_letters.append(record))
+        assert [engine.run_once() for _ in range(5)] == [False] * 4 + [True]
+        assert dead_letters == []
+        assert self.sleeps == [1, 2, 4, 8]
+        assert set(collection.docs) == {"https://a"}
+
+    def test_dead_letter_topic_sends_the_record_with_its_origin(self):
+        class Future:
+            def get(self, timeout=None):
+                return None
+
+        class Producer:
+            sent = []
+
+            def send(self, topic, value=None, headers=None):
+                self.sent.append((topic, value, dict(headers)))
+                return Future()
+
+        producer = Producer()
+        record = namedtuple("ConsumerRecord", ["topic", "partition", "offset", "value"])("medical-articles", 0, 7, b"{}")
+        mongo_ingest.DeadLetterTopic(producer, "medical-articles.dead-letter")(record, "BulkWriteError: too large")
+        assert producer.sent == [(
+            "medical-articles.dead-letter", b"{}",
+            {"reason": b"BulkWriteError: too large", "source": b"medical-articles-0@7"},
+        )]
+
+    def test_url_and_text_must_be_strings(self):
+        assert mongo_ingest.validate_message(dict(article("https://a"), url={"href": "https://a"})) == (
+            False, "url is not a non-empty string")
+        assert mongo_ingest.validate_message(dict(article("https://a"), text=["word"] * 400)) == (
+            False, "text is not a string")
+        assert mongo_ingest.validate_message(article("https://a")) == (True, None)
+
+    def test_invalid_messages_are_skipped_and_committed(self):
+        consumer = FakeConsumer([b"not json", {"url": "https://a"}, article("https://b", "short")])
+        collection = FakeCollection()
+        engine = self.engine(consumer, collection)
+        assert engine.run_once()
+        assert engine.metrics.totals["invalid"] == 3
+        assert collection.bulk_writes == []
+        assert consumer.commits == 1
+
+    def test_lag_is_recorded_per_partition(self):
+        consumer = FakeConsumer([article("https://a"), article("https://b")])
+        engine = self.engine(consumer, FakeCollection())
+        engine.run_once()
+        assert engine.metrics.lag == {"medical-articles-0": 8}
+
+    def test_chunk_spans_cover_the_text_with_overlap(self):
+        text = " ".join(f"w{i}" for i in range(1000))
+        spans = mongo_ingest.chunk_spans(text, size=500, overlap=50)
+        assert spans[0][0] == 0
+        assert spans[-1][1] == len(text)
+        for (start, end), (next_start, _) in zip(spans, spans[1:]):
+            assert end - start <= 500
+            assert next_start < end
+        assert mongo_ingest.chunk_spans("short", size=500) == [(0, 5)]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+import os
+import sys
+import unittest
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scraper"))
+
+import producer  # noqa: E402
+
+ARTICLE = "<html><head><title>{title}</title></head><body><article><p>{text}</p></article></body></html>"
+HOME = (
+    '<html><head><link rel="alternate" type="application/rss+xml" href="/feed.xml"></head>'
+    '<body><a href="/news/home-link">news</a><a href="https://other.org/x">other</a></body></html>'
+)
+SITEMAP = (
+    '<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+    '<url><loc>https://who.int/old</loc><lastmod>2023-01-01</lastmod></url>'
+    '<url><loc>https://who.int/new</loc><lastmod>2024-05-01</lastmod></url>'
+    '<url><loc>https://who.int/private/page</loc></url>'
+    '</urlset>'
+)
+FEED = '<?xml version="1.0"?><rss><channel><item><link>https://who.int/from-feed</link></item></channel></rss>'
+ROBOTS = "User-agent: *\nDisallow: /private/\nSitemap: https://who.int/sitemap.xml\n"
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+
+class FakeSite:
+    """Serves fixed pages and answers 304 to requests carrying the current ETag."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def session(self):
+        site = self
+
+        class Session:
+            headers = {}
+
+            def get(self, url, headers=None, timeout=None):
+                site.requests.append((url, dict(headers or {})))
+                if url not in site.pages:
+                    return FakeResponse(404)
+                text, etag = site.pages[url]
+                if etag and (headers or {}).get("If-None-Match") == etag:
+                    return FakeResponse(304)
+                return FakeResponse(200, text, {"ETag": etag} if etag else {})
+
+        return Session()
+
+
+class FakeFuture:
+    def __init__(self, ok=True):
+        self.ok = ok
+        self.exception = None if ok else Exception("broker down")
+
+    def succeeded(self):
+        return self.ok
+
+
+class FakeProducer:
+    def __init__(self, ok=True):
+        self.ok = ok
+        self.sent = []
+        self.flushes = 0
+
+    def send(self, topic, key=None, value=None):
+        self.sent.append(value)
+        return FakeFuture(self.ok)
+
+    def flush(self):
+        self.flushes += 1
+
+    def close(self):
+        pass
+
+
+def site_pages(article_text="health advice " * 40):
+    return {
+        "https://who.int/robots.txt": (ROBOTS, None),
+        "https://who.int": (HOME, None),
+        "https://who.int/sitemap.xml": (SITEMAP, None),
+        "https://who.int/feed.xml": (FEED, None),
+        "https://who.int/new": (ARTICLE.format(title="New", text=article_text), '"v1"'),
+        "https://who.int/old": (ARTICLE.format(title="Old", text="vaccines " * 60), None),
+        "https://who.int/from-feed": (ARTICLE.format(title="Feed", text="malaria " * 60), '"f1"'),
+        "https://who.int/news/home-link": (ARTICLE.format(title="Short", text="too short"), None),
+        "https://who.int/private/page": (ARTICLE.format(title="Private", text="secret " * 60), None),
+    }
+
+
+class TestScraperProducer(unittest.TestCase):
+    def setUp(self):
+        self.state = producer.StateStore(":memory:")
+
+    def run_scraper(self, site, kafka):
+        scraper = producer.Scraper(self.state, session_factory=site.session, delay=0, sleep=lambda seconds: None)
+        return producer.scrape_and_produce(scraper, kafka, [{"domain": "who.int"}], max_workers=4)
+
+    def test_discovers_sitemap_feed_and_homepage_links_and_respects_robots(self):
+        site = FakeSite(site_pages())
+        kafka = FakeProducer()
+        assert self.run_scraper(site, kafka) == 3
+        assert sorted(msg["url"] for msg in kafka.sent) == [
+            "https://who.int/from-feed", "https://who.int/new", "https://who.int/old"
+        ]
+        assert "https://who.int/private/page" not in [url for url, _ in site.requests]
+        assert kafka.flushes == 1
+
+    def test_second_run_sends_conditional_requests_and_only_changed_articles(self):
+        site = FakeSite(site_pages())
+        self.run_scraper(site, FakeProducer())
+        site.pages["https://who.int/old"] = (ARTICLE.format(title="Old", text="updated vaccines " * 60), None)
+        site.requests = []
+        kafka = FakeProducer()
+        assert self.run_scraper(site, kafka) == 1
+        assert [msg["url"] for msg in kafka.sent] == ["https://who.int/old"]
+        conditional = dict(site.requests)
+        assert conditional["https://who.int/new"] == {"If-None-Match": '"v1"'}
+        # robots.txt comes from the state store
+        assert "https://who.int/robots.txt" not in conditional
+
+    def test_undelivered_articles_are_sent_again(self):
+        site = FakeSite(site_pages())
+        assert self.run_scraper(site, FakeProducer(ok=False)) == 0
+        assert self.run_scraper(site, FakeProducer()) == 3
+
+    def test_domain_limiter_spaces_request_starts(self):
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        limiter = producer.DomainLimiter(concurrency=1, delay=2.0, clock=lambda: now[0], sleep=sleep)
+        for _ in range(3):
+            with limiter.slot():
+                pass
+        assert sleeps == [2.0, 2.0]
+
+    def test_parse_sitemap_orders_newest_first(self):
+        nested, pages = producer.parse_sitemap(SITEMAP.encode("utf-8"))
+        assert nested == []
+        assert pages[:2] == ["https://who.int/new", "https://who.int/old"]
+
+
+if __name__ == "__main__":
+    unittest.main()